@@ -84,9 +84,57 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # WAL lets pages keep reading while a quiz submission commits, and
+        # IMMEDIATE transactions take the write lock up front so concurrent
+        # writers wait up to the busy timeout instead of failing mid-way.
+        'OPTIONS': {
+            'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 20)),
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+        },
     }
 }
 
+# Write-behind buffer for exam-mode quiz submissions, see quizzes/exam.py
+EXAM_BATCH_SIZE = int(os.environ.get('EXAM_BATCH_SIZE', 50))
+EXAM_FLUSH_INTERVAL = float(os.environ.get('EXAM_FLUSH_INTERVAL', 0.5))
+
+# Seconds between full rebuilds of the in-memory leaderboards, see progress/leaderboards.py
+LEADERBOARD_REBUILD_INTERVAL = int(os.environ.get('LEADERBOARD_REBUILD_INTERVAL', 900))
+
+# Bytes of computed simulation results each process keeps, see simulations/results.py
+SIMULATION_CACHE_BYTES = int(os.environ.get('SIMULATION_CACHE_BYTES', 64 * 1024 * 1024))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+FRAGMENT_CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',  # requires the redis package
+}
+FRAGMENT_CACHE_BACKEND = os.environ.get('FRAGMENT_CACHE_BACKEND', 'locmem')
+FRAGMENT_CACHE_LOCATION = os.environ.get('FRAGMENT_CACHE_LOCATION', {
+    'locmem': 'physics-fragments',
+    'file': str(BASE_DIR / 'cache' / 'fragments'),
+    'redis': 'redis://127.0.0.1:6379/1',
+}.get(FRAGMENT_CACHE_BACKEND))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'physics-default',
+    },
+    # Rendered HTML fragments of catalogue pages, see topics/fragments.py
+    'fragments': {
+        'BACKEND': FRAGMENT_CACHE_BACKENDS[FRAGMENT_CACHE_BACKEND],
+        'LOCATION': FRAGMENT_CACHE_LOCATION,
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,52 @@
+"""
+Test helpers shared by the apps' test suites.
+
+``ListPageQueryCountTestCase`` checks that a list page costs the same
+number of queries at every size in ``ROW_COUNTS``; each app's subclass adds
+the rows its pages list.
+"""
+from django.test import TestCase
+
+from topics.models import CBCGrade, PhysicsTopic
+
+ROW_COUNTS = [10, 100, 1000]
+
+
+class ListPageQueryCountTestCase(TestCase):
+    """Each list page must cost the same number of queries whatever its size"""
+    # The context list of a page that must not be empty, if any
+    context_name = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.grades = [CBCGrade.objects.create(name=f'Grade {n}', order=n) for n in range(7, 10)]
+
+    @classmethod
+    def create_topics(cls, description):
+        """One topic in each grade"""
+        return [
+            PhysicsTopic.objects.create(
+                grade=grade, title=f'Topic {n}', slug=f'topic-{n}', description=description,
+                learning_outcomes='Outcomes', estimated_duration=30,
+            )
+            for n, grade in enumerate(cls.grades)
+        ]
+
+    def add_rows(self, start, stop):
+        """Bulk-create the listed rows numbered ``start`` to ``stop``"""
+        raise NotImplementedError
+
+    def assertConstantQueries(self, num, url, params=None, prepare=None):
+        """``prepare`` runs after each batch of rows is added, outside the count"""
+        created = 0
+        for rows in ROW_COUNTS:
+            with self.subTest(rows=rows):
+                self.add_rows(created, rows)
+                created = rows
+                if prepare is not None:
+                    prepare()
+                with self.assertNumQueries(num):
+                    response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 200)
+                if self.context_name:
+                    self.assertGreater(len(response.context[self.context_name]), 0)
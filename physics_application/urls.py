@@ -23,6 +23,7 @@ from topics import views as topics_views
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', topics_views.home, name='home'),
+    path('search/suggest/', topics_views.search_suggest, name='search_suggest'),
     path('topics/', include('topics.urls')),
     path('simulations/', include('simulations.urls')),
     path('quizzes/', include('quizzes.urls')),
@@ -0,0 +1,187 @@
+"""
+Achievement rules compiled from ``Achievement.criteria``.
+
+Each active achievement's criteria dict (for example ``{'topics_completed':
+5}`` or ``{'quiz_score': 100}``) is compiled once into rules indexed by the
+event that can satisfy them. Within an event the rules are sorted by the
+threshold of that event's criterion, so an incoming event only looks at the
+rules its value already reaches. Values come from the user's materialized
+``LearningAnalytics`` counters (or the event itself for a quiz score), so
+evaluating an event never scans history. New awards are written with one
+``bulk_create``.
+
+The compiled index lives in each process and is rebuilt when the shared
+``VERSION_KEY`` is bumped by a change to any achievement.
+"""
+from bisect import bisect_right
+from collections import namedtuple
+from functools import partial
+import logging
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+
+from quizzes.models import QuizAttempt
+from . import leaderboards
+from .models import Achievement, UserAchievement, LearningAnalytics
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'achievements:version'
+
+QUIZ_PASSED = 'quiz_passed'
+TOPIC_COMPLETED = 'topic_completed'
+SIMULATION_FINISHED = 'simulation_finished'
+STREAK_REACHED = 'streak_reached'
+
+# Criteria key -> event that can satisfy it
+CRITERIA_EVENTS = {
+    'quiz_score': QUIZ_PASSED,
+    'topics_completed': TOPIC_COMPLETED,
+    'simulations_completed': SIMULATION_FINISHED,
+    'streak_days': STREAK_REACHED,
+}
+EVENT_KEYS = {event: key for key, event in CRITERIA_EVENTS.items()}
+
+Rule = namedtuple('Rule', 'threshold achievement_id conditions')
+
+_lock = threading.Lock()
+_index = None
+
+
+def counters(analytics, quiz_score=None):
+    """Criteria values of a user from their analytics row"""
+    values = {
+        'topics_completed': analytics.topics_completed,
+        'simulations_completed': analytics.simulations_explored,
+        'streak_days': analytics.longest_streak,
+    }
+    if quiz_score is not None:
+        values['quiz_score'] = quiz_score
+    return values
+
+
+def compile_rules(achievements):
+    """Index ``(id, criteria)`` pairs by event, each list sorted by threshold"""
+    index = {}
+    for achievement_id, criteria in achievements:
+        if not isinstance(criteria, dict) or not criteria:
+            logger.warning('Achievement %s has no usable criteria', achievement_id)
+            continue
+        unknown = set(criteria) - set(CRITERIA_EVENTS)
+        if unknown:
+            logger.warning('Achievement %s has unknown criteria %s', achievement_id, sorted(unknown))
+            continue
+        try:
+            conditions = tuple(sorted((key, float(value)) for key, value in criteria.items()))
+        except (TypeError, ValueError):
+            logger.warning('Achievement %s has non-numeric criteria', achievement_id)
+            continue
+        # File the rule under every event that may complete it
+        for key, threshold in conditions:
+            index.setdefault(CRITERIA_EVENTS[key], []).append(
+                Rule(threshold, achievement_id, conditions)
+            )
+    for rules in index.values():
+        rules.sort()
+    return {event: (rules, [rule.threshold for rule in rules]) for event, rules in index.items()}
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate():
+    """Make every process recompile the rules"""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def get_rules():
+    global _index
+    version = current_version()
+    index = _index
+    if index is None or index[0] != version:
+        with _lock:
+            if _index is None or _index[0] != version:
+                _index = (version, compile_rules(
+                    Achievement.objects.filter(is_active=True).values_list('id', 'criteria')
+                ))
+            index = _index
+    return index[1]
+
+
+def satisfied(events, values, rules=None):
+    """Ids of achievements whose criteria ``values`` meet, among the rules of ``events``"""
+    rules = get_rules() if rules is None else rules
+    found = set()
+    for event in events:
+        value = values.get(EVENT_KEYS[event])
+        if event not in rules or value is None:
+            continue
+        event_rules, thresholds = rules[event]
+        # Only the rules whose threshold the event's value reaches can be met
+        for rule in event_rules[:bisect_right(thresholds, value)]:
+            if all(values.get(key, float('-inf')) >= threshold for key, threshold in rule.conditions):
+                found.add(rule.achievement_id)
+    return found
+
+
+def award(user_id, achievement_ids):
+    """Create the missing UserAchievement rows; returns the newly earned ids"""
+    if not achievement_ids:
+        return set()
+    # Also drops achievements removed since the rules were compiled
+    new = dict(Achievement.objects.filter(id__in=achievement_ids, is_active=True).exclude(
+        users__user_id=user_id
+    ).values_list('id', 'points'))
+    UserAchievement.objects.bulk_create(
+        [UserAchievement(user_id=user_id, achievement_id=achievement_id) for achievement_id in new],
+        ignore_conflicts=True,
+    )
+    if new:
+        transaction.on_commit(partial(leaderboards.record_points, user_id, sum(new.values())))
+    return set(new)
+
+
+def handle(analytics, events, quiz_score=None):
+    """Award whatever ``events`` completed for the owner of ``analytics``"""
+    if not events:
+        return set()
+    return award(analytics.user_id, satisfied(events, counters(analytics, quiz_score)))
+
+
+def backfill(batch_size=500):
+    """Evaluate every rule for every user with analytics, in batches; returns awards made"""
+    rules = get_rules()
+    events = list(rules)
+    awarded = 0
+    last_id = 0
+    while True:
+        batch = list(LearningAnalytics.objects.filter(id__gt=last_id).order_by('id')[:batch_size])
+        if not batch:
+            return awarded
+        last_id = batch[-1].id
+        user_ids = [analytics.user_id for analytics in batch]
+        best_scores = dict(QuizAttempt.objects.filter(
+            user_id__in=user_ids, is_passed=True, completed_at__isnull=False
+        ).values('user_id').annotate(best=Max('score')).values_list('user_id', 'best'))
+        earned = set(UserAchievement.objects.filter(user_id__in=user_ids).values_list(
+            'user_id', 'achievement_id'
+        ))
+        new = [
+            UserAchievement(user_id=analytics.user_id, achievement_id=achievement_id)
+            for analytics in batch
+            for achievement_id in satisfied(
+                events, counters(analytics, best_scores.get(analytics.user_id)), rules
+            )
+            if (analytics.user_id, achievement_id) not in earned
+        ]
+        UserAchievement.objects.bulk_create(new, ignore_conflicts=True)
+        awarded += len(new)
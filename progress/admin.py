@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (
     UserProfile, TopicProgress, LearningPath, Achievement, 
-    UserAchievement, StudySession, LearningAnalytics
+    UserAchievement, StudySession, LearningAnalytics, ActivityCalendar, ClassRoster,
+    ReviewAnswer, ReviewState,
 )
 
 
@@ -56,4 +57,35 @@ class LearningAnalyticsAdmin(admin.ModelAdmin):
     list_display = ['user', 'total_study_time', 'topics_completed', 'current_streak', 'last_updated']
     list_filter = ['last_updated']
     search_fields = ['user__username']
-    readonly_fields = ['last_updated']
\ No newline at end of file
+    readonly_fields = ['last_updated']
+
+
+@admin.register(ActivityCalendar)
+class ActivityCalendarAdmin(admin.ModelAdmin):
+    list_display = ['user', 'last_active_on', 'current_streak', 'longest_streak', 'updated_at']
+    search_fields = ['user__username']
+    readonly_fields = ['days', 'updated_at']
+
+
+@admin.register(ClassRoster)
+class ClassRosterAdmin(admin.ModelAdmin):
+    list_display = ['name', 'teacher', 'grade', 'school', 'created_at']
+    list_filter = ['grade', 'school']
+    search_fields = ['name', 'teacher__username', 'school']
+    filter_horizontal = ['students']
+
+
+@admin.register(ReviewState)
+class ReviewStateAdmin(admin.ModelAdmin):
+    list_display = ['user', 'question', 'repetitions', 'interval', 'ease', 'due_on']
+    list_filter = ['due_on']
+    search_fields = ['user__username', 'question__question_text']
+    raw_id_fields = ['user', 'question']
+
+
+@admin.register(ReviewAnswer)
+class ReviewAnswerAdmin(admin.ModelAdmin):
+    list_display = ['user', 'question', 'quality', 'answered_at']
+    list_filter = ['answered_at']
+    search_fields = ['user__username', 'question__question_text']
+    raw_id_fields = ['user', 'question', 'session']
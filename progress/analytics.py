@@ -0,0 +1,293 @@
+"""
+Materialized learning analytics.
+
+Each user's ``LearningAnalytics`` row is kept current from deltas: when a
+quiz attempt, topic progress, study session or simulation session is saved
+or deleted, only the difference between its old and new contribution is
+applied to the row. Dashboards therefore read one row instead of
+aggregating the user's whole history, and ``rebuild_all`` recomputes every
+row in bulk for backfills or after bulk updates that bypass signals.
+
+What each source contributes:
+
+* completed ``QuizAttempt`` -> ``quizzes_taken`` and ``average_quiz_score``
+* ``TopicProgress`` completed or mastered -> ``topics_completed`` and
+  ``learning_velocity``; its ``time_spent`` ranks ``favorite_topics``, and
+  any change between not started, in progress and completed makes
+  ``recommended_topics`` stale
+* ``StudySession.duration`` -> ``total_study_time``
+* completed ``SimulationSession`` -> ``simulations_explored`` (distinct)
+* closed study sessions, completed attempts and simulation sessions are
+  activity for ``current_streak``/``longest_streak``, and topic completions
+  feed ``learning_velocity``; both come from the user's activity calendar
+  (see ``progress.streaks``)
+"""
+from collections import defaultdict
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from quizzes.models import QuizAttempt
+from simulations.models import SimulationSession
+from . import achievements, leaderboards, streaks
+from .models import ActivityCalendar, TopicProgress, StudySession, LearningAnalytics
+
+User = get_user_model()
+
+COMPLETED_STATUSES = streaks.COMPLETED_STATUSES
+FAVORITE_TOPICS = 5
+# Contributions that progress.recommendations reads
+RECOMMENDATION_FEATURES = ('topics_completed', 'topics_in_progress', 'quizzes_taken', 'quiz_score_sum')
+
+
+def quiz_contribution(attempt):
+    if attempt.completed_at is None or attempt.score is None:
+        return {}
+    return {'quizzes_taken': 1, 'quiz_score_sum': attempt.score}
+
+
+def topic_contribution(progress):
+    completed = progress.status in COMPLETED_STATUSES
+    return {
+        'topics_completed': 1 if completed else 0,
+        # Not stored, but a feature of the recommendations
+        'topics_in_progress': 1 if progress.status != 'not_started' and not completed else 0,
+    }
+
+
+def study_contribution(session):
+    return {'total_study_time': session.duration or 0}
+
+
+CONTRIBUTIONS = {
+    QuizAttempt: quiz_contribution,
+    TopicProgress: topic_contribution,
+    StudySession: study_contribution,
+}
+
+
+def contribution(instance):
+    return CONTRIBUTIONS[type(instance)](instance)
+
+
+def activity_date(instance):
+    """The local day an instance counts as learning activity, if any"""
+    if isinstance(instance, QuizAttempt):
+        moment = instance.completed_at
+    elif isinstance(instance, StudySession):
+        moment = instance.ended_at
+    elif isinstance(instance, SimulationSession):
+        moment = instance.started_at
+    else:
+        moment = None
+    return timezone.localdate(moment) if moment else None
+
+
+def difference(before, after):
+    keys = set(before) | set(after)
+    delta = {key: after.get(key, 0) - before.get(key, 0) for key in keys}
+    return {key: value for key, value in delta.items() if value}
+
+
+def copy_calendar(analytics, calendar, today=None):
+    """Denormalize streaks and velocity from an activity calendar"""
+    analytics.last_active_on = calendar.last_active_on
+    analytics.current_streak = streaks.current_streak(calendar, today)
+    analytics.longest_streak = calendar.longest_streak
+    analytics.learning_velocity = streaks.topics_per_week(calendar, today=today)
+
+
+def rank_favorites(entries):
+    entries.sort(key=lambda entry: (-entry['minutes'], entry['topic']))
+    return entries[:FAVORITE_TOPICS]
+
+
+def merge_favorite(favorites, user_id, topic_id, minutes):
+    """
+    Update the favorite topics list with a topic's new ``minutes`` (None when
+    its progress row is gone), querying only when a listed topic lost time.
+    """
+    previous = next((entry for entry in favorites if entry['topic'] == topic_id), None)
+    if previous is not None and (minutes or 0) < previous['minutes']:
+        return favorite_topics(user_id)
+    entries = [entry for entry in favorites if entry['topic'] != topic_id]
+    if minutes:
+        entries.append({'topic': topic_id, 'minutes': minutes})
+    return rank_favorites(entries)
+
+
+def favorite_topics(user_id):
+    return [
+        {'topic': topic_id, 'minutes': minutes}
+        for topic_id, minutes in TopicProgress.objects.filter(
+            user_id=user_id, time_spent__gt=0
+        ).order_by('-time_spent', 'topic_id').values_list('topic_id', 'time_spent')[:FAVORITE_TOPICS]
+    ]
+
+
+@transaction.atomic
+def apply(user_id, delta=None, active_on=None, favorite=None, completed_on=None,
+          quiz_score=None, create=True):
+    """
+    Apply a contribution ``delta`` to a user's analytics row, record activity
+    on ``active_on`` and update the favorite topics with a
+    ``(topic_id, minutes)`` pair. A change of ``topics_completed`` is counted
+    in the week of ``completed_on``, which for a quiz attempt is the day it
+    was completed, for the weekly leaderboard; ``quiz_score`` is the score of
+    a newly passed quiz. Without ``create`` a missing row is left alone, as
+    when rows are deleted along with their user. Achievements the update
+    completes are awarded before returning, and the leaderboards follow on
+    commit.
+    """
+    delta = delta or {}
+    rows = LearningAnalytics.objects.select_for_update()
+    if create:
+        analytics, _ = rows.get_or_create(user_id=user_id)
+    else:
+        analytics = rows.filter(user_id=user_id).first()
+        if analytics is None:
+            return None
+
+    taken = analytics.quizzes_taken
+    score_sum = (analytics.average_quiz_score or 0) * taken + delta.get('quiz_score_sum', 0)
+    taken += delta.get('quizzes_taken', 0)
+    analytics.quizzes_taken = max(taken, 0)
+    analytics.average_quiz_score = score_sum / taken if taken > 0 else None
+
+    for field in ('topics_completed', 'total_study_time', 'simulations_explored'):
+        setattr(analytics, field, max(getattr(analytics, field) + delta.get(field, 0), 0))
+
+    completions = delta.get('topics_completed') if completed_on else None
+    if active_on is not None or completions:
+        calendar = streaks.record(user_id, active_on, completed_on if completions else None,
+                                  completions or 0, create=create)
+        if calendar is not None:
+            copy_calendar(analytics, calendar)
+    if favorite is not None:
+        analytics.favorite_topics = merge_favorite(analytics.favorite_topics, user_id, *favorite)
+    if any(field in delta for field in RECOMMENDATION_FEATURES):
+        # Recomputed on the next read, see progress.recommendations
+        analytics.recommended_topics = None
+    analytics.save()
+
+    events = []
+    if quiz_score is not None and delta.get('quizzes_taken', 0) > 0:
+        events.append(achievements.QUIZ_PASSED)
+    if delta.get('topics_completed', 0) > 0:
+        events.append(achievements.TOPIC_COMPLETED)
+    if delta.get('simulations_explored', 0) > 0:
+        events.append(achievements.SIMULATION_FINISHED)
+    if active_on is not None:
+        events.append(achievements.STREAK_REACHED)
+    achievements.handle(analytics, events, quiz_score)
+    transaction.on_commit(partial(
+        leaderboards.record_analytics, user_id, analytics.average_quiz_score,
+        analytics.current_streak, delta, active_on, completed_on,
+    ))
+    return analytics
+
+
+def simulation_explored(session):
+    """Whether the user completed this simulation in any other session"""
+    return SimulationSession.objects.filter(
+        user_id=session.user_id, simulation_id=session.simulation_id, is_completed=True
+    ).exclude(pk=session.pk).exists()
+
+
+def record_simulation(before, session, deleted=False):
+    """Apply a simulation session change; ``before`` is its old (is_completed, day)"""
+    was_completed = bool(before and before[0])
+    is_completed = session.is_completed and not deleted
+    delta = {}
+    if was_completed != is_completed and not simulation_explored(session):
+        delta['simulations_explored'] = 1 if is_completed else -1
+    active_on = None if deleted or before else activity_date(session)
+    if delta or active_on:
+        apply(session.user_id, delta, active_on, create=not deleted)
+
+
+def empty_stats():
+    return {
+        'quizzes_taken': 0, 'quiz_score_sum': 0, 'topics_completed': 0,
+        'total_study_time': 0, 'simulations_explored': 0, 'favorites': [],
+    }
+
+
+def rebuild_all():
+    """
+    Recompute every user's analytics row, and activity calendar, from
+    history; returns the number of analytics rows written.
+    """
+    stats = defaultdict(empty_stats)
+
+    for user_id, taken, score_sum in QuizAttempt.objects.filter(
+        completed_at__isnull=False, score__isnull=False
+    ).values('user_id').annotate(taken=Count('id'), score_sum=Sum('score')).values_list(
+        'user_id', 'taken', 'score_sum'
+    ):
+        stats[user_id]['quizzes_taken'] = taken
+        stats[user_id]['quiz_score_sum'] = score_sum
+    for user_id, completed in TopicProgress.objects.filter(
+        status__in=COMPLETED_STATUSES
+    ).values('user_id').annotate(completed=Count('id')).values_list('user_id', 'completed'):
+        stats[user_id]['topics_completed'] = completed
+    for user_id, minutes in StudySession.objects.values('user_id').annotate(
+        minutes=Sum('duration')
+    ).values_list('user_id', 'minutes'):
+        stats[user_id]['total_study_time'] = minutes or 0
+    for user_id, explored in SimulationSession.objects.filter(is_completed=True).values(
+        'user_id'
+    ).annotate(explored=Count('simulation_id', distinct=True)).values_list('user_id', 'explored'):
+        stats[user_id]['simulations_explored'] = explored
+    for user_id, topic_id, minutes in TopicProgress.objects.filter(time_spent__gt=0).values_list(
+        'user_id', 'topic_id', 'time_spent'
+    ):
+        stats[user_id]['favorites'].append({'topic': topic_id, 'minutes': minutes})
+
+    calendars, _ = streaks.rebuild_all()
+    for user_id in calendars:
+        # Users with activity but nothing else to count still get a row
+        stats.setdefault(user_id, empty_stats())
+
+    users = User.objects.in_bulk(list(stats))
+    existing = LearningAnalytics.objects.in_bulk(list(stats), field_name='user_id')
+    now = timezone.now()
+    today = timezone.localdate(now)
+    to_create, to_update = [], []
+    for user_id, user_stats in stats.items():
+        if user_id not in users:
+            continue
+        analytics = existing.get(user_id) or LearningAnalytics(user_id=user_id)
+        taken = user_stats['quizzes_taken']
+        analytics.quizzes_taken = taken
+        analytics.average_quiz_score = user_stats['quiz_score_sum'] / taken if taken else None
+        analytics.topics_completed = user_stats['topics_completed']
+        analytics.total_study_time = user_stats['total_study_time']
+        analytics.simulations_explored = user_stats['simulations_explored']
+        analytics.favorite_topics = rank_favorites(user_stats['favorites'])
+        copy_calendar(analytics, calendars.get(user_id) or ActivityCalendar(), today)
+        analytics.last_updated = now
+        (to_update if analytics.pk else to_create).append(analytics)
+
+    LearningAnalytics.objects.bulk_create(to_create, batch_size=500)
+    LearningAnalytics.objects.bulk_update(to_update, [
+        'quizzes_taken', 'average_quiz_score', 'topics_completed', 'total_study_time',
+        'simulations_explored', 'learning_velocity', 'favorite_topics',
+        'last_active_on', 'current_streak', 'longest_streak', 'last_updated',
+    ], batch_size=500)
+    return len(to_create) + len(to_update)
+
+
+def refresh_from_calendars(calendars):
+    """Copy streaks and velocity of rebuilt calendars into existing analytics rows"""
+    today = timezone.localdate()
+    rows = list(LearningAnalytics.objects.filter(user_id__in=list(calendars)))
+    for row in rows:
+        copy_calendar(row, calendars[row.user_id], today)
+    LearningAnalytics.objects.bulk_update(rows, [
+        'last_active_on', 'current_streak', 'longest_streak', 'learning_velocity',
+    ], batch_size=500)
+    return len(rows)
@@ -0,0 +1,361 @@
+"""
+Class and school leaderboards.
+
+Rankings are kept in memory as sorted sets (see ``progress.sortedset``),
+one per ``(metric, window, grade, school)``. A student is ranked on the
+board of their class (their grade within their school) and on the board of
+their whole school; a student without a school is ranked among everyone in
+their grade. Metrics are achievement points, average quiz score and current
+streak, for all time and, except the streak, for the current week.
+
+Scoring events (an award, a completed quiz, a new active day) move the
+student on their boards once the transaction commits, in O(log n) per
+board, and reading the top ``k`` or a student's rank is O(log n + k). The
+boards are built from the database on the first read, and rebuilt every
+``LEADERBOARD_REBUILD_INTERVAL`` seconds, at the start of every week, and
+whenever the shared ``VERSION_KEY`` is bumped by ``rebuild_leaderboards``;
+until then a process only sees the events it handled itself. A rebuild
+runs in a background thread while reads keep getting the stale boards, and
+``REBUILD_LOCK_KEY`` lets one process at a time rebuild.
+"""
+from datetime import datetime, time
+import threading
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from quizzes.models import QuizAttempt
+from . import streaks
+from .models import ActivityCalendar, UserAchievement
+from .sortedset import SortedSet
+
+User = get_user_model()
+
+VERSION_KEY = 'leaderboards:version'
+REBUILD_LOCK_KEY = 'leaderboards:rebuilding'
+# Longer than any rebuild takes, so a crashed process cannot hold the lock for good
+REBUILD_LOCK_TIMEOUT = 60 * 5
+
+POINTS = 'points'
+QUIZ_AVERAGE = 'quiz_average'
+STREAK = 'streak'
+
+ALL_TIME = 'all'
+WEEK = 'week'
+
+# Metric -> windows it is ranked over
+WINDOWS = {
+    POINTS: (ALL_TIME, WEEK),
+    QUIZ_AVERAGE: (ALL_TIME, WEEK),
+    STREAK: (ALL_TIME,),
+}
+
+
+def week_started(day):
+    """The aware moment the week of ``day`` began"""
+    return timezone.make_aware(datetime.combine(streaks.week_start(day), time.min))
+
+
+def user_scopes(user_ids=None):
+    """``{user_id: (grade, school)}``, from the user model or else the profile grade"""
+    fields = {field.name for field in User._meta.get_fields()}
+    grade = 'grade_level' if 'grade_level' in fields else 'profile__current_grade__name'
+    school = 'school' if 'school' in fields else None
+    users = User.objects.all() if user_ids is None else User.objects.filter(id__in=user_ids)
+    columns = ['id', grade] + ([school] if school else [])
+    return {
+        row[0]: (row[1] or '', (row[2] or '') if school else '')
+        for row in users.values_list(*columns).iterator()
+    }
+
+
+def board_scopes(scope):
+    """The ``(grade, school)`` boards a student with ``scope`` is ranked on"""
+    grade, school = scope
+    if school and grade:
+        return [(grade, school), ('', school)]
+    return [(grade, school)]
+
+
+def load_scores(user_ids=None, today=None):
+    """
+    Every score from the database: ``{(metric, window): {user_id: score}}``,
+    and the ``{user_id: [score sum, count]}`` of quizzes completed this week.
+    """
+    today = today or timezone.localdate()
+    since = week_started(today)
+
+    def only(queryset):
+        return queryset if user_ids is None else queryset.filter(user_id__in=user_ids)
+
+    scores = {(metric, window): {} for metric, windows in WINDOWS.items() for window in windows}
+    earned = only(UserAchievement.objects.all())
+    for window, queryset in ((ALL_TIME, earned), (WEEK, earned.filter(earned_at__gte=since))):
+        scores[POINTS, window] = dict(queryset.values('user_id').annotate(
+            total=Sum('achievement__points')
+        ).values_list('user_id', 'total'))
+
+    completed = only(QuizAttempt.objects.filter(completed_at__isnull=False, score__isnull=False))
+    for user_id, score_sum, taken in completed.values('user_id').annotate(
+        score_sum=Sum('score'), taken=Count('id')
+    ).values_list('user_id', 'score_sum', 'taken'):
+        scores[QUIZ_AVERAGE, ALL_TIME][user_id] = score_sum / taken
+    weekly_quizzes = {
+        user_id: [score_sum, taken]
+        for user_id, score_sum, taken in completed.filter(completed_at__gte=since).values(
+            'user_id'
+        ).annotate(score_sum=Sum('score'), taken=Count('id')).values_list(
+            'user_id', 'score_sum', 'taken'
+        )
+    }
+    scores[QUIZ_AVERAGE, WEEK] = {
+        user_id: score_sum / taken for user_id, (score_sum, taken) in weekly_quizzes.items()
+    }
+
+    for calendar in only(ActivityCalendar.objects.only('user_id', 'last_active_on', 'current_streak')):
+        streak = streaks.current_streak(calendar, today)
+        if streak:
+            scores[STREAK, ALL_TIME][calendar.user_id] = streak
+    return scores, weekly_quizzes
+
+
+class Leaderboards:
+    """Every board of one process, with the state to update them from events"""
+
+    def __init__(self, background=True):
+        self.background = background
+        self.lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._thread = None
+        self.boards = {}
+        self.scopes = {}
+        self.weekly_quizzes = {}
+        self.week = None
+        self.version = None
+        self.built_at = None
+
+    @property
+    def is_built(self):
+        return self.built_at is not None
+
+    def board(self, metric, window, grade, school):
+        key = (metric, window, grade, school)
+        if key not in self.boards:
+            self.boards[key] = SortedSet()
+        return self.boards[key]
+
+    def rebuild(self, today=None):
+        """Replace every board with rankings read from the database"""
+        today = today or timezone.localdate()
+        version = current_version()
+        scopes = user_scopes()
+        scores, weekly_quizzes = load_scores(today=today)
+        members = {}
+        for (metric, window), values in scores.items():
+            for user_id, score in values.items():
+                if user_id not in scopes:
+                    continue
+                for grade, school in board_scopes(scopes[user_id]):
+                    members.setdefault((metric, window, grade, school), []).append((user_id, score))
+        boards = {key: SortedSet.build(items) for key, items in members.items()}
+        with self.lock:
+            self.boards = boards
+            self.scopes = scopes
+            self.weekly_quizzes = weekly_quizzes
+            self.week = streaks.week_start(today)
+            self.version = version
+            self.built_at = timezone.now()
+
+    def is_stale(self):
+        return (
+            self.version != current_version()
+            or self.week != streaks.week_start(timezone.localdate())
+            or (timezone.now() - self.built_at).total_seconds() > settings.LEADERBOARD_REBUILD_INTERVAL
+        )
+
+    def ensure_fresh(self):
+        """
+        Build the boards on the first read. Stale boards keep being served
+        while a background thread rebuilds them, unless another process
+        holds the rebuild lock, in which case a later read tries again.
+        """
+        if not self.is_built:
+            with self._build_lock:
+                if not self.is_built:
+                    self.rebuild()
+            return
+        if not self.is_stale():
+            return
+        with self.lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if not cache.add(REBUILD_LOCK_KEY, True, REBUILD_LOCK_TIMEOUT):
+                return
+            if not self.background:
+                self.refresh()
+                return
+            self._thread = threading.Thread(target=self._run, name='leaderboard-rebuild', daemon=True)
+            self._thread.start()
+
+    def refresh(self):
+        """Rebuild the boards and release the rebuild lock"""
+        try:
+            self.rebuild()
+        finally:
+            cache.delete(REBUILD_LOCK_KEY)
+
+    def _run(self):
+        try:
+            self.refresh()
+        finally:
+            close_old_connections()
+
+    def scope_of(self, user_id):
+        if user_id not in self.scopes:
+            self.scopes.update(user_scopes([user_id]))
+        return self.scopes.get(user_id)
+
+    def set_score(self, user_id, metric, window, score):
+        """Rank a student with ``score`` (None to drop them) on all their boards"""
+        scope = self.scope_of(user_id)
+        if scope is None:
+            return
+        for grade, school in board_scopes(scope):
+            board = self.board(metric, window, grade, school)
+            if score is None:
+                board.remove(user_id)
+            else:
+                board.add(user_id, score)
+
+    def add_score(self, user_id, metric, window, amount):
+        scope = self.scope_of(user_id)
+        if scope is None:
+            return
+        for grade, school in board_scopes(scope):
+            self.board(metric, window, grade, school).increment(user_id, amount)
+
+    def move(self, user_id):
+        """Re-rank a student whose grade or school may have changed"""
+        with self.lock:
+            old = self.scopes.pop(user_id, None)
+            if old is not None:
+                for (metric, window, grade, school), board in self.boards.items():
+                    if (grade, school) in board_scopes(old):
+                        board.remove(user_id)
+            scores, weekly_quizzes = load_scores([user_id])
+            self.weekly_quizzes.pop(user_id, None)
+            self.weekly_quizzes.update(weekly_quizzes)
+            for (metric, window), values in scores.items():
+                if user_id in values:
+                    self.set_score(user_id, metric, window, values[user_id])
+
+
+_leaderboards = Leaderboards()
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate():
+    """Make every process rebuild its boards on the next read"""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def get_leaderboards():
+    _leaderboards.ensure_fresh()
+    return _leaderboards
+
+
+def check(metric, window):
+    if window not in WINDOWS.get(metric, ()):
+        raise ValueError(f'No {window!r} leaderboard for {metric!r}')
+
+
+def top(metric, grade='', school='', window=ALL_TIME, count=10, start=0):
+    """Ranked ``{'rank', 'user_id', 'score'}`` entries of one board, from 1-based ``start + 1``"""
+    check(metric, window)
+    leaderboards = get_leaderboards()
+    with leaderboards.lock:
+        board = leaderboards.boards.get((metric, window, grade, school))
+        items = board.range(start, count) if board is not None else []
+    return [
+        {'rank': start + offset + 1, 'user_id': user_id, 'score': score}
+        for offset, (user_id, score) in enumerate(items)
+    ]
+
+
+def standing(user_id, metric, window=ALL_TIME):
+    """A student's 1-based rank and score on each of their boards"""
+    check(metric, window)
+    leaderboards = get_leaderboards()
+    with leaderboards.lock:
+        scope = leaderboards.scope_of(user_id)
+        if scope is None:
+            return []
+        standings = []
+        for grade, school in board_scopes(scope):
+            board = leaderboards.boards.get((metric, window, grade, school))
+            rank = board.rank(user_id) if board is not None else None
+            standings.append({
+                'grade': grade,
+                'school': school,
+                'rank': rank + 1 if rank is not None else None,
+                'score': board.score(user_id) if rank is not None else None,
+                'size': len(board) if board is not None else 0,
+            })
+    return standings
+
+
+def record_points(user_id, points):
+    """Credit newly earned achievement points"""
+    leaderboards = _leaderboards
+    if not leaderboards.is_built or not points:
+        return
+    with leaderboards.lock:
+        for window in WINDOWS[POINTS]:
+            leaderboards.add_score(user_id, POINTS, window, points)
+
+
+def record_analytics(user_id, average_quiz_score, current_streak, delta=None, active_on=None,
+                     completed_on=None):
+    """
+    Re-rank a student after their analytics changed. ``delta``,
+    ``active_on`` and ``completed_on`` are those given to
+    ``analytics.apply``: a quiz completed this week, ``completed_on`` or else
+    ``active_on``, moves this week's average by its part of ``delta``,
+    whether it was added, rescored or deleted.
+    """
+    leaderboards = _leaderboards
+    if not leaderboards.is_built:
+        return
+    delta = delta or {}
+    with leaderboards.lock:
+        if 'quizzes_taken' in delta or 'quiz_score_sum' in delta:
+            leaderboards.set_score(user_id, QUIZ_AVERAGE, ALL_TIME, average_quiz_score)
+            day = completed_on or active_on
+            if day is not None and streaks.week_start(day) == leaderboards.week:
+                weekly = leaderboards.weekly_quizzes.setdefault(user_id, [0, 0])
+                weekly[0] += delta.get('quiz_score_sum', 0)
+                weekly[1] += delta.get('quizzes_taken', 0)
+                if weekly[1] > 0:
+                    leaderboards.set_score(user_id, QUIZ_AVERAGE, WEEK, weekly[0] / weekly[1])
+                else:
+                    del leaderboards.weekly_quizzes[user_id]
+                    leaderboards.set_score(user_id, QUIZ_AVERAGE, WEEK, None)
+        if active_on is not None:
+            leaderboards.set_score(user_id, STREAK, ALL_TIME, current_streak or None)
+
+
+def move_user(user_id):
+    if _leaderboards.is_built:
+        _leaderboards.move(user_id)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from progress import achievements
+
+
+class Command(BaseCommand):
+    help = 'Evaluate every achievement for every user and award the ones already earned'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Users evaluated per batch')
+
+    def handle(self, *args, **options):
+        awarded = achievements.backfill(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Awarded {awarded} achievements'))
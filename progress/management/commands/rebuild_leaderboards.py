@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from progress import leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Make every process rebuild its leaderboards from the database (run periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=0,
+                            help='Also print this many leaders of every board')
+
+    def handle(self, *args, **options):
+        leaderboards.invalidate()
+        started = time.perf_counter()
+        boards = leaderboards.get_leaderboards()
+        elapsed = time.perf_counter() - started
+        if options['top']:
+            for (metric, window, grade, school) in sorted(boards.boards):
+                self.stdout.write(f'{metric} ({window}) grade={grade or "-"} school={school or "-"}')
+                for entry in leaderboards.top(metric, grade, school, window, options['top']):
+                    self.stdout.write(f"  {entry['rank']}. user {entry['user_id']}: {entry['score']:g}")
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(boards.boards)} boards for {len(boards.scopes)} users in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from progress import analytics
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's learning analytics from their full history"
+
+    def handle(self, *args, **options):
+        count = analytics.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt analytics for {count} users'))
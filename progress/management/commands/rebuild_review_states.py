@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from progress import reviews
+
+
+class Command(BaseCommand):
+    help = 'Recompute every spaced-repetition review state from quiz response history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Responses fetched and states written per batch')
+
+    def handle(self, *args, **options):
+        written = reviews.rebuild_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} review states'))
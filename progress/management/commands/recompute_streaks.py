@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from progress import analytics, streaks
+
+
+class Command(BaseCommand):
+    help = 'Rebuild every activity calendar from history and report drifted ones (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report mismatches, do not write anything')
+
+    def handle(self, *args, **options):
+        calendars, mismatched = streaks.rebuild_all(fix=not options['check'])
+        if mismatched:
+            self.stdout.write(self.style.WARNING(
+                f'{len(mismatched)} of {len(calendars)} calendars differed from history'
+            ))
+        if options['check']:
+            return
+        # Streaks decay with the date even without activity, so refresh them all
+        count = analytics.refresh_from_calendars(calendars)
+        self.stdout.write(self.style.SUCCESS(
+            f'Verified {len(calendars)} calendars, refreshed {count} analytics rows'
+        ))
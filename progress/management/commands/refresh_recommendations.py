@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from progress import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Recompute the topic recommendations of every user (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Users scored per batch')
+        parser.add_argument('--stale', action='store_true',
+                            help='Only users whose recommendations were invalidated')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = recommendations.refresh_all(options['batch_size'], stale_only=options['stale'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed recommendations of {written} users in {time.perf_counter() - started:.1f}s'
+        ))
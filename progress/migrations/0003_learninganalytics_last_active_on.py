@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='learninganalytics',
+            name='last_active_on',
+            field=models.DateField(blank=True, help_text='Last day with learning activity', null=True),
+        ),
+    ]
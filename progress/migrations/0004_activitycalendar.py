@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0003_learninganalytics_last_active_on'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityCalendar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin', models.DateField(blank=True, help_text='Day of the first bit in days', null=True)),
+                ('days', models.BinaryField(default=bytes, help_text='Bitmap of active days since origin')),
+                ('last_active_on', models.DateField(blank=True, null=True)),
+                ('current_streak', models.PositiveIntegerField(default=0, help_text='Run of active days ending on last_active_on')),
+                ('longest_streak', models.PositiveIntegerField(default=0)),
+                ('weekly_completions', models.JSONField(default=list, help_text='Topics completed per week since the week of origin')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='activity_calendar', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0005_classroster'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='learninganalytics',
+            name='recommendations_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='learninganalytics',
+            name='recommended_topics',
+            field=models.JSONField(blank=True, help_text='Ranked topic recommendations, empty when stale', null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0006_learninganalytics_recommendations'),
+        ('quizzes', '0003_quizattempt_shuffle_seed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('repetitions', models.PositiveSmallIntegerField(default=0, help_text='Successful reviews in a row')),
+                ('interval', models.PositiveIntegerField(default=0, help_text='Days between the last review and due_on')),
+                ('ease', models.FloatField(default=2.5)),
+                ('lapses', models.PositiveSmallIntegerField(default=0)),
+                ('last_reviewed_on', models.DateField()),
+                ('due_on', models.DateField()),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_states', to='quizzes.question')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_states', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'due_on'], name='progress_re_user_id_d5f3bd_idx')],
+                'unique_together': {('user', 'question')},
+            },
+        ),
+    ]
@@ -3,7 +3,7 @@ from django.contrib.auth import get_user_model
 
 User = get_user_model()
 from topics.models import PhysicsTopic, CBCGrade
-from quizzes.models import Quiz
+from quizzes.models import Quiz, Question
 from simulations.models import Simulation
 
 
@@ -142,7 +142,77 @@ class LearningAnalytics(models.Model):
     average_quiz_score = models.FloatField(null=True, blank=True)
     favorite_topics = models.JSONField(default=list, help_text="Most studied topics")
     learning_velocity = models.FloatField(default=0, help_text="Topics completed per week")
+    last_active_on = models.DateField(null=True, blank=True, help_text="Last day with learning activity")
+    recommended_topics = models.JSONField(null=True, blank=True, help_text="Ranked topic recommendations, empty when stale")
+    recommendations_updated_at = models.DateTimeField(null=True, blank=True)
     last_updated = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return f"{self.user.username} Analytics"
\ No newline at end of file
+        return f"{self.user.username} Analytics"
+
+
+class ActivityCalendar(models.Model):
+    """Compact per-user record of active days and weekly topic completions"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='activity_calendar')
+    origin = models.DateField(null=True, blank=True, help_text="Day of the first bit in days")
+    days = models.BinaryField(default=bytes, help_text="Bitmap of active days since origin")
+    last_active_on = models.DateField(null=True, blank=True)
+    current_streak = models.PositiveIntegerField(default=0, help_text="Run of active days ending on last_active_on")
+    longest_streak = models.PositiveIntegerField(default=0)
+    weekly_completions = models.JSONField(default=list, help_text="Topics completed per week since the week of origin")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user.username} Activity"
+
+
+class ClassRoster(models.Model):
+    """A teacher's class: the students whose progress they follow"""
+    teacher = models.ForeignKey(User, on_delete=models.CASCADE, related_name='class_rosters')
+    name = models.CharField(max_length=200)
+    grade = models.ForeignKey(CBCGrade, on_delete=models.SET_NULL, null=True, blank=True,
+                              help_text="Grade whose topics make up the progress matrix")
+    school = models.CharField(max_length=200, blank=True)
+    students = models.ManyToManyField(User, related_name='rosters', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return f"{self.name} ({self.teacher.username})"
+
+
+class ReviewState(models.Model):
+    """Spaced-repetition memory state of one user for one quiz question"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='review_states')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='review_states')
+    repetitions = models.PositiveSmallIntegerField(default=0, help_text="Successful reviews in a row")
+    interval = models.PositiveIntegerField(default=0, help_text="Days between the last review and due_on")
+    ease = models.FloatField(default=2.5)
+    lapses = models.PositiveSmallIntegerField(default=0)
+    last_reviewed_on = models.DateField()
+    due_on = models.DateField()
+    
+    class Meta:
+        unique_together = ['user', 'question']
+        indexes = [models.Index(fields=['user', 'due_on'])]
+    
+    def __str__(self):
+        return f"{self.user.username} - question {self.question_id} due {self.due_on}"
+
+
+class ReviewAnswer(models.Model):
+    """One answer given in a review session, kept so review states can be replayed"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='review_answers')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='review_answers')
+    session = models.ForeignKey(StudySession, on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='review_answers')
+    quality = models.PositiveSmallIntegerField(help_text="SM-2 grade from 0 to 5")
+    answered_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['user', 'question', 'answered_at'])]
+    
+    def __str__(self):
+        return f"{self.user.username} - question {self.question_id} graded {self.quality}"
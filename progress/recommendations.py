@@ -0,0 +1,272 @@
+"""
+Topic recommendations.
+
+Every active topic is described by a row of a feature matrix built once per
+process (and again whenever the prerequisite graph is rebuilt or the shared
+``VERSION_KEY`` is bumped by a change to the learning material): its grade,
+its difficulty, how well its content suits each learning style, and its
+transitive prerequisites. A student is described by the topics they completed
+or started, how often they got each topic's quiz questions wrong, their
+grade, learning style and average quiz score. Scores for a batch of
+students against every topic are a handful of NumPy array operations.
+
+Each student's ranked list is stored on their ``LearningAnalytics`` row.
+``analytics.apply`` clears it when a topic completion or quiz changes the
+inputs, and the next read recomputes that one student; the
+``refresh_recommendations`` command regenerates everyone in batches.
+"""
+import threading
+import uuid
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from quizzes.models import QuizResponse
+from simulations.models import Simulation
+from topics import graph
+from topics.graph import bits
+from topics.models import PhysicsTopic, TopicContent, TopicExperiment, TopicMedia
+from .models import LearningAnalytics, TopicProgress, UserProfile
+
+VERSION_KEY = 'recommendations:features'
+RECOMMENDATIONS = 10
+COMPLETED_STATUSES = ('completed', 'mastered')
+DIFFICULTY = {'beginner': 0.0, 'intermediate': 0.5, 'advanced': 1.0}
+
+LEARNING_STYLES = ['visual', 'auditory', 'kinesthetic', 'reading']
+# Learning style -> the kinds of material that suit it
+STYLE_MATERIAL = {
+    'visual': ['media:image', 'media:video', 'media:animation', 'media:diagram', 'simulation'],
+    'auditory': ['media:audio', 'media:video'],
+    'kinesthetic': ['experiment', 'simulation', 'content:experiment'],
+    'reading': ['content:theory', 'content:example', 'content:formula', 'content:application'],
+}
+
+WEIGHTS = {
+    'prerequisites': 2.0,
+    'grade': 1.5,
+    'difficulty': 1.0,
+    'weakness': 1.5,
+    'style': 0.5,
+    'in_progress': 0.75,
+}
+
+_lock = threading.Lock()
+_features = None
+
+
+class TopicFeatures:
+    """Feature matrix of the active topics, in topological order"""
+
+    def __init__(self, topic_graph):
+        self.topic_ids = [
+            topic_id for position, topic_id in enumerate(topic_graph.order)
+            if topic_graph.active >> position & 1
+        ]
+        self.column = {topic_id: column for column, topic_id in enumerate(self.topic_ids)}
+        count = len(self.topic_ids)
+
+        topics = {
+            topic_id: (grade, difficulty)
+            for topic_id, grade, difficulty in PhysicsTopic.objects.filter(
+                id__in=self.topic_ids
+            ).values_list('id', 'grade__order', 'difficulty_level')
+        }
+        self.grade = np.array([topics[topic_id][0] for topic_id in self.topic_ids], dtype=float)
+        self.difficulty = np.array([
+            DIFFICULTY.get(topics[topic_id][1], 0.5) for topic_id in self.topic_ids
+        ], dtype=float)
+
+        # Transitive active prerequisites, row requires column
+        self.prerequisites = np.zeros((count, count), dtype=np.float32)
+        for column, topic_id in enumerate(self.topic_ids):
+            position = topic_graph.position[topic_id]
+            for prerequisite in bits(topic_graph.closure[position] & topic_graph.active):
+                self.prerequisites[column, self.column[topic_graph.order[prerequisite]]] = 1
+        self.prerequisite_counts = self.prerequisites.sum(axis=1)
+
+        material = np.zeros((count, len(LEARNING_STYLES)))
+        for kind, counts in material_counts(self.topic_ids).items():
+            for style, kinds in STYLE_MATERIAL.items():
+                if kind in kinds:
+                    column = LEARNING_STYLES.index(style)
+                    for topic_id, amount in counts:
+                        material[self.column[topic_id], column] += amount
+        # Scale each style to 0..1 across the catalogue
+        self.style = material / np.maximum(material.max(axis=0, initial=0), 1)
+
+    def __len__(self):
+        return len(self.topic_ids)
+
+
+def material_counts(topic_ids):
+    """``{kind: [(topic_id, count)]}`` of the learning material of each topic"""
+    counts = {}
+    for model, field, prefix in (
+        (TopicContent, 'content_type', 'content:'), (TopicMedia, 'media_type', 'media:'),
+    ):
+        for topic_id, kind, amount in model.objects.filter(topic_id__in=topic_ids).values(
+            'topic_id', field
+        ).annotate(amount=Count('id')).values_list('topic_id', field, 'amount'):
+            counts.setdefault(prefix + kind, []).append((topic_id, amount))
+    for model, kind in ((TopicExperiment, 'experiment'), (Simulation, 'simulation')):
+        counts[kind] = list(model.objects.filter(topic_id__in=topic_ids).values('topic_id').annotate(
+            amount=Count('id')
+        ).values_list('topic_id', 'amount'))
+    return counts
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate():
+    """Make every process rebuild the feature matrix"""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def get_features():
+    """The feature matrix of the current prerequisite graph and learning material"""
+    global _features
+    topic_graph = graph.get_graph()
+    version = current_version()
+    features = _features
+    if features is None or features[0] is not topic_graph or features[1] != version:
+        with _lock:
+            if _features is None or _features[0] is not topic_graph or _features[1] != version:
+                _features = (topic_graph, version, TopicFeatures(topic_graph))
+            features = _features
+    return features[2]
+
+
+class StudentSignals:
+    """The inputs of a batch of students, one row per student"""
+
+    def __init__(self, features, user_ids):
+        self.user_ids = list(user_ids)
+        row = {user_id: index for index, user_id in enumerate(self.user_ids)}
+        shape = (len(self.user_ids), len(features))
+        self.completed = np.zeros(shape, dtype=np.float32)
+        self.in_progress = np.zeros(shape, dtype=np.float32)
+        self.weakness = np.zeros(shape)
+        self.grade = np.full(len(self.user_ids), np.nan)
+        self.style = np.zeros(len(self.user_ids), dtype=int)
+        # Students without quiz results start from beginner topics
+        self.ability = np.zeros(len(self.user_ids))
+
+        # Inactive topics have no column
+        for user_id, topic_id, status in TopicProgress.objects.filter(
+            user_id__in=self.user_ids
+        ).exclude(status='not_started').values_list('user_id', 'topic_id', 'status'):
+            if topic_id in features.column:
+                target = self.completed if status in COMPLETED_STATUSES else self.in_progress
+                target[row[user_id], features.column[topic_id]] = 1
+
+        for user_id, topic_id, answered, wrong in QuizResponse.objects.filter(
+            attempt__user_id__in=self.user_ids, attempt__completed_at__isnull=False,
+        ).values('attempt__user_id', 'question__quiz__topic_id').annotate(
+            answered=Count('id'), wrong=Count('id', filter=Q(is_correct=False))
+        ).values_list('attempt__user_id', 'question__quiz__topic_id', 'answered', 'wrong'):
+            if topic_id in features.column:
+                self.weakness[row[user_id], features.column[topic_id]] = wrong / answered
+
+        for user_id, grade, style in UserProfile.objects.filter(user_id__in=self.user_ids).values_list(
+            'user_id', 'current_grade__order', 'preferred_learning_style'
+        ):
+            if grade is not None:
+                self.grade[row[user_id]] = grade
+            if style in LEARNING_STYLES:
+                self.style[row[user_id]] = LEARNING_STYLES.index(style)
+
+        for user_id, average in LearningAnalytics.objects.filter(
+            user_id__in=self.user_ids, average_quiz_score__isnull=False
+        ).values_list('user_id', 'average_quiz_score'):
+            self.ability[row[user_id]] = min(max(average / 100, 0), 1)
+
+
+def score(features, students):
+    """Scores of every topic for every student; completed topics score -inf"""
+    if not len(features):
+        return np.zeros((len(students.user_ids), 0))
+    # 1 for unlocked topics, less the more prerequisites are still missing
+    missing = features.prerequisite_counts[None, :] - students.completed @ features.prerequisites.T
+    prerequisites = 1 / (1 + missing)
+    # Closeness to the student's grade; students without one see every grade alike
+    distance = np.abs(features.grade[None, :] - students.grade[:, None])
+    grade = np.where(np.isnan(distance), 0.5, 1 / (1 + np.nan_to_num(distance)))
+    difficulty = 1 - np.abs(features.difficulty[None, :] - students.ability[:, None])
+    style = features.style[:, students.style].T
+
+    scores = (
+        WEIGHTS['prerequisites'] * prerequisites
+        + WEIGHTS['grade'] * grade
+        + WEIGHTS['difficulty'] * difficulty
+        + WEIGHTS['weakness'] * students.weakness
+        + WEIGHTS['style'] * style
+        + WEIGHTS['in_progress'] * students.in_progress
+    )
+    scores[students.completed > 0] = -np.inf
+    return scores
+
+
+def rank(features, scores, count=RECOMMENDATIONS):
+    """The ``count`` best ``{'topic', 'score'}`` entries of each row of ``scores``"""
+    count = min(count, scores.shape[1])
+    if not count:
+        return [[] for _ in range(scores.shape[0])]
+    best = np.argpartition(-scores, count - 1, axis=1)[:, :count]
+    ranked = []
+    for row, columns in enumerate(best):
+        columns = columns[np.lexsort((columns, -scores[row, columns]))]
+        ranked.append([
+            {'topic': features.topic_ids[column], 'score': round(float(scores[row, column]), 3)}
+            for column in columns if np.isfinite(scores[row, column])
+        ])
+    return ranked
+
+
+def recommend(user_ids, count=RECOMMENDATIONS):
+    """``{user_id: ranked entries}`` computed from the database"""
+    features = get_features()
+    students = StudentSignals(features, user_ids)
+    return dict(zip(students.user_ids, rank(features, score(features, students), count)))
+
+
+def for_user(user_id):
+    """A student's stored recommendations, recomputed first if they are stale"""
+    analytics, _ = LearningAnalytics.objects.get_or_create(user_id=user_id)
+    if analytics.recommended_topics is None:
+        analytics.recommended_topics = recommend([user_id])[user_id]
+        analytics.recommendations_updated_at = timezone.now()
+        LearningAnalytics.objects.filter(pk=analytics.pk).update(
+            recommended_topics=analytics.recommended_topics,
+            recommendations_updated_at=analytics.recommendations_updated_at,
+        )
+    return analytics.recommended_topics
+
+
+def refresh_all(batch_size=500, stale_only=False):
+    """Recompute the recommendations of every analytics row in batches; returns rows written"""
+    rows = LearningAnalytics.objects.all()
+    if stale_only:
+        rows = rows.filter(recommended_topics__isnull=True)
+    written = 0
+    last_id = 0
+    while True:
+        batch = list(rows.filter(id__gt=last_id).order_by('id').only('id', 'user_id')[:batch_size])
+        if not batch:
+            return written
+        last_id = batch[-1].id
+        recommendations = recommend([analytics.user_id for analytics in batch])
+        now = timezone.now()
+        for analytics in batch:
+            analytics.recommended_topics = recommendations[analytics.user_id]
+            analytics.recommendations_updated_at = now
+        LearningAnalytics.objects.bulk_update(batch, ['recommended_topics', 'recommendations_updated_at'])
+        written += len(batch)
@@ -0,0 +1,182 @@
+"""
+Spaced-repetition review of quiz questions.
+
+Every question a user has answered has one ``ReviewState`` row holding its
+SM-2 memory state: the run of successful recalls, the current interval, the
+ease factor and the day it is next due. Completing a quiz attempt folds its
+responses into those rows, and so does answering in a review session, so
+the "due today" queue is a range scan of the ``(user, due_on)`` index
+rather than a replay of the user's history. Review answers are also kept
+as ``ReviewAnswer`` rows, since they have no quiz response.
+
+``rebuild_all`` recomputes every row from the stored responses and review
+answers in one streaming pass, merging both ordered by user, question and
+time and holding only one batch of rows in memory; the
+``rebuild_review_states`` command runs it.
+"""
+from datetime import timedelta
+import heapq
+from itertools import groupby
+
+from django.db import transaction
+from django.utils import timezone
+
+from quizzes.models import QuizResponse
+from .models import ReviewAnswer, ReviewState, StudySession
+
+REVIEW_BATCH = 20
+MIN_EASE = 1.3
+INITIAL_EASE = 2.5
+# Answers within FAST_SECONDS are recalled easily, beyond SLOW_SECONDS with effort
+FAST_SECONDS = 20
+SLOW_SECONDS = 90
+
+
+def quality(is_correct, time_taken=None, earned_share=0):
+    """An SM-2 grade from 0 to 5 for one answer"""
+    if is_correct:
+        if time_taken is None:
+            return 4
+        if time_taken <= FAST_SECONDS:
+            return 5
+        return 3 if time_taken > SLOW_SECONDS else 4
+    return 2 if earned_share > 0 else 1
+
+
+def schedule(state, grade, day):
+    """Apply one review of ``grade`` on ``day`` to ``state`` (SM-2)"""
+    if grade >= 3:
+        if state.repetitions == 0:
+            state.interval = 1
+        elif state.repetitions == 1:
+            state.interval = 6
+        else:
+            state.interval = round(state.interval * state.ease)
+        state.repetitions += 1
+    else:
+        state.repetitions = 0
+        state.interval = 1
+        state.lapses += 1
+    state.ease = max(MIN_EASE, state.ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+    state.last_reviewed_on = day
+    state.due_on = day + timedelta(days=state.interval)
+    return state
+
+
+def new_state(user_id, question_id):
+    return ReviewState(user_id=user_id, question_id=question_id, repetitions=0, interval=0,
+                       ease=INITIAL_EASE, lapses=0)
+
+
+def response_grade(is_correct, points_earned, points, time_taken):
+    return quality(is_correct, time_taken, points_earned / points if points else 0)
+
+
+def record_attempt(attempt):
+    """Fold the responses of a completed attempt into the user's review states"""
+    day = timezone.localdate(attempt.completed_at)
+    responses = list(attempt.responses.values_list(
+        'question_id', 'is_correct', 'points_earned', 'question__points', 'time_taken'
+    ))
+    if not responses:
+        return
+    states = {state.question_id: state for state in ReviewState.objects.filter(
+        user_id=attempt.user_id, question_id__in=[response[0] for response in responses]
+    )}
+    to_create, to_update = [], []
+    for question_id, is_correct, points_earned, points, time_taken in responses:
+        state = states.get(question_id)
+        if state is None:
+            state = new_state(attempt.user_id, question_id)
+            to_create.append(state)
+        else:
+            to_update.append(state)
+        schedule(state, response_grade(is_correct, points_earned, points, time_taken), day)
+    ReviewState.objects.bulk_create(to_create)
+    ReviewState.objects.bulk_update(to_update, [
+        'repetitions', 'interval', 'ease', 'lapses', 'last_reviewed_on', 'due_on',
+    ])
+
+
+def due(user_id, today=None, limit=REVIEW_BATCH):
+    """The user's states due by ``today``, most overdue first"""
+    today = today or timezone.localdate()
+    return ReviewState.objects.filter(
+        user_id=user_id, due_on__lte=today, question__is_active=True
+    ).select_related('question').order_by('due_on', 'id')[:limit]
+
+
+def start_session(user_id, limit=REVIEW_BATCH):
+    """Open a review StudySession; returns it and the states to review"""
+    states = list(due(user_id, limit=limit))
+    session = StudySession.objects.create(user_id=user_id, session_type='review')
+    return session, states
+
+
+@transaction.atomic
+def answer(session, question_id, is_correct, time_taken=None):
+    """Record one answer of a review session and reschedule the question"""
+    day = timezone.localdate()
+    state = ReviewState.objects.select_for_update().filter(
+        user_id=session.user_id, question_id=question_id
+    ).first() or new_state(session.user_id, question_id)
+    grade = quality(is_correct, time_taken)
+    schedule(state, grade, day)
+    state.save()
+    ReviewAnswer.objects.create(user_id=session.user_id, question_id=question_id, session=session, quality=grade)
+    session.activities_completed = list(session.activities_completed) + [
+        {'question': question_id, 'quality': grade},
+    ]
+    session.save(update_fields=['activities_completed'])
+    return state
+
+
+def finish_session(session):
+    """Close a review session, counting its time and active day"""
+    session.ended_at = timezone.now()
+    session.duration = max(round((session.ended_at - session.started_at).total_seconds() / 60), 1)
+    session.save()
+    return session
+
+
+def replay(rows):
+    """SM-2 states from ``(user, question, answered_at, grade)`` rows sorted by user, question and time"""
+    for (user_id, question_id), answers in groupby(rows, key=lambda row: row[:2]):
+        state = new_state(user_id, question_id)
+        for _, _, answered_at, grade in answers:
+            schedule(state, grade, timezone.localdate(answered_at))
+        yield state
+
+
+def history(batch_size):
+    """Every graded answer as ``(user, question, answered_at, grade)``, sorted for ``replay``"""
+    responses = QuizResponse.objects.filter(attempt__completed_at__isnull=False).order_by(
+        'attempt__user_id', 'question_id', 'attempt__completed_at', 'id'
+    ).values_list(
+        'attempt__user_id', 'question_id', 'attempt__completed_at',
+        'is_correct', 'points_earned', 'question__points', 'time_taken',
+    )
+    graded = (
+        (user_id, question_id, completed_at, response_grade(*answer))
+        for user_id, question_id, completed_at, *answer in responses.iterator(chunk_size=batch_size)
+    )
+    answers = ReviewAnswer.objects.order_by('user_id', 'question_id', 'answered_at', 'id').values_list(
+        'user_id', 'question_id', 'answered_at', 'quality'
+    )
+    return heapq.merge(graded, answers.iterator(chunk_size=batch_size), key=lambda row: row[:3])
+
+
+def rebuild_all(batch_size=1000):
+    """Replace every review state with one replayed from history; returns rows written"""
+    written = 0
+    batch = []
+    with transaction.atomic():
+        ReviewState.objects.all().delete()
+        for state in replay(history(batch_size)):
+            batch.append(state)
+            if len(batch) >= batch_size:
+                ReviewState.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        ReviewState.objects.bulk_create(batch)
+    return written + len(batch)
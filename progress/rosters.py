@@ -0,0 +1,127 @@
+"""
+Class roster progress matrices.
+
+A teacher's view of a class is a matrix of students by topics, each cell
+holding the student's progress status, minutes spent and quiz results on
+that topic. It is read with a fixed number of queries whatever the size of
+the class: the students, the topics, every progress row of the class, and
+the class's quiz attempts grouped by student and topic. Rows are then
+produced one student at a time, so exports can be streamed as CSV or JSON
+while they are written.
+"""
+import csv
+import json
+
+from django.db.models import Avg, Count, Max
+
+from quizzes.models import QuizAttempt
+from topics.models import PhysicsTopic
+from .models import TopicProgress
+
+NOT_STARTED = 'not_started'
+
+CSV_HEADER = [
+    'student_id', 'username', 'name', 'topic_id', 'topic', 'status', 'time_spent',
+    'quiz_attempts', 'best_quiz_score', 'average_quiz_score',
+]
+
+
+def roster_topics(roster):
+    """The topics of the roster's grade, or every topic its students have touched"""
+    if roster.grade_id is not None:
+        topics = PhysicsTopic.objects.filter(grade_id=roster.grade_id, is_active=True)
+    else:
+        topics = PhysicsTopic.objects.filter(user_progress__user__rosters=roster).distinct()
+    return list(topics.values_list('id', 'slug', 'title'))
+
+
+def roster_students(roster):
+    return list(roster.students.order_by('last_name', 'first_name', 'username').values_list(
+        'id', 'username', 'first_name', 'last_name'
+    ))
+
+
+def progress_cells(roster):
+    """``{(student_id, topic_id): (status, minutes)}`` for the whole class"""
+    return {
+        (user_id, topic_id): (status, minutes)
+        for user_id, topic_id, status, minutes in TopicProgress.objects.filter(
+            user__rosters=roster
+        ).values_list('user_id', 'topic_id', 'status', 'time_spent')
+    }
+
+
+def quiz_cells(roster):
+    """``{(student_id, topic_id): (attempts, best, average)}`` of completed attempts"""
+    return {
+        (user_id, topic_id): (attempts, best, average)
+        for user_id, topic_id, attempts, best, average in QuizAttempt.objects.filter(
+            user__rosters=roster, completed_at__isnull=False, score__isnull=False
+        ).values('user_id', 'quiz__topic_id').annotate(
+            attempts=Count('id'), best=Max('score'), average=Avg('score')
+        ).values_list('user_id', 'quiz__topic_id', 'attempts', 'best', 'average')
+    }
+
+
+def progress_matrix(roster):
+    """
+    ``(topics, rows)``: the ``(id, slug, title)`` of each column and a
+    generator of ``(student, cells)``, one cell per topic as
+    ``(status, minutes, attempts, best score, average score)``. Every query
+    runs before the first row is produced.
+    """
+    topics = roster_topics(roster)
+    students = roster_students(roster)
+    progress = progress_cells(roster)
+    quizzes = quiz_cells(roster)
+
+    def rows():
+        for student in students:
+            cells = []
+            for topic_id, _, _ in topics:
+                status, minutes = progress.get((student[0], topic_id), (NOT_STARTED, 0))
+                attempts, best, average = quizzes.get((student[0], topic_id), (0, None, None))
+                cells.append((status, minutes, attempts, best, average))
+            yield student, cells
+
+    return topics, rows()
+
+
+def full_name(student):
+    return f'{student[2]} {student[3]}'.strip()
+
+
+class Echo:
+    """A file-like object that returns what is written, for streaming csv"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(roster):
+    """The matrix as CSV lines, one per student and topic"""
+    topics, rows = progress_matrix(roster)
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for student, cells in rows:
+        for (topic_id, _, title), (status, minutes, attempts, best, average) in zip(topics, cells):
+            yield writer.writerow([
+                student[0], student[1], full_name(student), topic_id, title, status, minutes,
+                attempts, best if best is not None else '',
+                round(average, 2) if average is not None else '',
+            ])
+
+
+def json_chunks(roster):
+    """The matrix as a JSON document, written one student at a time"""
+    topics, rows = progress_matrix(roster)
+    yield json.dumps({
+        'roster': {'id': roster.id, 'name': roster.name},
+        'topics': [{'id': topic_id, 'slug': slug, 'title': title} for topic_id, slug, title in topics],
+        'fields': ['status', 'time_spent', 'quiz_attempts', 'best_quiz_score', 'average_quiz_score'],
+    })[:-1] + ', "students": ['
+    for index, (student, cells) in enumerate(rows):
+        yield (', ' if index else '') + json.dumps({
+            'id': student[0], 'username': student[1], 'name': full_name(student), 'cells': cells,
+        })
+    yield ']}'
@@ -0,0 +1,125 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from quizzes.models import QuizAttempt
+from simulations.models import Simulation, SimulationSession
+from topics.models import TopicContent, TopicExperiment, TopicMedia
+from . import achievements, analytics, leaderboards, recommendations, reviews, streaks
+from .models import Achievement, TopicProgress, StudySession, UserProfile, LearningAnalytics
+
+
+@receiver(pre_save, sender=QuizAttempt)
+@receiver(pre_save, sender=TopicProgress)
+@receiver(pre_save, sender=StudySession)
+def remember_contribution(sender, instance, **kwargs):
+    """Keep what the stored row contributed, to apply only the difference"""
+    instance._analytics_before = None
+    instance._analytics_was_active = False
+    instance._analytics_minutes = 0
+    instance._analytics_completed_on = None
+    if instance.pk:
+        previous = sender._default_manager.filter(pk=instance.pk).first()
+        if previous is not None:
+            instance._analytics_before = analytics.contribution(previous)
+            instance._analytics_was_active = analytics.activity_date(previous) is not None
+            if sender is TopicProgress:
+                instance._analytics_minutes = previous.time_spent
+                if previous.status in streaks.COMPLETED_STATUSES:
+                    instance._analytics_completed_on = streaks.completion_day(previous)
+
+
+@receiver(post_save, sender=QuizAttempt)
+@receiver(post_save, sender=TopicProgress)
+@receiver(post_save, sender=StudySession)
+def apply_contribution(sender, instance, **kwargs):
+    before = getattr(instance, '_analytics_before', None) or {}
+    delta = analytics.difference(before, analytics.contribution(instance))
+    active_on = None
+    if not getattr(instance, '_analytics_was_active', False):
+        active_on = analytics.activity_date(instance)
+    favorite = completed_on = None
+    if sender is TopicProgress:
+        if instance.time_spent != instance._analytics_minutes:
+            favorite = (instance.topic_id, instance.time_spent)
+        if delta.get('topics_completed', 0) > 0:
+            completed_on = streaks.completion_day(instance)
+        elif delta.get('topics_completed', 0) < 0:
+            completed_on = instance._analytics_completed_on
+    elif sender is QuizAttempt:
+        completed_on = analytics.activity_date(instance)
+    quiz_score = instance.score if sender is QuizAttempt and instance.is_passed else None
+    if delta or active_on or favorite:
+        analytics.apply(instance.user_id, delta, active_on, favorite, completed_on, quiz_score)
+    if sender is QuizAttempt and active_on is not None:
+        # Newly completed: schedule its questions for review
+        reviews.record_attempt(instance)
+
+
+@receiver(post_delete, sender=QuizAttempt)
+@receiver(post_delete, sender=TopicProgress)
+@receiver(post_delete, sender=StudySession)
+def remove_contribution(sender, instance, **kwargs):
+    delta = analytics.difference(analytics.contribution(instance), {})
+    favorite = completed_on = None
+    if sender is TopicProgress:
+        favorite = (instance.topic_id, None)
+        if instance.status in streaks.COMPLETED_STATUSES:
+            completed_on = streaks.completion_day(instance)
+    elif sender is QuizAttempt:
+        completed_on = analytics.activity_date(instance)
+    if delta or favorite:
+        analytics.apply(instance.user_id, delta, favorite=favorite, completed_on=completed_on,
+                        create=False)
+
+
+@receiver(pre_save, sender=SimulationSession)
+def remember_simulation_state(sender, instance, **kwargs):
+    instance._analytics_before = None
+    if instance.pk:
+        instance._analytics_before = sender._default_manager.filter(
+            pk=instance.pk
+        ).values_list('is_completed', 'started_at').first()
+
+
+@receiver(post_save, sender=SimulationSession)
+def apply_simulation_state(sender, instance, **kwargs):
+    analytics.record_simulation(getattr(instance, '_analytics_before', None), instance)
+
+
+@receiver(post_delete, sender=SimulationSession)
+def remove_simulation_state(sender, instance, **kwargs):
+    analytics.record_simulation((instance.is_completed, instance.started_at), instance, deleted=True)
+
+
+@receiver(post_save, sender=Achievement)
+@receiver(post_delete, sender=Achievement)
+def recompile_achievement_rules(sender, **kwargs):
+    achievements.invalidate()
+
+
+@receiver(post_save, sender=TopicContent)
+@receiver(post_delete, sender=TopicContent)
+@receiver(post_save, sender=TopicMedia)
+@receiver(post_delete, sender=TopicMedia)
+@receiver(post_save, sender=TopicExperiment)
+@receiver(post_delete, sender=TopicExperiment)
+@receiver(post_save, sender=Simulation)
+@receiver(post_delete, sender=Simulation)
+def rebuild_recommendation_features(sender, **kwargs):
+    """How well a topic suits each learning style depends on its material"""
+    recommendations.invalidate()
+
+
+@receiver(post_save, sender=UserProfile)
+def move_on_leaderboards(sender, instance, **kwargs):
+    """A new grade moves the student to another class board"""
+    transaction.on_commit(partial(leaderboards.move_user, instance.user_id))
+
+
+@receiver(post_save, sender=UserProfile)
+def forget_recommendations(sender, instance, **kwargs):
+    """Grade and learning style feed the recommendations"""
+    LearningAnalytics.objects.filter(user_id=instance.user_id).update(recommended_topics=None)
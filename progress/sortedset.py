@@ -0,0 +1,166 @@
+"""
+An in-process sorted set with the semantics of a Redis ZSET.
+
+Members are kept in an indexable skip list ordered by score, highest first
+(ties broken by member), with the width of every link stored so that
+inserting, removing and finding the rank of a member are O(log n) and
+reading ``k`` members from any rank is O(log n + k).
+"""
+import random
+
+MAX_LEVEL = 32
+P = 0.25
+
+
+class _Node:
+    __slots__ = ('key', 'member', 'forward', 'width')
+
+    def __init__(self, key, member, level):
+        self.key = key
+        self.member = member
+        self.forward = [None] * level
+        self.width = [1] * level
+
+
+class SortedSet:
+    """Scores by member, readable in rank order"""
+
+    def __init__(self, items=()):
+        self._head = _Node(None, None, MAX_LEVEL)
+        self._level = 1
+        self._scores = {}
+        self._random = random.Random(0)
+        for member, score in items:
+            self.add(member, score)
+
+    @classmethod
+    def build(cls, items):
+        """A set of ``(member, score)`` pairs, linked in one pass after sorting"""
+        zset = cls()
+        entries = sorted((cls._key(member, score), member, score) for member, score in dict(items).items())
+        tails = [zset._head] * MAX_LEVEL
+        tail_ranks = [0] * MAX_LEVEL
+        for rank, (key, member, score) in enumerate(entries, 1):
+            level = zset._random_level()
+            node = _Node(key, member, level)
+            for i in range(level):
+                tails[i].forward[i] = node
+                tails[i].width[i] = rank - tail_ranks[i]
+                tails[i] = node
+                tail_ranks[i] = rank
+            zset._level = max(zset._level, level)
+            zset._scores[member] = score
+        return zset
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __contains__(self, member):
+        return member in self._scores
+
+    def score(self, member):
+        return self._scores.get(member)
+
+    @staticmethod
+    def _key(member, score):
+        # Highest score first, then by member
+        return (-score, member)
+
+    def _random_level(self):
+        level = 1
+        while level < MAX_LEVEL and self._random.random() < P:
+            level += 1
+        return level
+
+    def _path(self, key):
+        """The last node before ``key`` on every level, and its rank"""
+        update = [self._head] * MAX_LEVEL
+        ranks = [0] * MAX_LEVEL
+        node = self._head
+        rank = 0
+        for level in range(self._level - 1, -1, -1):
+            while node.forward[level] is not None and node.forward[level].key < key:
+                rank += node.width[level]
+                node = node.forward[level]
+            update[level] = node
+            ranks[level] = rank
+        return update, ranks
+
+    def add(self, member, score):
+        """Set the score of ``member``, moving it to its new rank"""
+        if member in self._scores:
+            if self._scores[member] == score:
+                return
+            self.remove(member)
+        key = self._key(member, score)
+        update, ranks = self._path(key)
+        level = self._random_level()
+        if level > self._level:
+            for extra in range(self._level, level):
+                update[extra] = self._head
+                ranks[extra] = 0
+                self._head.width[extra] = len(self._scores)
+            self._level = level
+
+        node = _Node(key, member, level)
+        for i in range(level):
+            node.forward[i] = update[i].forward[i]
+            update[i].forward[i] = node
+            # Split the width of the link the node was inserted into
+            node.width[i] = update[i].width[i] - (ranks[0] - ranks[i])
+            update[i].width[i] = ranks[0] - ranks[i] + 1
+        for i in range(level, self._level):
+            update[i].width[i] += 1
+        self._scores[member] = score
+
+    def increment(self, member, amount):
+        """Add ``amount`` to the score of ``member`` (0 if absent); returns the new score"""
+        score = self._scores.get(member, 0) + amount
+        self.add(member, score)
+        return score
+
+    def remove(self, member):
+        if member not in self._scores:
+            return False
+        key = self._key(member, self._scores.pop(member))
+        update, _ = self._path(key)
+        target = update[0].forward[0]
+        for i in range(self._level):
+            if update[i].forward[i] is target:
+                update[i].width[i] += target.width[i] - 1
+                update[i].forward[i] = target.forward[i]
+            else:
+                update[i].width[i] -= 1
+        while self._level > 1 and self._head.forward[self._level - 1] is None:
+            self._level -= 1
+        return True
+
+    def rank(self, member):
+        """Zero-based rank of ``member`` (0 is the highest score), or None"""
+        if member not in self._scores:
+            return None
+        key = self._key(member, self._scores[member])
+        node = self._head
+        rank = 0
+        for level in range(self._level - 1, -1, -1):
+            while node.forward[level] is not None and node.forward[level].key <= key:
+                rank += node.width[level]
+                node = node.forward[level]
+        return rank - 1
+
+    def range(self, start=0, count=10):
+        """``(member, score)`` pairs from rank ``start``, at most ``count`` of them"""
+        if count <= 0 or start >= len(self._scores):
+            return []
+        node = self._head
+        traversed = 0
+        for level in range(self._level - 1, -1, -1):
+            while node.forward[level] is not None and traversed + node.width[level] <= start:
+                traversed += node.width[level]
+                node = node.forward[level]
+        items = []
+        node = node.forward[0]
+        while node is not None and len(items) < count:
+            items.append((node.member, -node.key[0]))
+            node = node.forward[0]
+        return items
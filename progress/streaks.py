@@ -0,0 +1,242 @@
+"""
+Streak and velocity engine.
+
+Every user has one ``ActivityCalendar`` row: a bitmap with one bit per day
+since the user's first activity, the current and longest run of active
+days, and a list of topics completed per week. Closing a study session (or
+completing a quiz or simulation) sets one bit and extends the current run,
+and completing a topic bumps one weekly counter, so both are O(1) updates.
+Dashboards answer "current streak", "longest streak" and "topics per week
+over the last N weeks" from the calendar alone, without reading session
+rows. A late event for an earlier day re-derives the runs from the bitmap,
+which is still a few bytes per year.
+
+``build_calendars`` recomputes every calendar from history in one
+streaming pass per source; the nightly ``recompute_streaks`` command uses
+it to verify and repair the stored rows.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from quizzes.models import QuizAttempt
+from simulations.models import SimulationSession
+from .models import ActivityCalendar, StudySession, TopicProgress
+
+VELOCITY_WEEKS = 4
+COMPLETED_STATUSES = ('completed', 'mastered')
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def is_active(calendar, day):
+    index = (day - calendar.origin).days
+    days = calendar.days
+    return 0 <= index < len(days) * 8 and bool(days[index // 8] & (1 << index % 8))
+
+
+def active_days(calendar):
+    """Every active day of a calendar, oldest first"""
+    days = bytes(calendar.days)
+    return [
+        calendar.origin + timedelta(days=index * 8 + bit)
+        for index, byte in enumerate(days) if byte
+        for bit in range(8) if byte & (1 << bit)
+    ]
+
+
+def encode_days(origin, days):
+    bits = bytearray()
+    for day in days:
+        index = (day - origin).days
+        if len(bits) <= index // 8:
+            bits.extend(bytes(index // 8 + 1 - len(bits)))
+        bits[index // 8] |= 1 << index % 8
+    return bytes(bits)
+
+
+def runs(days):
+    """``(last_active_on, current_streak, longest_streak)`` of sorted days"""
+    last, run, longest = None, 0, 0
+    for day in days:
+        run = run + 1 if last is not None and day == last + timedelta(days=1) else 1
+        longest = max(longest, run)
+        last = day
+    return last, run, longest
+
+
+def move_origin(calendar, origin):
+    """Re-base a calendar on an earlier origin day"""
+    shift = (week_start(calendar.origin) - week_start(origin)).days // 7
+    calendar.days = encode_days(origin, active_days(calendar))
+    calendar.weekly_completions = [0] * shift + list(calendar.weekly_completions)
+    calendar.origin = origin
+
+
+def mark_active(calendar, day):
+    """Record activity on ``day``; O(1) unless the day is older than the last one"""
+    if calendar.origin is None:
+        calendar.origin = day
+    elif day < calendar.origin:
+        move_origin(calendar, day)
+    if is_active(calendar, day):
+        return
+
+    index = (day - calendar.origin).days
+    days = bytearray(calendar.days)
+    if len(days) <= index // 8:
+        days.extend(bytes(index // 8 + 1 - len(days)))
+    days[index // 8] |= 1 << index % 8
+    calendar.days = bytes(days)
+
+    last = calendar.last_active_on
+    if last is None or day > last:
+        calendar.current_streak = calendar.current_streak + 1 if last == day - timedelta(days=1) else 1
+        calendar.last_active_on = day
+        calendar.longest_streak = max(calendar.longest_streak, calendar.current_streak)
+    else:
+        # A late event may join two runs; derive them again from the bitmap
+        calendar.last_active_on, calendar.current_streak, calendar.longest_streak = runs(
+            active_days(calendar)
+        )
+
+
+def add_completions(calendar, day, count=1):
+    """Add ``count`` (possibly negative) topic completions in the week of ``day``"""
+    if calendar.origin is None:
+        calendar.origin = day
+    elif day < calendar.origin:
+        move_origin(calendar, day)
+    index = (week_start(day) - week_start(calendar.origin)).days // 7
+    weekly = list(calendar.weekly_completions)
+    if len(weekly) <= index:
+        weekly.extend([0] * (index + 1 - len(weekly)))
+    weekly[index] = max(weekly[index] + count, 0)
+    calendar.weekly_completions = weekly
+
+
+def current_streak(calendar, today=None):
+    """The streak as of ``today``: broken once a whole day passes idle"""
+    today = today or timezone.localdate()
+    if calendar.last_active_on is None or calendar.last_active_on < today - timedelta(days=1):
+        return 0
+    return calendar.current_streak
+
+
+def weekly_completions(calendar, weeks, today=None):
+    """Topics completed in each of the last ``weeks`` weeks, oldest first"""
+    today = today or timezone.localdate()
+    if calendar.origin is None:
+        return [0] * weeks
+    last = (week_start(today) - week_start(calendar.origin)).days // 7
+    stored = calendar.weekly_completions
+    return [
+        stored[index] if 0 <= index < len(stored) else 0
+        for index in range(last - weeks + 1, last + 1)
+    ]
+
+
+def topics_per_week(calendar, weeks=VELOCITY_WEEKS, today=None):
+    return sum(weekly_completions(calendar, weeks, today)) / weeks
+
+
+def record(user_id, active_on=None, completed_on=None, completions=1, create=True):
+    """
+    Update a user's calendar with an active day and/or topic completions.
+    Call it inside a transaction, so the locked row is written atomically.
+    """
+    rows = ActivityCalendar.objects.select_for_update()
+    if create:
+        calendar, _ = rows.get_or_create(user_id=user_id)
+    else:
+        calendar = rows.filter(user_id=user_id).first()
+        if calendar is None:
+            return None
+    if active_on is not None:
+        mark_active(calendar, active_on)
+    if completed_on is not None:
+        add_completions(calendar, completed_on, completions)
+    calendar.save()
+    return calendar
+
+
+def completion_day(progress):
+    """The local day a completed TopicProgress counts in the weekly totals"""
+    return timezone.localdate(progress.completed_at or progress.last_accessed or timezone.now())
+
+
+def activity_sources():
+    """``(queryset, datetime field)`` pairs whose rows mark active days"""
+    return [
+        (StudySession.objects.filter(ended_at__isnull=False), 'ended_at'),
+        (QuizAttempt.objects.filter(completed_at__isnull=False), 'completed_at'),
+        (SimulationSession.objects.all(), 'started_at'),
+    ]
+
+
+def build_calendars():
+    """Recompute every user's calendar from history; returns unsaved rows by user id"""
+    days = defaultdict(set)
+    for queryset, field in activity_sources():
+        for user_id, moment in queryset.values_list('user_id', field).iterator():
+            days[user_id].add(timezone.localdate(moment))
+    completions = defaultdict(list)
+    for user_id, moment in TopicProgress.objects.filter(
+        status__in=COMPLETED_STATUSES
+    ).values_list('user_id', Coalesce('completed_at', 'last_accessed')).iterator():
+        completions[user_id].append(timezone.localdate(moment))
+
+    calendars = {}
+    for user_id in set(days) | set(completions):
+        user_days = sorted(days[user_id])
+        calendar = ActivityCalendar(user_id=user_id)
+        calendar.origin = min(user_days[:1] + completions[user_id])
+        calendar.days = encode_days(calendar.origin, user_days)
+        calendar.last_active_on, calendar.current_streak, calendar.longest_streak = runs(user_days)
+        for day in completions[user_id]:
+            add_completions(calendar, day)
+        calendars[user_id] = calendar
+    return calendars
+
+
+def differs(stored, rebuilt):
+    return (
+        bytes(stored.days) != bytes(rebuilt.days)
+        or stored.origin != rebuilt.origin
+        or list(stored.weekly_completions) != list(rebuilt.weekly_completions)
+        or (stored.last_active_on, stored.current_streak, stored.longest_streak)
+        != (rebuilt.last_active_on, rebuilt.current_streak, rebuilt.longest_streak)
+    )
+
+
+def rebuild_all(fix=True):
+    """
+    Compare every stored calendar with one rebuilt from history and, with
+    ``fix``, write the rebuilt ones. Returns ``(calendars, mismatched user ids)``.
+    """
+    calendars = build_calendars()
+    stored = ActivityCalendar.objects.in_bulk(list(calendars), field_name='user_id')
+    mismatched = []
+    to_create, to_update = [], []
+    for user_id, calendar in calendars.items():
+        current = stored.get(user_id)
+        if current is None:
+            mismatched.append(user_id)
+            to_create.append(calendar)
+        elif differs(current, calendar):
+            mismatched.append(user_id)
+            calendar.pk = current.pk
+            to_update.append(calendar)
+    if fix:
+        with transaction.atomic():
+            ActivityCalendar.objects.bulk_create(to_create, batch_size=500)
+            ActivityCalendar.objects.bulk_update(to_update, [
+                'origin', 'days', 'last_active_on', 'current_streak', 'longest_streak',
+                'weekly_completions',
+            ], batch_size=500)
+    return calendars, mismatched
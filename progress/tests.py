@@ -1,3 +1,661 @@
+import csv
+from datetime import timedelta
+import json
+import random
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+
+from quizzes.models import Answer, Question, Quiz, QuizAttempt, QuizResponse
+from simulations.models import Simulation, SimulationSession
+from topics.models import CBCGrade, PhysicsTopic, TopicExperiment
+from . import achievements, analytics, leaderboards, recommendations, reviews, rosters, streaks
+from .models import (
+    Achievement, ActivityCalendar, ClassRoster, LearningAnalytics, ReviewAnswer, ReviewState, StudySession,
+    TopicProgress, UserAchievement, UserProfile,
+)
+from .sortedset import SortedSet
+
+ANALYTICS_FIELDS = [
+    'total_study_time', 'topics_completed', 'quizzes_taken', 'simulations_explored',
+    'current_streak', 'longest_streak', 'average_quiz_score', 'favorite_topics',
+    'learning_velocity', 'last_active_on',
+]
+
+
+def snapshot(user):
+    return LearningAnalytics.objects.filter(user=user).values(*ANALYTICS_FIELDS).get()
+
+
+class LearningAnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        grade = CBCGrade.objects.create(name='Grade 9', order=1)
+        cls.topics = [
+            PhysicsTopic.objects.create(
+                grade=grade, title=f'Topic {n}', slug=f'topic-{n}', description='About',
+                learning_outcomes='Outcomes', estimated_duration=30,
+            )
+            for n in range(7)
+        ]
+        cls.quiz = Quiz.objects.create(topic=cls.topics[0], title='Quiz', instructions='Go')
+        cls.simulation = Simulation.objects.create(
+            topic=cls.topics[0], title='Pendulum', description='Swing', simulation_type='motion',
+            html_content='<div></div>', learning_objectives='Periods', instructions='Drag',
+        )
+
+    def setUp(self):
+        self.user = User.objects.create_user('student')
+
+    def complete_attempt(self, score, number=1):
+        attempt = QuizAttempt.objects.create(user=self.user, quiz=self.quiz, attempt_number=number)
+        attempt.completed_at = timezone.now()
+        attempt.score = score
+        attempt.save()
+        return attempt
+
+    def test_quiz_attempts_update_count_and_average(self):
+        first = self.complete_attempt(60)
+        self.complete_attempt(90, number=2)
+        self.assertEqual(snapshot(self.user)['quizzes_taken'], 2)
+        self.assertEqual(snapshot(self.user)['average_quiz_score'], 75)
+
+        first.delete()
+        self.assertEqual(snapshot(self.user)['quizzes_taken'], 1)
+        self.assertEqual(snapshot(self.user)['average_quiz_score'], 90)
+
+    def test_topic_progress_counts_completions_and_favorites(self):
+        progress = [
+            TopicProgress.objects.create(user=self.user, topic=topic, time_spent=10 * (n + 1))
+            for n, topic in enumerate(self.topics)
+        ]
+        progress[0].status = 'completed'
+        progress[0].save()
+        progress[1].status = 'mastered'
+        progress[1].save()
+
+        row = snapshot(self.user)
+        self.assertEqual(row['topics_completed'], 2)
+        self.assertGreater(row['learning_velocity'], 0)
+        self.assertEqual([entry['topic'] for entry in row['favorite_topics']],
+                         [topic.id for topic in reversed(self.topics[2:])])
+
+        # A favorite losing time lets the next topic back in
+        progress[6].time_spent = 1
+        progress[6].save()
+        self.assertEqual([entry['topic'] for entry in snapshot(self.user)['favorite_topics']],
+                         [topic.id for topic in reversed(self.topics[1:6])])
+
+    def test_sessions_add_study_time_simulations_and_streaks(self):
+        StudySession.objects.create(user=self.user, session_type='topic_study', duration=25)
+        StudySession.objects.create(user=self.user, session_type='review', duration=5)
+        for _ in range(2):
+            SimulationSession.objects.create(user=self.user, simulation=self.simulation,
+                                             is_completed=True)
+
+        row = snapshot(self.user)
+        self.assertEqual(row['total_study_time'], 30)
+        self.assertEqual(row['simulations_explored'], 1)
+        self.assertEqual(row['current_streak'], 1)
+        self.assertEqual(row['last_active_on'], timezone.localdate())
+
+    def test_rebuild_matches_incremental_rows(self):
+        self.complete_attempt(70)
+        progress = TopicProgress.objects.create(user=self.user, topic=self.topics[0], time_spent=40)
+        progress.status = 'completed'
+        progress.save()
+        StudySession.objects.create(user=self.user, session_type='topic_study', duration=15,
+                                    ended_at=timezone.now())
+        SimulationSession.objects.create(user=self.user, simulation=self.simulation, is_completed=True)
+        incremental = snapshot(self.user)
+
+        LearningAnalytics.objects.all().delete()
+        self.assertEqual(analytics.rebuild_all(), 1)
+        rebuilt = snapshot(self.user)
+        self.assertAlmostEqual(rebuilt.pop('learning_velocity'), incremental.pop('learning_velocity'))
+        self.assertEqual(rebuilt, incremental)
+
+    def test_deleting_user_cascades_cleanly(self):
+        self.complete_attempt(50)
+        TopicProgress.objects.create(user=self.user, topic=self.topics[0], time_spent=5)
+        self.user.delete()
+        self.assertFalse(LearningAnalytics.objects.exists())
+
+
+class StreakEngineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student')
+        self.today = timezone.localdate()
+
+    def day(self, offset):
+        return self.today + timedelta(days=offset)
+
+    def test_runs_are_extended_in_place(self):
+        calendar = ActivityCalendar(user=self.user)
+        for offset in (-8, -7, -6, -5, -2, -1, 0):
+            streaks.mark_active(calendar, self.day(offset))
+        self.assertEqual(calendar.current_streak, 3)
+        self.assertEqual(calendar.longest_streak, 4)
+        self.assertEqual(streaks.current_streak(calendar, self.today), 3)
+        self.assertEqual(streaks.current_streak(calendar, self.day(2)), 0)
+        self.assertEqual(len(calendar.days), 2)
+
+    def test_late_and_earlier_days_rederive_runs(self):
+        calendar = ActivityCalendar(user=self.user)
+        for offset in (-4, -3, -1, 0):
+            streaks.mark_active(calendar, self.day(offset))
+        self.assertEqual((calendar.current_streak, calendar.longest_streak), (2, 2))
+
+        streaks.mark_active(calendar, self.day(-2))
+        self.assertEqual((calendar.current_streak, calendar.longest_streak), (5, 5))
+
+        streaks.mark_active(calendar, self.day(-30))
+        self.assertEqual(calendar.origin, self.day(-30))
+        self.assertEqual(streaks.active_days(calendar),
+                         [self.day(offset) for offset in (-30, -4, -3, -2, -1, 0)])
+
+    def test_topics_per_week(self):
+        calendar = ActivityCalendar(user=self.user)
+        streaks.add_completions(calendar, self.day(-7), 2)
+        streaks.add_completions(calendar, self.today, 3)
+        streaks.add_completions(calendar, self.day(-70))
+        self.assertEqual(streaks.weekly_completions(calendar, 2, self.today), [2, 3])
+        self.assertEqual(streaks.topics_per_week(calendar, 4, self.today), 5 / 4)
+        self.assertEqual(sum(calendar.weekly_completions), 6)
+
+    def test_closing_a_session_marks_the_day(self):
+        session = StudySession.objects.create(user=self.user, session_type='review')
+        self.assertFalse(ActivityCalendar.objects.exists())
+        session.ended_at = timezone.now()
+        session.duration = 20
+        session.save()
+
+        calendar = ActivityCalendar.objects.get(user=self.user)
+        self.assertEqual(calendar.last_active_on, self.today)
+        self.assertEqual(LearningAnalytics.objects.get(user=self.user).current_streak, 1)
+
+    def test_nightly_rebuild_verifies_and_repairs(self):
+        grade = CBCGrade.objects.create(name='Grade 9', order=1)
+        topic = PhysicsTopic.objects.create(
+            grade=grade, title='Heat', slug='heat', description='About',
+            learning_outcomes='Outcomes', estimated_duration=30,
+        )
+        StudySession.objects.create(user=self.user, session_type='review', ended_at=timezone.now())
+        TopicProgress.objects.create(user=self.user, topic=topic, status='completed',
+                                     completed_at=timezone.now())
+        self.assertEqual(streaks.rebuild_all(fix=False)[1], [])
+
+        ActivityCalendar.objects.update(days=b'', current_streak=9)
+        calendars, mismatched = streaks.rebuild_all()
+        self.assertEqual(mismatched, [self.user.id])
+        calendar = ActivityCalendar.objects.get(user=self.user)
+        self.assertEqual(streaks.active_days(calendar), [self.today])
+        self.assertEqual(calendar.current_streak, 1)
+        self.assertEqual(streaks.weekly_completions(calendar, 1), [1])
+
+
+class AchievementEngineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        grade = CBCGrade.objects.create(name='Grade 9', order=1)
+        cls.topics = [
+            PhysicsTopic.objects.create(
+                grade=grade, title=f'Topic {n}', slug=f'topic-{n}', description='About',
+                learning_outcomes='Outcomes', estimated_duration=30,
+            )
+            for n in range(3)
+        ]
+        cls.quiz = Quiz.objects.create(topic=cls.topics[0], title='Quiz', instructions='Go')
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('student')
+        self.first_steps = self.achievement('First Steps', {'topics_completed': 1})
+        self.scholar = self.achievement('Scholar', {'topics_completed': 3})
+        self.quiz_master = self.achievement('Quiz Master', {'quiz_score': 100})
+        self.dedicated = self.achievement('Dedicated', {'topics_completed': 2, 'streak_days': 1})
+
+    def achievement(self, name, criteria, **kwargs):
+        return Achievement.objects.create(name=name, description=name, achievement_type='streak',
+                                          icon='star', criteria=criteria, **kwargs)
+
+    def earned(self):
+        return set(UserAchievement.objects.filter(user=self.user).values_list('achievement__name', flat=True))
+
+    def complete_topic(self, topic):
+        TopicProgress.objects.create(user=self.user, topic=topic, status='completed',
+                                     completed_at=timezone.now())
+
+    def test_rules_are_indexed_by_event_and_threshold(self):
+        self.achievement('Broken', {'unknown_counter': 1})
+        self.achievement('Retired', {'topics_completed': 1}, is_active=False)
+        rules = achievements.get_rules()
+        self.assertEqual(set(rules), {achievements.TOPIC_COMPLETED, achievements.QUIZ_PASSED,
+                                      achievements.STREAK_REACHED})
+        self.assertEqual(rules[achievements.TOPIC_COMPLETED][1], [1, 2, 3])
+        self.assertEqual(
+            achievements.satisfied([achievements.TOPIC_COMPLETED], {'topics_completed': 2}),
+            {self.first_steps.id},
+        )
+
+    def test_events_award_once(self):
+        self.complete_topic(self.topics[0])
+        self.assertEqual(self.earned(), {'First Steps'})
+
+        StudySession.objects.create(user=self.user, session_type='review', ended_at=timezone.now())
+        self.complete_topic(self.topics[1])
+        self.assertEqual(self.earned(), {'First Steps', 'Dedicated'})
+
+        attempt = QuizAttempt.objects.create(user=self.user, quiz=self.quiz)
+        attempt.completed_at = timezone.now()
+        attempt.score = 100
+        attempt.is_passed = True
+        attempt.save()
+        self.assertEqual(self.earned(), {'First Steps', 'Dedicated', 'Quiz Master'})
+        self.assertEqual(UserAchievement.objects.filter(user=self.user).count(), 3)
+
+    def test_achievement_changes_recompile_rules(self):
+        self.complete_topic(self.topics[0])
+        self.first_steps.criteria = {'topics_completed': 2}
+        self.first_steps.save()
+        self.assertEqual(achievements.get_rules()[achievements.TOPIC_COMPLETED][1], [2, 2, 3])
+
+    def test_backfill(self):
+        for topic in self.topics:
+            self.complete_topic(topic)
+        QuizAttempt.objects.create(user=self.user, quiz=self.quiz, score=100, is_passed=True,
+                                   completed_at=timezone.now())
+        UserAchievement.objects.all().delete()
+
+        self.assertEqual(achievements.backfill(batch_size=1), 4)
+        self.assertEqual(self.earned(), {'First Steps', 'Scholar', 'Quiz Master', 'Dedicated'})
+        self.assertEqual(achievements.backfill(), 0)
+
+
+class SortedSetTests(TestCase):
+    def ranked(self, scores):
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def test_matches_a_sorted_list(self):
+        rng = random.Random(7)
+        zset = SortedSet()
+        scores = {}
+        for _ in range(2000):
+            member = rng.randrange(200)
+            if rng.random() < 0.2:
+                self.assertEqual(zset.remove(member), member in scores)
+                scores.pop(member, None)
+            else:
+                scores[member] = rng.randrange(50)
+                zset.add(member, scores[member])
+        expected = self.ranked(scores)
+        self.assertEqual(len(zset), len(expected))
+        self.assertEqual(zset.range(0, len(expected)), expected)
+        self.assertEqual(zset.range(10, 5), expected[10:15])
+        for rank, (member, score) in enumerate(expected):
+            self.assertEqual(zset.rank(member), rank)
+        self.assertIsNone(zset.rank(-1))
+
+    def test_build_and_increment(self):
+        scores = {member: member % 7 for member in range(100)}
+        zset = SortedSet.build(scores.items())
+        self.assertEqual(zset.range(0, 100), self.ranked(scores))
+        self.assertEqual(zset.increment(3, 10), 13)
+        self.assertEqual(zset.range(0, 1), [(3, 13)])
+        self.assertEqual(zset.rank(3), 0)
+
+
+class LeaderboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.grades = [CBCGrade.objects.create(name=f'Grade {n}', order=n) for n in (9, 10)]
+        topic = PhysicsTopic.objects.create(
+            grade=cls.grades[0], title='Heat', slug='heat', description='About',
+            learning_outcomes='Outcomes', estimated_duration=30,
+        )
+        cls.quiz = Quiz.objects.create(topic=topic, title='Quiz', instructions='Go')
+        cls.users = []
+        for n, grade in enumerate([0, 0, 0, 1]):
+            user = User.objects.create_user(f'student{n}')
+            UserProfile.objects.create(user=user, current_grade=cls.grades[grade])
+            cls.users.append(user)
+
+    def setUp(self):
+        cache.clear()
+        leaderboards._leaderboards = leaderboards.Leaderboards(background=False)
+
+    def complete_attempt(self, user, score, completed_at=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            QuizAttempt.objects.create(
+                user=user, quiz=self.quiz, score=score, is_passed=score >= 50,
+                attempt_number=QuizAttempt.objects.filter(user=user).count() + 1,
+                completed_at=completed_at or timezone.now(),
+            )
+
+    def leaders(self, metric, grade='Grade 9', window=leaderboards.ALL_TIME):
+        return [(entry['user_id'], entry['score'])
+                for entry in leaderboards.top(metric, grade, window=window)]
+
+    def test_rebuild_ranks_each_grade(self):
+        self.complete_attempt(self.users[0], 60)
+        self.complete_attempt(self.users[1], 90)
+        self.complete_attempt(self.users[3], 70)
+        self.complete_attempt(self.users[0], 80, timezone.now() - timedelta(days=14))
+
+        self.assertEqual(self.leaders(leaderboards.QUIZ_AVERAGE),
+                         [(self.users[1].id, 90), (self.users[0].id, 70)])
+        self.assertEqual(self.leaders(leaderboards.QUIZ_AVERAGE, window=leaderboards.WEEK),
+                         [(self.users[1].id, 90), (self.users[0].id, 60)])
+        self.assertEqual(self.leaders(leaderboards.QUIZ_AVERAGE, 'Grade 10'), [(self.users[3].id, 70)])
+        self.assertEqual(self.leaders(leaderboards.STREAK)[0][1], 1)
+
+    def test_events_move_students_without_queries(self):
+        reward = Achievement.objects.create(name='Ace', description='Ace', achievement_type='quiz',
+                                            icon='star', criteria={'quiz_score': 95}, points=25)
+        self.complete_attempt(self.users[0], 60)
+        self.assertEqual(leaderboards.standing(self.users[2].id, leaderboards.QUIZ_AVERAGE),
+                         [{'grade': 'Grade 9', 'school': '', 'rank': None, 'score': None, 'size': 1}])
+
+        self.complete_attempt(self.users[2], 100)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.leaders(leaderboards.QUIZ_AVERAGE),
+                             [(self.users[2].id, 100), (self.users[0].id, 60)])
+            self.assertEqual(self.leaders(leaderboards.POINTS, window=leaderboards.WEEK),
+                             [(self.users[2].id, reward.points)])
+            self.assertEqual(leaderboards.standing(self.users[0].id, leaderboards.QUIZ_AVERAGE)[0]['rank'], 2)
+
+        incremental = {key: board.range(0, len(board)) for key, board in
+                       leaderboards.get_leaderboards().boards.items() if len(board)}
+        leaderboards.invalidate()
+        rebuilt = {key: board.range(0, len(board)) for key, board in
+                   leaderboards.get_leaderboards().boards.items() if len(board)}
+        self.assertEqual(rebuilt, incremental)
+
+    def test_deleted_attempt_leaves_the_weekly_average(self):
+        self.complete_attempt(self.users[0], 60)
+        self.complete_attempt(self.users[0], 80)
+        self.complete_attempt(self.users[1], 70)
+        with self.captureOnCommitCallbacks(execute=True):
+            QuizAttempt.objects.filter(user=self.users[0], score=80).first().delete()
+        self.assertEqual(self.leaders(leaderboards.QUIZ_AVERAGE, window=leaderboards.WEEK),
+                         [(self.users[1].id, 70), (self.users[0].id, 60)])
+        with self.captureOnCommitCallbacks(execute=True):
+            QuizAttempt.objects.filter(user=self.users[0]).delete()
+        self.assertEqual(self.leaders(leaderboards.QUIZ_AVERAGE, window=leaderboards.WEEK),
+                         [(self.users[1].id, 70)])
+        self.assertNotIn(self.users[0].id, leaderboards.get_leaderboards().weekly_quizzes)
+
+    def test_stale_boards_are_served_while_rebuilding_in_the_background(self):
+        leaderboards._leaderboards = leaderboards.Leaderboards()
+        self.complete_attempt(self.users[0], 60)
+        self.assertEqual(len(self.leaders(leaderboards.QUIZ_AVERAGE)), 1)
+        # Reaches the database without moving the in-memory boards
+        QuizAttempt.objects.filter(user=self.users[0]).update(score=90)
+        leaderboards.invalidate()
+        with mock.patch.object(leaderboards.threading, 'Thread') as Thread:
+            self.assertEqual(self.leaders(leaderboards.QUIZ_AVERAGE), [(self.users[0].id, 60)])
+            self.assertEqual(self.leaders(leaderboards.QUIZ_AVERAGE), [(self.users[0].id, 60)])
+        # One rebuild, holding the lock other processes wait on
+        Thread.assert_called_once()
+        self.assertFalse(cache.add(leaderboards.REBUILD_LOCK_KEY, True))
+        with mock.patch.object(leaderboards, 'close_old_connections'):
+            Thread.call_args.kwargs['target']()
+        self.assertIsNone(cache.get(leaderboards.REBUILD_LOCK_KEY))
+        self.assertEqual(self.leaders(leaderboards.QUIZ_AVERAGE), [(self.users[0].id, 90)])
+
+    def test_changing_grade_moves_the_student(self):
+        self.complete_attempt(self.users[0], 60)
+        self.assertEqual(len(self.leaders(leaderboards.QUIZ_AVERAGE)), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = self.users[0].profile
+            profile.current_grade = self.grades[1]
+            profile.save()
+        self.assertEqual(self.leaders(leaderboards.QUIZ_AVERAGE), [])
+        self.assertEqual(self.leaders(leaderboards.QUIZ_AVERAGE, 'Grade 10'), [(self.users[0].id, 60)])
+
+    def test_unknown_windows_are_rejected(self):
+        with self.assertRaises(ValueError):
+            leaderboards.top(leaderboards.STREAK, window=leaderboards.WEEK)
+
+
+class RosterMatrixTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        grade = CBCGrade.objects.create(name='Grade 9', order=1)
+        cls.topics = [
+            PhysicsTopic.objects.create(
+                grade=grade, title=f'Topic {n}', slug=f'topic-{n}', description='About',
+                learning_outcomes='Outcomes', estimated_duration=30, order=n,
+            )
+            for n in range(3)
+        ]
+        quiz = Quiz.objects.create(topic=cls.topics[1], title='Quiz', instructions='Go')
+        teacher = User.objects.create_user('teacher')
+        cls.students = [User.objects.create_user(f'student{n}', last_name=f'Last {n:02}') for n in range(20)]
+        cls.roster = ClassRoster.objects.create(teacher=teacher, name='9 West', grade=grade)
+        cls.roster.students.set(cls.students)
+        TopicProgress.objects.bulk_create(
+            TopicProgress(user=student, topic=cls.topics[0], status='completed', time_spent=n)
+            for n, student in enumerate(cls.students)
+        )
+        QuizAttempt.objects.bulk_create(
+            QuizAttempt(user=cls.students[0], quiz=quiz, attempt_number=number, score=score,
+                        completed_at=timezone.now())
+            for number, score in enumerate([40, 80], 1)
+        )
+        # Outside the class
+        TopicProgress.objects.create(user=teacher, topic=cls.topics[0], status='in_progress')
+
+    def test_matrix_is_read_with_a_fixed_number_of_queries(self):
+        with self.assertNumQueries(4):
+            topics, rows = rosters.progress_matrix(self.roster)
+            rows = list(rows)
+        self.assertEqual([topic[0] for topic in topics], [topic.id for topic in self.topics])
+        self.assertEqual(len(rows), 20)
+        student, cells = rows[0]
+        self.assertEqual(student[0], self.students[0].id)
+        self.assertEqual(cells, [('completed', 0, 0, None, None), ('not_started', 0, 2, 80, 60),
+                                 ('not_started', 0, 0, None, None)])
+
+    def test_csv_and_json_exports(self):
+        lines = list(csv.DictReader(rosters.csv_lines(self.roster)))
+        self.assertEqual(len(lines), 20 * 3)
+        self.assertEqual(lines[1]['best_quiz_score'], '80.0')
+        self.assertEqual(lines[3]['time_spent'], '1')
+
+        document = json.loads(''.join(rosters.json_chunks(self.roster)))
+        self.assertEqual(len(document['topics']), 3)
+        self.assertEqual(document['students'][19]['name'], 'Last 19')
+        self.assertEqual(document['students'][19]['cells'][0], ['completed', 19, 0, None, None])
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        grades = [CBCGrade.objects.create(name=f'Grade {n}', order=n) for n in (9, 10)]
+        cls.topic = {}
+        for n, (name, grade, difficulty) in enumerate([
+            ('Measurement', 0, 'beginner'), ('Motion', 0, 'beginner'), ('Forces', 0, 'intermediate'),
+            ('Waves', 0, 'beginner'), ('Optics', 1, 'advanced'),
+        ]):
+            cls.topic[name] = PhysicsTopic.objects.create(
+                grade=grades[grade], title=name, slug=name.lower(), description='About',
+                learning_outcomes='Outcomes', estimated_duration=30, order=n,
+                difficulty_level=difficulty,
+            )
+        cls.topic['Motion'].prerequisites.add(cls.topic['Measurement'])
+        cls.topic['Forces'].prerequisites.add(cls.topic['Motion'])
+        cls.topic['Optics'].prerequisites.add(cls.topic['Waves'])
+        cls.quiz = Quiz.objects.create(topic=cls.topic['Waves'], title='Waves quiz', instructions='Go')
+        cls.question = Question.objects.create(quiz=cls.quiz, question_text='Speed?',
+                                               question_type='multiple_choice')
+        cls.user = User.objects.create_user('student')
+        UserProfile.objects.create(user=cls.user, current_grade=grades[0])
+
+    def setUp(self):
+        cache.clear()
+
+    def ranked(self):
+        return [entry['topic'] for entry in recommendations.for_user(self.user.id)]
+
+    def test_prerequisites_grade_and_progress_shape_the_ranking(self):
+        ranked = self.ranked()
+        self.assertEqual(len(ranked), 5)
+        self.assertLess(ranked.index(self.topic['Measurement'].id), ranked.index(self.topic['Motion'].id))
+        self.assertLess(ranked.index(self.topic['Motion'].id), ranked.index(self.topic['Forces'].id))
+        self.assertEqual(ranked[-1], self.topic['Optics'].id)
+
+        TopicProgress.objects.create(user=self.user, topic=self.topic['Measurement'], status='completed',
+                                     completed_at=timezone.now())
+        ranked = self.ranked()
+        self.assertNotIn(self.topic['Measurement'].id, ranked)
+        self.assertEqual(ranked[0], self.topic['Motion'].id)
+
+    def test_quiz_weakness_raises_a_topic(self):
+        TopicProgress.objects.create(user=self.user, topic=self.topic['Measurement'], status='completed',
+                                     completed_at=timezone.now())
+        self.assertEqual(self.ranked()[0], self.topic['Motion'].id)
+        attempt = QuizAttempt.objects.create(user=self.user, quiz=self.quiz)
+        QuizResponse.objects.create(attempt=attempt, question=self.question, is_correct=False)
+        attempt.completed_at = timezone.now()
+        attempt.score = 0
+        attempt.save()
+        self.assertEqual(self.ranked()[0], self.topic['Waves'].id)
+
+    def test_starting_a_topic_makes_recommendations_stale(self):
+        self.ranked()
+        progress = TopicProgress.objects.create(user=self.user, topic=self.topic['Forces'])
+        self.assertIsNotNone(LearningAnalytics.objects.get(user=self.user).recommended_topics)
+        progress.status = 'in_progress'
+        progress.save()
+        self.assertIsNone(LearningAnalytics.objects.get(user=self.user).recommended_topics)
+        stored = {entry['topic']: entry['score'] for entry in recommendations.for_user(self.user.id)}
+        fresh = {entry['topic']: entry['score'] for entry in recommendations.recommend([self.user.id])[self.user.id]}
+        self.assertEqual(stored, fresh)
+        progress.delete()
+        self.assertIsNone(LearningAnalytics.objects.get(user=self.user).recommended_topics)
+
+    def test_stored_until_stale_and_refreshed_in_batches(self):
+        self.ranked()
+        with self.assertNumQueries(1):
+            self.ranked()
+        profile = self.user.profile
+        profile.preferred_learning_style = 'reading'
+        profile.save()
+        self.assertIsNone(LearningAnalytics.objects.get(user=self.user).recommended_topics)
+
+        other = User.objects.create_user('other')
+        LearningAnalytics.objects.create(user=other)
+        self.assertEqual(recommendations.refresh_all(batch_size=1, stale_only=True), 2)
+        self.assertEqual(len(LearningAnalytics.objects.get(user=other).recommended_topics), 5)
+
+    def test_material_changes_rebuild_the_features(self):
+        features = recommendations.get_features()
+        waves = features.column[self.topic['Waves'].id]
+        kinesthetic = recommendations.LEARNING_STYLES.index('kinesthetic')
+        self.assertEqual(features.style[waves, kinesthetic], 0)
+        experiment = TopicExperiment.objects.create(
+            topic=self.topic['Waves'], title='Ripple tank', objective='Observe', materials_needed='Tank',
+            procedure='Fill', expected_results='Ripples',
+        )
+        self.assertEqual(recommendations.get_features().style[waves, kinesthetic], 1)
+        experiment.delete()
+        self.assertEqual(recommendations.get_features().style[waves, kinesthetic], 0)
+
+
+class ReviewSchedulerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        grade = CBCGrade.objects.create(name='Grade 9', order=1)
+        topic = PhysicsTopic.objects.create(
+            grade=grade, title='Waves', slug='waves', description='About',
+            learning_outcomes='Outcomes', estimated_duration=30,
+        )
+        cls.quiz = Quiz.objects.create(topic=topic, title='Waves quiz', instructions='Go')
+        cls.questions = [
+            Question.objects.create(quiz=cls.quiz, question_text=f'Question {n}',
+                                    question_type='true_false', order=n)
+            for n in range(3)
+        ]
+
+    def setUp(self):
+        self.user = User.objects.create_user('student')
+        self.today = timezone.localdate()
+
+    def complete_attempt(self, correct, number=1, completed_at=None):
+        attempt = QuizAttempt.objects.create(user=self.user, quiz=self.quiz, attempt_number=number)
+        QuizResponse.objects.bulk_create(
+            QuizResponse(attempt=attempt, question=question, is_correct=question.id in correct,
+                         points_earned=1 if question.id in correct else 0, time_taken=10)
+            for question in self.questions
+        )
+        attempt.completed_at = completed_at or timezone.now()
+        attempt.score = 100 * len(correct) / len(self.questions)
+        attempt.save()
+        return attempt
+
+    def test_sm2_intervals(self):
+        state = reviews.new_state(self.user.id, self.questions[0].id)
+        intervals = [reviews.schedule(state, 5, self.today).interval for _ in range(4)]
+        self.assertEqual(intervals, [1, 6, 16, 45])
+        reviews.schedule(state, 1, self.today)
+        self.assertEqual((state.repetitions, state.interval, state.lapses), (0, 1, 1))
+        self.assertEqual(state.due_on, self.today + timedelta(days=1))
+        for _ in range(10):
+            reviews.schedule(state, 0, self.today)
+        self.assertEqual(state.ease, reviews.MIN_EASE)
+
+    def test_completed_attempts_fill_the_due_queue(self):
+        self.complete_attempt(correct={self.questions[0].id})
+        self.assertEqual(ReviewState.objects.filter(user=self.user).count(), 3)
+        tomorrow = self.today + timedelta(days=1)
+        self.assertEqual(list(reviews.due(self.user.id, self.today)), [])
+        self.assertEqual(len(reviews.due(self.user.id, tomorrow)), 3)
+
+        self.complete_attempt(correct={question.id for question in self.questions}, number=2)
+        state = ReviewState.objects.get(user=self.user, question=self.questions[0])
+        self.assertEqual((state.repetitions, state.interval), (2, 6))
+
+    def test_review_session(self):
+        self.complete_attempt(correct=set(), completed_at=timezone.now() - timedelta(days=2))
+        session, states = reviews.start_session(self.user.id)
+        self.assertEqual(session.session_type, 'review')
+        self.assertEqual([state.question_id for state in states], [q.id for q in self.questions])
+
+        state = reviews.answer(session, self.questions[0].id, True, time_taken=5)
+        self.assertEqual(state.due_on, self.today + timedelta(days=1))
+        self.assertEqual(session.activities_completed, [{'question': self.questions[0].id, 'quality': 5}])
+        self.assertEqual(list(ReviewAnswer.objects.values_list('session', 'question', 'quality')),
+                         [(session.id, self.questions[0].id, 5)])
+        self.assertEqual(len(reviews.due(self.user.id)), 2)
+        reviews.finish_session(session)
+        self.assertEqual(LearningAnalytics.objects.get(user=self.user).total_study_time, 1)
+
+    def test_rebuild_replays_history(self):
+        self.complete_attempt(correct=set(), completed_at=timezone.now() - timedelta(days=3))
+        self.complete_attempt(correct={self.questions[1].id}, number=2)
+        incremental = list(ReviewState.objects.order_by('question_id').values(
+            'question_id', 'repetitions', 'interval', 'ease', 'lapses', 'due_on'
+        ))
+        ReviewState.objects.all().delete()
+        self.assertEqual(reviews.rebuild_all(batch_size=2), 3)
+        self.assertEqual(list(ReviewState.objects.order_by('question_id').values(
+            'question_id', 'repetitions', 'interval', 'ease', 'lapses', 'due_on'
+        )), incremental)
 
-# Create your tests here.
+    def test_rebuild_keeps_review_session_answers(self):
+        self.complete_attempt(correct=set(), completed_at=timezone.now() - timedelta(days=3))
+        session, _ = reviews.start_session(self.user.id)
+        reviews.answer(session, self.questions[0].id, True, time_taken=5)
+        reviews.answer(session, self.questions[1].id, False)
+        incremental = list(ReviewState.objects.order_by('question_id').values(
+            'question_id', 'repetitions', 'interval', 'ease', 'lapses', 'last_reviewed_on', 'due_on'
+        ))
+        self.assertEqual(reviews.rebuild_all(batch_size=2), 3)
+        self.assertEqual(list(ReviewState.objects.order_by('question_id').values(
+            'question_id', 'repetitions', 'interval', 'ease', 'lapses', 'last_reviewed_on', 'due_on'
+        )), incremental)
+        self.assertEqual(ReviewState.objects.get(question=self.questions[0]).repetitions, 1)
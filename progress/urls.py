@@ -5,4 +5,9 @@ app_name = 'progress'
 
 urlpatterns = [
     # Remove all views since they require authentication
+    # path('leaderboard/<str:metric>/', views.leaderboard, name='leaderboard'),
+    # path('rosters/<int:roster_id>/progress/', views.roster_progress, name='roster_progress'),
+    # path('review/', views.review_session, name='review_session'),
+    # path('review/<int:session_id>/answer/<int:question_id>/', views.review_answer, name='review_answer'),
+    # path('review/<int:session_id>/finish/', views.review_finish, name='review_finish'),
 ]
\ No newline at end of file
@@ -1,11 +1,14 @@
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.db.models import Count, Sum, Avg, Q
 from .models import (
     TopicProgress, LearningPath, Achievement, UserAchievement, 
-    StudySession, LearningAnalytics, UserProfile
+    StudySession, LearningAnalytics, UserProfile, ClassRoster
 )
 from topics.models import PhysicsTopic, CBCGrade
+from quizzes import grading
+from quizzes.models import Question
+from . import leaderboards, recommendations, reviews, rosters
 # Remove login_required decorator
 # from django.contrib.auth.decorators import login_required
 
@@ -26,8 +29,8 @@ from topics.models import PhysicsTopic, CBCGrade
 #     # Get achievements
 #     user_achievements = UserAchievement.objects.filter(user=user).order_by('-earned_at')[:5]
 #     
-#     # Get learning analytics
-#     analytics, created = LearningAnalytics.objects.get_or_create(user=user)
+#     # Get learning analytics, maintained incrementally by progress.analytics
+#     analytics = LearningAnalytics.objects.filter(user=user).first() or LearningAnalytics(user=user)
 #     
 #     context = {
 #         'completed_topics': completed_topics,
@@ -45,10 +48,11 @@ from topics.models import PhysicsTopic, CBCGrade
 #     """Detailed learning analytics"""
 #     user = request.user
 #     
-#     # Get analytics
-#     analytics, created = LearningAnalytics.objects.get_or_create(user=user)
+#     # Totals are kept up to date by progress.analytics, so this is one row
+#     analytics = LearningAnalytics.objects.filter(user=user).first() or LearningAnalytics(user=user)
 #     
 #     # Get topic progress breakdown
+#     topic_progress = TopicProgress.objects.filter(user=user)
 #     progress_by_grade = topic_progress.values('topic__grade__name').annotate(
 #         total=Count('id'),
 #         completed=Count('id', filter=Q(status='completed'))
@@ -103,15 +107,10 @@ from topics.models import PhysicsTopic, CBCGrade
 #     # Get user's learning paths
 #     learning_paths = LearningPath.objects.filter(user=user, is_active=True)
 #     
-#     # Get recommended topics based on progress
-#     completed_topics = TopicProgress.objects.filter(
-#         user=user, 
-#         status='completed'
-#     ).values_list('topic_id', flat=True)
-#     
-#     recommended_topics = PhysicsTopic.objects.filter(
-#         is_active=True
-#     ).exclude(id__in=completed_topics)[:10]
+#     # Recommend topics from the user's progress, quiz results and profile
+#     recommended = [entry['topic'] for entry in recommendations.for_user(user.id)]
+#     topics = PhysicsTopic.objects.select_related('grade').in_bulk(recommended)
+#     recommended_topics = [topics[topic_id] for topic_id in recommended if topic_id in topics]
 #     
 #     context = {
 #         'learning_paths': learning_paths,
@@ -140,4 +139,70 @@ from topics.models import PhysicsTopic, CBCGrade
 #         'total_time': total_time,
 #         'avg_satisfaction': avg_satisfaction,
 #     }
-#     return render(request, 'progress/study_sessions.html', context)
\ No newline at end of file
+#     return render(request, 'progress/study_sessions.html', context)
+
+# Remove leaderboard view since it requires authentication
+# @login_required
+# def leaderboard(request, metric):
+#     """Top of the user's class and school boards, with the user's own rank"""
+#     window = request.GET.get('window', leaderboards.ALL_TIME)
+#     try:
+#         standings = leaderboards.standing(request.user.id, metric, window)
+#     except ValueError as error:
+#         return JsonResponse({'success': False, 'error': str(error)}, status=400)
+#     boards = [
+#         dict(standing, leaders=leaderboards.top(metric, standing['grade'], standing['school'], window))
+#         for standing in standings
+#     ]
+#     return JsonResponse({'success': True, 'metric': metric, 'window': window, 'boards': boards})
+
+
+# Remove roster_progress view since it requires authentication
+# @login_required
+# def roster_progress(request, roster_id):
+#     """A class's progress matrix, streamed as CSV (?format=csv) or JSON"""
+#     roster = get_object_or_404(ClassRoster, id=roster_id, teacher=request.user)
+#     if request.GET.get('format') == 'csv':
+#         response = StreamingHttpResponse(rosters.csv_lines(roster), content_type='text/csv')
+#         response['Content-Disposition'] = f'attachment; filename="roster-{roster.id}.csv"'
+#         return response
+#     return StreamingHttpResponse(rosters.json_chunks(roster), content_type='application/json')
+
+
+# Remove review views since they require authentication
+# @login_required
+# def review_session(request):
+#     """Start a spaced-repetition review of the questions due today"""
+#     session, states = reviews.start_session(request.user.id)
+#     return JsonResponse({
+#         'success': True,
+#         'session_id': session.id,
+#         'questions': [
+#             {'id': state.question_id, 'text': state.question.question_text, 'due_on': state.due_on}
+#             for state in states
+#         ],
+#     })
+#
+#
+# @login_required
+# def review_answer(request, session_id, question_id):
+#     """Grade one review answer and reschedule the question"""
+#     session = get_object_or_404(StudySession, id=session_id, user=request.user, session_type='review',
+#                                 ended_at__isnull=True)
+#     question = get_object_or_404(Question.objects.select_related('quiz'), id=question_id)
+#     answer_key = grading.get_answer_key(question.quiz)
+#     submission = grading.parse_submission(request.POST)
+#     result = next(result for result in grading.grade(answer_key, submission)
+#                   if result.question_id == question.id)
+#     time_taken = request.POST.get('time_taken')
+#     state = reviews.answer(session, question.id, result.is_correct,
+#                            int(time_taken) if time_taken and time_taken.isdigit() else None)
+#     return JsonResponse({'success': True, 'is_correct': result.is_correct, 'due_on': state.due_on})
+#
+#
+# @login_required
+# def review_finish(request, session_id):
+#     """Close a review session"""
+#     session = get_object_or_404(StudySession, id=session_id, user=request.user, session_type='review')
+#     reviews.finish_session(session)
+#     return JsonResponse({'success': True, 'duration': session.duration})
@@ -0,0 +1,296 @@
+"""
+Adaptive quiz delivery.
+
+An adaptive quiz asks each student only the questions that tell most about
+their ability rather than every question. Each active question carries item
+response theory parameters, a difficulty ``b`` and a discrimination ``a``
+(1 for every question under the 1PL / Rasch model), fitted offline from the
+stored responses by the ``fit_item_parameters`` command. A student of
+ability ``theta`` answers it correctly with probability
+``1 / (1 + exp(-a (theta - b)))``.
+
+For every quiz version the questions are kept in an index sorted by
+difficulty. After each answer the student's ability is re-estimated from
+their answers so far (the posterior mean over a fixed grid, with its
+standard error), and the next question is found by bisecting the index at
+that ability and comparing the information of the few unused questions on
+either side, so a step costs O(log n) whatever the size of the bank. The
+attempt ends once the standard error falls to ``TARGET_ERROR`` or
+``MAX_QUESTIONS`` have been asked, and is scored with the percentage of the
+whole quiz the student is expected to earn at the estimated ability. Only
+the questions actually asked are written as responses.
+"""
+import bisect
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from topics import fragments
+from . import grading
+from .models import Question, Quiz, QuizAttempt, QuizResponse
+from .packages import get_package, version_of
+
+INDEX_TIMEOUT = 60 * 60 * 24
+MIN_QUESTIONS = 5
+MAX_QUESTIONS = 20
+TARGET_ERROR = 0.4
+# Unused questions either side of the ability compared for information
+WINDOW = 3
+
+# Abilities are estimated on this grid under a standard normal prior
+GRID = np.linspace(-4, 4, 81)
+LOG_PRIOR = -GRID ** 2 / 2
+
+MODELS = ('1pl', '2pl')
+# Priors of the offline fit: difficulty ~ N(0, 2), discrimination ~ N(1, 0.5)
+DIFFICULTY_PRECISION = 1 / 2 ** 2
+DISCRIMINATION_PRECISION = 1 / 0.5 ** 2
+DISCRIMINATION_RANGE = (0.2, 4.0)
+DIFFICULTY_RANGE = (-4.0, 4.0)
+
+
+def probability(ability, difficulty, discrimination):
+    """Chance of a correct answer; broadcasts over its arguments"""
+    return 1 / (1 + np.exp(-discrimination * (ability - difficulty)))
+
+
+class ItemIndex:
+    """The active questions of a quiz sorted by difficulty"""
+
+    def __init__(self, rows):
+        """``rows`` are ``(question id, difficulty, discrimination, points)``"""
+        rows = sorted(rows, key=lambda row: (row[1], row[0]))
+        self.question_ids = [row[0] for row in rows]
+        self.position = {question_id: position for position, question_id in enumerate(self.question_ids)}
+        # A list for bisect, arrays for scoring
+        self.sorted_difficulty = [row[1] for row in rows]
+        self.difficulty = np.array(self.sorted_difficulty, dtype=float)
+        self.discrimination = np.array([row[2] for row in rows], dtype=float)
+        self.points = np.array([row[3] for row in rows], dtype=float)
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def information(self, position, ability):
+        p = probability(ability, self.difficulty[position], self.discrimination[position])
+        return self.discrimination[position] ** 2 * p * (1 - p)
+
+    def select(self, ability, asked=()):
+        """The most informative question not in ``asked`` near ``ability``, or None"""
+        left = bisect.bisect_left(self.sorted_difficulty, ability) - 1
+        right = left + 1
+        candidates = []
+        # Walk outwards from the ability, nearest difficulty first
+        while len(candidates) < 2 * WINDOW and (left >= 0 or right < len(self)):
+            if right >= len(self) or (
+                left >= 0 and ability - self.sorted_difficulty[left] <= self.sorted_difficulty[right] - ability
+            ):
+                position, left = left, left - 1
+            else:
+                position, right = right, right + 1
+            if self.question_ids[position] not in asked:
+                candidates.append(position)
+        if not candidates:
+            return None
+        best = max(candidates, key=lambda position: (self.information(position, ability), -position))
+        return self.question_ids[best]
+
+    def estimate(self, answers):
+        """``(ability, standard error)`` from ``(question id, is_correct)`` pairs"""
+        positions, correct = [], []
+        for question_id, is_correct in answers:
+            position = self.position.get(question_id)
+            if position is not None:
+                positions.append(position)
+                correct.append(is_correct)
+        log_posterior = LOG_PRIOR.copy()
+        if positions:
+            p = probability(GRID[:, None], self.difficulty[positions], self.discrimination[positions])
+            p = np.clip(p, 1e-12, 1 - 1e-12)
+            log_posterior += np.where(correct, np.log(p), np.log(1 - p)).sum(axis=1)
+        posterior = np.exp(log_posterior - log_posterior.max())
+        posterior /= posterior.sum()
+        ability = float(GRID @ posterior)
+        return ability, float(np.sqrt((GRID - ability) ** 2 @ posterior))
+
+    def expected_score(self, ability):
+        """Percentage of the quiz's points expected at ``ability``"""
+        total = self.points.sum()
+        if not total:
+            return 0
+        return float(self.points @ probability(ability, self.difficulty, self.discrimination) / total * 100)
+
+    def step(self, answers):
+        """``(next question id or None when finished, ability, error)`` after ``answers``"""
+        ability, error = self.estimate(answers)
+        asked = {question_id for question_id, _ in answers}
+        if len(asked) >= MAX_QUESTIONS or (len(asked) >= MIN_QUESTIONS and error <= TARGET_ERROR):
+            return None, ability, error
+        return self.select(ability, asked), ability, error
+
+
+def index_key(quiz_id, version):
+    return f'quiz-item-index:{quiz_id}:{version}'
+
+
+def build_index(quiz_id):
+    return ItemIndex(Question.objects.filter(quiz_id=quiz_id, is_active=True).values_list(
+        'id', 'irt_difficulty', 'irt_discrimination', 'points'
+    ))
+
+
+def get_index(quiz):
+    """Return the item index of ``quiz`` at its current version"""
+    key = index_key(quiz.id, version_of(quiz))
+    index = cache.get(key)
+    if index is None:
+        index = build_index(quiz.id)
+        cache.set(key, index, INDEX_TIMEOUT)
+    return index
+
+
+def answers_of(attempt):
+    return list(attempt.responses.order_by('id').values_list('question_id', 'is_correct'))
+
+
+def next_question(attempt):
+    """
+    The package entry of the attempt's next question, or None when the
+    attempt has finished. ``attempt.quiz`` should already be loaded.
+    """
+    if attempt.completed_at:
+        return None
+    question_id, _, _ = get_index(attempt.quiz).step(answers_of(attempt))
+    if question_id is None:
+        return None
+    return next(
+        question for question in get_package(attempt.quiz)['questions'] if question['id'] == question_id
+    )
+
+
+@transaction.atomic
+def answer(attempt, question_id, data):
+    """
+    Grade the answer to one question of an adaptive attempt from form
+    ``data`` and store it. Returns ``(graded, next question id)``; when no
+    question follows, the attempt is completed and scored. Raises
+    ValueError unless ``question_id`` is the question the attempt is asking.
+    """
+    # Locked so that two answers to the same question cannot both be stored
+    if QuizAttempt.objects.select_for_update().filter(
+        pk=attempt.pk, completed_at__isnull=True,
+    ).values_list('pk', flat=True).first() is None:
+        raise ValueError('The attempt has finished')
+    index = get_index(attempt.quiz)
+    answers = answers_of(attempt)
+    if question_id != index.step(answers)[0]:
+        raise ValueError('Not the question being asked')
+
+    answer_key = grading.get_answer_key(attempt.quiz)
+    result = grading.grade({question_id: answer_key[question_id]}, grading.parse_submission(data))[0]
+    response = QuizResponse.objects.create(
+        attempt=attempt, question_id=question_id, text_response=result.text_response,
+        is_correct=result.is_correct, points_earned=result.points_earned,
+    )
+    if result.answer_ids:
+        Selected = QuizResponse.selected_answers.through
+        Selected.objects.bulk_create([
+            Selected(quizresponse_id=response.id, answer_id=answer_id) for answer_id in result.answer_ids
+        ])
+
+    following, ability, error = index.step(answers + [(question_id, result.is_correct)])
+    if following is None:
+        finish(attempt, index, ability, error)
+    return result, following
+
+
+def finish(attempt, index, ability, error):
+    attempt.completed_at = timezone.now()
+    attempt.time_taken = int((attempt.completed_at - attempt.started_at).total_seconds())
+    attempt.ability = ability
+    attempt.ability_error = error
+    attempt.score = index.expected_score(ability)
+    attempt.is_passed = attempt.score >= attempt.quiz.passing_score
+    attempt.save(update_fields=['completed_at', 'time_taken', 'ability', 'ability_error', 'score', 'is_passed'])
+
+
+def load_history(quiz_id):
+    """
+    ``(question_ids, correct, answered)`` of a quiz's completed attempts:
+    attempts x questions matrices of correctness and of which questions each
+    attempt was asked, from a single query.
+    """
+    rows = {}
+    columns = {}
+    cells = []
+    for attempt_id, question_id, is_correct in QuizResponse.objects.filter(
+        attempt__quiz_id=quiz_id, attempt__completed_at__isnull=False, question__is_active=True,
+    ).values_list('attempt_id', 'question_id', 'is_correct'):
+        cells.append((rows.setdefault(attempt_id, len(rows)),
+                      columns.setdefault(question_id, len(columns)), is_correct))
+    correct = np.zeros((len(rows), len(columns)))
+    answered = np.zeros((len(rows), len(columns)))
+    if cells:
+        cells = np.array(cells, dtype=int)
+        correct[cells[:, 0], cells[:, 1]] = cells[:, 2]
+        answered[cells[:, 0], cells[:, 1]] = 1
+    return list(columns), correct, answered
+
+
+def fit(correct, answered, model='2pl', iterations=200, tolerance=1e-4):
+    """
+    Marginal maximum a posteriori estimates of the question parameters from
+    attempts x questions matrices, by EM over the ability grid: each
+    iteration weighs every attempt's abilities by their posterior under the
+    current parameters, then takes a Newton step on each question's
+    difficulty (and discrimination for 2PL) against those expected counts.
+    Questions an attempt was not asked (``answered`` 0) do not count.
+    Returns ``(ability, difficulty, discrimination)``, abilities being the
+    posterior means.
+    """
+    difficulty = np.zeros(correct.shape[1])
+    discrimination = np.ones(correct.shape[1])
+    right = correct * answered
+    wrong = (1 - correct) * answered
+    for _ in range(iterations):
+        p = np.clip(probability(GRID[:, None], difficulty, discrimination), 1e-12, 1 - 1e-12)
+        log_posterior = right @ np.log(p).T + wrong @ np.log(1 - p).T + LOG_PRIOR
+        posterior = np.exp(log_posterior - log_posterior.max(axis=1, keepdims=True))
+        posterior /= posterior.sum(axis=1, keepdims=True)
+
+        # Questions x grid: expected answers and correct answers at each ability
+        expected_answered = answered.T @ posterior
+        residual = right.T @ posterior - expected_answered * p.T
+        weight = expected_answered * p.T * (1 - p.T)
+        step = (-discrimination * residual.sum(axis=1) - difficulty * DIFFICULTY_PRECISION) / (
+            discrimination ** 2 * weight.sum(axis=1) + DIFFICULTY_PRECISION
+        )
+        change = np.abs(step).max(initial=0)
+        if model == '2pl':
+            spread = GRID - difficulty[:, None]
+            a_step = ((residual * spread).sum(axis=1) - (discrimination - 1) * DISCRIMINATION_PRECISION) / (
+                (weight * spread ** 2).sum(axis=1) + DISCRIMINATION_PRECISION
+            )
+            discrimination = np.clip(discrimination + a_step, *DISCRIMINATION_RANGE)
+            change = max(change, np.abs(a_step).max(initial=0))
+        difficulty = np.clip(difficulty + step, *DIFFICULTY_RANGE)
+        if change < tolerance:
+            break
+    return posterior @ GRID, difficulty, discrimination
+
+
+def fit_quiz(quiz, model='2pl'):
+    """Fit and store the IRT parameters of a quiz's questions; returns ``(questions, attempts)``"""
+    question_ids, correct, answered = load_history(quiz.id)
+    if correct.shape[0] < 2:
+        return 0, correct.shape[0]
+    _, difficulty, discrimination = fit(correct, answered, model)
+    Question.objects.bulk_update([
+        Question(id=question_id, irt_difficulty=round(float(b), 4), irt_discrimination=round(float(a), 4))
+        for question_id, b, a in zip(question_ids, difficulty, discrimination)
+    ], ['irt_difficulty', 'irt_discrimination'])
+    # A new quiz version rebuilds the item index everywhere
+    fragments.touch(Quiz, pk=quiz.id)
+    return len(question_ids), correct.shape[0]
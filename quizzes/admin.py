@@ -1,4 +1,10 @@
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
+from . import item_analysis
 from .models import Quiz, Question, Answer, QuizAttempt, QuizResponse, QuizFeedback
 
 
@@ -9,11 +15,39 @@ class AnswerInline(admin.TabularInline):
 
 @admin.register(Quiz)
 class QuizAdmin(admin.ModelAdmin):
-    list_display = ['title', 'topic', 'difficulty_level', 'passing_score', 'is_active']
-    list_filter = ['difficulty_level', 'is_active', 'topic__grade']
+    list_display = ['title', 'topic', 'difficulty_level', 'passing_score', 'is_active', 'item_analysis_link']
+    list_filter = ['difficulty_level', 'is_adaptive', 'is_active', 'topic__grade']
     search_fields = ['title', 'description']
     list_editable = ['is_active']
 
+    def get_urls(self):
+        return [
+            path(
+                '<path:object_id>/item-analysis/',
+                self.admin_site.admin_view(self.item_analysis_view),
+                name='quizzes_quiz_item_analysis',
+            ),
+        ] + super().get_urls()
+
+    @admin.display(description='Item analysis')
+    def item_analysis_link(self, obj):
+        return format_html(
+            '<a href="{}">View</a>', reverse('admin:quizzes_quiz_item_analysis', args=[obj.pk])
+        )
+
+    def item_analysis_view(self, request, object_id):
+        quiz = get_object_or_404(Quiz, pk=object_id)
+        if not self.has_view_permission(request, quiz):
+            raise PermissionDenied
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f'Item analysis: {quiz.title}',
+            'opts': self.model._meta,
+            'original': quiz,
+            'analysis': item_analysis.get_analysis(quiz),
+        }
+        return TemplateResponse(request, 'admin/quizzes/quiz/item_analysis.html', context)
+
 
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
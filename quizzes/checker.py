@@ -0,0 +1,436 @@
+"""
+Checking of typed answers.
+
+``fill_blank``, ``short_answer`` and ``calculation`` questions are marked
+against the text of their correct ``Answer`` rows, or against the
+``TopicFormula`` the question is linked to:
+
+* numbers, optionally with units (``9.8 m/s^2``, ``3.2e3 N``,
+  ``4.5 x 10^-3 kg``), are converted to the expected answer's unit and
+  compared within the question's relative ``tolerance``, or after rounding
+  both to its ``significant_figures``
+* expressions are compared with the formula's right-hand side by
+  evaluating both at fixed random values of the formula's variables
+* anything else is compared as text, ignoring case and spacing
+
+Questions without either keep the old rule that any answer counts.
+
+The expected answer of a question is parsed once, when the quiz's answer
+key is built, into a picklable ``Expected`` that is cached with the key.
+Expressions are compiled to code objects once per process and cached, and
+``check`` marks every answer to one question in a single call: each
+distinct answer is parsed once, then all of them are compared with the
+expected values as one NumPy array operation.
+"""
+import ast
+import logging
+import math
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOLERANCE = 0.01
+# Expressions are compared at SAMPLES points with this relative tolerance
+SAMPLES = 16
+EQUIVALENCE_TOLERANCE = 1e-6
+SAMPLE_SEED = 20240
+MAX_EXPRESSION = 200
+
+Expected = namedtuple('Expected', 'quantities texts tolerance significant_figures expression variables')
+# A number in its own unit, that unit's factor to SI and its dimensions, and
+# every ``(factor, dimensions)`` the unit can be read as, that one first
+Quantity = namedtuple('Quantity', 'value factor dimensions sig_figs readings')
+
+# Exponents of m, kg, s, A, K, mol
+DIMENSIONLESS = (0, 0, 0, 0, 0, 0)
+
+
+def dimensions(m=0, kg=0, s=0, A=0, K=0, mol=0):
+    return (m, kg, s, A, K, mol)
+
+
+UNITS = {
+    'm': (1, dimensions(m=1)),
+    'g': (1e-3, dimensions(kg=1)),
+    's': (1, dimensions(s=1)),
+    'A': (1, dimensions(A=1)),
+    'K': (1, dimensions(K=1)),
+    'mol': (1, dimensions(mol=1)),
+    'N': (1, dimensions(m=1, kg=1, s=-2)),
+    'J': (1, dimensions(m=2, kg=1, s=-2)),
+    'W': (1, dimensions(m=2, kg=1, s=-3)),
+    'Pa': (1, dimensions(m=-1, kg=1, s=-2)),
+    'Hz': (1, dimensions(s=-1)),
+    'C': (1, dimensions(s=1, A=1)),
+    'V': (1, dimensions(m=2, kg=1, s=-3, A=-1)),
+    'ohm': (1, dimensions(m=2, kg=1, s=-3, A=-2)),
+    'Ω': (1, dimensions(m=2, kg=1, s=-3, A=-2)),
+    'T': (1, dimensions(kg=1, s=-2, A=-1)),
+    'L': (1e-3, dimensions(m=3)),
+    'min': (60, dimensions(s=1)),
+    'h': (3600, dimensions(s=1)),
+    'eV': (1.602176634e-19, dimensions(m=2, kg=1, s=-2)),
+    'rad': (1, DIMENSIONLESS),
+}
+PREFIXES = {
+    'G': 1e9, 'M': 1e6, 'k': 1e3, 'c': 1e-2, 'm': 1e-3, 'u': 1e-6, 'µ': 1e-6, 'μ': 1e-6,
+    'n': 1e-9, 'p': 1e-12,
+}
+
+NUMBER = re.compile(
+    r'^\s*(?P<mantissa>[+-]?(?:\d+\.?\d*|\.\d+))(?:[eE](?P<exponent>[+-]?\d+))?'
+    r'(?:\s*(?:x|×|\*|·)\s*10\s*(?:\^|\*\*)\s*(?P<power>[+-]?\d+))?\s*(?P<unit>.*?)\s*\.?$'
+)
+UNIT_TOKEN = re.compile(r'\s*(?:(?P<symbol>[A-Za-zΩµμ]+)(?:\s*(?:\^|\*\*)?\s*(?P<power>[+-]?\d+))?|(?P<op>[*/·()]))')
+SUPERSCRIPTS = str.maketrans('⁰¹²³⁴⁵⁶⁷⁸⁹⁻', '0123456789-')
+
+FUNCTIONS = {
+    'sqrt': np.sqrt, 'sin': np.sin, 'cos': np.cos, 'tan': np.tan, 'exp': np.exp,
+    'log': np.log, 'ln': np.log, 'abs': np.abs,
+}
+CONSTANTS = {'pi': math.pi}
+EXPRESSION_TOKEN = re.compile(r'\s*(?:(?P<number>\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+)|(?P<name>[A-Za-z_]\w*)|(?P<op>\*\*|[-+*/()^]))')
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow,
+    ast.USub, ast.UAdd, ast.Call, ast.Name, ast.Load, ast.Constant,
+)
+
+
+def unit_of(text):
+    """
+    Every ``(factor to SI, dimensions)`` a unit such as ``km/h`` or
+    ``kg m s^-2`` can be read as, the plain reading first: ``ms^-1`` is per
+    millisecond, or metres per second.
+    """
+    text = text.translate(SUPERSCRIPTS).replace(' per ', '/')
+    readings = [(1.0, DIMENSIONLESS)]
+    # Each symbol is divided when it follows '/', or sits in brackets after one
+    sign, bracket_sign, position = 1, 1, 0
+    while position < len(text):
+        match = UNIT_TOKEN.match(text, position)
+        if match is None:
+            raise ValueError(f'Unknown unit {text!r}')
+        position = match.end()
+        if match['op'] == '/':
+            sign = -bracket_sign
+        elif match['op'] == '(':
+            bracket_sign = sign
+        elif match['op'] == ')':
+            bracket_sign = sign = 1
+        elif match['symbol']:
+            readings = [
+                (factor * unit_factor, tuple(a + b for a, b in zip(dims, unit_dims)))
+                for factor, dims in readings
+                for unit_factor, unit_dims in symbol_readings(match['symbol'], match['power'], sign)
+            ]
+            sign = bracket_sign
+    return list(dict.fromkeys(readings))
+
+
+def symbol_unit(symbol):
+    if symbol in UNITS:
+        return UNITS[symbol]
+    if symbol[0] in PREFIXES and symbol[1:] in UNITS:
+        factor, dims = UNITS[symbol[1:]]
+        return PREFIXES[symbol[0]] * factor, dims
+    raise ValueError(f'Unknown unit {symbol!r}')
+
+
+def raised(unit, power):
+    factor, dims = unit
+    return factor ** power, tuple(exponent * power for exponent in dims)
+
+
+def symbol_readings(symbol, power, sign):
+    """
+    The ``(factor, dimensions)`` readings of ``symbol`` raised to ``power``.
+    A run of letters with a power may also be two units written together,
+    the power belonging to the second, as in ``ms^-1`` or ``kgm^2``.
+    """
+    exponent = int(power or 1) * sign
+    readings = []
+    try:
+        readings.append(raised(symbol_unit(symbol), exponent))
+    except ValueError:
+        pass
+    if power:
+        for cut in range(1, len(symbol)):
+            try:
+                first, second = raised(symbol_unit(symbol[:cut]), sign), raised(symbol_unit(symbol[cut:]), exponent)
+            except ValueError:
+                continue
+            readings.append((first[0] * second[0], tuple(a + b for a, b in zip(first[1], second[1]))))
+    if not readings:
+        raise ValueError(f'Unknown unit {symbol!r}')
+    return readings
+
+
+def significant_figures(mantissa):
+    digits = mantissa.lstrip('+-')
+    if '.' in digits:
+        return max(len(digits.replace('.', '').lstrip('0')), 1)
+    return max(len(digits.lstrip('0').rstrip('0')), 1)
+
+
+@lru_cache(maxsize=4096)
+def parse_quantity(text):
+    """A ``Quantity`` from answer text, with ``dimensions`` None when no unit was given, or None"""
+    match = NUMBER.match(text.replace(',', '').replace('−', '-'))
+    if match is None:
+        return None
+    try:
+        exponent = int(match['exponent'] or 0) + int(match['power'] or 0)
+    except ValueError:
+        # More digits than int() reads
+        return None
+    value = float(f"{match['mantissa']}e{exponent}")
+    if not math.isfinite(value):
+        return None
+    if not match['unit']:
+        return Quantity(value, 1.0, None, significant_figures(match['mantissa']), ())
+    try:
+        readings = tuple(unit_of(match['unit']))
+    except ValueError:
+        return None
+    return Quantity(value, *readings[0], significant_figures(match['mantissa']), readings)
+
+
+def normalise_text(text):
+    return ' '.join(text.casefold().split()).rstrip('.')
+
+
+def latex_to_expression(text):
+    """Plain expression syntax from the LaTeX subset formulas are written in"""
+    output = []
+    position = 0
+
+    def group(start):
+        """The contents of the brace group at ``start`` and the position after it"""
+        while start < len(text) and text[start] == ' ':
+            start += 1
+        if start >= len(text) or text[start] != '{':
+            return text[start:start + 1], start + 1
+        depth = 0
+        for end in range(start, len(text)):
+            depth += {'{': 1, '}': -1}.get(text[end], 0)
+            if not depth:
+                return text[start + 1:end], end + 1
+        raise ValueError('Unbalanced braces')
+
+    while position < len(text):
+        char = text[position]
+        if char == '\\':
+            command = re.match(r'\\([A-Za-z]+|.)', text[position:], re.DOTALL)
+            if command is None:
+                raise ValueError('A backslash ends the formula')
+            name = command.group(1)
+            position += len(name) + 1
+            if name == 'frac':
+                numerator, position = group(position)
+                denominator, position = group(position)
+                output.append(f'(({latex_to_expression(numerator)})/({latex_to_expression(denominator)}))')
+            elif name == 'sqrt':
+                radicand, position = group(position)
+                output.append(f'sqrt({latex_to_expression(radicand)})')
+            elif name in ('cdot', 'times'):
+                output.append('*')
+            elif name in ('left', 'right', ',', ';', ' '):
+                continue
+            else:
+                output.append(f' {name} ')
+        elif char == '_':
+            subscript, position = group(position + 1)
+            output.append('_' + subscript.replace(' ', ''))
+        elif char == '^':
+            exponent, position = group(position + 1)
+            output.append(f'**({latex_to_expression(exponent)})')
+        elif char in '{}':
+            output.append('(' if char == '{' else ')')
+            position += 1
+        else:
+            output.append(char)
+            position += 1
+    return ''.join(output)
+
+
+def split_name(name, known):
+    """Split a run of letters such as ``ma`` into known names, longest first, or None"""
+    if name in known:
+        return [name]
+    for length in range(len(name) - 1, 0, -1):
+        if name[:length] in known:
+            rest = split_name(name[length:], known)
+            if rest is not None:
+                return [name[:length]] + rest
+    return None
+
+
+def to_python(text, variables):
+    """
+    Python source for an expression in ``variables``: ``^`` powers, implicit
+    products such as ``2mc^2`` and plain numbers made floats.
+    """
+    text = text.replace('²', '^2').replace('³', '^3').replace('·', '*').replace('−', '-')
+    known = set(variables) | set(FUNCTIONS) | set(CONSTANTS)
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = EXPRESSION_TOKEN.match(text, position)
+        if match is None:
+            if text[position:].strip():
+                raise ValueError(f'Unexpected {text[position:]!r}')
+            break
+        position = match.end()
+        if match['number']:
+            tokens.append(('value', repr(float(match['number']))))
+        elif match['name']:
+            names = split_name(match['name'], known)
+            if names is None:
+                raise ValueError(f'Unknown name {match["name"]!r}')
+            tokens.extend(('function' if name in FUNCTIONS else 'value', name) for name in names)
+        else:
+            tokens.append(('op', '**' if match['op'] == '^' else match['op']))
+
+    source = []
+    for index, (kind, token) in enumerate(tokens):
+        if index:
+            previous_kind, previous = tokens[index - 1]
+            ends_operand = previous_kind == 'value' or previous == ')'
+            starts_operand = kind in ('value', 'function') or token == '('
+            if ends_operand and starts_operand:
+                source.append('*')
+        source.append(token)
+    return ''.join(source)
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(text, variables):
+    """Compile an answer or formula expression into a code object, raising ValueError"""
+    if '=' in text:
+        text = text.rsplit('=', 1)[1]
+    if len(text) > MAX_EXPRESSION:
+        raise ValueError('Expression too long')
+    source = to_python(text, variables)
+    try:
+        tree = ast.parse(source, mode='eval')
+    except SyntaxError as error:
+        raise ValueError(str(error)) from None
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ValueError(f'{type(node).__name__} is not allowed')
+        if isinstance(node, ast.Call) and (
+            not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords
+        ):
+            raise ValueError('Unknown function')
+    return compile(tree, '<answer>', 'eval')
+
+
+@lru_cache(maxsize=256)
+def sample_points(variables):
+    """Fixed random positive values of each variable"""
+    rng = np.random.default_rng(SAMPLE_SEED)
+    return {name: rng.uniform(0.5, 2.5, SAMPLES) for name in variables}
+
+
+def evaluate(code, variables):
+    namespace = {'__builtins__': {}, **FUNCTIONS, **CONSTANTS, **sample_points(variables)}
+    with np.errstate(all='ignore'):
+        try:
+            return np.broadcast_to(np.asarray(eval(code, namespace), dtype=float), (SAMPLES,))
+        except (ArithmeticError, TypeError, ValueError):
+            return np.full(SAMPLES, np.nan)
+
+
+def build_expected(answer_texts, tolerance=None, sig_figs=None, formula=None, formula_variables=None):
+    """The picklable ``Expected`` of a question, or None when any answer counts"""
+    expression = variables = None
+    if formula:
+        variables = tuple(sorted(formula_variables or ()))
+        try:
+            expression = latex_to_expression(formula.rsplit('=', 1)[-1]).strip()
+            compile_expression(expression, variables)
+        except ValueError as error:
+            logger.warning('Cannot check answers against formula %r: %s', formula, error)
+            expression = variables = None
+    if expression is None and not answer_texts:
+        return None
+    quantities = tuple(
+        quantity for quantity in map(parse_quantity, answer_texts) if quantity is not None
+    )
+    return Expected(
+        quantities, frozenset(normalise_text(text) for text in answer_texts),
+        DEFAULT_TOLERANCE if tolerance is None else tolerance, sig_figs, expression, variables,
+    )
+
+
+def round_significant(values, figures):
+    with np.errstate(all='ignore'):
+        scale = 10.0 ** (figures - 1 - np.floor(np.log10(np.abs(values))))
+        return np.where(values == 0, 0, np.round(values * scale) / scale)
+
+
+def check_quantities(expected, texts):
+    """Whether each of ``texts`` is one of the expected quantities"""
+    parsed = [parse_quantity(text) for text in texts]
+    # Answers x expected quantities: each answer in the expected quantity's unit
+    given = np.full((len(texts), len(expected.quantities)), np.nan)
+    for row, quantity in enumerate(parsed):
+        if quantity is None:
+            continue
+        for column, wanted in enumerate(expected.quantities):
+            if quantity.dimensions is None:
+                given[row, column] = quantity.value
+                continue
+            # The first readings of the two units that agree in dimensions
+            ratio = next((
+                factor / wanted_factor
+                for factor, dims in quantity.readings
+                for wanted_factor, wanted_dims in wanted.readings or ((wanted.factor, DIMENSIONLESS),)
+                if dims == wanted_dims
+            ), None)
+            if ratio is not None:
+                given[row, column] = quantity.value * ratio
+    wanted = np.array([quantity.value for quantity in expected.quantities], dtype=float)
+    if expected.significant_figures:
+        figures = expected.significant_figures
+        matches = np.isclose(round_significant(given, figures), round_significant(wanted, figures)[None, :],
+                             rtol=1e-9, atol=0)
+    else:
+        matches = np.isclose(given, wanted[None, :], rtol=expected.tolerance,
+                             atol=np.where(wanted == 0, expected.tolerance, 0)[None, :])
+    return matches.any(axis=1)
+
+
+def check_expressions(expected, texts):
+    """Whether each of ``texts`` is equivalent to the expected expression"""
+    target = evaluate(compile_expression(expected.expression, expected.variables), expected.variables)
+    finite = np.isfinite(target)
+    results = {}
+    for text in set(texts):
+        try:
+            values = evaluate(compile_expression(text.strip(), expected.variables), expected.variables)
+        except ValueError:
+            results[text] = False
+            continue
+        results[text] = bool(finite.any()) and bool(np.all(
+            np.isclose(values[finite], target[finite], rtol=EQUIVALENCE_TOLERANCE, atol=0)
+        ))
+    return np.array([results[text] for text in texts], dtype=bool)
+
+
+def check(expected, texts):
+    """Mark every answer in ``texts`` to one question; returns a boolean array"""
+    texts = [str(text) for text in texts]
+    answered = np.array([bool(text.strip()) for text in texts], dtype=bool)
+    if expected is None:
+        return answered
+    correct = np.array([normalise_text(text) in expected.texts for text in texts], dtype=bool)
+    if expected.quantities:
+        correct |= check_quantities(expected, texts)
+    if expected.expression is not None:
+        correct |= check_expressions(expected, texts)
+    return correct & answered
@@ -0,0 +1,208 @@
+"""
+Exam-mode quiz submissions.
+
+When a whole school submits at the bell, writing every attempt in its own
+request makes hundreds of SQLite writers queue for the single write lock.
+In exam mode a submission is only parked in an in-process write-behind
+buffer and acknowledged at once with a signed receipt. A background thread
+drains the buffer in batches, grading each attempt with
+``grading.submit_attempt`` inside one transaction per batch, so a burst of
+submissions becomes a few short write transactions.
+
+Receipts are the signed attempt id, so any worker process can report the
+status of any receipt from the attempt row itself. A submission waiting in
+the buffer is lost if its process dies before the next flush; the student
+still sees the attempt as not completed and can submit again.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import signing
+from django.db import OperationalError, close_old_connections, transaction
+
+from . import grading
+from .models import QuizAttempt
+
+logger = logging.getLogger(__name__)
+
+RECEIPT_SALT = 'quizzes.exam.receipt'
+RETRY_DELAY = 1.0
+# Failure messages kept for status polls; the oldest are forgotten first
+MAX_FAILURES = 1000
+
+
+def make_receipt(attempt_id):
+    return signing.Signer(salt=RECEIPT_SALT).sign(str(attempt_id))
+
+
+def read_receipt(receipt):
+    """Return the attempt id of a receipt, or None if it was tampered with"""
+    try:
+        return int(signing.Signer(salt=RECEIPT_SALT).unsign(receipt))
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+class SubmissionBuffer:
+    """Pending submissions by attempt id, flushed in batched transactions"""
+
+    def __init__(self, batch_size=None, flush_interval=None, background=True):
+        self.batch_size = batch_size or settings.EXAM_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.EXAM_FLUSH_INTERVAL
+        self.background = background
+        self.failures = OrderedDict()
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def __len__(self):
+        with self._condition:
+            return len(self._pending)
+
+    def submit(self, attempt_id, data):
+        """Queue the form data of an attempt and return its receipt"""
+        with self._condition:
+            # A later submission of the same attempt replaces the queued one
+            self._pending.pop(attempt_id, None)
+            self._pending[attempt_id] = data
+            self.failures.pop(attempt_id, None)
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+            if self.background and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(
+                    target=self._run, name='exam-write-behind', daemon=True
+                )
+                self._thread.start()
+        return make_receipt(attempt_id)
+
+    def take_batch(self):
+        with self._condition:
+            batch = []
+            for attempt_id in list(self._pending)[:self.batch_size]:
+                batch.append((attempt_id, self._pending.pop(attempt_id)))
+            return batch
+
+    def requeue(self, batch):
+        with self._condition:
+            for attempt_id, data in batch:
+                # Keep any newer submission that arrived in the meantime
+                self._pending.setdefault(attempt_id, data)
+                # Failures recorded in the rolled back transaction did not happen
+                self.failures.pop(attempt_id, None)
+
+    def flush(self):
+        """Write every pending submission now; returns the number written"""
+        written = 0
+        while True:
+            batch = self.take_batch()
+            if not batch:
+                return written
+            try:
+                written += self.write(batch)
+            except Exception:
+                # The batch's transaction was rolled back, e.g. another process
+                # held the write lock past the busy timeout; keep the batch for
+                # the next flush
+                self.requeue(batch)
+                raise
+
+    def write(self, batch):
+        attempts = QuizAttempt.objects.select_related('quiz').in_bulk(
+            [attempt_id for attempt_id, _ in batch]
+        )
+        pending = []
+        for attempt_id, data in batch:
+            attempt = attempts.get(attempt_id)
+            if attempt is None:
+                self.fail(attempt_id, 'Unknown attempt')
+            elif attempt.completed_at:
+                self.fail(attempt_id, 'Quiz already completed')
+            else:
+                pending.append((attempt, data))
+        # Typed answers of the whole batch are checked together, question by question
+        try:
+            graded = grading.grade_batch([(attempt.quiz, data) for attempt, data in pending])
+        except Exception:
+            # Grade one by one instead, so only the faulty submission fails
+            logger.exception('Exam batch grading failed; grading attempts one by one')
+            graded = [None] * len(pending)
+
+        written = 0
+        with transaction.atomic():
+            for (attempt, data), result in zip(pending, graded):
+                try:
+                    grading.submit_attempt(attempt, data, result)
+                except OperationalError:
+                    # The database is busy: retry the whole batch later
+                    raise
+                except Exception as error:
+                    # Only this attempt's savepoint is rolled back; the rest of the batch commits
+                    logger.exception('Exam submission of attempt %s failed', attempt.id)
+                    self.fail(attempt.id, str(error) or type(error).__name__)
+                else:
+                    with self._condition:
+                        self.failures.pop(attempt.id, None)
+                    written += 1
+        return written
+
+    def fail(self, attempt_id, message):
+        with self._condition:
+            self.failures.pop(attempt_id, None)
+            self.failures[attempt_id] = message
+            while len(self.failures) > MAX_FAILURES:
+                self.failures.popitem(last=False)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if len(self._pending) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+                if not self._pending:
+                    continue
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Exam write-behind flush failed')
+                time.sleep(RETRY_DELAY)
+            finally:
+                close_old_connections()
+
+    def status(self, receipt):
+        """Describe the state of a receipt as a dict, or None if unknown"""
+        attempt_id = read_receipt(receipt)
+        if attempt_id is None:
+            return None
+        with self._condition:
+            if attempt_id in self.failures:
+                return {'status': 'failed', 'message': self.failures[attempt_id]}
+            if attempt_id in self._pending:
+                return {'status': 'queued'}
+        attempt = QuizAttempt.objects.filter(id=attempt_id).values(
+            'completed_at', 'score', 'is_passed'
+        ).first()
+        if attempt is None:
+            return None
+        if attempt['completed_at'] is None:
+            # Queued in another worker process
+            return {'status': 'queued'}
+        return {'status': 'graded', 'score': attempt['score'], 'is_passed': attempt['is_passed']}
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """The write-behind buffer of this process"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = SubmissionBuffer()
+                # Write whatever is still queued when the worker shuts down
+                atexit.register(_buffer.flush)
+    return _buffer
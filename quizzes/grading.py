@@ -0,0 +1,209 @@
+"""
+Whole-attempt quiz grading.
+
+A student's answers to every question of an attempt arrive in one POST and
+are scored in a single pass against the quiz's answer key: the set of
+correct answer ids, the valid choices and the points of each active
+question. The key is built with three queries and cached per quiz version,
+like the delivery package in ``quizzes.packages``. Responses and their
+selected answers are then written with one ``bulk_create`` each, so
+grading costs the same handful of queries however long the quiz is.
+
+Typed answers are marked by ``quizzes.checker`` against the expected answer
+parsed into the key. ``grade_many`` checks the typed answers of many
+submissions to a question in one call, which the exam-mode buffer uses to
+grade a whole batch of a class's submissions together.
+"""
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from . import checker
+from .models import Quiz, Question, Answer, QuizResponse
+from .packages import TEXT_TYPES, version_of
+
+KEY_TIMEOUT = 60 * 60 * 24
+
+CHOICE_TYPES = {'multiple_choice', 'true_false', 'matching', 'ordering'}
+
+KeyEntry = namedtuple('KeyEntry', 'question_type points choices correct explanation expected')
+Graded = namedtuple('Graded', 'question_id answer_ids text_response is_correct points_earned')
+
+
+def answer_key_cache_key(quiz_id, version):
+    return f'quiz-answer-key:3:{quiz_id}:{version}'
+
+
+def build_answer_key(quiz_id):
+    """
+    ``(version, answer key)`` of a quiz, the key mapping each active question
+    id to its KeyEntry. The version is read first, so the key is at least as
+    new as it.
+    """
+    quiz = Quiz.objects.only('updated_at').filter(id=quiz_id).first()
+    choices = {}
+    correct = {}
+    correct_texts = {}
+    for answer_id, question_id, is_correct, answer_text in Answer.objects.filter(
+        question__quiz_id=quiz_id, question__is_active=True
+    ).values_list('id', 'question_id', 'is_correct', 'answer_text'):
+        choices.setdefault(question_id, set()).add(answer_id)
+        if is_correct:
+            correct.setdefault(question_id, set()).add(answer_id)
+            correct_texts.setdefault(question_id, []).append(answer_text)
+
+    answer_key = {}
+    for (question_id, question_type, points, explanation, tolerance, significant_figures,
+         formula, variables) in Question.objects.filter(quiz_id=quiz_id, is_active=True).values_list(
+        'id', 'question_type', 'points', 'explanation', 'tolerance', 'significant_figures',
+        'formula__formula', 'formula__variables',
+    ):
+        expected = None
+        if question_type in TEXT_TYPES:
+            expected = checker.build_expected(
+                correct_texts.get(question_id, ()), tolerance, significant_figures, formula, variables,
+            )
+        answer_key[question_id] = KeyEntry(
+            question_type, points,
+            frozenset(choices.get(question_id, ())),
+            frozenset(correct.get(question_id, ())),
+            explanation, expected,
+        )
+    return version_of(quiz) if quiz else 0, answer_key
+
+
+def get_answer_key(quiz):
+    """Return the answer key of ``quiz`` at its current version"""
+    key = answer_key_cache_key(quiz.id, version_of(quiz))
+    answer_key = cache.get(key)
+    if answer_key is None:
+        version, answer_key = build_answer_key(quiz.id)
+        # Store it under the version it was actually built from
+        cache.set(answer_key_cache_key(quiz.id, version), answer_key, KEY_TIMEOUT)
+    return answer_key
+
+
+def parse_submission(data):
+    """
+    Read the take-quiz form (``question_<id>`` answer ids and
+    ``text_response_<id>`` text) into ``{question_id: (answer_ids, text)}``.
+    """
+    submission = {}
+    for name in data:
+        prefix, _, question_id = name.rpartition('_')
+        if prefix not in ('question', 'text_response') or not question_id.isdigit():
+            continue
+        answer_ids, text = submission.get(int(question_id), ((), ''))
+        if prefix == 'question':
+            values = data.getlist(name) if hasattr(data, 'getlist') else data[name]
+            if not isinstance(values, (list, tuple)):
+                values = [values]
+            answer_ids = tuple(int(value) for value in values if str(value).isdigit())
+        else:
+            text = data[name]
+        submission[int(question_id)] = (answer_ids, text)
+    return submission
+
+
+def grade_many(answer_key, submissions):
+    """
+    Score every question of the key for each of ``submissions``; unanswered
+    questions earn nothing. The typed answers to each question are checked
+    together.
+    """
+    checked = {
+        question_id: checker.check(entry.expected, [
+            submission.get(question_id, ((), ''))[1] for submission in submissions
+        ])
+        for question_id, entry in answer_key.items() if entry.question_type in TEXT_TYPES
+    }
+    graded = []
+    for index, submission in enumerate(submissions):
+        results = []
+        for question_id, entry in answer_key.items():
+            answer_ids, text = submission.get(question_id, ((), ''))
+            # Ignore ids that are not choices of this question
+            selected = frozenset(answer_ids) & entry.choices
+            if entry.question_type in TEXT_TYPES:
+                is_correct = bool(checked[question_id][index])
+            else:
+                is_correct = bool(selected) and selected == entry.correct
+            results.append(Graded(
+                question_id, selected, text, is_correct,
+                entry.points if is_correct else 0,
+            ))
+        graded.append(results)
+    return graded
+
+
+def grade(answer_key, submission):
+    """Score every question of the key in one pass; unanswered ones earn nothing"""
+    return grade_many(answer_key, [submission])[0]
+
+
+def grade_batch(items):
+    """Grade ``(quiz, data)`` pairs, the submissions to each quiz together"""
+    by_quiz = {}
+    for index, (quiz, data) in enumerate(items):
+        by_quiz.setdefault(quiz.id, (quiz, []))[1].append((index, parse_submission(data)))
+    graded = [None] * len(items)
+    for quiz, submissions in by_quiz.values():
+        results = grade_many(get_answer_key(quiz), [submission for _, submission in submissions])
+        for (index, _), result in zip(submissions, results):
+            graded[index] = result
+    return graded
+
+
+@transaction.atomic
+def submit_attempt(attempt, data, graded=None):
+    """
+    Grade and store a complete attempt from submitted form ``data``, replacing
+    any earlier responses, and mark the attempt completed. ``attempt.quiz``
+    should already be loaded; ``graded`` is its result from ``grade_batch``
+    when the attempt was graded with others.
+    """
+    answer_key = get_answer_key(attempt.quiz)
+    if graded is None:
+        graded = grade(answer_key, parse_submission(data))
+
+    attempt.responses.all().delete()
+    responses = QuizResponse.objects.bulk_create([
+        QuizResponse(
+            attempt=attempt, question_id=result.question_id,
+            text_response=result.text_response, is_correct=result.is_correct,
+            points_earned=result.points_earned,
+        )
+        for result in graded
+    ])
+    Selected = QuizResponse.selected_answers.through
+    Selected.objects.bulk_create([
+        Selected(quizresponse_id=response.id, answer_id=answer_id)
+        for response, result in zip(responses, graded)
+        for answer_id in result.answer_ids
+    ])
+
+    total_points = sum(entry.points for entry in answer_key.values())
+    earned_points = sum(result.points_earned for result in graded)
+    attempt.completed_at = timezone.now()
+    attempt.time_taken = int((attempt.completed_at - attempt.started_at).total_seconds())
+    attempt.score = (earned_points / total_points * 100) if total_points > 0 else 0
+    attempt.is_passed = attempt.score >= attempt.quiz.passing_score
+    attempt.save(update_fields=['completed_at', 'time_taken', 'score', 'is_passed'])
+
+    return {
+        'score': attempt.score,
+        'is_passed': attempt.is_passed,
+        'earned_points': earned_points,
+        'total_points': total_points,
+        'results': [
+            {
+                'question_id': result.question_id,
+                'is_correct': result.is_correct,
+                'points_earned': result.points_earned,
+                'explanation': answer_key[result.question_id].explanation if result.is_correct else '',
+            }
+            for result in graded
+        ],
+    }
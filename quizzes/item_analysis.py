@@ -0,0 +1,183 @@
+"""
+Item analysis of quiz questions.
+
+Every response to a quiz's completed attempts, with its selected answers,
+is read in one query into NumPy arrays: an attempts x questions matrix of
+correctness and one of points earned, and the (attempt, answer) pairs of
+every selection. From those, all statistics are whole-array operations:
+
+* difficulty: share of attempts answering each question correctly
+* discrimination: difference in difficulty between the top and bottom 27%
+  of attempts by total score, and the correlation of each question with the
+  rest of the quiz (corrected point-biserial)
+* distractor analysis: how often each answer was chosen, overall and by
+  the top and bottom groups
+* reliability: KR-20 of correctness and Cronbach's alpha of points
+
+Results are cached per quiz version and per count of completed attempts.
+The questions, answers and key come from the cached quiz package and answer
+key, so a cache miss costs that one query plus the cheap state query.
+"""
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from .grading import get_answer_key
+from .models import QuizAttempt, QuizResponse
+from .packages import get_package, version_of
+
+RESULT_TIMEOUT = 60 * 60 * 24
+GROUP_SHARE = 0.27
+
+
+def state_of(quiz):
+    """What the analysis depends on besides the quiz version"""
+    state = QuizAttempt.objects.filter(quiz_id=quiz.id, completed_at__isnull=False).aggregate(
+        attempts=Count('id'), last=Max('completed_at'),
+    )
+    return state['attempts'], state['last'].timestamp() if state['last'] else 0
+
+
+def result_key(quiz_id, version, attempts, last):
+    return f'quiz-item-analysis:{quiz_id}:{version}:{attempts}:{last}'
+
+
+def load_responses(quiz_id, question_ids, answer_ids):
+    """
+    ``(correct, points, selections)``: attempts x questions matrices and an
+    array of (attempt row, answer column) pairs, from a single query.
+    """
+    column = {question_id: index for index, question_id in enumerate(question_ids)}
+    answer_column = {answer_id: index for index, answer_id in enumerate(answer_ids)}
+    rows = {}
+    cells = {}
+    selections = []
+    for attempt_id, question_id, is_correct, points_earned, answer_id in QuizResponse.objects.filter(
+        attempt__quiz_id=quiz_id, attempt__completed_at__isnull=False
+    ).values_list('attempt_id', 'question_id', 'is_correct', 'points_earned', 'selected_answers'):
+        row = rows.setdefault(attempt_id, len(rows))
+        if question_id not in column:
+            continue
+        cells[row, column[question_id]] = (is_correct, points_earned)
+        if answer_id in answer_column:
+            selections.append((row, answer_column[answer_id]))
+
+    correct = np.zeros((len(rows), len(question_ids)))
+    points = np.zeros((len(rows), len(question_ids)))
+    if cells:
+        index = np.array(list(cells), dtype=int)
+        values = np.array(list(cells.values()), dtype=float)
+        correct[index[:, 0], index[:, 1]] = values[:, 0]
+        points[index[:, 0], index[:, 1]] = values[:, 1]
+    return correct, points, np.array(selections, dtype=int).reshape(-1, 2)
+
+
+def groups(totals):
+    """Row masks of the top and bottom ``GROUP_SHARE`` of attempts by total"""
+    size = max(1, int(round(len(totals) * GROUP_SHARE)))
+    order = np.argsort(totals, kind='stable')
+    upper = np.zeros(len(totals), dtype=bool)
+    lower = np.zeros(len(totals), dtype=bool)
+    upper[order[-size:]] = True
+    lower[order[:size]] = True
+    return upper, lower
+
+
+def reliability(matrix):
+    """Cronbach's alpha of an attempts x items matrix (KR-20 when it is 0/1)"""
+    attempts, items = matrix.shape
+    if attempts < 2 or items < 2:
+        return None
+    total_variance = matrix.sum(axis=1).var()
+    if total_variance == 0:
+        return None
+    return float(items / (items - 1) * (1 - matrix.var(axis=0).sum() / total_variance))
+
+
+def item_rest_correlation(points):
+    """Correlation of each item with the total of the other items"""
+    rest = points.sum(axis=1, keepdims=True) - points
+    item = points - points.mean(axis=0)
+    rest = rest - rest.mean(axis=0)
+    denominator = np.sqrt((item ** 2).sum(axis=0) * (rest ** 2).sum(axis=0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlation = (item * rest).sum(axis=0) / denominator
+    return correlation
+
+
+def number(value, digits=4):
+    return None if value is None or not np.isfinite(value) else round(float(value), digits)
+
+
+def share(count, size):
+    return round(float(count / size), 4) if size else None
+
+
+def analyse(quiz):
+    """Compute the item analysis of ``quiz`` from its stored responses"""
+    package = get_package(quiz)
+    answer_key = get_answer_key(quiz)
+    questions = [question for question in package['questions'] if question['id'] in answer_key]
+    question_ids = [question['id'] for question in questions]
+    answer_ids = [answer['id'] for question in questions for answer in question['answers']]
+    correct, points, selections = load_responses(quiz.id, question_ids, answer_ids)
+    attempts = correct.shape[0]
+
+    result = {
+        'quiz_id': quiz.id,
+        'version': version_of(quiz),
+        'attempts': attempts,
+        'kr20': None,
+        'alpha': None,
+        'questions': [],
+    }
+    if attempts:
+        upper, lower = groups(points.sum(axis=1))
+        difficulty = correct.mean(axis=0)
+        discrimination = correct[upper].mean(axis=0) - correct[lower].mean(axis=0)
+        correlation = item_rest_correlation(points)
+    else:
+        upper = lower = np.zeros(0, dtype=bool)
+        difficulty = discrimination = correlation = np.full(len(questions), np.nan)
+
+    chosen_rows, chosen_answers = selections[:, 0], selections[:, 1]
+    chosen = np.bincount(chosen_answers, minlength=len(answer_ids))
+    chosen_upper = np.bincount(chosen_answers[upper[chosen_rows]], minlength=len(answer_ids))
+    chosen_lower = np.bincount(chosen_answers[lower[chosen_rows]], minlength=len(answer_ids))
+
+    result['kr20'] = number(reliability(correct))
+    result['alpha'] = number(reliability(points))
+    answer_index = 0
+    for index, question in enumerate(questions):
+        entry = answer_key[question['id']]
+        answers = []
+        for answer in question['answers']:
+            answers.append({
+                'id': answer['id'],
+                'text': answer['answer_text'],
+                'is_correct': answer['id'] in entry.correct,
+                'chosen': int(chosen[answer_index]),
+                'share': share(chosen[answer_index], attempts),
+                'upper_share': share(chosen_upper[answer_index], upper.sum()),
+                'lower_share': share(chosen_lower[answer_index], lower.sum()),
+            })
+            answer_index += 1
+        result['questions'].append({
+            'id': question['id'],
+            'text': question['question_text'],
+            'difficulty': number(difficulty[index]),
+            'discrimination': number(discrimination[index]),
+            'item_rest_correlation': number(correlation[index]),
+            'answers': answers,
+        })
+    return result
+
+
+def get_analysis(quiz):
+    """The cached item analysis of ``quiz`` at its current version and responses"""
+    key = result_key(quiz.id, version_of(quiz), *state_of(quiz))
+    result = cache.get(key)
+    if result is None:
+        result = analyse(quiz)
+        cache.set(key, result, RESULT_TIMEOUT)
+    return result
@@ -0,0 +1,182 @@
+from importlib import import_module
+import json
+import statistics
+import threading
+import time
+from urllib import parse, request as urlrequest
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.utils.crypto import get_random_string
+
+from quizzes import exam, grading
+from quizzes.models import Quiz, Question, Answer, QuizAttempt
+from topics.models import CBCGrade, PhysicsTopic
+
+User = get_user_model()
+
+BENCHMARK_NAME = 'Exam benchmark'
+
+
+class Command(BaseCommand):
+    help = 'Simulate many students submitting a quiz at the same moment'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submitters', type=int, default=500,
+                            help='Number of concurrent submissions')
+        parser.add_argument('--questions', type=int, default=40,
+                            help='Questions in the benchmark quiz')
+        parser.add_argument('--mode', choices=['buffered', 'direct'], default='buffered',
+                            help='In-process: queue through the write-behind buffer, '
+                                 'or grade every submission in its own transaction')
+        parser.add_argument('--url',
+                            help='Base URL of a running server (e.g. gunicorn on '
+                                 'http://127.0.0.1:8000) to POST to instead; needs the '
+                                 'exam_submit view enabled and the same database')
+        parser.add_argument('--timeout', type=float, default=120,
+                            help='Seconds to wait for every submission to be graded')
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the benchmark quiz, user and attempts afterwards')
+
+    def handle(self, *args, **options):
+        user, quiz, form_data = self.create_fixtures(options['questions'])
+        attempts = QuizAttempt.objects.bulk_create([
+            QuizAttempt(user=user, quiz=quiz, attempt_number=n + 1)
+            for n in range(options['submitters'])
+        ])
+        attempt_ids = [attempt.id for attempt in attempts]
+        self.stdout.write(
+            f'{len(attempt_ids)} submitters, {options["questions"]} questions, '
+            f'{"HTTP " + options["url"] if options["url"] else options["mode"]}'
+        )
+
+        try:
+            if options['url']:
+                submit = self.http_submitter(options['url'], user, form_data)
+            elif options['mode'] == 'buffered':
+                buffer = exam.SubmissionBuffer()
+                submit = lambda attempt_id: buffer.submit(attempt_id, form_data)
+            else:
+                submit = self.direct_submitter(form_data)
+
+            started = time.perf_counter()
+            latencies, errors = self.run_concurrently(submit, attempt_ids)
+            acknowledged = time.perf_counter() - started
+            pending = self.wait_until_graded(attempt_ids, options['timeout'])
+            finished = time.perf_counter() - started
+
+            self.report(latencies, errors, acknowledged, finished, pending)
+        finally:
+            if not options['keep']:
+                User.objects.filter(pk=user.pk).delete()
+                CBCGrade.objects.filter(name=BENCHMARK_NAME).delete()
+
+    def create_fixtures(self, questions):
+        grade, _ = CBCGrade.objects.get_or_create(name=BENCHMARK_NAME, defaults={'order': 999})
+        topic, _ = PhysicsTopic.objects.get_or_create(
+            slug='exam-benchmark',
+            defaults={
+                'title': BENCHMARK_NAME, 'grade': grade, 'description': BENCHMARK_NAME,
+                'learning_outcomes': BENCHMARK_NAME, 'estimated_duration': 1, 'is_active': False,
+            },
+        )
+        quiz = Quiz.objects.create(topic=topic, title=BENCHMARK_NAME, instructions='-',
+                                   is_active=False)
+        form_data = {}
+        for n in range(questions):
+            question = Question.objects.create(quiz=quiz, question_type='multiple_choice',
+                                               question_text=f'Question {n}', order=n)
+            answers = Answer.objects.bulk_create([
+                Answer(question=question, answer_text='Right', is_correct=True, order=0),
+                Answer(question=question, answer_text='Wrong', order=1),
+            ])
+            form_data[f'question_{question.id}'] = str(answers[n % 2].id)
+        user = User.objects.create_user(f'exam-benchmark-{get_random_string(8).lower()}')
+        return user, quiz, form_data
+
+    def direct_submitter(self, form_data):
+        def submit(attempt_id):
+            try:
+                attempt = QuizAttempt.objects.select_related('quiz').get(id=attempt_id)
+                grading.submit_attempt(attempt, form_data)
+            finally:
+                connection.close()
+        return submit
+
+    def http_submitter(self, base_url, user, form_data):
+        # Log the benchmark user in by creating its session directly
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        csrf_token = get_random_string(32)
+        headers = {
+            'Cookie': f'{settings.SESSION_COOKIE_NAME}={session.session_key}; '
+                      f'{settings.CSRF_COOKIE_NAME}={csrf_token}',
+            'X-CSRFToken': csrf_token,
+            'Referer': base_url,
+        }
+        body = parse.urlencode(form_data).encode()
+
+        def submit(attempt_id):
+            url = parse.urljoin(base_url, f'/quizzes/attempt/{attempt_id}/exam-submit/')
+            with urlrequest.urlopen(urlrequest.Request(url, body, headers), timeout=60) as response:
+                payload = json.load(response)
+            if not payload.get('success'):
+                raise RuntimeError(payload.get('message'))
+        return submit
+
+    def run_concurrently(self, submit, attempt_ids):
+        """Release every submitter at once, like the end-of-exam bell"""
+        barrier = threading.Barrier(len(attempt_ids))
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def run(attempt_id):
+            barrier.wait()
+            started = time.perf_counter()
+            try:
+                submit(attempt_id)
+            except Exception as error:
+                with lock:
+                    errors.append(error)
+            else:
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+
+        threads = [threading.Thread(target=run, args=(attempt_id,)) for attempt_id in attempt_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, errors
+
+    def wait_until_graded(self, attempt_ids, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            pending = QuizAttempt.objects.filter(id__in=attempt_ids, completed_at__isnull=True).count()
+            if not pending or time.monotonic() > deadline:
+                return pending
+            time.sleep(0.1)
+
+    def report(self, latencies, errors, acknowledged, finished, pending):
+        if latencies:
+            latencies.sort()
+            self.stdout.write(
+                f'Acknowledged {len(latencies)} in {acknowledged:.2f}s: '
+                f'p50 {statistics.median(latencies) * 1000:.1f}ms, '
+                f'p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms, '
+                f'max {latencies[-1] * 1000:.1f}ms'
+            )
+        self.stdout.write(f'All graded after {finished:.2f}s')
+        locked = sum(1 for error in errors
+                     if isinstance(error, OperationalError) and 'locked' in str(error))
+        style = self.style.ERROR if errors or pending else self.style.SUCCESS
+        self.stdout.write(style(
+            f'{len(errors)} failed submissions ({locked} "database is locked"), '
+            f'{pending} still ungraded'
+        ))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from quizzes import adaptive
+from quizzes.models import Quiz
+
+
+class Command(BaseCommand):
+    help = 'Fit the IRT parameters of quiz questions from response history (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=adaptive.MODELS, default='2pl',
+                            help='1PL (difficulty only) or 2PL (difficulty and discrimination)')
+        parser.add_argument('--quiz', type=int, action='append',
+                            help='Only this quiz; may be repeated')
+        parser.add_argument('--all', action='store_true',
+                            help='Every quiz, not only the adaptive ones')
+
+    def handle(self, *args, **options):
+        quizzes = Quiz.objects.filter(is_active=True)
+        if options['quiz']:
+            quizzes = quizzes.filter(id__in=options['quiz'])
+        elif not options['all']:
+            quizzes = quizzes.filter(is_adaptive=True)
+
+        started = time.perf_counter()
+        fitted = 0
+        for quiz in quizzes.order_by('id'):
+            questions, attempts = adaptive.fit_quiz(quiz, options['model'])
+            if questions:
+                fitted += 1
+                self.stdout.write(f'{quiz.title}: {questions} questions from {attempts} attempts')
+            else:
+                self.stdout.write(f'{quiz.title}: skipped, {attempts} completed attempts')
+        self.stdout.write(self.style.SUCCESS(
+            f'Fitted {options["model"].upper()} parameters of {fitted} quizzes '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
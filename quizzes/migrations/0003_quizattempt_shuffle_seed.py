@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:17
+
+import quizzes.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizattempt',
+            name='shuffle_seed',
+            field=models.PositiveIntegerField(default=quizzes.models.new_shuffle_seed, help_text="Seed of this attempt's question order"),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0003_quizattempt_shuffle_seed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='irt_difficulty',
+            field=models.FloatField(default=0, help_text='IRT difficulty, fitted from responses'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='irt_discrimination',
+            field=models.FloatField(default=1, help_text='IRT discrimination, fitted from responses'),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='is_adaptive',
+            field=models.BooleanField(default=False, help_text='Ask each student only the questions suited to their estimated ability'),
+        ),
+        migrations.AddField(
+            model_name='quizattempt',
+            name='ability',
+            field=models.FloatField(blank=True, help_text='Estimated ability of an adaptive attempt', null=True),
+        ),
+        migrations.AddField(
+            model_name='quizattempt',
+            name='ability_error',
+            field=models.FloatField(blank=True, help_text='Standard error of the ability estimate', null=True),
+        ),
+    ]
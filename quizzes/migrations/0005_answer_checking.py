@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0004_adaptive_quizzes'),
+        ('topics', '0002_topic_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='formula',
+            field=models.ForeignKey(blank=True, help_text='Formula that typed expression answers must be equivalent to', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='questions', to='topics.topicformula'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='significant_figures',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Compare numeric answers rounded to this many significant figures instead', null=True),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='tolerance',
+            field=models.FloatField(default=0.01, help_text='Relative tolerance of numeric answers'),
+        ),
+    ]
@@ -1,8 +1,10 @@
+import random
+
 from django.db import models
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
-from topics.models import PhysicsTopic
+from topics.models import PhysicsTopic, TopicFormula
 
 
 class Quiz(models.Model):
@@ -15,6 +17,8 @@ class Quiz(models.Model):
     passing_score = models.PositiveIntegerField(default=70, help_text="Passing percentage")
     max_attempts = models.PositiveIntegerField(default=3, help_text="Maximum attempts allowed")
     is_randomized = models.BooleanField(default=True, help_text="Randomize question order")
+    is_adaptive = models.BooleanField(default=False,
+                                      help_text="Ask each student only the questions suited to their estimated ability")
     show_correct_answers = models.BooleanField(default=True, help_text="Show correct answers after completion")
     show_explanations = models.BooleanField(default=True, help_text="Show explanations for answers")
     difficulty_level = models.CharField(max_length=20, choices=[
@@ -51,6 +55,15 @@ class Question(models.Model):
     explanation = models.TextField(blank=True, help_text="Explanation for the correct answer")
     points = models.PositiveIntegerField(default=1)
     order = models.PositiveIntegerField(default=0)
+    tolerance = models.FloatField(default=0.01, help_text="Relative tolerance of numeric answers")
+    significant_figures = models.PositiveSmallIntegerField(
+        null=True, blank=True, help_text="Compare numeric answers rounded to this many significant figures instead"
+    )
+    formula = models.ForeignKey(TopicFormula, on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='questions',
+                                help_text="Formula that typed expression answers must be equivalent to")
+    irt_difficulty = models.FloatField(default=0, help_text="IRT difficulty, fitted from responses")
+    irt_discrimination = models.FloatField(default=1, help_text="IRT discrimination, fitted from responses")
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -76,6 +89,10 @@ class Answer(models.Model):
         return f"{self.question.question_text[:50]}... - {self.answer_text[:30]}..."
 
 
+def new_shuffle_seed():
+    return random.getrandbits(31)
+
+
 class QuizAttempt(models.Model):
     """User quiz attempts"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_attempts')
@@ -86,6 +103,10 @@ class QuizAttempt(models.Model):
     score = models.FloatField(null=True, blank=True, help_text="Score percentage")
     is_passed = models.BooleanField(default=False)
     attempt_number = models.PositiveIntegerField(default=1)
+    shuffle_seed = models.PositiveIntegerField(default=new_shuffle_seed,
+                                               help_text="Seed of this attempt's question order")
+    ability = models.FloatField(null=True, blank=True, help_text="Estimated ability of an adaptive attempt")
+    ability_error = models.FloatField(null=True, blank=True, help_text="Standard error of the ability estimate")
     
     class Meta:
         ordering = ['-started_at']
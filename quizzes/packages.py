@@ -0,0 +1,92 @@
+"""
+Compiled quiz packages for delivering attempts.
+
+A package holds everything the take-quiz page shows: the quiz header and
+its active questions with their answer choices, as plain dicts and tuples.
+It is built with one query per table the first time a quiz version is
+delivered and then cached under the quiz's ``updated_at``, which moves on
+whenever a question or answer of the quiz changes. Packages never carry
+``is_correct`` flags, nor the expected answers of typed questions, so they
+are safe to hand to a template as they are.
+
+Each attempt sees the package through its own ``shuffle_seed``, so question
+order is random per attempt but stable across page loads, without any
+``ORDER BY RANDOM()`` in the database.
+"""
+import random
+
+from django.core.cache import cache
+
+from .models import Quiz, Question, Answer
+
+PACKAGE_TIMEOUT = 60 * 60 * 24
+
+# Questions answered by typing, whose expected answers packages leave out
+TEXT_TYPES = {'fill_blank', 'short_answer', 'calculation'}
+
+
+def package_key(quiz_id, version):
+    return f'quiz-package:2:{quiz_id}:{version}'
+
+
+def version_of(quiz):
+    return quiz.updated_at.timestamp() if quiz.updated_at else 0
+
+
+def build_package(quiz_id):
+    """Serialize a quiz and its active questions and answers, or None"""
+    quiz = Quiz.objects.filter(id=quiz_id).select_related('topic__grade').first()
+    if quiz is None:
+        return None
+
+    # The answers of typed questions are what the student must find
+    answers = {}
+    for answer in Answer.objects.filter(
+        question__quiz_id=quiz_id, question__is_active=True
+    ).exclude(question__question_type__in=TEXT_TYPES).values('id', 'question_id', 'answer_text'):
+        answers.setdefault(answer.pop('question_id'), []).append(answer)
+
+    questions = tuple(
+        dict(question, answers=tuple(answers.get(question['id'], ())))
+        for question in Question.objects.filter(quiz_id=quiz_id, is_active=True).values(
+            'id', 'question_type', 'question_text', 'points',
+        )
+    )
+    return {
+        'id': quiz.id,
+        'version': version_of(quiz),
+        'title': quiz.title,
+        'description': quiz.description,
+        'instructions': quiz.instructions,
+        'time_limit': quiz.time_limit,
+        'difficulty_level': quiz.difficulty_level,
+        'is_randomized': quiz.is_randomized,
+        'grade': quiz.topic.grade.name,
+        'total_points': sum(question['points'] for question in questions),
+        'questions': questions,
+    }
+
+
+def get_package(quiz):
+    """Return the package of ``quiz`` at its current version"""
+    key = package_key(quiz.id, version_of(quiz))
+    package = cache.get(key)
+    if package is None:
+        package = build_package(quiz.id)
+        if package is not None:
+            # Store it under the version it was actually built from
+            cache.set(package_key(quiz.id, package['version']), package, PACKAGE_TIMEOUT)
+    return package
+
+
+def shuffled_questions(package, seed):
+    """The package's questions in the order an attempt with ``seed`` sees them"""
+    questions = list(package['questions'])
+    if package['is_randomized']:
+        random.Random(seed).shuffle(questions)
+    return questions
+
+
+def attempt_questions(attempt):
+    """Questions of an attempt in its own order; ``attempt.quiz`` should be loaded"""
+    return shuffled_questions(get_package(attempt.quiz), attempt.shuffle_seed)
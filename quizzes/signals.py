@@ -0,0 +1,38 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from topics import fragments
+from topics.models import CBCGrade, TopicFormula
+from .models import Quiz, Question, Answer
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def touch_parent_quiz(sender, instance, **kwargs):
+    """Question changes alter what a quiz's pages show"""
+    fragments.touch(Quiz, pk=instance.quiz_id)
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def touch_answer_quiz(sender, instance, **kwargs):
+    """Answer choices are part of the compiled quiz package"""
+    fragments.touch(Quiz, questions=instance.question_id)
+
+
+@receiver(post_save, sender=TopicFormula)
+@receiver(pre_delete, sender=TopicFormula)
+def touch_formula_quizzes(sender, instance, **kwargs):
+    """
+    A formula is parsed into the answer keys of the quizzes whose questions
+    check against it. Deleting it unlinks those questions, so they are found
+    before the delete.
+    """
+    fragments.touch(Quiz, questions__formula=instance)
+
+
+@receiver(post_save, sender=CBCGrade)
+def touch_grade_quizzes(sender, instance, created, **kwargs):
+    """The grade name is part of the compiled quiz package"""
+    if not created:
+        fragments.touch(Quiz, topic__grade=instance)
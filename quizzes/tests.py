@@ -1,3 +1,689 @@
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import OperationalError
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from physics_application.testing import ListPageQueryCountTestCase
+from progress import achievements
+from progress.models import ActivityCalendar, LearningAnalytics
+from topics.models import CBCGrade, PhysicsTopic, TopicFormula
+from . import adaptive, checker, exam, grading, item_analysis, packages
+from .models import Quiz, Question, Answer, QuizAttempt, QuizResponse
+
+
+class ListPageQueryCountTests(ListPageQueryCountTestCase):
+    context_name = 'quizzes'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.topics = cls.create_topics('Forces')
+
+    def add_rows(self, start, stop):
+        Quiz.objects.bulk_create([
+            Quiz(topic=self.topics[i % len(self.topics)], title=f'Forces quiz {i}',
+                 instructions='Answer all questions')
+            for i in range(start, stop)
+        ])
+
+    def test_quiz_list(self):
+        # validators, quizzes with topic and grade
+        self.assertConstantQueries(2, reverse('quizzes:quiz_list'))
+
+    def test_quiz_list_by_topic(self):
+        # validators (quizzes, topic), quizzes with topic and grade, topic
+        self.assertConstantQueries(4, reverse('quizzes:quiz_list_by_topic', args=[self.topics[0].id]))
+
+    def test_search_quizzes(self):
+        # validators, matching quizzes with topic and grade
+        self.assertConstantQueries(2, reverse('quizzes:search_quizzes'), {'q': 'forces'})
+
+
+class QuizPackageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        grade = CBCGrade.objects.create(name='Grade 9', order=1)
+        topic = PhysicsTopic.objects.create(
+            grade=grade, title='Motion', slug='motion', description='Speed',
+            learning_outcomes='Outcomes', estimated_duration=30,
+        )
+        cls.quiz = Quiz.objects.create(topic=topic, title='Motion quiz', instructions='Go')
+        for n in range(12):
+            question = Question.objects.create(
+                quiz=cls.quiz, question_type='multiple_choice',
+                question_text=f'Question {n}', order=n, points=n % 3 + 1,
+            )
+            Answer.objects.create(question=question, answer_text='Right', is_correct=True, order=0)
+            Answer.objects.create(question=question, answer_text='Wrong', order=1)
+        Question.objects.create(quiz=cls.quiz, question_type='true_false',
+                                question_text='Retired', is_active=False)
+        cls.user = User.objects.create_user('student')
+
+    def setUp(self):
+        cache.clear()
+        self.quiz.refresh_from_db()
+
+    def test_package_is_built_once_per_version(self):
+        with self.assertNumQueries(3):
+            package = packages.get_package(self.quiz)
+        self.assertEqual(len(package['questions']), 12)
+        self.assertEqual(package['total_points'], 24)
+        self.assertEqual(package['grade'], 'Grade 9')
+        self.assertEqual(
+            [answer['answer_text'] for answer in package['questions'][0]['answers']],
+            ['Right', 'Wrong'],
+        )
+        self.assertNotIn('is_correct', package['questions'][0]['answers'][0])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(packages.get_package(self.quiz), package)
+
+    def test_attempt_order_is_seeded(self):
+        first = QuizAttempt.objects.create(user=self.user, quiz=self.quiz, shuffle_seed=1)
+        second = QuizAttempt.objects.create(user=self.user, quiz=self.quiz, shuffle_seed=2,
+                                            attempt_number=2)
+        order = [question['id'] for question in packages.attempt_questions(first)]
+        self.assertEqual(order, [question['id'] for question in packages.attempt_questions(first)])
+        self.assertNotEqual(order, [question['id'] for question in packages.attempt_questions(second)])
+        self.assertEqual(sorted(order), [q['id'] for q in packages.get_package(self.quiz)['questions']])
+
+    def test_unrandomized_quiz_keeps_question_order(self):
+        Quiz.objects.filter(pk=self.quiz.pk).update(is_randomized=False)
+        self.quiz.refresh_from_db()
+        questions = packages.shuffled_questions(packages.get_package(self.quiz), 1)
+        self.assertEqual([q['question_text'] for q in questions], [f'Question {n}' for n in range(12)])
+
+    def test_answer_change_moves_quiz_to_a_new_package(self):
+        old = packages.get_package(self.quiz)
+        answer = Answer.objects.filter(question__quiz=self.quiz).first()
+        answer.answer_text = 'Changed'
+        answer.save()
+
+        self.quiz.refresh_from_db()
+        new = packages.get_package(self.quiz)
+        self.assertNotEqual(new['version'], old['version'])
+        self.assertIn('Changed', [a['answer_text'] for q in new['questions'] for a in q['answers']])
+
+    def test_grade_rename_moves_quiz_to_a_new_package(self):
+        packages.get_package(self.quiz)
+        grade = self.quiz.topic.grade
+        grade.name = 'Form 3'
+        grade.save()
+
+        self.quiz.refresh_from_db()
+        self.assertEqual(packages.get_package(self.quiz)['grade'], 'Form 3')
+
+
+class GradingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        grade = CBCGrade.objects.create(name='Grade 10', order=2)
+        topic = PhysicsTopic.objects.create(
+            grade=grade, title='Waves', slug='waves', description='Waves',
+            learning_outcomes='Outcomes', estimated_duration=30,
+        )
+        cls.quiz = Quiz.objects.create(topic=topic, title='Waves quiz', instructions='Go',
+                                       passing_score=50)
+        cls.right = {}
+        cls.wrong = {}
+        for n in range(40):
+            question_type = 'short_answer' if n % 10 == 9 else 'multiple_choice'
+            question = Question.objects.create(quiz=cls.quiz, question_type=question_type,
+                                               question_text=f'Question {n}', order=n)
+            if question_type == 'multiple_choice':
+                cls.right[question.id] = Answer.objects.create(question=question, answer_text='Yes',
+                                                               is_correct=True).id
+                cls.wrong[question.id] = Answer.objects.create(question=question, answer_text='No').id
+            else:
+                cls.right[question.id] = None
+        cls.user = User.objects.create_user('student')
+
+    def setUp(self):
+        cache.clear()
+        self.attempt = QuizAttempt.objects.select_related('quiz').get(
+            pk=QuizAttempt.objects.create(user=self.user, quiz=self.quiz).pk
+        )
+
+    def form_data(self, correct):
+        data = {}
+        for n, (question_id, answer_id) in enumerate(self.right.items()):
+            if answer_id is None:
+                data[f'text_response_{question_id}'] = 'A wave carries energy'
+            elif n < correct:
+                data[f'question_{question_id}'] = str(answer_id)
+            else:
+                data[f'question_{question_id}'] = str(self.wrong[question_id])
+        return data
+
+    def test_whole_attempt_costs_a_handful_of_queries(self):
+        grading.get_answer_key(self.attempt.quiz)
+        LearningAnalytics.objects.create(user=self.user)
+        ActivityCalendar.objects.create(user=self.user)
+        achievements.get_rules()
+        # savepoint, collect old responses, insert responses, insert selections,
+        # previous attempt state, update attempt, savepoint, lock/update of the
+        # user's analytics row and activity calendar, read responses and review
+        # states, insert review states, release savepoints
+        with self.assertNumQueries(16):
+            result = grading.submit_attempt(self.attempt, self.form_data(correct=20))
+
+        self.assertEqual(result['total_points'], 40)
+        # 18 choice questions among the first 20, plus all 4 text answers
+        self.assertEqual(result['earned_points'], 18 + 4)
+        self.assertEqual(QuizResponse.objects.filter(attempt=self.attempt).count(), 40)
+        self.assertEqual(QuizResponse.selected_answers.through.objects.count(), 36)
+
+        self.attempt.refresh_from_db()
+        self.assertIsNotNone(self.attempt.completed_at)
+        self.assertAlmostEqual(self.attempt.score, 55)
+        self.assertTrue(self.attempt.is_passed)
+
+    def test_answer_key_is_cached_under_the_version_it_was_built_from(self):
+        stale = self.attempt.quiz
+        Question.objects.filter(id=next(iter(self.right))).update(points=5)
+        Quiz.objects.filter(id=self.quiz.id).update(updated_at=timezone.now())
+        current = Quiz.objects.get(id=self.quiz.id)
+        self.assertEqual(grading.get_answer_key(stale)[next(iter(self.right))].points, 5)
+        self.assertIsNone(cache.get(grading.answer_key_cache_key(stale.id, packages.version_of(stale))))
+        self.assertIsNotNone(cache.get(grading.answer_key_cache_key(current.id, packages.version_of(current))))
+
+    def test_foreign_and_missing_answers_score_nothing(self):
+        question_ids = list(self.right)
+        data = {
+            # an answer of another question
+            f'question_{question_ids[0]}': str(self.right[question_ids[1]]),
+            f'question_{question_ids[1]}': 'not-a-number',
+        }
+        result = grading.submit_attempt(self.attempt, data)
+        self.assertEqual(result['earned_points'], 0)
+        self.assertFalse(self.attempt.is_passed)
+        self.assertFalse(QuizResponse.selected_answers.through.objects.exists())
+
+    def test_resubmission_replaces_responses(self):
+        grading.submit_attempt(self.attempt, self.form_data(correct=0))
+        result = grading.submit_attempt(self.attempt, self.form_data(correct=40))
+        self.assertEqual(result['score'], 100)
+        self.assertEqual(QuizResponse.objects.filter(attempt=self.attempt).count(), 40)
+
+
+class ExamBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        grade = CBCGrade.objects.create(name='Grade 12', order=3)
+        topic = PhysicsTopic.objects.create(
+            grade=grade, title='Electricity', slug='electricity', description='Charge',
+            learning_outcomes='Outcomes', estimated_duration=30,
+        )
+        cls.quiz = Quiz.objects.create(topic=topic, title='Circuits', instructions='Go')
+        question = Question.objects.create(quiz=cls.quiz, question_type='true_false',
+                                           question_text='Current flows?')
+        cls.right = Answer.objects.create(question=question, answer_text='True', is_correct=True)
+        cls.wrong = Answer.objects.create(question=question, answer_text='False')
+        cls.field = f'question_{question.id}'
+        user = User.objects.create_user('student')
+        cls.attempts = QuizAttempt.objects.bulk_create([
+            QuizAttempt(user=user, quiz=cls.quiz, attempt_number=n + 1) for n in range(5)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.buffer = exam.SubmissionBuffer(batch_size=2, background=False)
+
+    def test_submission_is_acknowledged_without_touching_the_database(self):
+        with self.assertNumQueries(0):
+            receipt = self.buffer.submit(self.attempts[0].id, {self.field: str(self.right.id)})
+        self.assertEqual(exam.read_receipt(receipt), self.attempts[0].id)
+        self.assertEqual(self.buffer.status(receipt), {'status': 'queued'})
+        self.assertIsNone(exam.read_receipt(receipt + 'x'))
+
+    def test_flush_writes_batches_and_reports_receipts(self):
+        receipts = [
+            self.buffer.submit(attempt.id, {self.field: str(self.right.id)})
+            for attempt in self.attempts
+        ]
+        # The latest submission of an attempt replaces the queued one
+        self.buffer.submit(self.attempts[0].id, {self.field: str(self.wrong.id)})
+
+        self.assertEqual(self.buffer.flush(), 5)
+        self.assertEqual(len(self.buffer), 0)
+        self.assertEqual(self.buffer.status(receipts[0]),
+                         {'status': 'graded', 'score': 0, 'is_passed': False})
+        self.assertEqual(self.buffer.status(receipts[1]),
+                         {'status': 'graded', 'score': 100, 'is_passed': True})
+
+        self.buffer.submit(self.attempts[1].id, {})
+        self.buffer.flush()
+        self.assertEqual(self.buffer.status(receipts[1])['status'], 'failed')
+
+    def test_error_while_grading_fails_only_that_attempt(self):
+        receipts = [
+            self.buffer.submit(attempt.id, {self.field: str(self.right.id)}) for attempt in self.attempts[:2]
+        ]
+        submit_attempt = grading.submit_attempt
+
+        def broken(attempt, data, graded=None):
+            if attempt.id == self.attempts[0].id:
+                raise RuntimeError('Grading broke')
+            return submit_attempt(attempt, data, graded)
+
+        with mock.patch.object(grading, 'grade_batch', side_effect=KeyError('question')), \
+                mock.patch.object(grading, 'submit_attempt', side_effect=broken), \
+                self.assertLogs('quizzes.exam', 'ERROR'):
+            self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.buffer.status(receipts[0]), {'status': 'failed', 'message': 'Grading broke'})
+        self.assertEqual(self.buffer.status(receipts[1])['status'], 'graded')
+
+    def test_rolled_back_failure_is_forgotten(self):
+        receipts = [
+            self.buffer.submit(attempt.id, {self.field: str(self.right.id)}) for attempt in self.attempts[:2]
+        ]
+
+        def broken(attempt, data, graded=None):
+            if attempt.id == self.attempts[0].id:
+                raise RuntimeError('Grading broke')
+            raise OperationalError('database is locked')
+
+        with mock.patch.object(grading, 'submit_attempt', side_effect=broken), \
+                self.assertLogs('quizzes.exam', 'ERROR'):
+            with self.assertRaises(OperationalError):
+                self.buffer.flush()
+        self.assertEqual(self.buffer.status(receipts[0]), {'status': 'queued'})
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.buffer.status(receipts[0])['status'], 'graded')
+
+    def test_failures_are_capped(self):
+        with mock.patch.object(exam, 'MAX_FAILURES', 2):
+            for attempt_id in range(1, 4):
+                self.buffer.fail(attempt_id, 'Unknown attempt')
+        self.assertEqual(list(self.buffer.failures), [2, 3])
+
+    def test_failed_batch_is_requeued(self):
+        receipt = self.buffer.submit(self.attempts[0].id, {self.field: str(self.right.id)})
+        with mock.patch.object(QuizAttempt.objects, 'select_related', side_effect=RuntimeError('Lost')):
+            with self.assertRaises(RuntimeError):
+                self.buffer.flush()
+        self.assertEqual(self.buffer.status(receipt), {'status': 'queued'})
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.buffer.status(receipt)['status'], 'graded')
+
+    def test_receipt_view(self):
+        receipt = exam.make_receipt(self.attempts[0].id)
+        response = self.client.get(reverse('quizzes:exam_receipt', args=[receipt]))
+        self.assertEqual(response.json(), {'success': True, 'status': 'queued'})
+        self.assertIn('no-store', response['Cache-Control'])
+
+        response = self.client.get(reverse('quizzes:exam_receipt', args=['1:forged']))
+        self.assertEqual(response.status_code, 404)
+
+
+class ItemAnalysisTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        grade = CBCGrade.objects.create(name='Grade 11', order=3)
+        topic = PhysicsTopic.objects.create(
+            grade=grade, title='Optics', slug='optics', description='Light',
+            learning_outcomes='Outcomes', estimated_duration=30,
+        )
+        cls.quiz = Quiz.objects.create(topic=topic, title='Optics quiz', instructions='Go')
+        cls.questions = []
+        for n in range(3):
+            question = Question.objects.create(quiz=cls.quiz, question_text=f'Question {n}', order=n)
+            right = Answer.objects.create(question=question, answer_text='Right', is_correct=True)
+            wrong = Answer.objects.create(question=question, answer_text='Wrong')
+            cls.questions.append((question, right, wrong))
+        Answer.objects.create(question=cls.questions[0][0], answer_text='Never chosen')
+        cls.staff = User.objects.create_user('teacher', password='secret', is_staff=True)
+        # Student n answers the first 3 - n questions correctly
+        for n in range(4):
+            user = User.objects.create_user(f'student{n}')
+            attempt = QuizAttempt.objects.select_related('quiz').get(
+                pk=QuizAttempt.objects.create(user=user, quiz=cls.quiz).pk
+            )
+            grading.submit_attempt(attempt, {
+                f'question_{question.id}': str((right if index < 3 - n else wrong).id)
+                for index, (question, right, wrong) in enumerate(cls.questions)
+            })
+
+    def setUp(self):
+        cache.clear()
+
+    def test_statistics(self):
+        analysis = item_analysis.analyse(self.quiz)
+        self.assertEqual(analysis['attempts'], 4)
+        self.assertEqual([question['difficulty'] for question in analysis['questions']],
+                         [0.75, 0.5, 0.25])
+        # The top and bottom attempts differ on every question
+        self.assertEqual([question['discrimination'] for question in analysis['questions']],
+                         [1.0, 1.0, 1.0])
+        self.assertTrue(all(question['item_rest_correlation'] > 0
+                            for question in analysis['questions']))
+        # Item variances sum to 0.625 against a total score variance of 1.25
+        self.assertEqual(analysis['kr20'], 0.75)
+        self.assertEqual(analysis['alpha'], 0.75)
+
+    def test_distractors(self):
+        analysis = item_analysis.analyse(self.quiz)
+        right, wrong, never = analysis['questions'][0]['answers']
+        self.assertTrue(right['is_correct'])
+        self.assertEqual((right['chosen'], right['share'], right['upper_share'], right['lower_share']),
+                         (3, 0.75, 1.0, 0.0))
+        self.assertEqual((wrong['chosen'], wrong['share'], wrong['upper_share'], wrong['lower_share']),
+                         (1, 0.25, 0.0, 1.0))
+        self.assertEqual(never['chosen'], 0)
+
+    def test_quiz_without_attempts(self):
+        quiz = Quiz.objects.create(topic=self.quiz.topic, title='Empty quiz', instructions='Go')
+        Question.objects.create(quiz=quiz, question_text='Alone')
+        analysis = item_analysis.analyse(quiz)
+        self.assertEqual(analysis['attempts'], 0)
+        self.assertIsNone(analysis['kr20'])
+        self.assertIsNone(analysis['questions'][0]['difficulty'])
+
+    def test_responses_are_read_in_one_query(self):
+        quiz = Quiz.objects.get(pk=self.quiz.pk)
+        packages.get_package(quiz)
+        grading.get_answer_key(quiz)
+        with self.assertNumQueries(1):
+            item_analysis.analyse(quiz)
+
+    def test_result_is_cached_until_another_attempt_completes(self):
+        item_analysis.get_analysis(self.quiz)
+        # the attempt state only
+        with self.assertNumQueries(1):
+            self.assertEqual(item_analysis.get_analysis(self.quiz)['attempts'], 4)
+
+        attempt = QuizAttempt.objects.select_related('quiz').get(pk=QuizAttempt.objects.create(
+            user=User.objects.create_user('late'), quiz=self.quiz,
+        ).pk)
+        grading.submit_attempt(attempt, {})
+        self.assertEqual(item_analysis.get_analysis(self.quiz)['attempts'], 5)
+
+    def test_api_is_staff_only(self):
+        url = reverse('quizzes:quiz_item_analysis', args=[self.quiz.id])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.staff)
+        response = self.client.get(url)
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(response.json()['kr20'], 0.75)
+
+    def test_admin_page(self):
+        self.client.force_login(User.objects.create_superuser('admin'))
+        response = self.client.get(reverse('admin:quizzes_quiz_item_analysis', args=[self.quiz.id]))
+        self.assertContains(response, 'KR-20')
+        self.assertContains(response, 'Never chosen')
+
+
+class AdaptiveQuizTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        grade = CBCGrade.objects.create(name='Grade 12', order=4)
+        topic = PhysicsTopic.objects.create(
+            grade=grade, title='Electricity', slug='electricity', description='Charge',
+            learning_outcomes='Outcomes', estimated_duration=30,
+        )
+        cls.quiz = Quiz.objects.create(topic=topic, title='Electricity quiz', instructions='Go',
+                                       is_adaptive=True, passing_score=50)
+        # 41 questions from difficulty -2 to 2
+        cls.right = {}
+        cls.wrong = {}
+        for n in range(41):
+            question = Question.objects.create(
+                quiz=cls.quiz, question_type='multiple_choice', question_text=f'Question {n}',
+                order=n, irt_difficulty=n / 10 - 2, irt_discrimination=1.5,
+            )
+            cls.right[question.id] = Answer.objects.create(question=question, answer_text='Yes',
+                                                           is_correct=True).id
+            cls.wrong[question.id] = Answer.objects.create(question=question, answer_text='No').id
+        cls.difficulty = dict(Question.objects.values_list('id', 'irt_difficulty'))
+
+    def setUp(self):
+        cache.clear()
+
+    def start(self, username):
+        return QuizAttempt.objects.select_related('quiz').get(pk=QuizAttempt.objects.create(
+            user=User.objects.create_user(username), quiz=self.quiz,
+        ).pk)
+
+    def test_select_takes_the_nearest_unasked_difficulty(self):
+        index = adaptive.ItemIndex([(n, n / 10 - 2, 1, 1) for n in range(41)])
+        self.assertEqual(index.select(0.62), 26)
+        self.assertEqual(index.select(0.62, asked={26}), 27)
+        self.assertEqual(index.select(-9), 0)
+        self.assertIsNone(index.select(0, asked=set(range(41))))
+
+    def test_estimate(self):
+        index = adaptive.ItemIndex([(n, n / 10 - 2, 1, 1) for n in range(41)])
+        self.assertAlmostEqual(index.estimate([])[0], 0, places=6)
+        ability, error = index.estimate([(20, True), (30, True)])
+        self.assertGreater(ability, 0)
+        self.assertLess(error, index.estimate([(20, True)])[1])
+        self.assertLess(index.estimate([(20, False), (10, False)])[0], 0)
+
+    def test_attempt_stops_early_near_the_students_ability(self):
+        attempt = self.start('adaptive')
+        asked = 0
+        question = adaptive.next_question(attempt)
+        while question is not None:
+            # The student knows every question easier than 0.5
+            choice = self.right if self.difficulty[question['id']] < 0.5 else self.wrong
+            if asked == 1:
+                # savepoint, lock the attempt, read its answers, insert
+                # response and selection, release savepoint
+                with self.assertNumQueries(6):
+                    _, following = adaptive.answer(
+                        attempt, question['id'], {f'question_{question["id"]}': str(choice[question['id']])}
+                    )
+            else:
+                _, following = adaptive.answer(
+                    attempt, question['id'], {f'question_{question["id"]}': str(choice[question['id']])}
+                )
+            asked += 1
+            question = adaptive.next_question(attempt) if following else None
+
+        attempt.refresh_from_db()
+        self.assertIsNotNone(attempt.completed_at)
+        self.assertLessEqual(asked, adaptive.MAX_QUESTIONS)
+        self.assertEqual(attempt.responses.count(), asked)
+        self.assertAlmostEqual(attempt.ability, 0.5, delta=0.5)
+        self.assertLessEqual(attempt.ability_error, 0.5)
+        # Expected share of the whole quiz at that ability
+        self.assertAlmostEqual(attempt.score, 60, delta=15)
+        self.assertTrue(attempt.is_passed)
+        self.assertIsNone(adaptive.next_question(attempt))
+
+    def test_only_the_question_being_asked_is_answered(self):
+        attempt = self.start('adaptive')
+        question_id = adaptive.next_question(attempt)['id']
+        other = next(other for other in self.right if other != question_id)
+        with self.assertRaisesMessage(ValueError, 'Not the question being asked'):
+            adaptive.answer(attempt, other, {f'question_{other}': str(self.right[other])})
+        adaptive.answer(attempt, question_id, {f'question_{question_id}': str(self.wrong[question_id])})
+        # Answering again cannot replace the first answer
+        with self.assertRaisesMessage(ValueError, 'Not the question being asked'):
+            adaptive.answer(attempt, question_id, {f'question_{question_id}': str(self.right[question_id])})
+        self.assertEqual(adaptive.answers_of(attempt), [(question_id, False)])
+
+    def test_fit_recovers_question_difficulty(self):
+        rng = np.random.default_rng(7)
+        ability = rng.normal(size=300)
+        difficulty = np.linspace(-1.5, 1.5, 12)
+        discrimination = np.linspace(0.8, 2, 12)
+        p = adaptive.probability(ability[:, None], difficulty, discrimination)
+        correct = (rng.random(p.shape) < p).astype(float)
+        # Every attempt was asked about two thirds of the questions
+        answered = (rng.random(p.shape) < 0.66).astype(float)
+        for model in adaptive.MODELS:
+            with self.subTest(model=model):
+                fitted, fitted_difficulty, fitted_discrimination = adaptive.fit(correct, answered, model)
+                self.assertGreater(np.corrcoef(difficulty, fitted_difficulty)[0, 1], 0.95)
+                self.assertGreater(np.corrcoef(ability, fitted)[0, 1], 0.8)
+                if model == '1pl':
+                    self.assertTrue((fitted_discrimination == 1).all())
+                else:
+                    self.assertGreater(np.corrcoef(discrimination, fitted_discrimination)[0, 1], 0.5)
+
+    def test_fit_quiz_stores_parameters_and_rebuilds_the_index(self):
+        question_ids = list(self.right)[:5]
+        Question.objects.exclude(id__in=question_ids).update(is_active=False)
+        for n in range(6):
+            attempt = self.start(f'student{n}')
+            # Student n answers the first n questions correctly
+            grading.submit_attempt(attempt, {
+                f'question_{question_id}': str((self.right if index < n else self.wrong)[question_id])
+                for index, question_id in enumerate(question_ids)
+            })
+        quiz = Quiz.objects.get(pk=self.quiz.pk)
+        old_index = adaptive.get_index(quiz)
+
+        self.assertEqual(adaptive.fit_quiz(quiz, '1pl'), (5, 6))
+        fitted = dict(Question.objects.filter(id__in=question_ids).values_list('id', 'irt_difficulty'))
+        self.assertEqual(sorted(fitted, key=fitted.get), question_ids)
+        quiz.refresh_from_db()
+        self.assertIsNot(adaptive.get_index(quiz), old_index)
+        self.assertEqual(adaptive.get_index(quiz).question_ids, question_ids)
+
+
+class AnswerCheckerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        grade = CBCGrade.objects.create(name='Grade 9', order=1)
+        topic = PhysicsTopic.objects.create(
+            grade=grade, title='Motion', slug='motion', description='Speed',
+            learning_outcomes='Outcomes', estimated_duration=30,
+        )
+        cls.formula = TopicFormula.objects.create(
+            topic=topic, name='Acceleration', formula='a = \\frac{v_f - v_i}{t}', description='Change',
+            variables={'a': 'acceleration', 'v_f': 'final velocity', 'v_i': 'initial velocity', 't': 'time'},
+            units='m/s²',
+        )
+        cls.quiz = Quiz.objects.create(topic=topic, title='Kinematics quiz', instructions='Go')
+        cls.numeric = Question.objects.create(quiz=cls.quiz, question_type='calculation',
+                                              question_text='g?', order=0)
+        Answer.objects.create(question=cls.numeric, answer_text='9.8 m/s^2', is_correct=True)
+        cls.symbolic = Question.objects.create(quiz=cls.quiz, question_type='calculation',
+                                               question_text='a?', formula=cls.formula, order=1)
+        cls.blank = Question.objects.create(quiz=cls.quiz, question_type='fill_blank',
+                                            question_text='Unit of force?', order=2)
+        Answer.objects.create(question=cls.blank, answer_text='Newton', is_correct=True)
+        cls.essay = Question.objects.create(quiz=cls.quiz, question_type='short_answer',
+                                            question_text='Explain', order=3)
+        cls.user = User.objects.create_user('student')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_quantities(self):
+        self.assertEqual(checker.parse_quantity('4.5 x 10^-3 kg').dimensions, checker.dimensions(kg=1))
+        self.assertAlmostEqual(checker.parse_quantity('36 km/h').factor, 1 / 3.6)
+        self.assertEqual(checker.parse_quantity('1.2 J/(kg K)').dimensions, checker.dimensions(m=2, s=-2, K=-1))
+        self.assertEqual(checker.parse_quantity('0.0450 kg').sig_figs, 3)
+        self.assertIsNone(checker.parse_quantity('12 furlongs'))
+        self.assertIsNone(checker.parse_quantity('fast'))
+        # Too large for a float: marked wrong rather than raising
+        self.assertIsNone(checker.parse_quantity('1e400'))
+        self.assertIsNone(checker.parse_quantity('9.8 x 10^999 m'))
+        self.assertIsNone(checker.parse_quantity('1e' + '9' * 5000))
+        self.assertEqual(checker.parse_quantity('1e200 x 10^100').value, 1e300)
+
+        expected = checker.build_expected(['9.8 m/s^2'])
+        self.assertEqual(
+            checker.check(expected, ['9.8 m/s^2', '980 cm/s²', '9.75', '9.7', '9.8 N', '', 'fast']).tolist(),
+            [True, True, True, False, False, False, False],
+        )
+        expected = checker.build_expected(['9.81 m/s^2'], sig_figs=2)
+        self.assertEqual(checker.check(expected, ['9.8', '9.84 m s^-2', '9.9']).tolist(), [True, True, False])
+
+        # "ms^-1" reads as metres per second where that is what is wanted
+        expected = checker.build_expected(['20 m/s'])
+        self.assertEqual(checker.check(expected, ['20 ms^-1', '20 ms⁻¹', '20 ms', '0.02 ms^-1']).tolist(),
+                         [True, True, False, False])
+        expected = checker.build_expected(['9.8 m/s^2'])
+        self.assertEqual(checker.check(expected, ['9.8 ms⁻²', '9.8 ms^-2']).tolist(), [True, True])
+        expected = checker.build_expected(['50 Hz'])
+        self.assertEqual(checker.check(expected, ['0.05 ms^-1', '50 ms^-1']).tolist(), [True, False])
+        self.assertEqual(checker.parse_quantity('4 mm^2').dimensions, checker.dimensions(m=2))
+
+    def test_expressions(self):
+        expected = checker.build_expected([], formula='E = mc^2', formula_variables={'E': 0, 'm': 0, 'c': 0})
+        self.assertEqual(
+            checker.check(expected, ['mc^2', 'E = m*c*c', 'sqrt(m^2c^4)', 'mc', 'm + c^2']).tolist(),
+            [True, True, True, False, False],
+        )
+        # Only arithmetic on the formula's variables is ever evaluated
+        self.assertEqual(checker.check(expected, [
+            '__import__("os")', 'm.__class__', 'open(m)', 'x * m', '9^9^9^9', '2 *',
+        ]).tolist(), [False] * 6)
+
+    def test_malformed_formula_is_not_checked(self):
+        with self.assertRaisesMessage(ValueError, 'A backslash ends the formula'):
+            checker.latex_to_expression('v = u + at\\')
+        with self.assertLogs('quizzes.checker', 'WARNING'):
+            self.assertIsNone(checker.build_expected([], formula='v = u + at\\', formula_variables={'u': 0}))
+
+    def test_expressions_are_compiled_once(self):
+        checker.compile_expression.cache_clear()
+        expected = checker.build_expected([], formula='F = ma', formula_variables={'F': 0, 'm': 0, 'a': 0})
+        checker.check(expected, ['m a', 'a m', 'm a'] * 100)
+        self.assertEqual(checker.compile_expression.cache_info().misses, 3)
+
+    def test_text(self):
+        expected = checker.build_expected(['Newton'])
+        self.assertEqual(checker.check(expected, [' newton. ', 'Newtons']).tolist(), [True, False])
+        self.assertEqual(checker.check(None, ['anything', ' ']).tolist(), [True, False])
+
+    def test_grading_marks_typed_answers(self):
+        attempt = QuizAttempt.objects.select_related('quiz').get(
+            pk=QuizAttempt.objects.create(user=self.user, quiz=self.quiz).pk
+        )
+        result = grading.submit_attempt(attempt, {
+            f'text_response_{self.numeric.id}': '980 cm/s^2',
+            f'text_response_{self.symbolic.id}': '(v_f - v_i)/t',
+            f'text_response_{self.blank.id}': 'Joule',
+            f'text_response_{self.essay.id}': 'Because',
+        })
+        marked = {row['question_id']: row['is_correct'] for row in result['results']}
+        self.assertEqual(marked, {
+            self.numeric.id: True, self.symbolic.id: True, self.blank.id: False, self.essay.id: True,
+        })
+
+    def test_editing_a_formula_regrades_its_questions(self):
+        def marked(answer):
+            quiz = Quiz.objects.get(pk=self.quiz.pk)
+            graded = grading.grade_batch([(quiz, {f'text_response_{self.symbolic.id}': answer})])[0]
+            return next(result.is_correct for result in graded if result.question_id == self.symbolic.id)
+
+        self.assertTrue(marked('(v_f - v_i)/t'))
+        self.formula.formula = 'a = v_f t'
+        self.formula.save()
+        self.assertFalse(marked('(v_f - v_i)/t'))
+        self.assertTrue(marked('v_f * t'))
+        self.formula.delete()
+        # Without its formula any answer to the question counts
+        self.assertTrue(marked('anything'))
+
+    def test_batch_grades_each_submission(self):
+        submissions = [
+            {f'text_response_{self.numeric.id}': value} for value in ('9.8', '9.8 N', '0.0098 km/s^2')
+        ]
+        graded = grading.grade_batch([(self.quiz, data) for data in submissions])
+        self.assertEqual([
+            next(result.is_correct for result in results if result.question_id == self.numeric.id)
+            for results in graded
+        ], [True, False, True])
+
+    def test_overflowing_answer_is_marked_wrong(self):
+        attempt = QuizAttempt.objects.select_related('quiz').get(
+            pk=QuizAttempt.objects.create(user=self.user, quiz=self.quiz).pk
+        )
+        result = grading.submit_attempt(attempt, {f'text_response_{self.numeric.id}': '9.8 x 10^999 m/s^2'})
+        marked = {row['question_id']: row['is_correct'] for row in result['results']}
+        self.assertFalse(marked[self.numeric.id])
 
-# Create your tests here.
+    def test_package_hides_expected_answers(self):
+        package = packages.get_package(Quiz.objects.get(pk=self.quiz.pk))
+        self.assertEqual([question['answers'] for question in package['questions']], [()] * 4)
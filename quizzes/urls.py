@@ -11,8 +11,14 @@ urlpatterns = [
     # path('quiz/<int:quiz_id>/start/', views.start_quiz, name='start_quiz'),
     # path('attempt/<int:attempt_id>/', views.take_quiz, name='take_quiz'),
     # path('attempt/<int:attempt_id>/question/<int:question_id>/submit/', views.submit_quiz_response, name='submit_quiz_response'),
+    # path('attempt/<int:attempt_id>/submit/', views.submit_quiz, name='submit_quiz'),
+    # path('attempt/<int:attempt_id>/exam-submit/', views.exam_submit, name='exam_submit'),
+    # path('attempt/<int:attempt_id>/adaptive/', views.adaptive_question, name='adaptive_question'),
+    # path('attempt/<int:attempt_id>/adaptive/<int:question_id>/', views.adaptive_answer, name='adaptive_answer'),
     # path('attempt/<int:attempt_id>/complete/', views.complete_quiz, name='complete_quiz'),
     # path('attempt/<int:attempt_id>/result/', views.quiz_result, name='quiz_result'),
     # path('attempt/<int:attempt_id>/feedback/', views.submit_quiz_feedback, name='submit_quiz_feedback'),
     path('search/', views.search_quizzes, name='search_quizzes'),
+    path('exam/receipt/<str:receipt>/', views.exam_receipt, name='exam_receipt'),
+    path('quiz/<int:quiz_id>/item-analysis/', views.quiz_item_analysis, name='quiz_item_analysis'),
 ]
\ No newline at end of file
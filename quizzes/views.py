@@ -1,15 +1,33 @@
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render, get_object_or_404, redirect
 from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
 from django.db.models import Q
 from django.utils import timezone
 from .models import Quiz, Question, Answer, QuizAttempt, QuizResponse, QuizFeedback
 from topics.models import PhysicsTopic
+from topics import conditional
+from . import exam, item_analysis
 # Remove login_required decorator
 # from django.contrib.auth.decorators import login_required
 
+def quiz_list_state(request, topic_id=None):
+    quizzes = Quiz.objects.filter(is_active=True)
+    topics = PhysicsTopic.objects.none()
+    if topic_id:
+        quizzes = quizzes.filter(topic_id=topic_id)
+        topics = PhysicsTopic.objects.filter(id=topic_id)
+    return conditional.page_state(
+        (quizzes, ['updated_at', 'topic__updated_at']),
+        (topics, ['updated_at']),
+    )
+
+
+@conditional.catalogue_page(quiz_list_state)
 def quiz_list(request, topic_id=None):
     """List all quizzes, optionally filtered by topic"""
-    quizzes = Quiz.objects.filter(is_active=True)
+    quizzes = Quiz.objects.filter(is_active=True).select_related('topic__grade')
     
     if topic_id:
         quizzes = quizzes.filter(topic_id=topic_id)
@@ -28,6 +46,13 @@ def quiz_list(request, topic_id=None):
     return render(request, 'quizzes/quiz_list.html', context)
 
 
+def quiz_detail_state(request, quiz_id):
+    return conditional.page_state(
+        (Quiz.objects.filter(id=quiz_id, is_active=True), ['updated_at', 'topic__updated_at']),
+    )
+
+
+@conditional.catalogue_page(quiz_detail_state)
 def quiz_detail(request, quiz_id):
     """Detailed view of a quiz"""
     quiz = get_object_or_404(Quiz, id=quiz_id, is_active=True)
@@ -78,15 +103,15 @@ def quiz_detail(request, quiz_id):
 # @login_required
 # def take_quiz(request, attempt_id):
 #     """Take a quiz attempt"""
-#     attempt = get_object_or_404(QuizAttempt, id=attempt_id, user=request.user)
+#     attempt = get_object_or_404(QuizAttempt.objects.select_related('quiz'), id=attempt_id, user=request.user)
 #     
 #     if attempt.completed_at:
 #         return redirect('quiz_result', attempt_id=attempt.id)
 #     
-#     # Get questions for the quiz
-#     questions = attempt.quiz.questions.filter(is_active=True)
-#     if attempt.quiz.is_randomized:
-#         questions = questions.order_by('?')
+#     # Questions and answers come from the cached quiz package, shuffled in
+#     # memory with the attempt's own seed
+#     package = packages.get_package(attempt.quiz)
+#     questions = packages.shuffled_questions(package, attempt.shuffle_seed)
 #     
 #     # Get existing responses
 #     responses = QuizResponse.objects.filter(attempt=attempt)
@@ -94,6 +119,7 @@ def quiz_detail(request, quiz_id):
 #     
 #     context = {
 #         'attempt': attempt,
+#         'quiz': package,
 #         'questions': questions,
 #         'responses': response_dict,
 #     }
@@ -135,11 +161,12 @@ def quiz_detail(request, quiz_id):
 #             response.is_correct = selected_answer.is_correct
 #             response.points_earned = question.points if response.is_correct else 0
 #     
-#     elif question.question_type in ['fill_blank', 'short_answer', 'calculation']:
+#     elif question.question_type in grading.TEXT_TYPES:
 #         text_response = request.POST.get('text_response', '')
 #         response.text_response = text_response
-#         # For now, mark as correct if text is provided (can be enhanced with AI checking)
-#         response.is_correct = bool(text_response.strip())
+#         # Numbers with units, formula expressions or text, per the answer key
+#         expected = grading.get_answer_key(attempt.quiz)[question.id].expected
+#         response.is_correct = bool(checker.check(expected, [text_response])[0])
 #         response.points_earned = question.points if response.is_correct else 0
 #     
 #     response.save()
@@ -152,6 +179,94 @@ def quiz_detail(request, quiz_id):
 #     })
 
 
+# Remove submit_quiz view since it requires authentication
+# @login_required
+# @require_POST
+# def submit_quiz(request, attempt_id):
+#     """Grade and store every answer of a quiz attempt in one request"""
+#     attempt = get_object_or_404(QuizAttempt.objects.select_related('quiz'), id=attempt_id, user=request.user)
+#     
+#     if attempt.completed_at:
+#         return JsonResponse({
+#             'success': False,
+#             'message': 'Quiz already completed'
+#         })
+#     
+#     result = grading.submit_attempt(attempt, request.POST)
+#     
+#     return JsonResponse({
+#         'success': True,
+#         **result,
+#         'message': f'Quiz completed with {result["score"]:.1f}% score'
+#     })
+
+
+# Remove exam_submit view since it requires authentication
+# @login_required
+# @require_POST
+# def exam_submit(request, attempt_id):
+#     """Queue a whole attempt in exam mode and acknowledge it with a receipt"""
+#     attempt = get_object_or_404(QuizAttempt.objects.only('id', 'completed_at'), id=attempt_id, user=request.user)
+#     
+#     if attempt.completed_at:
+#         return JsonResponse({
+#             'success': False,
+#             'message': 'Quiz already completed'
+#         })
+#     
+#     receipt = exam.get_buffer().submit(attempt.id, request.POST.copy())
+#     
+#     return JsonResponse({
+#         'success': True,
+#         'receipt': receipt,
+#         'status_url': reverse('quizzes:exam_receipt', args=[receipt]),
+#         'message': 'Submission received'
+#     }, status=202)
+
+
+# Remove adaptive quiz views since they require authentication
+# @login_required
+# def adaptive_question(request, attempt_id):
+#     """The next question of an adaptive attempt, chosen by estimated ability"""
+#     attempt = get_object_or_404(QuizAttempt.objects.select_related('quiz'), id=attempt_id, user=request.user,
+#                                 quiz__is_adaptive=True)
+#     question = adaptive.next_question(attempt)
+#     if question is None:
+#         return JsonResponse({'success': True, 'finished': True,
+#                              'result_url': reverse('quizzes:quiz_result', args=[attempt.id])})
+#     return JsonResponse({'success': True, 'finished': False, 'question': question})
+# 
+# 
+# @login_required
+# @require_POST
+# def adaptive_answer(request, attempt_id, question_id):
+#     """Grade one answer of an adaptive attempt and point to the next question"""
+#     attempt = get_object_or_404(QuizAttempt.objects.select_related('quiz'), id=attempt_id, user=request.user,
+#                                 quiz__is_adaptive=True, completed_at__isnull=True)
+#     try:
+#         result, following = adaptive.answer(attempt, question_id, request.POST)
+#     except ValueError as error:
+#         return JsonResponse({'success': False, 'message': str(error)}, status=409)
+#     return JsonResponse({
+#         'success': True,
+#         'is_correct': result.is_correct,
+#         'finished': following is None,
+#         'score': attempt.score,
+#         'next_url': reverse('quizzes:adaptive_question', args=[attempt.id]),
+#     })
+
+
+def exam_receipt(request, receipt):
+    """Report the grading status of an exam-mode submission receipt"""
+    status = exam.get_buffer().status(receipt)
+    if status is None:
+        return JsonResponse({'success': False, 'message': 'Unknown receipt'}, status=404)
+    
+    response = JsonResponse({'success': True, **status})
+    patch_cache_control(response, no_store=True)
+    return response
+
+
 # Remove complete_quiz view since it requires authentication
 # @login_required
 # def complete_quiz(request, attempt_id):
@@ -223,10 +338,17 @@ def quiz_detail(request, quiz_id):
 #     })
 
 
+def search_quizzes_state(request):
+    return conditional.page_state(
+        (Quiz.objects.filter(is_active=True), ['updated_at', 'topic__updated_at']),
+    )
+
+
+@conditional.catalogue_page(search_quizzes_state)
 def search_quizzes(request):
     """Search quizzes"""
     query = request.GET.get('q', '')
-    quizzes = Quiz.objects.filter(is_active=True)
+    quizzes = Quiz.objects.filter(is_active=True).select_related('topic__grade')
     
     if query:
         quizzes = quizzes.filter(
@@ -239,4 +361,11 @@ def search_quizzes(request):
         'quizzes': quizzes,
         'query': query,
     }
-    return render(request, 'quizzes/search_results.html', context)
\ No newline at end of file
+    return render(request, 'quizzes/search_results.html', context)
+
+
+@staff_member_required
+def quiz_item_analysis(request, quiz_id):
+    """Question difficulty, discrimination, distractors and reliability of a quiz"""
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    return JsonResponse({'success': True, **item_analysis.get_analysis(quiz)})
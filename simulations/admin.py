@@ -5,7 +5,7 @@ from .models import Simulation, SimulationParameter, SimulationSession, Simulati
 @admin.register(Simulation)
 class SimulationAdmin(admin.ModelAdmin):
     list_display = ['title', 'topic', 'simulation_type', 'difficulty_level', 'is_active']
-    list_filter = ['simulation_type', 'difficulty_level', 'is_active', 'topic__grade']
+    list_filter = ['simulation_type', 'kernel', 'difficulty_level', 'is_active', 'precompute_results', 'topic__grade']
     search_fields = ['title', 'description', 'learning_objectives']
     list_editable = ['is_active']
 
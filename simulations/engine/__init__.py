@@ -0,0 +1,273 @@
+"""
+Server-side simulation engine.
+
+Every ``Simulation.simulation_type`` has a kernel: a model of the physics
+written as NumPy array expressions, so one call evaluates a whole grid of
+parameter values as easily as a single point. A type may have further
+kernels chosen by name with ``Simulation.kernel``, such as the N-body
+kernel of ``motion`` and the circuit solver of ``electricity``, which reads
+its netlist from the simulation. A request names values for
+some of the kernel's parameters, each a number, a comma-separated list or a
+``start:stop:num`` range; parameters given more than one value are swept
+and the rest take their defaults. The grid is built with a sparse
+``meshgrid``, so inputs are never materialised at full size; only the
+outputs are.
+
+Defaults come from the kernel, then the simulation's ``parameters`` JSON,
+then its ``SimulationParameter`` rows, whose ``min_value``/``max_value``
+also bound what a request may ask for and whose ``step`` snaps requested
+values to the slider's positions. Low-powered devices fetch the results as
+JSON instead of integrating in the browser; ``simulations.results`` caches
+them.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+MAX_POINTS = 100_000
+MAX_SERIES = 2_000
+SERIES_SAMPLES = 200
+
+# Kernel parameter: default value, allowed range and unit
+Parameter = namedtuple('Parameter', 'default minimum maximum unit')
+
+KERNELS = {}
+
+
+def register(kernel):
+    """Class decorator adding a kernel to ``KERNELS`` under its simulation type and name"""
+    KERNELS[kernel.simulation_type, kernel.name] = kernel()
+    return kernel
+
+
+class Kernel:
+    """A vectorised model of one simulation type"""
+    simulation_type = None
+    # Blank for the simulation type's default kernel; others are chosen by Simulation.kernel
+    name = ''
+    # name -> Parameter
+    parameters = {}
+    # name -> unit
+    outputs = {}
+
+    def evaluate(self, values):
+        """Outputs for ``values``, a dict of mutually broadcastable arrays"""
+        raise NotImplementedError
+
+    def series(self, values, samples):
+        """Curves of a single point (e.g. a trajectory) as 1-D arrays, or None"""
+        return None
+
+    def evaluate_points(self, values, points, samples):
+        """
+        ``(outputs, series of each of points)`` of a grid: ``points`` are the
+        values of its points in ``np.ndindex`` order. Kernels that get the
+        series out of the evaluation override this, so nothing runs twice.
+        """
+        return self.evaluate(values), [self.series(point, samples) for point in points]
+
+    def bind(self, simulation):
+        """The kernel as configured by ``simulation``, for kernels that read more than numbers from it"""
+        return self
+
+
+def get_kernel(simulation_type, name=''):
+    kernel = KERNELS.get((simulation_type, name or ''))
+    if kernel is None:
+        raise ValueError(f'No simulation engine for {simulation_type!r}' + (f' named {name!r}' if name else ''))
+    return kernel
+
+
+def kernel_of(simulation):
+    return get_kernel(simulation.simulation_type, simulation.kernel).bind(simulation)
+
+
+def parse_values(text):
+    """``20``, ``10,20,30`` or ``10:80:71`` as a 1-D array of at most ``MAX_POINTS`` values"""
+    text = str(text).strip()
+    # Counted before anything is allocated
+    if text.count(',') >= MAX_POINTS:
+        raise ValueError(f'At most {MAX_POINTS} values per parameter')
+    try:
+        if ':' in text:
+            start, stop, num = text.split(':')
+            start, stop, num = float(start), float(stop), int(num)
+            if num < 1:
+                raise ValueError
+        else:
+            return np.array([float(value) for value in text.split(',')])
+    except ValueError:
+        raise ValueError(f'Cannot read {text!r} as numbers') from None
+    if num > MAX_POINTS:
+        raise ValueError(f'At most {MAX_POINTS} values per parameter')
+    return np.linspace(start, stop, num)
+
+
+def number(value):
+    """A default from the ``parameters`` JSON: a number or ``{"default": number}``"""
+    if isinstance(value, dict):
+        value = value.get('default', value.get('value'))
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def settings_of(kernel, simulation=None, parameter_rows=()):
+    """``{name: (default, minimum, maximum, step)}`` of a kernel for a simulation"""
+    settings = {
+        name: (parameter.default, parameter.minimum, parameter.maximum, None)
+        for name, parameter in kernel.parameters.items()
+    }
+    if simulation is not None:
+        for name, value in (simulation.parameters or {}).items():
+            if name in settings and number(value) is not None:
+                settings[name] = (number(value),) + settings[name][1:]
+    for name, default, minimum, maximum, step in parameter_rows:
+        if name in settings:
+            current, low, high, _ = settings[name]
+            settings[name] = (
+                number(default) if number(default) is not None else current,
+                low if minimum is None else max(low, minimum),
+                high if maximum is None else min(high, maximum),
+                step if step and step > 0 else None,
+            )
+    return settings
+
+
+def quantise(values, minimum, maximum, step):
+    """Snap ``values`` to the slider positions ``minimum + k * step``, dropping repeats"""
+    positions = np.round((values - minimum) / step)
+    # A maximum off the grid snaps down to the last position below it
+    positions = np.minimum(positions, np.floor((maximum - minimum) / step + 1e-9))
+    snapped = minimum + positions * step
+    _, first = np.unique(snapped, return_index=True)
+    return snapped[np.sort(first)]
+
+
+def choose(settings, requested):
+    """
+    ``{name: 1-D array}`` of the values of every parameter: its default, or
+    the requested values snapped to its step. Raises ValueError for unknown
+    parameters and values out of range.
+    """
+    unknown = sorted(set(requested) - set(settings))
+    if unknown:
+        raise ValueError(f'Unknown parameters: {", ".join(unknown)}')
+    chosen = {name: np.array([default], dtype=float) for name, (default, _, _, _) in settings.items()}
+    for name, text in requested.items():
+        values = parse_values(text)
+        _, minimum, maximum, step = settings[name]
+        if not np.all(np.isfinite(values)) or values.min() < minimum or values.max() > maximum:
+            raise ValueError(f'{name} must be between {minimum:g} and {maximum:g}')
+        chosen[name] = quantise(values, minimum, maximum, step) if step else values
+    return chosen
+
+
+def prepare(simulation_type, requested, simulation=None, parameter_rows=(), name=None):
+    """
+    ``(kernel, chosen)`` for a request: the kernel of ``simulation_type``
+    named ``name`` (by default the simulation's) and the values of every
+    parameter as ``choose`` returns them. ``parameter_rows`` are ``(name,
+    default_value, min_value, max_value, step)`` of the simulation's
+    ``SimulationParameter`` rows.
+    """
+    if name is None:
+        name = simulation.kernel if simulation is not None else ''
+    kernel = get_kernel(simulation_type, name)
+    if simulation is not None:
+        kernel = kernel.bind(simulation)
+    return kernel, choose(settings_of(kernel, simulation, parameter_rows), requested)
+
+
+def build_grid(chosen, limit=MAX_POINTS):
+    """
+    ``(values, axes, shape)``: the value of every parameter, swept ones as
+    sparse grid axes, the swept ``{name: 1-D array}`` and the grid shape.
+    """
+    axes = {name: array for name, array in chosen.items() if array.size > 1}
+    shape = tuple(array.size for array in axes.values())
+    if int(np.prod(shape, dtype=np.int64)) > limit:
+        raise ValueError(f'At most {limit} parameter combinations per request')
+    grid = dict(zip(axes, np.meshgrid(*axes.values(), indexing='ij', sparse=True))) if axes else {}
+    values = {name: grid.get(name, array[0]) for name, array in chosen.items()}
+    return values, axes, shape
+
+
+def to_json(array):
+    """Nested lists with None for values that are not finite"""
+    array = np.asarray(array, dtype=float)
+    if np.isfinite(array).all():
+        return array.tolist()
+    cleaned = array.astype(object)
+    cleaned[~np.isfinite(array)] = None
+    return cleaned.tolist()
+
+
+def describe(kernel, values, axes, shape, outputs, series):
+    return {
+        'simulation_type': kernel.simulation_type,
+        'kernel': kernel.name,
+        'parameters': {
+            name: {'value': float(values[name]) if name not in axes else None,
+                   'unit': kernel.parameters[name].unit}
+            for name in kernel.parameters
+        },
+        'grid': {name: to_json(array) for name, array in axes.items()},
+        'shape': list(shape),
+        'outputs': {name: to_json(output) for name, output in outputs.items()},
+        'units': dict(kernel.outputs),
+        'series': {name: to_json(curve) for name, curve in series.items()} if series else None,
+    }
+
+
+def series_samples(samples):
+    return min(max(int(samples), 2), MAX_SERIES)
+
+
+def compute(kernel, chosen, samples=SERIES_SAMPLES):
+    """Evaluate ``kernel`` over the grid of ``chosen`` values in one call"""
+    values, axes, shape = build_grid(chosen)
+    with np.errstate(all='ignore'):
+        outputs = {name: np.broadcast_to(output, shape) for name, output in kernel.evaluate(values).items()}
+        series = kernel.series(values, series_samples(samples)) if not shape else None
+    return describe(kernel, values, axes, shape, outputs, series)
+
+
+def compute_points(kernel, chosen, samples=SERIES_SAMPLES, limit=MAX_POINTS):
+    """
+    Yield ``(point, result)`` for every combination of ``chosen`` values,
+    ``point`` being its own ``chosen`` and ``result`` what ``compute`` returns
+    for it, with the outputs of the whole grid evaluated in one call.
+    """
+    values, axes, shape = build_grid(chosen, limit)
+    points = []
+    for index in np.ndindex(shape):
+        point = dict(chosen)
+        for axis, name in enumerate(axes):
+            point[name] = axes[name][index[axis]:index[axis] + 1]
+        points.append((index, point, {name: array[0] for name, array in point.items()}))
+    with np.errstate(all='ignore'):
+        outputs, series = kernel.evaluate_points(
+            values, [point_values for _, _, point_values in points], series_samples(samples),
+        )
+        outputs = {name: np.broadcast_to(output, shape) for name, output in outputs.items()}
+        for (index, point, point_values), point_series in zip(points, series):
+            yield point, describe(
+                kernel, point_values, {}, (), {name: output[index] for name, output in outputs.items()},
+                point_series,
+            )
+
+
+def run(simulation_type, requested, simulation=None, parameter_rows=(), samples=SERIES_SAMPLES, name=None):
+    """
+    Evaluate the kernel of ``simulation_type`` over the requested grid.
+    ``requested`` maps parameter names to values as text. Raises ValueError
+    for a bad request.
+    """
+    kernel, chosen = prepare(simulation_type, requested, simulation, parameter_rows, name)
+    return compute(kernel, chosen, samples)
+
+
+# Kernel modules register themselves on import
+from . import circuit, electricity, motion, nbody, optics, quantum, relativity, thermodynamics, waves  # noqa: E402
@@ -0,0 +1,365 @@
+"""
+Circuits of resistors, capacitors, inductors and DC sources, solved by
+modified nodal analysis (MNA).
+
+A simulation with the ``circuit`` kernel lists its elements in SPICE style
+under ``circuit`` in its ``parameters`` JSON, as a list of lines or one
+string of them::
+
+    V1 in 0 12
+    R1 in out 1k
+    C1 out 0 100u
+
+The first letter of a name gives the kind (R, C, L, V or I), followed by
+the positive and negative nodes and the value, with SPICE's scale suffixes;
+``0`` or ``gnd`` is ground. Every element's value becomes a parameter of
+the kernel named after it, so components are swept like any other
+parameter. The outputs are the voltage of every node, ``V(node)``, and the
+current through every element, ``I(name)``, flowing from its positive node
+through the element to its negative one.
+
+The unknowns are the node voltages and the currents of voltage sources and
+inductors. The sparse matrix depends on the resistors, capacitors,
+inductors and the time step, never on the sources, so grid points that
+differ only in their sources share one LU factorisation and are solved
+together, a right-hand side each; a circuit keeps its last
+``FACTORISATIONS`` factorisations for later requests. With ``time`` 0 the
+result is the DC operating point, capacitors open and inductors shorted.
+Otherwise the circuit is switched on from rest and integrated over
+``steps`` steps with companion models: each capacitor and inductor becomes
+a conductance beside a source carrying its history, by backward Euler for
+the first step and the trapezoidal rule after it, so the matrix stays the
+same from step to step.
+"""
+from collections import Counter, OrderedDict, namedtuple
+from functools import lru_cache
+import re
+import threading
+
+import numpy as np
+from scipy.sparse import csc_matrix, csr_matrix, hstack
+from scipy.sparse.linalg import splu
+
+from . import Kernel, Parameter, register
+
+GROUND = {'0', 'gnd'}
+# Conductance from every node to ground, so nodes reached only through capacitors have a DC voltage
+GMIN = 1e-12
+# Factorisations each circuit keeps
+FACTORISATIONS = 32
+# Unknowns times steps times grid points one request may solve
+WORK = 50_000_000
+# Output values one request may return
+MAX_VALUES = 2_000_000
+
+# Allowed values and unit of each kind of element
+LIMITS = {
+    'R': (1e-6, 1e12, 'Ω'),
+    'C': (0.0, 1e3, 'F'),
+    'L': (0.0, 1e6, 'H'),
+    'V': (-1e6, 1e6, 'V'),
+    'I': (-1e6, 1e6, 'A'),
+}
+SCALES = {'f': 1e-15, 'p': 1e-12, 'n': 1e-9, 'u': 1e-6, 'µ': 1e-6, 'm': 1e-3,
+          'k': 1e3, 'meg': 1e6, 'g': 1e9, 't': 1e12}
+# A number, a scale and an optional unit: 4.7k, 100u, 2.2e-3, 10mA
+VALUE = re.compile(r'([-+]?(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?)(meg|[fpnuµmkgt])?[a-zµω]*')
+
+Element = namedtuple('Element', 'name kind positive negative value')
+
+
+def parse(netlist):
+    """The elements of a netlist, a string of lines or a list of them; ``*`` starts a comment line"""
+    lines = netlist.splitlines() if isinstance(netlist, str) else list(netlist)
+    elements = []
+    for number, line in enumerate(lines, 1):
+        fields = str(line).split()
+        if not fields or fields[0].startswith('*'):
+            continue
+        kind = fields[0][0].upper()
+        if kind not in LIMITS or len(fields) != 4:
+            raise ValueError(f'Line {number}: expected "<R|C|L|V|I>name node node value", not {line!r}')
+        match = VALUE.fullmatch(fields[3].lower())
+        if match is None:
+            raise ValueError(f'Line {number}: cannot read {fields[3]!r} as a value')
+        value = float(match[1]) * SCALES.get(match[2], 1.0)
+        elements.append(Element(fields[0], kind, fields[1], fields[2], value))
+    return elements
+
+
+def incidence(positive, negative, size):
+    """``(size, elements)``: +1 at the row of each element's positive node, -1 at its negative one"""
+    columns = np.arange(len(positive))
+    rows = np.r_[positive, negative]
+    keep = rows >= 0
+    data = np.r_[np.ones(len(positive)), -np.ones(len(negative))]
+    return csr_matrix((data[keep], (rows[keep], np.r_[columns, columns][keep])), shape=(size, len(positive)))
+
+
+def selection(rows, size):
+    """``(size, len(rows))`` with a 1 at each of ``rows``"""
+    return csr_matrix((np.ones(len(rows)), (rows, np.arange(len(rows)))), shape=(size, len(rows)))
+
+
+class Circuit:
+    """The MNA system of a list of elements, its sparsity pattern assembled once"""
+
+    def __init__(self, elements):
+        if not elements:
+            raise ValueError('The circuit has no elements')
+        counts = Counter(element.name for element in elements)
+        repeated = sorted(name for name, count in counts.items() if count > 1)
+        if repeated:
+            raise ValueError(f'Elements named more than once: {", ".join(repeated)}')
+        self.elements = elements
+        self.parameters = {}
+        for element in elements:
+            low, high, unit = LIMITS[element.kind]
+            if not low <= element.value <= high:
+                raise ValueError(f'{element.name} must be between {low:g} and {high:g} {unit}')
+            self.parameters[element.name] = Parameter(element.value, low, high, unit)
+        terminals = [node for element in elements for node in (element.positive, element.negative)]
+        if not any(node.lower() in GROUND for node in terminals):
+            raise ValueError('The circuit needs a ground node, 0')
+        self.nodes = [node for node in dict.fromkeys(terminals) if node.lower() not in GROUND]
+        node_index = {node: index for index, node in enumerate(self.nodes)}
+        self.outputs = {f'V({node})': 'V' for node in self.nodes}
+        self.outputs.update((f'I({element.name})', 'A') for element in elements)
+
+        kinds = np.array([element.kind for element in elements])
+        self.of_kind = {kind: np.flatnonzero(kinds == kind) for kind in LIMITS}
+        # The unknowns of each element's nodes, -1 for ground
+        ends = {
+            kind: tuple(
+                np.array([node_index.get(getattr(elements[index], end), -1) for index in indices], dtype=np.int64)
+                for end in ('positive', 'negative')
+            )
+            for kind, indices in self.of_kind.items()
+        }
+        count = {kind: len(indices) for kind, indices in self.of_kind.items()}
+        nodes = len(self.nodes)
+        # Voltage sources' currents, then inductors'
+        self.source_rows = nodes + np.arange(count['V'])
+        self.inductor_rows = nodes + count['V'] + np.arange(count['L'])
+        self.size = size = nodes + count['V'] + count['L']
+
+        # Matrix coefficients: resistor conductances, capacitor and inductor companions, 1 and GMIN
+        first = {'R': 0, 'C': count['R'], 'L': count['R'] + count['C']}
+        self.one = count['R'] + count['C'] + count['L']
+        rows, columns, slots, signs = [], [], [], []
+
+        def stamp(row, column, slot, sign):
+            row, column, slot = np.broadcast_arrays(row, column, slot)
+            keep = (row >= 0) & (column >= 0)
+            rows.append(row[keep])
+            columns.append(column[keep])
+            slots.append(slot[keep])
+            signs.append(np.full(keep.sum(), sign, dtype=float))
+
+        for kind in 'RC':
+            a, b = ends[kind]
+            slot = first[kind] + np.arange(count[kind])
+            stamp(a, a, slot, 1)
+            stamp(b, b, slot, 1)
+            stamp(a, b, slot, -1)
+            stamp(b, a, slot, -1)
+        for kind, branch in (('V', self.source_rows), ('L', self.inductor_rows)):
+            a, b = ends[kind]
+            stamp(a, branch, self.one, 1)
+            stamp(b, branch, self.one, -1)
+            stamp(branch, a, self.one, 1)
+            stamp(branch, b, self.one, -1)
+        stamp(self.inductor_rows, self.inductor_rows, first['L'] + np.arange(count['L']), -1)
+        stamp(np.arange(nodes), np.arange(nodes), self.one + 1, 1)
+        # Compressed columns: the entries sorted by column, then row, duplicates summed
+        keys, self.entry = np.unique(np.concatenate(columns) * size + np.concatenate(rows), return_inverse=True)
+        self.indices = keys % size
+        self.indptr = np.r_[0, np.cumsum(np.bincount(keys // size, minlength=size))]
+        self.slots = np.concatenate(slots)
+        self.signs = np.concatenate(signs)
+
+        self.across = {kind: incidence(*ends[kind], size) for kind in 'RCL'}
+        # The voltage across each element from the unknowns
+        self.voltages = {kind: matrix.T.tocsr() for kind, matrix in self.across.items()}
+        # Right-hand side per unit of each source, voltage sources first
+        self.drive = hstack([selection(self.source_rows, size), -incidence(*ends['I'], size)], format='csr')
+        self.sources = np.r_[self.of_kind['V'], self.of_kind['I']]
+        self.passive = np.r_[self.of_kind['R'], self.of_kind['C'], self.of_kind['L']]
+        self.companions = selection(self.inductor_rows, size)
+        self._factors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def coefficients(self, values, step=0.0, order=0):
+        """
+        The matrix coefficients for element ``values``: the DC circuit when
+        ``order`` is 0, else the companion models of backward Euler (1) or
+        the trapezoidal rule (2) for a time ``step``
+        """
+        scale = order / step if order else 0.0
+        return np.r_[1 / values[self.of_kind['R']], scale * values[self.of_kind['C']],
+                     scale * values[self.of_kind['L']], 1.0, GMIN]
+
+    def matrix(self, coefficients):
+        data = np.bincount(self.entry, weights=self.signs * coefficients[self.slots], minlength=len(self.indices))
+        return csc_matrix((data, self.indices, self.indptr), shape=(self.size, self.size))
+
+    def factorise(self, coefficients):
+        """The LU factorisation of the matrix, reused while the coefficients stay the same"""
+        key = coefficients.tobytes()
+        with self._lock:
+            factors = self._factors.get(key)
+            if factors is not None:
+                self._factors.move_to_end(key)
+                return factors
+        try:
+            factors = splu(self.matrix(coefficients))
+        except RuntimeError:
+            raise ValueError(
+                'The circuit has no unique solution: look for a loop of voltage sources and inductors'
+            ) from None
+        with self._lock:
+            self._factors[key] = factors
+            while len(self._factors) > FACTORISATIONS:
+                self._factors.popitem(last=False)
+        return factors
+
+    def transient(self, values, drive, time, steps, frames=()):
+        """
+        Integrate from rest for ``steps`` steps up to ``time``. Returns the
+        final unknowns and capacitor currents, and the same at the steps in
+        ``frames``, a sorted sequence.
+        """
+        step = time / steps
+        capacitance = values[self.of_kind['C']][:, None]
+        inductance = values[self.of_kind['L']][:, None]
+        x = np.zeros_like(drive)
+        voltage = np.zeros((len(capacitance), drive.shape[1]))
+        current = np.zeros_like(voltage)
+        recorded = [(x, current)] if frames and frames[0] == 0 else []
+        wanted = set(frames)
+        for n in range(1, steps + 1):
+            order = 1 if n == 1 else 2
+            if n <= 2:
+                factors = self.factorise(self.coefficients(values, step, order))
+                conductance = order * capacitance / step
+                resistance = order * inductance / step
+            # Backward Euler has no use for the previous current or voltage
+            history = conductance * voltage + (current if order == 2 else 0)
+            branch = -resistance * x[self.inductor_rows]
+            if order == 2:
+                branch -= self.voltages['L'] @ x
+            x = factors.solve(drive + self.across['C'] @ history + self.companions @ branch)
+            voltage = self.voltages['C'] @ x
+            current = conductance * voltage - history
+            if n in wanted:
+                recorded.append((x, current))
+        return x, current, recorded
+
+    def currents(self, values, x, capacitor_current):
+        """The current through every element, ``values`` being theirs at each column of ``x``"""
+        currents = np.empty((len(self.elements), x.shape[1]))
+        resistors = self.of_kind['R']
+        currents[resistors] = (self.voltages['R'] @ x) / values[resistors]
+        currents[self.of_kind['C']] = capacitor_current
+        currents[self.of_kind['L']] = x[self.inductor_rows]
+        currents[self.of_kind['V']] = x[self.source_rows]
+        currents[self.of_kind['I']] = values[self.of_kind['I']]
+        return currents
+
+    def solve(self, values, time, steps):
+        """
+        Every output at each point: ``values`` is ``(elements, points)``,
+        ``time`` and ``steps`` are per point. Returns ``(outputs, points)``.
+        """
+        points = values.shape[1]
+        steps = np.where(time > 0, np.round(steps), 0).astype(np.int64)
+        # Points sharing every passive value, time and step count share their factorisations
+        keys = np.vstack([values[self.passive], time, steps])
+        keys = keys[(keys != keys[:, :1]).any(axis=1)]
+        _, group = np.unique(keys, axis=1, return_inverse=True)
+        group = group.ravel()
+        order = np.argsort(group, kind='stable')
+        bounds = np.r_[0, np.cumsum(np.bincount(group))]
+        results = np.empty((len(self.outputs), points))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            members = order[start:end]
+            point = members[0]
+            drive = self.drive @ values[self.sources][:, members]
+            if steps[point]:
+                x, current, _ = self.transient(values[:, point], drive, time[point], steps[point])
+            else:
+                x = self.factorise(self.coefficients(values[:, point])).solve(drive)
+                current = np.zeros((len(self.of_kind['C']), len(members)))
+            results[:len(self.nodes), members] = x[:len(self.nodes)]
+            results[len(self.nodes):, members] = self.currents(values[:, members], x, current)
+        return results
+
+
+@lru_cache(maxsize=16)
+def build(netlist):
+    return Circuit(parse(netlist))
+
+
+@register
+class CircuitKernel(Kernel):
+    simulation_type = 'electricity'
+    name = 'circuit'
+    # The elements' values come first once bound to a simulation
+    parameters = {
+        # 0 for the DC operating point
+        'time': Parameter(0.0, 0.0, 1e6, 's'),
+        'steps': Parameter(200.0, 1.0, 10_000.0, ''),
+    }
+    outputs = {}
+
+    def __init__(self, circuit=None):
+        self.circuit = circuit
+        if circuit is not None:
+            self.parameters = {**circuit.parameters, **CircuitKernel.parameters}
+            self.outputs = circuit.outputs
+
+    def bind(self, simulation):
+        netlist = (simulation.parameters or {}).get('circuit')
+        if not netlist:
+            return self
+        return CircuitKernel(build(netlist if isinstance(netlist, str) else '\n'.join(map(str, netlist))))
+
+    def columns(self, values):
+        """``(element values, time, steps)`` as ``(elements, points)`` and per-point arrays, and the grid shape"""
+        if self.circuit is None:
+            raise ValueError('The simulation has no circuit')
+        shape = np.broadcast_shapes(*(np.shape(values[name]) for name in self.parameters))
+        points = int(np.prod(shape, dtype=np.int64))
+        if points * len(self.outputs) > MAX_VALUES:
+            raise ValueError(f'At most {MAX_VALUES} output values per request')
+        arrays = [np.broadcast_to(values[name], shape).ravel() for name in self.parameters]
+        time, steps = arrays[-2:]
+        work = self.circuit.size * np.where(time > 0, np.round(steps), 1).sum()
+        if work > WORK:
+            raise ValueError(f'At most {WORK} unknowns times steps per request')
+        return np.array(arrays[:-2], dtype=float).reshape(-1, points), time, steps, shape
+
+    def evaluate(self, values):
+        element_values, time, steps, shape = self.columns(values)
+        results = self.circuit.solve(element_values, time, steps)
+        return {name: result.reshape(shape) for name, result in zip(self.outputs, results)}
+
+    def series(self, values, samples):
+        """Node voltages and the currents of capacitors and inductors while the circuit settles"""
+        element_values, (time,), (steps,), _ = self.columns(values)
+        if not time > 0:
+            return None
+        circuit = self.circuit
+        element_values = element_values[:, 0]
+        steps = int(round(steps))
+        frames = np.unique(np.linspace(0, steps, min(samples, steps + 1)).round().astype(int))
+        drive = circuit.drive @ element_values[circuit.sources][:, None]
+        _, _, recorded = circuit.transient(element_values, drive, time, steps, list(frames))
+        x = np.hstack([state for state, _ in recorded])
+        current = np.hstack([current for _, current in recorded])
+        currents = circuit.currents(element_values[:, None], x, current)
+        series = {'t': frames * time / steps}
+        series.update((f'V({node})', x[index]) for index, node in enumerate(circuit.nodes))
+        for index in np.r_[circuit.of_kind['C'], circuit.of_kind['L']]:
+            series[f'I({circuit.elements[index].name})'] = currents[index]
+        return series
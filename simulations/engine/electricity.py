@@ -0,0 +1,50 @@
+"""A capacitor charging through a resistor (RC circuit)"""
+import numpy as np
+
+from . import Kernel, Parameter, register
+
+
+@register
+class RCCircuitKernel(Kernel):
+    simulation_type = 'electricity'
+    parameters = {
+        'emf': Parameter(12.0, 0.0, 1e4, 'V'),
+        'resistance': Parameter(1000.0, 1e-3, 1e9, 'Ω'),
+        'capacitance': Parameter(100.0, 1e-6, 1e6, 'µF'),
+        'time': Parameter(0.1, 0.0, 1e6, 's'),
+    }
+    outputs = {
+        'time_constant': 's',
+        'initial_current': 'A',
+        'current': 'A',
+        'capacitor_voltage': 'V',
+        'charge': 'C',
+        'stored_energy': 'J',
+        'power': 'W',
+    }
+
+    def state(self, values, time):
+        capacitance = values['capacitance'] * 1e-6
+        time_constant = values['resistance'] * capacitance
+        remaining = np.exp(-time / time_constant)
+        voltage = values['emf'] * (1 - remaining)
+        current = values['emf'] / values['resistance'] * remaining
+        return time_constant, capacitance, voltage, current
+
+    def evaluate(self, values):
+        time_constant, capacitance, voltage, current = self.state(values, values['time'])
+        return {
+            'time_constant': time_constant,
+            'initial_current': values['emf'] / values['resistance'],
+            'current': current,
+            'capacitor_voltage': voltage,
+            'charge': capacitance * voltage,
+            'stored_energy': capacitance * voltage ** 2 / 2,
+            'power': current ** 2 * values['resistance'],
+        }
+
+    def series(self, values, samples):
+        time_constant = values['resistance'] * values['capacitance'] * 1e-6
+        time = np.linspace(0, 5 * time_constant, samples)
+        _, _, voltage, current = self.state(values, time)
+        return {'t': time, 'capacitor_voltage': voltage, 'current': current}
@@ -0,0 +1,258 @@
+"""
+Integrators of ordinary differential equations on NumPy state arrays.
+
+A state is an array of any shape, so one call advances many bodies or many
+parameter sets at once; ``derivative(t, y)`` returns dy/dt with the state's
+shape. Every integrator returns a ``Solution`` holding the states at its
+steps, which also interpolates between them (dense output) so frames can be
+sampled at any times without shortening the steps:
+
+* ``rk4``: classical fourth-order Runge-Kutta with a fixed step
+* ``leapfrog``: velocity Verlet for ``x'' = a(t, x)``, second order and
+  symplectic, so the energy error of a conservative system stays bounded
+  rather than drifting
+* ``dormand_prince``: adaptive RK45 keeping the local error estimate of
+  every element within ``rtol * |y| + atol``; the batch shares one time
+  grid, paced by its hardest member
+
+Fixed-step solutions interpolate with cubic Hermite polynomials through the
+states and derivatives at the steps, Dormand-Prince with its own quartic.
+"""
+import numpy as np
+
+MAX_STEPS = 100_000
+
+# Dormand-Prince 5(4) tableau, error weights and dense output coefficients
+DP_C = np.array([0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1])
+DP_A = [np.array(row) for row in [
+    [],
+    [1 / 5],
+    [3 / 40, 9 / 40],
+    [44 / 45, -56 / 15, 32 / 9],
+    [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+    [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+]]
+DP_B = np.array([35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84])
+DP_E = np.array([-71 / 57600, 0, 71 / 16695, -71 / 1920, 17253 / 339200, -22 / 525, 1 / 40])
+DP_P = np.array([
+    [1, -8048581381 / 2820520608, 8663915743 / 2820520608, -12715105075 / 11282082432],
+    [0, 0, 0, 0],
+    [0, 131558114200 / 32700410799, -68118460800 / 10900136933, 87487479700 / 32700410799],
+    [0, -1754552775 / 470086768, 14199869525 / 1410260304, -10690763975 / 1880347072],
+    [0, 127303824393 / 49829197408, -318862633887 / 49829197408, 701980252875 / 199316789632],
+    [0, -282668133 / 205662961, 2019193451 / 616988883, -1453857185 / 822651844],
+    [0, 40617522 / 29380423, -110615467 / 29380423, 69997945 / 29380423],
+])
+# Bounds on how much one adaptive step may grow or shrink the next
+MIN_FACTOR = 0.2
+MAX_FACTOR = 10.0
+SAFETY = 0.9
+
+
+class Solution:
+    """States at the steps of an integration, interpolated between them"""
+
+    def __init__(self, t, y, dy, evaluations):
+        self.t = np.asarray(t, dtype=float)
+        self.y = np.asarray(y)
+        self.dy = np.asarray(dy)
+        self.evaluations = evaluations
+
+    @property
+    def steps(self):
+        return len(self.t) - 1
+
+    def parts(self, select):
+        """The per-step arrays of the interpolant, each passed through ``select``"""
+        return select(self.y[:-1]), select(self.y[1:]), select(self.dy[:-1]), select(self.dy[1:])
+
+    def interpolate(self, parts, theta, h):
+        y0, y1, dy0, dy1 = parts
+        theta2, theta3 = theta ** 2, theta ** 3
+        return ((2 * theta3 - 3 * theta2 + 1) * y0 + (-2 * theta3 + 3 * theta2) * y1
+                + h * ((theta3 - 2 * theta2 + theta) * dy0 + (theta3 - theta2) * dy1))
+
+    def locate(self, times):
+        index = np.clip(np.searchsorted(self.t, times, side='right') - 1, 0, self.steps - 1)
+        h = self.t[index + 1] - self.t[index]
+        return index, (times - self.t[index]) / h, h
+
+    def __call__(self, times):
+        """States at ``times``, a 1-D array within the integrated span: ``(len(times), *state shape)``"""
+        times = np.asarray(times, dtype=float)
+        index, theta, h = self.locate(times)
+        shape = (-1,) + (1,) * (self.y.ndim - 1)
+        return self.interpolate(self.parts(lambda array: array[index]), theta.reshape(shape), h.reshape(shape))
+
+    def at_steps(self, index, theta):
+        """
+        For states whose last axis is a batch, the state of batch element
+        ``j`` at ``theta[j]`` of the way through step ``index[j]``
+        """
+        batch = np.arange(self.y.shape[-1])
+        parts = self.parts(lambda array: np.moveaxis(array[index, ..., batch], 0, -1))
+        return self.interpolate(parts, theta, self.t[index + 1] - self.t[index])
+
+    def at(self, times):
+        """For states whose last axis is a batch, the state of element ``j`` at ``times[j]``"""
+        index, theta, _ = self.locate(np.asarray(times, dtype=float))
+        return self.at_steps(index, theta)
+
+
+class DenseSolution(Solution):
+    """A Dormand-Prince solution, interpolated with the method's own quartic"""
+
+    def __init__(self, t, y, dy, evaluations, coefficients, next_step=None):
+        super().__init__(t, y, dy, evaluations)
+        # One (steps, *state shape) array per power of theta
+        self.coefficients = coefficients
+        # The step size the integration would have taken next
+        self.next_step = next_step
+
+    def parts(self, select):
+        return (select(self.y[:-1]),) + tuple(select(q) for q in self.coefficients)
+
+    def interpolate(self, parts, theta, h):
+        y0, *coefficients = parts
+        total = 0
+        for q in reversed(coefficients):
+            total = (total + q) * theta
+        return y0 + h * total
+
+
+def span_of(t_span):
+    start, end = (float(value) for value in t_span)
+    if not end > start:
+        raise ValueError('The time span must end after it starts')
+    return start, end
+
+
+def fixed_steps(start, end, dt):
+    if not dt > 0:
+        raise ValueError('The step must be positive')
+    steps = int(np.ceil((end - start) / dt - 1e-9))
+    if steps > MAX_STEPS:
+        raise ValueError(f'At most {MAX_STEPS} steps per integration')
+    return np.linspace(start, end, steps + 1)
+
+
+def rk4(derivative, y0, t_span, dt):
+    """Classical Runge-Kutta with steps of at most ``dt``, shortened to end on the span"""
+    t = fixed_steps(*span_of(t_span), dt)
+    y = np.empty((len(t),) + np.shape(y0))
+    dy = np.empty_like(y)
+    y[0] = y0
+    dy[0] = derivative(t[0], y[0])
+    for n in range(len(t) - 1):
+        h = t[n + 1] - t[n]
+        k1 = dy[n]
+        k2 = derivative(t[n] + h / 2, y[n] + h / 2 * k1)
+        k3 = derivative(t[n] + h / 2, y[n] + h / 2 * k2)
+        k4 = derivative(t[n] + h, y[n] + h * k3)
+        y[n + 1] = y[n] + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+        # The next step's first stage
+        dy[n + 1] = derivative(t[n + 1], y[n + 1])
+    return Solution(t, y, dy, 4 * (len(t) - 1) + 1)
+
+
+def leapfrog(acceleration, position, velocity, t_span, dt):
+    """
+    Velocity Verlet for ``x'' = acceleration(t, x)``. The states of the
+    solution stack position and velocity: ``(2, *position shape)``.
+    """
+    t = fixed_steps(*span_of(t_span), dt)
+    y = np.empty((len(t), 2) + np.shape(position))
+    dy = np.empty_like(y)
+    x, v, a = y[:, 0], y[:, 1], dy[:, 1]
+    x[0], v[0] = position, velocity
+    a[0] = acceleration(t[0], x[0])
+    for n in range(len(t) - 1):
+        h = t[n + 1] - t[n]
+        half = v[n] + h / 2 * a[n]
+        x[n + 1] = x[n] + h * half
+        a[n + 1] = acceleration(t[n + 1], x[n + 1])
+        v[n + 1] = half + h / 2 * a[n + 1]
+    dy[:, 0] = v
+    return Solution(t, y, dy, len(t))
+
+
+def error_norm(error, y, y_new, rtol, atol):
+    return np.max(np.abs(error) / (atol + rtol * np.maximum(np.abs(y), np.abs(y_new))), initial=0)
+
+
+def initial_step(derivative, start, end, y0, f0, rtol, atol):
+    scale = atol + rtol * np.abs(y0)
+    d0 = np.max(np.abs(y0) / scale, initial=0)
+    d1 = np.max(np.abs(f0) / scale, initial=0)
+    h = 1e-6 if d0 < 1e-5 or d1 < 1e-5 else 0.01 * d0 / d1
+    return min(h, end - start)
+
+
+def dormand_prince(derivative, y0, t_span, rtol=1e-6, atol=1e-9, first_step=None, max_steps=MAX_STEPS,
+                   truncate=False):
+    """
+    Adaptive RK45 (Dormand-Prince) with error control and dense output.
+    After ``max_steps`` steps it raises ValueError or, with ``truncate``,
+    returns the solution so far, ending short of the span; its
+    ``next_step`` is where to continue from.
+    """
+    start, end = span_of(t_span)
+    y = np.array(y0, dtype=float)
+    f = derivative(start, y)
+    evaluations = 1
+    h = first_step or initial_step(derivative, start, end, y, f, rtol, atol)
+    t = start
+    times, states, derivatives, coefficients = [t], [y], [f], [[] for _ in range(DP_P.shape[1])]
+    stages = np.empty((7,) + y.shape)
+    # Combinations of the stages are matrix products on this flat view
+    flat = stages.reshape(7, -1)
+    while t < end:
+        if len(times) > max_steps:
+            if truncate:
+                break
+            raise ValueError(f'At most {max_steps} steps per integration')
+        h = min(h, end - t)
+        stages[0] = f
+        for i in range(1, 6):
+            stages[i] = derivative(t + DP_C[i] * h, y + h * (DP_A[i] @ flat[:i]).reshape(y.shape))
+        y_new = y + h * (DP_B @ flat[:6]).reshape(y.shape)
+        stages[6] = f_new = derivative(t + h, y_new)
+        evaluations += 6
+        norm = error_norm(h * (DP_E @ flat).reshape(y.shape), y, y_new, rtol, atol)
+        factor = MAX_FACTOR if norm == 0 else min(MAX_FACTOR, max(MIN_FACTOR, SAFETY * norm ** -0.2))
+        if norm > 1:
+            h *= factor
+            if t + h == t:
+                raise ValueError('The step size became too small')
+            continue
+        for power, q in enumerate((DP_P.T @ flat).reshape((-1,) + y.shape)):
+            coefficients[power].append(q)
+        t = end if end - (t + h) < 1e-12 * (end - start) else t + h
+        y, f = y_new, f_new
+        times.append(t)
+        states.append(y)
+        derivatives.append(f)
+        h *= factor
+    return DenseSolution(times, np.stack(states), np.stack(derivatives), evaluations,
+                         [np.stack(q) for q in coefficients], h)
+
+
+def first_crossing(solution, level, iterations=60):
+    """
+    For states whose last axis is a batch, the first time after the start
+    each element's ``level`` falls to zero or below, found by bisection on
+    the dense output, or nan when it never does. ``level`` maps states with
+    a leading axis of times to a ``(times, batch)`` array.
+    """
+    below = level(solution.y)[1:] <= 0
+    found = below.any(axis=0)
+    index = np.where(found, below.argmax(axis=0), 0)
+    low = np.zeros(len(index))
+    high = np.ones(len(index))
+    for _ in range(iterations):
+        middle = (low + high) / 2
+        above = level(solution.at_steps(index, middle)[None])[0] > 0
+        low = np.where(above, middle, low)
+        high = np.where(above, high, middle)
+    times = solution.t[index] + high * (solution.t[index + 1] - solution.t[index])
+    return np.where(found, times, np.nan)
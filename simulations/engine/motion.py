@@ -0,0 +1,172 @@
+"""
+Projectile motion, optionally with quadratic air resistance.
+
+Without drag every output has a closed form. With drag the batch of
+launches is integrated together by Dormand-Prince in stretches of at most
+``SEGMENT_STEPS`` steps, each continuing where the last stopped, so only
+one stretch's dense output is held at a time. Landing and apex are found on
+each stretch as it is integrated, and launches leave the batch once they
+land. Every request has a budget of integration steps; launches that have
+not landed after ``MAX_EXTENSIONS`` doublings of the horizon get nan.
+"""
+import numpy as np
+
+from . import Kernel, Parameter, register
+from .integrators import dormand_prince, first_crossing
+
+RTOL = 1e-7
+ATOL = 1e-7
+# Launches integrated together; the batch shares its steps
+CHUNK = 256
+# Steps of one stretch of integration, whose dense output is held in memory
+SEGMENT_STEPS = 200
+# Horizon doublings tried before giving up on launches that have not landed
+MAX_EXTENSIONS = 20
+# Steps, and launches times steps, one request may integrate
+DRAG_STEPS = 5_000
+LAUNCH_STEPS = 1_000_000
+
+
+class Budget:
+    """The integration work a request has left"""
+
+    def __init__(self, steps=DRAG_STEPS, launch_steps=LAUNCH_STEPS):
+        self.steps = steps
+        self.launch_steps = launch_steps
+
+    def allowance(self, launches):
+        """Steps the next stretch of ``launches`` launches may take; ValueError once spent"""
+        steps = min(SEGMENT_STEPS, self.steps, self.launch_steps // launches)
+        if steps < 1:
+            raise ValueError(f'At most {DRAG_STEPS} steps and {LAUNCH_STEPS} launches times steps '
+                             f'per request with drag')
+        return steps
+
+    def charge(self, steps, launches):
+        self.steps -= steps
+        self.launch_steps -= steps * launches
+
+
+@register
+class ProjectileKernel(Kernel):
+    simulation_type = 'motion'
+    parameters = {
+        'speed': Parameter(20.0, 0.0, 1000.0, 'm/s'),
+        'angle': Parameter(45.0, -90.0, 90.0, '°'),
+        'height': Parameter(0.0, 0.0, 1e5, 'm'),
+        'gravity': Parameter(9.81, 0.1, 300.0, 'm/s²'),
+        # Drag acceleration per squared speed, rho * Cd * A / (2 m)
+        'drag': Parameter(0.0, 0.0, 1.0, '1/m'),
+    }
+    outputs = {
+        'flight_time': 's',
+        'range': 'm',
+        'max_height': 'm',
+        'impact_speed': 'm/s',
+        'impact_angle': '°',
+    }
+
+    def components(self, values):
+        angle = np.radians(values['angle'])
+        return values['speed'] * np.cos(angle), values['speed'] * np.sin(angle)
+
+    def flight_time(self, values, vertical):
+        gravity = values['gravity']
+        return (vertical + np.sqrt(vertical ** 2 + 2 * gravity * values['height'])) / gravity
+
+    def trajectories(self, horizontal, vertical, height, gravity, drag, budget, keep=False):
+        """
+        ``(landing time, landing state, apex height, stretches)`` of launches
+        with drag, given as 1-D arrays, integrated together as states ``(x,
+        y, vx, vy)``. Launches that never land get nan. ``stretches`` are the
+        solutions of every stretch when ``keep`` is set, else empty.
+        """
+        landing = np.full(len(height), np.nan)
+        final = np.full((4, len(height)), np.nan)
+        apex = np.full(len(height), np.nan)
+        state = np.stack([np.zeros_like(height), height, horizontal, vertical])
+        active = np.arange(len(height))
+        # Drag shortens the climb, but may lengthen the fall from a height
+        horizon = max(float(np.max(self.flight_time({'gravity': gravity, 'height': height}, vertical))), 1e-3)
+        start, step, extensions, stretches = 0.0, None, 0, []
+        while len(active):
+            def derivative(t, state, gravity=gravity[active], drag=drag[active]):
+                speed = np.hypot(state[2], state[3])
+                return np.stack([state[2], state[3], -drag * speed * state[2],
+                                 -gravity - drag * speed * state[3]])
+
+            solution = dormand_prince(derivative, state, (start, horizon), RTOL, ATOL, first_step=step,
+                                      max_steps=budget.allowance(len(active)), truncate=True)
+            budget.charge(solution.steps, len(active))
+            if keep:
+                stretches.append(solution)
+            peak = first_crossing(solution, lambda states: states[:, 3])
+            peaked = np.isnan(apex[active]) & ~np.isnan(peak)
+            apex[active[peaked]] = solution.at(np.where(peaked, peak, start))[1][peaked]
+            down = first_crossing(solution, lambda states: states[:, 1])
+            landed = ~np.isnan(down)
+            landing[active[landed]] = down[landed]
+            final[:, active[landed]] = solution.at(np.where(landed, down, start))[:, landed]
+
+            start, step = solution.t[-1], solution.next_step
+            state = solution.y[-1][:, ~landed]
+            active = active[~landed]
+            if start >= horizon:
+                extensions += 1
+                if extensions > MAX_EXTENSIONS:
+                    break
+                horizon *= 2
+        return landing, final, apex, stretches
+
+    def launches(self, values):
+        """The launch arrays of every grid point, flattened, and the grid shape"""
+        horizontal, vertical = self.components(values)
+        arrays = np.broadcast_arrays(horizontal, vertical, values['height'], values['gravity'], values['drag'])
+        return [np.ravel(array).astype(float) for array in arrays], arrays[0].shape
+
+    def evaluate(self, values):
+        if np.any(values['drag'] > 0):
+            return self.evaluate_with_drag(values)
+        horizontal, vertical = self.components(values)
+        gravity = values['gravity']
+        time = self.flight_time(values, vertical)
+        final_vertical = vertical - gravity * time
+        return {
+            'flight_time': time,
+            'range': horizontal * time,
+            'max_height': values['height'] + np.maximum(vertical, 0) ** 2 / (2 * gravity),
+            'impact_speed': np.hypot(horizontal, final_vertical),
+            'impact_angle': np.degrees(np.arctan2(-final_vertical, horizontal)),
+        }
+
+    def evaluate_with_drag(self, values):
+        launches, shape = self.launches(values)
+        outputs = {name: np.empty(launches[0].size) for name in self.outputs}
+        budget = Budget()
+        for start in range(0, launches[0].size, CHUNK):
+            chunk = slice(start, start + CHUNK)
+            landing, final, apex, _ = self.trajectories(*(array[chunk] for array in launches), budget)
+            outputs['flight_time'][chunk] = landing
+            outputs['range'][chunk] = final[0]
+            outputs['max_height'][chunk] = apex
+            outputs['impact_speed'][chunk] = np.hypot(final[2], final[3])
+            outputs['impact_angle'][chunk] = np.degrees(np.arctan2(-final[3], final[2]))
+        return {name: output.reshape(shape) for name, output in outputs.items()}
+
+    def series(self, values, samples):
+        if values['drag'] > 0:
+            (landing,), _, _, stretches = self.trajectories(*self.launches(values)[0], Budget(), keep=True)
+            # A launch that never lands is drawn as far as it was integrated
+            time = np.linspace(0, stretches[-1].t[-1] if np.isnan(landing) else landing, samples)
+            states = np.empty((samples, 4))
+            for solution in stretches:
+                inside = (time >= solution.t[0]) & (time <= solution.t[-1])
+                states[inside] = solution(time[inside])[:, :, 0]
+            return {'t': time, 'x': states[:, 0], 'y': states[:, 1]}
+        horizontal, vertical = self.components(values)
+        time = np.linspace(0, self.flight_time(values, vertical), samples)
+        return {
+            't': time,
+            'x': horizontal * time,
+            'y': values['height'] + vertical * time - values['gravity'] * time ** 2 / 2,
+        }
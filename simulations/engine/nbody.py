@@ -0,0 +1,404 @@
+"""
+Gravitational N-body systems: star clusters and asteroid belts.
+
+Forces come from one of two methods, chosen by the number of bodies:
+
+* ``direct_field`` sums over every pair, in blocks of rows so memory stays
+  bounded. It is exact and costs O(n²), but it is pure array arithmetic,
+  so it wins for small systems.
+* ``Tree`` is a Barnes-Hut octree (a quadtree in 2-D) costing O(n log n).
+  Bodies are sorted by Morton key, so every cell is a contiguous run of the
+  sorted bodies and each level of the tree comes from the key prefixes
+  without recursion. The walk is vectorised as well: runs of ``GROUP``
+  bodies adjacent in key order walk together, keeping a frontier of
+  (group, cell) pairs; a cell acts as a point mass on the group when its
+  size over its distance is below the opening angle ``theta``, near leaves
+  act body by body, and every other pair is replaced by the group and the
+  cell's children. Pulls are computed as dense pairs x ``GROUP`` blocks.
+
+``CROSSOVER`` is where the tree starts to pay off; the ``nbody_benchmark``
+command measures it. Units are N-body units with G = 1.
+
+A request is charged the pair interactions its force evaluations cost:
+n² for the direct sum, and for the tree n log₂ n times a term that grows as
+1 / theta³, since a small opening angle opens nearly every cell. The
+constants are fitted to timings of ``field`` on a uniform cluster.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from . import MAX_POINTS, MAX_SERIES, Kernel, Parameter, register
+from .integrators import leapfrog
+
+DEPTH = 16
+# Bodies from which the tree is faster than the direct sum, see nbody_benchmark
+CROSSOVER = 1000
+# Bodies of the groups that walk the tree together
+GROUP = 16
+# Group-source pairs evaluated at once by the tree walk
+PAIR_BLOCK = 1 << 12
+# Pairs evaluated at once by the direct sum
+DIRECT_BLOCK = 1 << 20
+# Pair interactions one request may evaluate, a few seconds of work
+PAIR_BUDGET = 200_000_000
+# Tree cost per body and level in direct-sum pairs: TREE_OVERHEAD + TREE_OPENING / theta³
+TREE_OVERHEAD = 200
+TREE_OPENING = 10
+
+
+def interactions(bodies, theta):
+    """Estimated cost of one force evaluation, in direct-sum pair interactions"""
+    if bodies < CROSSOVER:
+        return bodies ** 2
+    return bodies * np.log2(bodies) * (TREE_OVERHEAD + TREE_OPENING / theta ** 3)
+
+
+def add_pull(accelerations, potentials, slots, groups, positions, masses, softening, sources=None):
+    """
+    Add the pull of point ``masses`` at ``positions`` on every slot of
+    ``groups``, which must be sorted. ``sources`` are the bodies the masses
+    are, so a body does not pull itself.
+    """
+    if not len(groups):
+        return
+    delta = positions[:, :, None] - slots[:, groups, :]
+    inverse = np.einsum('ijk,ijk->jk', delta, delta)
+    inverse += softening ** 2
+    with np.errstate(divide='ignore'):
+        np.divide(1, np.sqrt(inverse, out=inverse), out=inverse)
+    if sources is not None:
+        inverse[sources[:, None] == groups[:, None] * GROUP + np.arange(GROUP)] = 0
+    weight = masses[:, None] * inverse
+    first = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    targets = groups[first]
+    potentials[targets] -= np.add.reduceat(weight, first, axis=0)
+    inverse *= inverse
+    weight *= inverse
+    with np.errstate(invalid='ignore'):
+        delta *= weight
+    accelerations[:, targets] += np.add.reduceat(delta, first, axis=1)
+
+
+def direct_field(positions, masses, softening=0.0):
+    """
+    ``(accelerations, potentials)`` of bodies at ``positions`` (dimensions x
+    bodies) from every other body
+    """
+    dimensions, size = positions.shape
+    accelerations = np.zeros((dimensions, size))
+    potentials = np.zeros(size)
+    rows = max(1, DIRECT_BLOCK // max(size, 1))
+    for start in range(0, size, rows):
+        block = np.arange(start, min(start + rows, size))
+        delta = positions[:, None, :] - positions[:, block, None]
+        r2 = np.einsum('ijk,ijk->jk', delta, delta) + softening ** 2
+        with np.errstate(divide='ignore'):
+            inverse = 1 / np.sqrt(r2)
+        inverse[np.arange(len(block)), block] = 0
+        weighted = masses * inverse
+        potentials[block] = -weighted.sum(axis=1)
+        accelerations[:, block] = np.einsum('ijk,jk->ij', delta, weighted * inverse ** 2)
+    return accelerations, potentials
+
+
+def morton(cells, depth):
+    """Interleave the bits of integer cell coordinates (dimensions x bodies) into one key per body"""
+    keys = np.zeros(cells.shape[1], dtype=np.int64)
+    for bit in range(depth):
+        for axis in range(len(cells)):
+            keys |= ((cells[axis] >> bit) & 1) << (bit * len(cells) + axis)
+    return keys
+
+
+def expand(counts):
+    """For groups of ``counts``, the group of every member and its offset within the group"""
+    group = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(len(group)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return group, offsets
+
+
+class Tree:
+    """A Barnes-Hut tree of bodies, its cells held as flat arrays"""
+
+    def __init__(self, positions, masses, depth=DEPTH):
+        dimensions, size = positions.shape
+        low = positions.min(axis=1)
+        width = max(float((positions.max(axis=1) - low).max()), 1e-12) * (1 + 1e-9)
+        cells = np.minimum(((positions - low[:, None]) / width * (1 << depth)).astype(np.int64), (1 << depth) - 1)
+        keys = morton(cells, depth)
+        self.order = np.argsort(keys, kind='stable')
+        keys = keys[self.order]
+        self.positions = positions[:, self.order]
+        self.masses = masses[self.order]
+
+        starts, levels, parents = [np.zeros(1, dtype=np.int64)], [0], [np.zeros(0, dtype=np.int64)]
+        counts = [np.array([size])]
+        for level in range(1, depth + 1):
+            if not (counts[-1] > 1).any():
+                break
+            prefix = keys >> (dimensions * (depth - level))
+            level_starts = np.flatnonzero(np.r_[True, prefix[1:] != prefix[:-1]])
+            parent = np.searchsorted(starts[-1], level_starts, side='right') - 1
+            # Single bodies are leaves already; only crowded cells are split
+            kept = parent >= 0
+            kept[kept] = (counts[-1][parent[kept]] > 1) & (
+                level_starts[kept] < starts[-1][parent[kept]] + counts[-1][parent[kept]]
+            )
+            level_starts, parent = level_starts[kept], parent[kept]
+            level_ends = np.r_[level_starts[1:], size]
+            # The last child of a parent ends where its parent does
+            parent_ends = starts[-1][parent] + counts[-1][parent]
+            counts.append(np.minimum(level_ends, parent_ends) - level_starts)
+            starts.append(level_starts)
+            levels.append(level)
+            parents.append(parent)
+
+        offsets = np.cumsum([0] + [len(level_starts) for level_starts in starts])
+        self.start = np.concatenate(starts)
+        self.count = np.concatenate(counts)
+        self.size = np.concatenate([
+            np.full(len(level_starts), width / (1 << level)) for level, level_starts in zip(levels, starts)
+        ])
+        self.child_count = np.zeros(len(self.start), dtype=np.int64)
+        self.child_first = np.zeros(len(self.start), dtype=np.int64)
+        for index in range(1, len(starts)):
+            children = np.bincount(parents[index], minlength=len(starts[index - 1]))
+            self.child_count[offsets[index - 1]:offsets[index]] = children
+            self.child_first[offsets[index - 1]:offsets[index]] = offsets[index] + np.cumsum(children) - children
+        self.leaf = self.child_count == 0
+
+        # Cells are runs of the sorted bodies, so their sums are differences of prefix sums
+        end = self.start + self.count
+        mass = np.r_[0, np.cumsum(self.masses)]
+        weighted = np.pad(np.cumsum(self.masses * self.positions, axis=1), ((0, 0), (1, 0)))
+        summed = np.pad(np.cumsum(self.positions, axis=1), ((0, 0), (1, 0)))
+        self.mass = mass[end] - mass[self.start]
+        weighted = weighted[:, end] - weighted[:, self.start]
+        centroid = (summed[:, end] - summed[:, self.start]) / self.count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.centre = np.where(self.mass > 0, weighted / self.mass, centroid)
+        # How far each centre of mass sits from its cell's geometric centre
+        level = np.concatenate([np.full(len(level_starts), level) for level, level_starts in zip(levels, starts)])
+        corner = cells[:, self.order][:, self.start] >> (depth - level)
+        self.offset = np.linalg.norm(self.centre - (low[:, None] + (corner + 0.5) * self.size), axis=0)
+
+    def __len__(self):
+        return len(self.start)
+
+    def field(self, theta=0.5, softening=0.0):
+        """
+        ``(accelerations, potentials)`` of every body, in the original order.
+        Runs of ``GROUP`` bodies in key order walk the tree together: a cell
+        is a point mass for the whole group when its size is below ``theta``
+        times its distance from the group's bounding sphere, less how far
+        its centre of mass is off centre (Barnes' modified criterion, which
+        keeps a heavy body near a cell's edge from being lumped in early).
+        """
+        dimensions, size = self.positions.shape
+        count = -(-size // GROUP)
+        padding = count * GROUP - size
+        # Padding slots repeat the last body; their results are dropped
+        slots = np.pad(self.positions, ((0, 0), (0, padding)), mode='edge').reshape(dimensions, count, GROUP)
+        low, high = slots.min(axis=2), slots.max(axis=2)
+        group_centre = (low + high) / 2
+        group_radius = np.sqrt(((high - low) ** 2).sum(axis=0)) / 2
+        accelerations = np.zeros((dimensions, count, GROUP))
+        potentials = np.zeros((count, GROUP))
+
+        def pull(groups, positions, masses, sources=None):
+            for block in range(0, len(groups), PAIR_BLOCK):
+                part = slice(block, block + PAIR_BLOCK)
+                add_pull(accelerations, potentials, slots, groups[part], positions[:, part], masses[part],
+                         softening, None if sources is None else sources[part])
+
+        groups = np.arange(count)
+        cells = np.zeros(count, dtype=np.int64)
+        while groups.size:
+            offset = self.centre[:, cells] - group_centre[:, groups]
+            distance = np.sqrt(np.einsum('ij,ij->j', offset, offset)) - group_radius[groups]
+            far = self.size[cells] < theta * (distance - self.offset[cells])
+            pull(groups[far], self.centre[:, cells[far]], self.mass[cells[far]])
+
+            # Near leaves pull body by body
+            leaf = self.leaf[cells] & ~far
+            pair, index = expand(self.count[cells[leaf]])
+            sources = self.start[cells[leaf]][pair] + index
+            pull(groups[leaf][pair], self.positions[:, sources], self.masses[sources], sources)
+
+            opened = ~far & ~self.leaf[cells]
+            pair, index = expand(self.child_count[cells[opened]])
+            groups = groups[opened][pair]
+            cells = self.child_first[cells[opened]][pair] + index
+
+        result = np.empty((dimensions, size)), np.empty(size)
+        result[0][:, self.order] = accelerations.reshape(dimensions, -1)[:, :size]
+        result[1][self.order] = potentials.reshape(-1)[:size]
+        return result
+
+
+def field(positions, masses, theta=0.5, softening=0.0, crossover=CROSSOVER):
+    """``(accelerations, potentials)``: the direct sum below ``crossover`` bodies, the tree from it"""
+    if positions.shape[1] < crossover:
+        return direct_field(positions, masses, softening)
+    return Tree(positions, masses).field(theta, softening)
+
+
+def cluster(bodies, mass, radius, virial_ratio, softening, rng):
+    """Equal masses spread uniformly through a sphere, velocities scaled to ``virial_ratio``"""
+    direction = rng.normal(size=(3, bodies))
+    direction /= np.linalg.norm(direction, axis=0)
+    positions = direction * radius * rng.random(bodies) ** (1 / 3)
+    masses = np.full(bodies, mass / bodies)
+    velocities = rng.normal(size=(3, bodies))
+    _, potentials = field(positions, masses, softening=softening)
+    potential_energy = masses @ potentials / 2
+    kinetic_energy = masses @ (velocities ** 2).sum(axis=0) / 2
+    if kinetic_energy > 0:
+        velocities *= np.sqrt(virial_ratio * -potential_energy / kinetic_energy)
+    return positions, velocities, masses
+
+
+def belt(bodies, mass, radius, central_share, rng):
+    """A central star holding ``central_share`` of the mass, the rest on circular orbits in a thin disc"""
+    distance = radius * (0.5 + 0.5 * rng.random(bodies - 1))
+    angle = 2 * np.pi * rng.random(bodies - 1)
+    height = 0.01 * radius * rng.normal(size=bodies - 1)
+    speed = np.sqrt(central_share * mass / distance)
+    positions = np.zeros((3, bodies))
+    velocities = np.zeros((3, bodies))
+    positions[:, 1:] = distance * np.cos(angle), distance * np.sin(angle), height
+    velocities[:2, 1:] = -speed * np.sin(angle), speed * np.cos(angle)
+    masses = np.r_[central_share * mass, np.full(bodies - 1, (1 - central_share) * mass / (bodies - 1))]
+    return positions, velocities, masses
+
+
+def centre(positions, velocities, masses):
+    """Move to the centre-of-mass frame"""
+    total = masses.sum()
+    positions -= (positions @ masses / total)[:, None]
+    velocities -= (velocities @ masses / total)[:, None]
+
+
+def energies(positions, velocities, masses, theta, softening):
+    """``(kinetic, potential, specific energy of every body)``"""
+    _, potentials = field(positions, masses, theta, softening)
+    speed2 = (velocities ** 2).sum(axis=0)
+    return masses @ speed2 / 2, masses @ potentials / 2, speed2 / 2 + potentials
+
+
+def half_mass_radius(positions, masses):
+    distance = np.linalg.norm(positions - (positions @ masses / masses.sum())[:, None], axis=0)
+    order = np.argsort(distance)
+    enclosed = np.cumsum(masses[order])
+    return float(distance[order][np.searchsorted(enclosed, enclosed[-1] / 2)])
+
+
+@lru_cache(maxsize=4)
+def simulate(bodies, mass, radius, central_mass, virial_ratio, duration, time_step, theta, softening, seed):
+    """
+    Integrate one system by leapfrog; returns its outputs and snapshots of
+    the bodies' positions, ``(frames, 3, bodies)`` at evenly spaced times
+    """
+    rng = np.random.default_rng(seed)
+    if central_mass > 0:
+        positions, velocities, masses = belt(bodies, mass, radius, central_mass, rng)
+    else:
+        positions, velocities, masses = cluster(bodies, mass, radius, virial_ratio, softening, rng)
+    centre(positions, velocities, masses)
+    kinetic, potential, _ = energies(positions, velocities, masses, theta, softening)
+
+    solution = leapfrog(lambda t, x: field(x, masses, theta, softening)[0],
+                        positions, velocities, (0, duration), time_step)
+    final_kinetic, final_potential, specific = energies(
+        solution.y[-1, 0], solution.y[-1, 1], masses, theta, softening,
+    )
+    # The central star of a belt cannot escape itself
+    movers = slice(1, None) if central_mass > 0 else slice(None)
+    outputs = {
+        'energy_error': abs((final_kinetic + final_potential) / (kinetic + potential) - 1),
+        'kinetic_energy': final_kinetic,
+        'potential_energy': final_potential,
+        'virial_ratio': final_kinetic / -final_potential,
+        'half_mass_radius': half_mass_radius(solution.y[-1, 0], masses),
+        'escaped_fraction': float(np.mean(specific[movers] > 0)),
+    }
+    frames = max(2, min(MAX_SERIES, MAX_POINTS // bodies))
+    times = np.linspace(0, duration, frames)
+    return outputs, times, solution(times)[:, 0]
+
+
+def snapshots(times, positions, samples):
+    """At most ``samples`` evenly spread frames of a simulation as series"""
+    frames = np.unique(np.linspace(0, len(times) - 1, min(samples, len(times))).round().astype(int))
+    return {'t': times[frames], 'x': positions[frames, 0], 'y': positions[frames, 1], 'z': positions[frames, 2]}
+
+
+@register
+class NBodyKernel(Kernel):
+    simulation_type = 'motion'
+    name = 'nbody'
+    parameters = {
+        'bodies': Parameter(500.0, 2.0, 10_000.0, ''),
+        'mass': Parameter(1.0, 1e-6, 1e6, 'M'),
+        'radius': Parameter(1.0, 1e-3, 1e3, 'R'),
+        # Share of the mass in a central star; 0 for a star cluster
+        'central_mass': Parameter(0.0, 0.0, 0.999, ''),
+        'virial_ratio': Parameter(0.5, 0.0, 2.0, ''),
+        'duration': Parameter(1.0, 1e-3, 1e3, 'T'),
+        'time_step': Parameter(0.01, 1e-4, 1.0, 'T'),
+        # Below 0.2 the tree opens nearly every cell and costs more than the direct sum
+        'theta': Parameter(0.5, 0.2, 1.5, ''),
+        # Coincident bodies need some softening to have a finite pull
+        'softening': Parameter(0.01, 1e-3, 1.0, 'R'),
+        'seed': Parameter(0.0, 0.0, 2.0 ** 31, ''),
+    }
+    outputs = {
+        'energy_error': '',
+        'kinetic_energy': 'E',
+        'potential_energy': 'E',
+        'virial_ratio': '',
+        'half_mass_radius': 'R',
+        'escaped_fraction': '',
+    }
+
+    def systems(self, values):
+        """The settings of every grid point as ``simulate`` arguments, and the grid shape"""
+        arrays = np.broadcast_arrays(*(values[name] for name in self.parameters))
+        shape = arrays[0].shape
+        total = 0
+        systems = []
+        for index in np.ndindex(shape):
+            settings = [float(array[index]) for array in arrays]
+            settings[0] = int(round(settings[0]))
+            settings[-1] = int(settings[-1])
+            # A field per step, and the energies at the start and the end
+            evaluations = int(np.ceil(settings[5] / settings[6])) + 2
+            total += evaluations * interactions(settings[0], settings[7])
+            systems.append(tuple(settings))
+        if total > PAIR_BUDGET:
+            raise ValueError(f'At most {PAIR_BUDGET:.0e} pair interactions per request: '
+                             'use fewer bodies, fewer steps or a larger theta')
+        return systems, shape
+
+    def evaluate(self, values):
+        return self.evaluate_points(values, (), None)[0]
+
+    def evaluate_points(self, values, points, samples):
+        """Every system is simulated once, for both its outputs and its snapshots"""
+        systems, shape = self.systems(values)
+        outputs = {name: np.empty(len(systems)) for name in self.outputs}
+        series = []
+        for index, settings in enumerate(systems):
+            results, times, positions = simulate(*settings)
+            for name, value in results.items():
+                outputs[name][index] = value
+            if points:
+                series.append(snapshots(times, positions, samples))
+        return {name: output.reshape(shape) for name, output in outputs.items()}, series
+
+    def series(self, values, samples):
+        (settings,), _ = self.systems(values)
+        _, times, positions = simulate(*settings)
+        return snapshots(times, positions, samples)
+
@@ -0,0 +1,42 @@
+"""A thin lens, and refraction at a boundary (Snell's law)"""
+import numpy as np
+
+from . import Kernel, Parameter, register
+
+
+@register
+class LensKernel(Kernel):
+    simulation_type = 'optics'
+    parameters = {
+        'focal_length': Parameter(10.0, -1e4, 1e4, 'cm'),
+        'object_distance': Parameter(30.0, 0.01, 1e5, 'cm'),
+        'object_height': Parameter(2.0, 0.0, 1e4, 'cm'),
+        'incidence_angle': Parameter(30.0, 0.0, 90.0, '°'),
+        'n1': Parameter(1.0, 1.0, 5.0, ''),
+        'n2': Parameter(1.5, 1.0, 5.0, ''),
+    }
+    outputs = {
+        # Real images have positive image distances
+        'image_distance': 'cm',
+        'magnification': '',
+        'image_height': 'cm',
+        'refraction_angle': '°',
+        'critical_angle': '°',
+    }
+
+    def evaluate(self, values):
+        focal_length = values['focal_length']
+        distance = values['object_distance']
+        # 1/f = 1/u + 1/v; an object at the focus makes no image
+        image = np.where(distance == focal_length, np.inf, focal_length * distance / (distance - focal_length))
+        magnification = -image / distance
+        ratio = values['n1'] / values['n2']
+        sine = ratio * np.sin(np.radians(values['incidence_angle']))
+        return {
+            'image_distance': image,
+            'magnification': magnification,
+            'image_height': magnification * values['object_height'],
+            # Not finite under total internal reflection
+            'refraction_angle': np.degrees(np.where(sine <= 1, np.arcsin(np.minimum(sine, 1)), np.nan)),
+            'critical_angle': np.degrees(np.where(ratio > 1, np.arcsin(1 / np.maximum(ratio, 1)), np.nan)),
+        }
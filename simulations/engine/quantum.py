@@ -0,0 +1,41 @@
+"""The photoelectric effect"""
+import numpy as np
+
+from . import Kernel, Parameter, register
+
+PLANCK = 6.62607015e-34
+ELECTRON_VOLT = 1.602176634e-19
+ELECTRON_MASS = 9.1093837015e-31
+# h c in eV nm
+HC = 1239.841984
+
+
+@register
+class PhotoelectricKernel(Kernel):
+    simulation_type = 'quantum'
+    parameters = {
+        'wavelength': Parameter(400.0, 1.0, 1e5, 'nm'),
+        'work_function': Parameter(2.3, 0.0, 20.0, 'eV'),
+    }
+    outputs = {
+        'photon_energy': 'eV',
+        'frequency': 'Hz',
+        'max_kinetic_energy': 'eV',
+        'stopping_potential': 'V',
+        'threshold_wavelength': 'nm',
+        'electron_wavelength': 'nm',
+    }
+
+    def evaluate(self, values):
+        energy = HC / values['wavelength']
+        kinetic = np.maximum(energy - values['work_function'], 0)
+        momentum = np.sqrt(2 * ELECTRON_MASS * kinetic * ELECTRON_VOLT)
+        return {
+            'photon_energy': energy,
+            'frequency': energy * ELECTRON_VOLT / PLANCK,
+            'max_kinetic_energy': kinetic,
+            'stopping_potential': kinetic,
+            'threshold_wavelength': HC / values['work_function'],
+            # No electrons are emitted below the threshold
+            'electron_wavelength': np.where(kinetic > 0, PLANCK / momentum * 1e9, np.nan),
+        }
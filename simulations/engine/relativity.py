@@ -0,0 +1,38 @@
+"""Special relativity: time dilation, length contraction and energy"""
+import numpy as np
+
+from . import Kernel, Parameter, register
+
+LIGHT_SPEED = 299792458.0
+
+
+@register
+class SpecialRelativityKernel(Kernel):
+    simulation_type = 'relativity'
+    parameters = {
+        'beta': Parameter(0.5, 0.0, 0.999999, 'c'),
+        'proper_time': Parameter(1.0, 0.0, 1e12, 's'),
+        'proper_length': Parameter(1.0, 0.0, 1e12, 'm'),
+        'rest_mass': Parameter(1.0, 0.0, 1e30, 'kg'),
+    }
+    outputs = {
+        'gamma': '',
+        'dilated_time': 's',
+        'contracted_length': 'm',
+        'momentum': 'kg m/s',
+        'total_energy': 'J',
+        'kinetic_energy': 'J',
+    }
+
+    def evaluate(self, values):
+        beta = values['beta']
+        gamma = 1 / np.sqrt(1 - beta ** 2)
+        rest_energy = values['rest_mass'] * LIGHT_SPEED ** 2
+        return {
+            'gamma': gamma,
+            'dilated_time': gamma * values['proper_time'],
+            'contracted_length': values['proper_length'] / gamma,
+            'momentum': gamma * values['rest_mass'] * beta * LIGHT_SPEED,
+            'total_energy': gamma * rest_energy,
+            'kinetic_energy': (gamma - 1) * rest_energy,
+        }
@@ -0,0 +1,34 @@
+"""An ideal monatomic gas"""
+import numpy as np
+
+from . import Kernel, Parameter, register
+
+GAS_CONSTANT = 8.314462618
+
+
+@register
+class IdealGasKernel(Kernel):
+    simulation_type = 'thermodynamics'
+    parameters = {
+        'moles': Parameter(1.0, 1e-6, 1e6, 'mol'),
+        'temperature': Parameter(300.0, 1e-3, 1e6, 'K'),
+        'volume': Parameter(22.4, 1e-6, 1e9, 'L'),
+        'molar_mass': Parameter(4.0, 1e-3, 1e4, 'g/mol'),
+    }
+    outputs = {
+        'pressure': 'Pa',
+        'internal_energy': 'J',
+        'rms_speed': 'm/s',
+        'density': 'kg/m³',
+    }
+
+    def evaluate(self, values):
+        volume = values['volume'] * 1e-3
+        molar_mass = values['molar_mass'] * 1e-3
+        thermal = values['moles'] * GAS_CONSTANT * values['temperature']
+        return {
+            'pressure': thermal / volume,
+            'internal_energy': 1.5 * thermal,
+            'rms_speed': np.sqrt(3 * GAS_CONSTANT * values['temperature'] / molar_mass),
+            'density': values['moles'] * molar_mass / volume,
+        }
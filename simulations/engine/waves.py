@@ -0,0 +1,45 @@
+"""A sinusoidal travelling wave"""
+import numpy as np
+
+from . import Kernel, Parameter, register
+
+
+@register
+class TravellingWaveKernel(Kernel):
+    simulation_type = 'waves'
+    parameters = {
+        'amplitude': Parameter(0.1, 0.0, 1e3, 'm'),
+        'frequency': Parameter(2.0, 1e-3, 1e9, 'Hz'),
+        'wave_speed': Parameter(340.0, 1e-3, 3e8, 'm/s'),
+        'position': Parameter(0.0, -1e6, 1e6, 'm'),
+        'time': Parameter(0.0, 0.0, 1e6, 's'),
+    }
+    outputs = {
+        'wavelength': 'm',
+        'period': 's',
+        'wavenumber': 'rad/m',
+        'angular_frequency': 'rad/s',
+        'displacement': 'm',
+        'max_particle_speed': 'm/s',
+    }
+
+    def displacement(self, values, position):
+        wavenumber = 2 * np.pi * values['frequency'] / values['wave_speed']
+        angular_frequency = 2 * np.pi * values['frequency']
+        return values['amplitude'] * np.sin(wavenumber * position - angular_frequency * values['time'])
+
+    def evaluate(self, values):
+        angular_frequency = 2 * np.pi * values['frequency']
+        return {
+            'wavelength': values['wave_speed'] / values['frequency'],
+            'period': 1 / values['frequency'],
+            'wavenumber': angular_frequency / values['wave_speed'],
+            'angular_frequency': angular_frequency,
+            'displacement': self.displacement(values, values['position']),
+            'max_particle_speed': values['amplitude'] * angular_frequency,
+        }
+
+    def series(self, values, samples):
+        wavelength = values['wave_speed'] / values['frequency']
+        position = values['position'] + np.linspace(0, 2 * wavelength, samples)
+        return {'x': position, 'displacement': self.displacement(values, position)}
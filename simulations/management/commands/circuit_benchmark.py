@@ -0,0 +1,65 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from simulations.engine import circuit
+
+
+def mesh(side):
+    """
+    A ``side`` x ``side`` grid of 1 kΩ resistors with 1 µF from every node
+    to ground, driven at one corner through 50 Ω and loaded at the other
+    """
+    lines = ['V1 in 0 5', 'RS in n0_0 50', f'RL n{side - 1}_{side - 1} 0 10k']
+    for row in range(side):
+        for column in range(side):
+            node = f'n{row}_{column}'
+            lines.append(f'C{row}_{column} {node} 0 1u')
+            if column + 1 < side:
+                lines.append(f'RH{row}_{column} {node} n{row}_{column + 1} 1k')
+            if row + 1 < side:
+                lines.append(f'RV{row}_{column} {node} n{row + 1}_{column} 1k')
+    return '\n'.join(lines)
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return time.perf_counter() - started, result
+
+
+class Command(BaseCommand):
+    help = 'Time the MNA circuit solver on a resistor-capacitor mesh: assembly, sweeps and transient steps'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--side', type=int, default=32, help='Nodes along each side of the mesh')
+        parser.add_argument('--sweep', type=int, default=50, help='Values of each swept component')
+        parser.add_argument('--steps', type=int, default=1000, help='Steps of the transient analysis')
+
+    def handle(self, *args, **options):
+        elements = circuit.parse(mesh(options['side']))
+        elapsed, system = timed(lambda: circuit.Circuit(elements))
+        defaults = np.array([parameter.default for parameter in system.parameters.values()])
+        entries = system.matrix(system.coefficients(defaults)).nnz
+        self.stdout.write(f'{len(elements)} elements, {system.size} unknowns, {entries} non-zeros; '
+                          f'assembled in {elapsed:.4f} s')
+        sweep = options['sweep']
+        names = list(system.parameters)
+
+        def run(swept, points, time=0.0, steps=0):
+            values = np.repeat(defaults[:, None], points, axis=1)
+            values[names.index(swept)] *= np.linspace(0.5, 1.5, points)
+            # A fresh circuit, so no factorisation is cached yet
+            fresh = circuit.Circuit(elements)
+            return timed(lambda: fresh.solve(values, np.full(points, time), np.full(points, steps)))[0]
+
+        for swept, reuse in (('V1', 'one factorisation'), ('RS', 'a factorisation each')):
+            elapsed = run(swept, sweep)
+            self.stdout.write(f'DC sweep of {sweep} {swept} values: {elapsed:.4f} s '
+                              f'({elapsed / sweep * 1e3:.2f} ms a point, {reuse})')
+        steps = options['steps']
+        elapsed = run('V1', 1, time=1e-3, steps=steps)
+        self.stdout.write(f'Transient of {steps} steps: {elapsed:.4f} s ({steps / elapsed:.0f} steps/s)')
+        elapsed = run('V1', sweep, time=1e-3, steps=steps)
+        self.stdout.write(f'Transient of {steps} steps for {sweep} V1 values at once: {elapsed:.4f} s')
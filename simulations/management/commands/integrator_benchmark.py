@@ -0,0 +1,74 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from simulations.engine import integrators
+
+PERIOD = 2 * np.pi
+
+
+def kepler_start(eccentricities):
+    """Orbits of semi-major axis 1 around GM = 1, starting at periapsis"""
+    position = np.stack([1 - eccentricities, np.zeros_like(eccentricities)])
+    velocity = np.stack([np.zeros_like(eccentricities), np.sqrt((1 + eccentricities) / (1 - eccentricities))])
+    return position, velocity
+
+
+def gravity(t, position):
+    return -position / np.sum(position ** 2, axis=0) ** 1.5
+
+
+def derivative(t, state):
+    return np.concatenate([state[2:], gravity(t, state[:2])])
+
+
+def energy(position, velocity):
+    return np.sum(velocity ** 2, axis=-2) / 2 - 1 / np.sqrt(np.sum(position ** 2, axis=-2))
+
+
+class Command(BaseCommand):
+    help = 'Compare the ODE integrators on a batch of Kepler orbits: speed and energy drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orbits', type=int, default=1000,
+                            help='Orbits integrated at once, eccentricities spread from 0 to --eccentricity')
+        parser.add_argument('--eccentricity', type=float, default=0.6,
+                            help='Largest eccentricity of the batch')
+        parser.add_argument('--periods', type=float, default=10,
+                            help='Orbital periods to integrate')
+        parser.add_argument('--dt', type=float, default=0.01,
+                            help='Step of the fixed-step integrators')
+        parser.add_argument('--rtol', type=float, default=1e-6,
+                            help='Relative tolerance of Dormand-Prince')
+        parser.add_argument('--atol', type=float, default=1e-9,
+                            help='Absolute tolerance of Dormand-Prince')
+
+    def handle(self, *args, **options):
+        eccentricities = np.linspace(0, options['eccentricity'], options['orbits'])
+        position, velocity = kepler_start(eccentricities)
+        start_energy = energy(position, velocity)
+        span = (0, options['periods'] * PERIOD)
+        runs = {
+            'rk4': lambda: integrators.rk4(derivative, np.concatenate([position, velocity]), span, options['dt']),
+            'leapfrog': lambda: integrators.leapfrog(gravity, position, velocity, span, options['dt']),
+            'dormand_prince': lambda: integrators.dormand_prince(
+                derivative, np.concatenate([position, velocity]), span, options['rtol'], options['atol'],
+            ),
+        }
+        self.stdout.write(
+            f'{options["orbits"]} orbits (e <= {options["eccentricity"]:g}) over {options["periods"]:g} periods'
+        )
+        self.stdout.write(f'{"integrator":<16}{"steps":>8}{"evals":>8}{"seconds":>10}'
+                          f'{"steps/s":>10}{"orbit-steps/s":>15}{"max |dE/E|":>12}{"final |dE/E|":>14}')
+        for name, run in runs.items():
+            started = time.perf_counter()
+            solution = run()
+            elapsed = time.perf_counter() - started
+            states = solution.y.reshape(len(solution.t), 4, -1)
+            drift = np.abs(energy(states[:, :2], states[:, 2:]) / start_energy - 1)
+            self.stdout.write(
+                f'{name:<16}{solution.steps:>8}{solution.evaluations:>8}{elapsed:>10.3f}'
+                f'{solution.steps / elapsed:>10.0f}{solution.steps * options["orbits"] / elapsed:>15.3g}'
+                f'{drift.max():>12.2e}{drift[-1].max():>14.2e}'
+            )
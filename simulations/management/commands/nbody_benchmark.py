@@ -0,0 +1,57 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from simulations.engine import nbody
+
+
+def best_of(repeat, function, *args):
+    """The fastest of ``repeat`` runs, with the result of the last"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+class Command(BaseCommand):
+    help = 'Time the Barnes-Hut tree against the direct sum to find where the tree pays off'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bodies', type=int, nargs='+', default=[250, 500, 1000, 2000, 4000, 8000, 16000],
+                            help='System sizes to time')
+        parser.add_argument('--system', choices=['cluster', 'belt'], default='cluster',
+                            help='A uniform star cluster, or a central star with a thin belt')
+        parser.add_argument('--theta', type=float, default=0.5, help='Opening angle of the tree')
+        parser.add_argument('--softening', type=float, default=0.01)
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per method; the fastest counts')
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        self.stdout.write(f'{options["system"]}, theta {options["theta"]:g}, '
+                          f'current crossover {nbody.CROSSOVER} bodies')
+        self.stdout.write(f'{"bodies":>8}{"direct s":>11}{"tree s":>10}{"speedup":>9}'
+                          f'{"median err":>12}{"p99 err":>10}')
+        crossover = None
+        for bodies in sorted(options['bodies']):
+            if options['system'] == 'belt':
+                positions, _, masses = nbody.belt(bodies, 1.0, 1.0, 0.9, rng)
+            else:
+                positions, _, masses = nbody.cluster(bodies, 1.0, 1.0, 0.5, options['softening'], rng)
+            direct_time, (exact, _) = best_of(options['repeat'], nbody.direct_field,
+                                              positions, masses, options['softening'])
+            tree_time, (approximate, _) = best_of(
+                options['repeat'], lambda: nbody.Tree(positions, masses).field(options['theta'], options['softening'])
+            )
+            # Relative to each body's pull; the few bodies whose pulls cancel sit beyond p99
+            error = np.linalg.norm(approximate - exact, axis=0) / np.linalg.norm(exact, axis=0)
+            if crossover is None and tree_time < direct_time:
+                crossover = bodies
+            self.stdout.write(f'{bodies:>8}{direct_time:>11.4f}{tree_time:>10.4f}{direct_time / tree_time:>9.2f}'
+                              f'{np.median(error):>12.2e}{np.percentile(error, 99):>10.2e}')
+        if crossover is None:
+            self.stdout.write(self.style.WARNING('The direct sum was faster at every size'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'The tree is faster from {crossover} bodies'))
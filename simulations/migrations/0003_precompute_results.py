@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulations', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='simulation',
+            name='precompute_results',
+            field=models.BooleanField(default=False, help_text="Compute every point of the stepped parameters' grid when published"),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulations', '0003_precompute_results'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='simulation',
+            name='kernel',
+            field=models.CharField(blank=True, help_text='Server-side engine of the simulation type, e.g. nbody; blank for its default', max_length=30),
+        ),
+    ]
@@ -1,8 +1,10 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 from topics.models import PhysicsTopic
+from . import engine
 
 
 class Simulation(models.Model):
@@ -16,11 +18,19 @@ class Simulation(models.Model):
         ('quantum', 'Quantum Physics'),
         ('relativity', 'Relativity'),
     ]
+    # Engines other than the default of a simulation type, see simulations.engine
+    KERNELS = [
+        ('', 'Default'),
+        ('nbody', 'N-body (motion)'),
+        ('circuit', 'Circuit (electricity)'),
+    ]
     
     topic = models.ForeignKey(PhysicsTopic, on_delete=models.CASCADE, related_name='simulations')
     title = models.CharField(max_length=200)
     description = models.TextField()
     simulation_type = models.CharField(max_length=20, choices=SIMULATION_TYPES)
+    kernel = models.CharField(max_length=30, blank=True, choices=KERNELS,
+                              help_text="Server-side engine of the simulation type, e.g. nbody; blank for its default")
     html_content = models.TextField(help_text="HTML/JavaScript simulation code")
     css_content = models.TextField(blank=True, help_text="Custom CSS for simulation")
     js_content = models.TextField(blank=True, help_text="JavaScript code for simulation")
@@ -36,6 +46,9 @@ class Simulation(models.Model):
     estimated_duration = models.PositiveIntegerField(help_text="Estimated time in minutes", default=10)
     order = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
+    precompute_results = models.BooleanField(
+        default=False, help_text="Compute every point of the stepped parameters' grid when published"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -44,6 +57,10 @@ class Simulation(models.Model):
     
     def __str__(self):
         return f"{self.topic.title} - {self.title}"
+    
+    def clean(self):
+        if self.kernel and (self.simulation_type, self.kernel) not in engine.KERNELS:
+            raise ValidationError({'kernel': f"No {self.kernel} engine for {self.get_simulation_type_display()}"})
 
 
 class SimulationParameter(models.Model):
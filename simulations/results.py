@@ -0,0 +1,231 @@
+"""
+Cache of computed simulation results.
+
+Results are kept as the encoded JSON bodies the compute view returns, in a
+process-local LRU bounded by ``SIMULATION_CACHE_BYTES`` of body size rather
+than by entry count, since a swept grid can be thousands of times larger
+than a single point. Keys are ``(simulation id, version, series samples,
+digest of the parameter vector)``: the version is the simulation's
+``updated_at``, which editing the simulation or any of its parameter rows
+moves on, and the vector holds every parameter's values after snapping to
+its step, so slider positions that round to the same values share an entry.
+
+A simulation with ``precompute_results`` set has every point of its stepped
+parameters' grid computed in one vectorised pass when it is published, as
+long as the grid has at most ``PRECOMPUTE_POINTS`` points. Each other worker
+process warms its own cache in a background thread the first time it serves
+such a simulation at a new version; requests meanwhile compute their own
+points.
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from . import engine
+from .models import Simulation
+
+logger = logging.getLogger(__name__)
+
+PRECOMPUTE_POINTS = 1000
+SETTINGS_TIMEOUT = 60 * 60 * 24
+
+
+class ResultCache:
+    """An LRU of encoded results holding at most ``max_bytes`` of them"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def set(self, key, body):
+        """Store ``body``, evicting the least recently used; too large a body is not kept"""
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.size, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+# (simulation id, version) already precomputed by this process
+_warmed = set()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(settings.SIMULATION_CACHE_BYTES)
+        return _cache
+
+
+def reset():
+    """Empty this process's result cache and forget what it has warmed"""
+    get_cache().clear()
+    _warmed.clear()
+
+
+def version_of(simulation):
+    return simulation.updated_at.timestamp() if simulation.updated_at else 0
+
+
+def settings_key(simulation_id, version):
+    return f'simulation-settings:{simulation_id}:{version}'
+
+
+def get_settings(simulation):
+    """The engine settings of ``simulation`` at its current version"""
+    key = settings_key(simulation.id, version_of(simulation))
+    parameter_settings = cache.get(key)
+    if parameter_settings is None:
+        parameter_settings = engine.settings_of(
+            engine.kernel_of(simulation), simulation,
+            simulation.parameters_list.values_list('name', 'default_value', 'min_value', 'max_value', 'step'),
+        )
+        cache.set(key, parameter_settings, SETTINGS_TIMEOUT)
+    return parameter_settings
+
+
+def digest(chosen):
+    """A stable digest of the values of every parameter"""
+    text = ';'.join(
+        f'{name}=' + ','.join(f'{value:.12g}' for value in chosen[name]) for name in sorted(chosen)
+    )
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def result_key(simulation, chosen, samples):
+    return (simulation.id, version_of(simulation), engine.series_samples(samples), digest(chosen))
+
+
+def encode(simulation, result):
+    return json.dumps({'success': True, 'simulation_id': simulation.id, **result}).encode()
+
+
+def get_result(simulation, requested, samples=engine.SERIES_SAMPLES):
+    """
+    The encoded compute result of ``simulation`` for ``requested`` values,
+    from the cache or computed and stored. Raises ValueError for a bad
+    request.
+    """
+    kernel = engine.kernel_of(simulation)
+    chosen = engine.choose(get_settings(simulation), requested)
+    if simulation.precompute_results:
+        warm_in_background(simulation)
+    results = get_cache()
+    key = result_key(simulation, chosen, samples)
+    body = results.get(key)
+    if body is None:
+        body = encode(simulation, engine.compute(kernel, chosen, samples))
+        results.set(key, body)
+    return body
+
+
+def precompute(simulation, limit=PRECOMPUTE_POINTS):
+    """
+    Cache the result of every point of the grid spanned by the simulation's
+    stepped parameters, the others at their defaults. Returns the number of
+    points cached, 0 when the grid has more than ``limit``.
+    """
+    _warmed.add((simulation.id, version_of(simulation)))
+    try:
+        parameter_settings = get_settings(simulation)
+    except ValueError as error:
+        # A kernel that cannot read the simulation, e.g. a malformed circuit; requests report why
+        logger.warning('Not precomputing simulation %s (%s engine %r): %s', simulation.id,
+                       simulation.simulation_type, simulation.kernel, error)
+        return 0
+    positions = {
+        name: int(np.floor((maximum - minimum) / step + 1e-9)) + 1
+        for name, (_, minimum, maximum, step) in parameter_settings.items() if step
+    }
+    if int(np.prod(list(positions.values()), dtype=np.int64)) > limit:
+        return 0
+    chosen = {
+        name: minimum + np.arange(positions[name]) * step if name in positions else np.array([default], dtype=float)
+        for name, (default, minimum, maximum, step) in parameter_settings.items()
+    }
+    kernel = engine.kernel_of(simulation)
+    results = get_cache()
+    count = 0
+    try:
+        for point, result in engine.compute_points(kernel, chosen, limit=limit):
+            results.set(result_key(simulation, point, engine.SERIES_SAMPLES), encode(simulation, result))
+            count += 1
+    except ValueError as error:
+        # Beyond what the kernel computes per request; points are computed when asked for
+        logger.warning('Stopped precomputing simulation %s (%s engine %r) after %d points of %s: %s',
+                       simulation.id, simulation.simulation_type, simulation.kernel, count,
+                       {name: values.size for name, values in chosen.items()}, error)
+    return count
+
+
+def warm_in_background(simulation):
+    """Precompute ``simulation`` in a background thread, once per version and process"""
+    key = (simulation.id, version_of(simulation))
+    with _cache_lock:
+        if key in _warmed:
+            return
+        _warmed.add(key)
+    threading.Thread(target=_warm, args=(simulation,), name='simulation-precompute', daemon=True).start()
+
+
+def _warm(simulation):
+    try:
+        precompute(simulation)
+    except Exception:
+        logger.exception('Precomputing simulation %s failed', simulation.id)
+    finally:
+        close_old_connections()
+
+
+def warm(simulation_id):
+    """Precompute the results of an active simulation that asks for it"""
+    simulation = Simulation.objects.filter(id=simulation_id, is_active=True, precompute_results=True).first()
+    if simulation is not None:
+        precompute(simulation)
@@ -0,0 +1,23 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from topics import fragments
+from . import results
+from .models import Simulation, SimulationParameter
+
+
+@receiver(post_save, sender=SimulationParameter)
+@receiver(post_delete, sender=SimulationParameter)
+def touch_parent_simulation(sender, instance, **kwargs):
+    """Parameter rows set a simulation's defaults, ranges and steps"""
+    fragments.touch(Simulation, pk=instance.simulation_id)
+    transaction.on_commit(partial(results.warm, instance.simulation_id))
+
+
+@receiver(post_save, sender=Simulation)
+def precompute_published_results(sender, instance, **kwargs):
+    if instance.is_active and instance.precompute_results:
+        transaction.on_commit(partial(results.warm, instance.id))
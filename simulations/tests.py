@@ -1,3 +1,507 @@
+import json
+from unittest import mock
+
+import numpy as np
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.test import TestCase
+from django.urls import reverse
+
+from physics_application.testing import ListPageQueryCountTestCase
+from topics.models import CBCGrade, PhysicsTopic
+from . import engine, results
+from .engine import circuit, integrators, motion, nbody
+from .models import Simulation, SimulationParameter
+
+
+class ListPageQueryCountTests(ListPageQueryCountTestCase):
+    context_name = 'simulations'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.topics = cls.create_topics('Motion')
+
+    def add_rows(self, start, stop):
+        Simulation.objects.bulk_create([
+            Simulation(topic=self.topics[i % len(self.topics)], title=f'Simulation {i}',
+                       description='Motion', simulation_type='motion', html_content='<div></div>',
+                       learning_objectives='Objectives', instructions='Instructions', order=i)
+            for i in range(start, stop)
+        ])
+
+    def test_simulation_list(self):
+        # validators, simulations with topic and grade
+        self.assertConstantQueries(2, reverse('simulations:simulation_list'))
+
+    def test_simulation_list_by_topic(self):
+        # validators (simulations, topic), simulations with topic and grade, topic
+        self.assertConstantQueries(4, reverse('simulations:simulation_list_by_topic', args=[self.topics[0].id]))
+
+
+class EngineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        results.reset()
+
+    @classmethod
+    def setUpTestData(cls):
+        grade = CBCGrade.objects.create(name='Grade 9', order=1)
+        topic = PhysicsTopic.objects.create(
+            grade=grade, title='Motion', slug='motion', description='Motion',
+            learning_outcomes='Outcomes', estimated_duration=30,
+        )
+        cls.simulation = Simulation.objects.create(
+            topic=topic, title='Projectiles', description='Launch', simulation_type='motion',
+            html_content='<div></div>', learning_objectives='Objectives', instructions='Instructions',
+            parameters={'speed': 15, 'gravity': {'default': 1.62}},
+        )
+        SimulationParameter.objects.create(simulation=cls.simulation, name='angle', parameter_type='slider',
+                                           default_value='30', min_value=0, max_value=80)
+
+    def test_every_simulation_type_has_a_kernel(self):
+        for simulation_type, _ in Simulation.SIMULATION_TYPES:
+            with self.subTest(simulation_type=simulation_type):
+                result = engine.run(simulation_type, {})
+                self.assertEqual(result['shape'], [])
+                self.assertEqual(set(result['outputs']), set(result['units']))
+
+    def test_projectile(self):
+        outputs = engine.run('motion', {'speed': '20', 'angle': '45', 'gravity': '10'})['outputs']
+        self.assertAlmostEqual(outputs['range'], 40)
+        self.assertAlmostEqual(outputs['max_height'], 10)
+        self.assertAlmostEqual(outputs['flight_time'], 2 * np.sqrt(2))
+        # Launched from a cliff, the projectile lands faster than it left
+        outputs = engine.run('motion', {'speed': '20', 'angle': '0', 'height': '20', 'gravity': '10'})['outputs']
+        self.assertAlmostEqual(outputs['flight_time'], 2)
+        self.assertAlmostEqual(outputs['impact_speed'], np.hypot(20, 20))
+
+    def test_parameter_sweep(self):
+        result = engine.run('motion', {'speed': '10,20', 'angle': '0:90:10000'})
+        self.assertEqual(result['shape'], [2, 10000])
+        self.assertEqual(len(result['grid']['angle']), 10000)
+        ranges = np.array(result['outputs']['range'])
+        self.assertEqual(ranges.shape, (2, 10000))
+        # Four times the range at twice the speed; the longest at 45 degrees
+        self.assertTrue(np.allclose(ranges[1], 4 * ranges[0]))
+        self.assertAlmostEqual(result['grid']['angle'][int(ranges[0].argmax())], 45, delta=0.01)
+        self.assertIsNone(result['series'])
+
+    def test_single_point_has_series(self):
+        series = engine.run('motion', {}, samples=50)['series']
+        self.assertEqual(len(series['x']), 50)
+        self.assertAlmostEqual(series['y'][-1], 0, places=6)
+
+    def test_drag(self):
+        vacuum = engine.run('motion', {'speed': '20', 'angle': '45', 'gravity': '10'})['outputs']
+        light = engine.run('motion', {'speed': '20', 'angle': '45', 'gravity': '10', 'drag': '1e-9'})['outputs']
+        for name, value in vacuum.items():
+            self.assertAlmostEqual(light[name], value, places=4)
+        result = engine.run('motion', {'angle': '30:60:4', 'drag': '0,0.01,0.05'})
+        ranges = np.array(result['outputs']['range'])
+        self.assertEqual(ranges.shape, (4, 3))
+        # More drag, shorter flights
+        self.assertTrue(np.all(np.diff(ranges, axis=1) < 0))
+        series = engine.run('motion', {'drag': '0.05', 'height': '10'}, samples=30)['series']
+        self.assertAlmostEqual(series['y'][-1], 0, places=6)
+        self.assertLess(series['x'][-1], engine.run('motion', {'height': '10'})['outputs']['range'] / 2)
+
+    def test_drag_integrates_in_stretches(self):
+        requested = {'angle': '20:70:6', 'drag': '0.02', 'height': '5'}
+        expected = engine.run('motion', requested)['outputs']
+        with mock.patch.object(motion, 'SEGMENT_STEPS', 3):
+            stitched = engine.run('motion', requested)['outputs']
+        for name, values in expected.items():
+            np.testing.assert_allclose(stitched[name], values, rtol=1e-6)
+
+    def test_launch_that_never_lands_is_null(self):
+        # Without extensions the horizon is the flight time in a vacuum, too short with drag
+        with mock.patch.object(motion, 'MAX_EXTENSIONS', 0):
+            outputs = engine.run('motion', {'height': '100', 'angle': '0', 'drag': '0.5'})['outputs']
+        self.assertIsNone(outputs['flight_time'])
+        self.assertIsNone(outputs['range'])
+        self.assertIsNone(outputs['impact_speed'])
+
+    def test_drag_has_a_work_budget(self):
+        with self.assertRaisesRegex(ValueError, 'per request with drag'):
+            engine.run('motion', {'speed': '1000', 'drag': '1', 'height': '100000', 'gravity': '0.1'})
+        with self.assertRaises(ValueError):
+            engine.run('motion', {'speed': '10000', 'drag': '0.1'})
+
+    def test_rejects_bad_requests(self):
+        for requested in ({'mass': '1'}, {'speed': 'fast'}, {'angle': '100'}, {'speed': '0:1:1000', 'angle': '0:1:1000'}):
+            with self.subTest(requested=requested):
+                with self.assertRaises(ValueError):
+                    engine.run('motion', requested)
+
+    def test_huge_ranges_are_rejected_before_allocating(self):
+        for text in ('0:1:1000000000', '0:1:' + '9' * 30, ','.join(['1'] * (engine.MAX_POINTS + 1))):
+            with self.assertRaisesRegex(ValueError, 'values per parameter'):
+                engine.parse_values(text)
+        self.assertEqual(len(engine.parse_values(f'0:1:{engine.MAX_POINTS}')), engine.MAX_POINTS)
+        response = self.client.get(reverse('simulations:simulation_compute', args=[self.simulation.id]),
+                                   {'angle': '0:1:1000000000'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_non_finite_outputs_are_null(self):
+        outputs = engine.run('optics', {'incidence_angle': '10,60', 'n1': '1.5', 'n2': '1'})['outputs']
+        self.assertIsNone(outputs['refraction_angle'][1])
+        self.assertIsNotNone(outputs['refraction_angle'][0])
+
+    def test_compute_view(self):
+        url = reverse('simulations:simulation_compute', args=[self.simulation.id])
+        # simulation, parameter rows
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        data = response.json()
+        # The result and the parameter settings are cached
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).content, response.content)
+        self.assertTrue(data['success'])
+        # Defaults from the simulation and its parameter rows
+        self.assertEqual(data['parameters']['speed']['value'], 15)
+        self.assertEqual(data['parameters']['gravity']['value'], 1.62)
+        self.assertEqual(data['parameters']['angle']['value'], 30)
+        self.assertIn('public', response['Cache-Control'])
+
+        response = self.client.get(url, {'angle': '10:90:5'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('between 0 and 80', response.json()['message'])
+
+
+class ResultCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        grade = CBCGrade.objects.create(name='Grade 9', order=1)
+        topic = PhysicsTopic.objects.create(
+            grade=grade, title='Motion', slug='motion', description='Motion',
+            learning_outcomes='Outcomes', estimated_duration=30,
+        )
+        cls.simulation = Simulation.objects.create(
+            topic=topic, title='Projectiles', description='Launch', simulation_type='motion',
+            html_content='<div></div>', learning_objectives='Objectives', instructions='Instructions',
+        )
+        SimulationParameter.objects.create(simulation=cls.simulation, name='angle', parameter_type='slider',
+                                           default_value='30', min_value=0, max_value=90, step=5)
+        SimulationParameter.objects.create(simulation=cls.simulation, name='speed', parameter_type='slider',
+                                           default_value='20', min_value=10, max_value=30, step=2)
+
+    def setUp(self):
+        cache.clear()
+        results.reset()
+
+    def test_lru_keeps_to_its_byte_budget(self):
+        lru = results.ResultCache(max_bytes=10)
+        lru.set('a', b'1234')
+        lru.set('b', b'1234')
+        lru.get('a')
+        lru.set('c', b'1234')
+        # 'b' was the least recently used
+        self.assertNotIn('b', lru)
+        self.assertIn('a', lru)
+        self.assertEqual(lru.size, 8)
+        lru.set('d', b'x' * 11)
+        self.assertNotIn('d', lru)
+        self.assertEqual(lru.stats()['evictions'], 1)
+
+    def test_values_are_snapped_to_the_step(self):
+        chosen = engine.choose(results.get_settings(self.simulation), {'angle': '44,46,48', 'speed': '30'})
+        self.assertEqual(chosen['angle'].tolist(), [45, 50])
+        body = results.get_result(self.simulation, {'angle': '44'})
+        self.assertIs(results.get_result(self.simulation, {'angle': '46.2'}), body)
+        self.assertEqual(json.loads(body)['parameters']['angle']['value'], 45)
+        self.assertEqual(results.get_cache().stats()['hits'], 1)
+
+    def test_new_version_misses(self):
+        body = results.get_result(self.simulation, {'angle': '45'})
+        SimulationParameter.objects.filter(simulation=self.simulation, name='speed').get().save()
+        simulation = Simulation.objects.get(pk=self.simulation.pk)
+        self.assertIsNot(results.get_result(simulation, {'angle': '45'}), body)
+        self.assertEqual(results.get_cache().stats()['misses'], 2)
+
+    def test_precompute_at_publish(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.simulation.precompute_results = True
+            self.simulation.save()
+        # 19 angles x 11 speeds
+        self.assertEqual(len(results.get_cache()), 19 * 11)
+        body = results.get_result(self.simulation, {'angle': '60', 'speed': '14'})
+        self.assertEqual(results.get_cache().stats()['misses'], 0)
+        expected = engine.run('motion', {'angle': '60', 'speed': '14'})
+        self.assertAlmostEqual(json.loads(body)['outputs']['range'], expected['outputs']['range'])
+
+    def test_requests_warm_other_processes_in_the_background(self):
+        # As if another process published it
+        self.simulation.precompute_results = True
+        with mock.patch.object(results.threading, 'Thread') as Thread:
+            body = results.get_result(self.simulation, {'angle': '60'})
+            results.get_result(self.simulation, {'angle': '65'})
+        Thread.assert_called_once()
+        self.assertEqual(len(results.get_cache()), 2)
+        results.precompute(*Thread.call_args.kwargs['args'])
+        self.assertEqual(len(results.get_cache()), 19 * 11)
+        self.assertEqual(results.get_result(self.simulation, {'angle': '60'}), body)
+
+    def test_large_grids_are_not_precomputed(self):
+        self.assertEqual(results.precompute(self.simulation, limit=100), 0)
+        self.assertEqual(len(results.get_cache()), 0)
+
+
+class IntegratorTests(TestCase):
+    """Harmonic oscillators of several frequencies integrated as one batch"""
+    frequencies = np.array([0.5, 1.0, 2.0])
+
+    def derivative(self, t, state):
+        return np.stack([state[1], -self.frequencies ** 2 * state[0]])
+
+    def start(self):
+        return np.stack([np.ones(3), np.zeros(3)])
+
+    def exact(self, times):
+        return np.cos(np.outer(times, self.frequencies))
+
+    def test_rk4(self):
+        solution = integrators.rk4(self.derivative, self.start(), (0, 10), 0.01)
+        self.assertEqual(solution.steps, 1000)
+        self.assertLess(np.abs(solution.y[:, 0] - self.exact(solution.t)).max(), 1e-7)
+
+    def test_leapfrog_energy_stays_bounded(self):
+        solution = integrators.leapfrog(
+            lambda t, x: -self.frequencies ** 2 * x, np.ones(3), np.zeros(3), (0, 1000), 0.05,
+        )
+        x, v = solution.y[:, 0], solution.y[:, 1]
+        energy = (v ** 2 + self.frequencies ** 2 * x ** 2) / self.frequencies ** 2
+        drift = np.abs(energy - 1)
+        self.assertLess(drift.max(), 0.01)
+        # Symplectic: as small after 1000 time units as after the first 100
+        self.assertLess(drift[-2000:].max(), 1.01 * drift[:2000].max())
+
+    def test_dormand_prince_meets_tolerance(self):
+        for rtol in (1e-4, 1e-8):
+            with self.subTest(rtol=rtol):
+                solution = integrators.dormand_prince(self.derivative, self.start(), (0, 10), rtol, rtol)
+                self.assertEqual(solution.t[-1], 10)
+                self.assertLess(np.abs(solution.y[-1, 0] - self.exact([10])[0]).max(), 100 * rtol)
+        coarse = integrators.dormand_prince(self.derivative, self.start(), (0, 10), 1e-4, 1e-4)
+        self.assertLess(coarse.steps, solution.steps)
+
+    def test_dense_output(self):
+        times = np.linspace(0, 10, 101)
+        for solution in (
+            integrators.rk4(self.derivative, self.start(), (0, 10), 0.02),
+            integrators.dormand_prince(self.derivative, self.start(), (0, 10), 1e-8, 1e-8),
+        ):
+            with self.subTest(solution=type(solution).__name__):
+                frames = solution(times)
+                self.assertEqual(frames.shape, (101, 2, 3))
+                self.assertLess(np.abs(frames[:, 0] - self.exact(times)).max(), 1e-5)
+
+    def test_first_crossing(self):
+        solution = integrators.dormand_prince(self.derivative, self.start(), (0, 10), 1e-8, 1e-8)
+        crossing = integrators.first_crossing(solution, lambda states: states[:, 0])
+        np.testing.assert_allclose(crossing, np.pi / 2 / self.frequencies, rtol=1e-6)
+        self.assertTrue(np.allclose(solution.at(crossing)[0], 0, atol=1e-9))
+
+    def test_rejects_bad_spans(self):
+        with self.assertRaises(ValueError):
+            integrators.rk4(self.derivative, self.start(), (1, 0), 0.1)
+        with self.assertRaises(ValueError):
+            integrators.leapfrog(lambda t, x: -x, 1.0, 0.0, (0, 1), 0)
+
+
+class NBodyTests(TestCase):
+    def system(self, bodies, seed=0):
+        rng = np.random.default_rng(seed)
+        return rng.normal(size=(3, bodies)), rng.random(bodies)
+
+    def test_tree_without_approximation_is_exact(self):
+        positions, masses = self.system(300)
+        # Coincident bodies share a cell down to the full depth
+        positions[:, :10] = positions[:, :1]
+        exact = nbody.direct_field(positions, masses, 0.01)
+        tree = nbody.Tree(positions, masses).field(0, 0.01)
+        for expected, actual in zip(exact, tree):
+            np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9)
+
+    def test_tree_approximation(self):
+        positions, masses = self.system(3000)
+        exact, _ = nbody.direct_field(positions, masses, 0.01)
+        errors = {}
+        for theta in (0.3, 0.7):
+            approximate, _ = nbody.Tree(positions, masses).field(theta, 0.01)
+            errors[theta] = np.median(np.linalg.norm(approximate - exact, axis=0) / np.linalg.norm(exact, axis=0))
+        self.assertLess(errors[0.3], errors[0.7])
+        self.assertLess(errors[0.7], 0.01)
+
+    def test_field_switches_method_at_the_crossover(self):
+        positions, masses = self.system(50)
+        direct = nbody.field(positions, masses, theta=1.0)
+        tree = nbody.field(positions, masses, theta=1.0, crossover=10)
+        np.testing.assert_array_equal(direct[0], nbody.direct_field(positions, masses)[0])
+        self.assertFalse(np.array_equal(direct[0], tree[0]))
+
+    def test_kernel(self):
+        result = engine.run('motion', {'bodies': '200', 'duration': '0.5', 'time_step': '0.005'},
+                            name='nbody', samples=10)
+        self.assertEqual(result['kernel'], 'nbody')
+        self.assertLess(result['outputs']['energy_error'], 1e-3)
+        self.assertAlmostEqual(result['outputs']['virial_ratio'], 0.5, delta=0.2)
+        self.assertEqual(np.array(result['series']['x']).shape, (10, 200))
+        belt = engine.run('motion', {'bodies': '200', 'central_mass': '0.99', 'duration': '0.2'}, name='nbody')
+        self.assertEqual(belt['outputs']['escaped_fraction'], 0)
+        with self.assertRaises(ValueError):
+            engine.run('motion', {'bodies': '20000', 'duration': '10'}, name='nbody')
+
+    def test_work_is_bounded(self):
+        kernel = engine.get_kernel('motion', 'nbody')
+        # The worst request in range is rejected before any integration
+        with self.assertRaisesMessage(ValueError, 'pair interactions per request'):
+            engine.run('motion', {'bodies': '10000', 'theta': '0.2', 'duration': '1000', 'time_step': '0.0001'},
+                       name='nbody')
+        # So is a single step of the largest system at the smallest opening angle
+        with self.assertRaisesMessage(ValueError, 'pair interactions per request'):
+            engine.run('motion', {'bodies': '10000', 'theta': '0.2', 'duration': '0.01'}, name='nbody')
+        # Ranges leave no free opening angle or softening
+        self.assertGreaterEqual(kernel.parameters['theta'].minimum, 0.2)
+        self.assertGreater(kernel.parameters['softening'].minimum, 0)
+        self.assertGreater(nbody.interactions(5000, 0.2), nbody.interactions(5000, 1.0))
+
+    def test_points_are_simulated_once(self):
+        kernel = engine.get_kernel('motion', 'nbody')
+        chosen = engine.choose(engine.settings_of(kernel, None, ()), {'bodies': '20,30', 'duration': '0.1'})
+        nbody.simulate.cache_clear()
+        points = list(engine.compute_points(kernel, chosen))
+        self.assertEqual(len(points), 2)
+        self.assertEqual(nbody.simulate.cache_info().misses, 2)
+        self.assertEqual(nbody.simulate.cache_info().hits, 0)
+        self.assertEqual(np.array(points[1][1]['series']['x']).shape[1], 30)
+
+    def test_simulation_chooses_its_kernel(self):
+        grade = CBCGrade.objects.create(name='Grade 10', order=1)
+        topic = PhysicsTopic.objects.create(
+            grade=grade, title='Gravitation', slug='gravitation', description='Orbits',
+            learning_outcomes='Outcomes', estimated_duration=30,
+        )
+        simulation = Simulation.objects.create(
+            topic=topic, title='Star cluster', description='Cluster', simulation_type='motion', kernel='nbody',
+            html_content='<div></div>', learning_objectives='Objectives', instructions='Instructions',
+            parameters={'bodies': 50, 'duration': 0.1},
+        )
+        cache.clear()
+        results.reset()
+        data = self.client.get(reverse('simulations:simulation_compute', args=[simulation.id])).json()
+        self.assertEqual(data['kernel'], 'nbody')
+        self.assertEqual(data['parameters']['bodies']['value'], 50)
+
+        simulation.kernel = 'nbdoy'
+        with self.assertRaises(ValidationError) as raised:
+            simulation.full_clean()
+        self.assertIn('kernel', raised.exception.message_dict)
+        simulation.kernel = 'circuit'
+        with self.assertRaisesMessage(ValidationError, 'No circuit engine for Motion & Mechanics'):
+            simulation.full_clean()
+
+
+class CircuitTests(TestCase):
+    def solve(self, netlist, **requested):
+        kernel = circuit.CircuitKernel(circuit.build(netlist))
+        return engine.compute(kernel, engine.choose(engine.settings_of(kernel), requested), samples=20)
+
+    def test_parse(self):
+        elements = circuit.parse(['* divider', 'V1 in 0 12', 'R1 in out 4.7k', 'C1 out gnd 100u', 'L1 out 0 2meg'])
+        self.assertEqual([element.kind for element in elements], ['V', 'R', 'C', 'L'])
+        self.assertAlmostEqual(elements[1].value, 4700)
+        self.assertAlmostEqual(elements[2].value, 1e-4)
+        self.assertAlmostEqual(elements[3].value, 2e6)
+        for netlist in ('X1 a 0 1', 'R1 a 0', 'R1 a 0 ten'):
+            with self.assertRaises(ValueError):
+                circuit.parse(netlist)
+        for netlist in ('R1 a b 1\nR2 b c 1', 'R1 a 0 1\nR1 a 0 2', 'R1 a 0 -5'):
+            with self.assertRaises(ValueError):
+                circuit.build(netlist)
+
+    def test_dc_operating_point(self):
+        outputs = self.solve('V1 in 0 10\nR1 in out 1k\nR2 out 0 3k\nC1 out 0 1u\nL1 out load 1m\nR3 load 0 3k')['outputs']
+        self.assertAlmostEqual(outputs['V(out)'], 6, places=6)
+        self.assertAlmostEqual(outputs['V(load)'], 6, places=6)
+        self.assertAlmostEqual(outputs['I(R1)'], 4e-3, places=9)
+        # Currents flow from the positive node through the element: the source delivers
+        self.assertAlmostEqual(outputs['I(V1)'], -4e-3, places=9)
+        self.assertAlmostEqual(outputs['I(L1)'], 2e-3, places=9)
+        self.assertEqual(outputs['I(C1)'], 0)
+        outputs = self.solve('I1 0 1 1m\nR1 1 0 1k')['outputs']
+        self.assertAlmostEqual(outputs['V(1)'], 1, places=6)
+
+    def test_rc_charging_matches_the_closed_form(self):
+        result = self.solve('V1 in 0 12\nR1 in out 1k\nC1 out 0 100u', time='0.1', steps='500')
+        expected = engine.run('electricity', {'time': '0.1'})['outputs']
+        self.assertAlmostEqual(result['outputs']['V(out)'], expected['capacitor_voltage'], places=4)
+        self.assertAlmostEqual(result['outputs']['I(C1)'], expected['current'], places=7)
+        series = result['series']
+        self.assertEqual(len(series['t']), 20)
+        self.assertEqual(series['V(out)'][0], 0)
+        self.assertAlmostEqual(series['t'][-1], 0.1)
+        self.assertIn('I(C1)', series)
+
+    def test_rlc_ringing(self):
+        # Underdamped: 1 / sqrt(LC) = 1000 rad/s, decaying at R / 2L = 100 per second
+        result = self.solve('V1 in 0 1\nR1 in a 20\nL1 a b 100m\nC1 b 0 10u', time='0.01', steps='2000')
+        frequency = np.sqrt(1000 ** 2 - 100 ** 2)
+        expected = 1 - np.exp(-1) * (np.cos(frequency * 0.01) + 100 / frequency * np.sin(frequency * 0.01))
+        self.assertAlmostEqual(result['outputs']['V(b)'], expected, places=4)
+
+    def test_sweeps_share_factorisations(self):
+        netlist = 'V1 in 0 10\nR1 in out 1k\nR2 out 0 1k\nC1 out 0 1u'
+        system = circuit.build(netlist)
+        system._factors.clear()
+        outputs = self.solve(netlist, V1='1:10:10')['outputs']
+        np.testing.assert_allclose(outputs['V(out)'], np.linspace(0.5, 5, 10))
+        self.assertEqual(len(system._factors), 1)
+        self.solve(netlist, V1='20')
+        self.assertEqual(len(system._factors), 1)
+        outputs = self.solve(netlist, V1='1,2', R2='1000,3000')['outputs']
+        np.testing.assert_allclose(outputs['V(out)'], [[0.5, 0.75], [1, 1.5]])
+        self.assertEqual(len(system._factors), 2)
+        # A transient needs the backward Euler and trapezoidal matrices of its step
+        self.solve(netlist, V1='1:5:5', time='1e-3', steps='10')
+        self.assertEqual(len(system._factors), 4)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            self.solve('V1 a 0 1\nV2 a 0 2')
+        with self.assertRaises(ValueError):
+            engine.run('electricity', {}, name='circuit')
+        with self.assertRaises(ValueError):
+            self.solve('V1 in 0 10\nR1 in 0 1k', time='1', steps='10000', V1='1:100:10000')
 
-# Create your tests here.
+    def test_simulation_circuit(self):
+        grade = CBCGrade.objects.create(name='Grade 11', order=1)
+        topic = PhysicsTopic.objects.create(
+            grade=grade, title='Circuits', slug='circuits', description='Circuits',
+            learning_outcomes='Outcomes', estimated_duration=30,
+        )
+        simulation = Simulation.objects.create(
+            topic=topic, title='Divider', description='Divider', simulation_type='electricity', kernel='circuit',
+            html_content='<div></div>', learning_objectives='Objectives', instructions='Instructions',
+            parameters={'circuit': ['V1 in 0 9', 'R1 in out 1k', 'R2 out 0 2k'], 'V1': 6},
+        )
+        SimulationParameter.objects.create(
+            simulation=simulation, name='R2', parameter_type='slider', default_value='2000',
+            min_value=1000, max_value=5000, step=1000,
+        )
+        cache.clear()
+        results.reset()
+        url = reverse('simulations:simulation_compute', args=[simulation.id])
+        data = self.client.get(url, {'R2': '1000,3000'}).json()
+        self.assertEqual(data['kernel'], 'circuit')
+        self.assertEqual(data['parameters']['V1']['value'], 6)
+        self.assertEqual(data['units']['V(out)'], 'V')
+        np.testing.assert_allclose(data['outputs']['V(out)'], [3, 4.5], rtol=1e-6)
+        self.assertEqual(self.client.get(url, {'R2': '9000'}).status_code, 400)
+        simulation.parameters = {'circuit': 'R1 a b 1k'}
+        simulation.save()
+        self.assertEqual(self.client.get(url).status_code, 400)
+        # Nothing to precompute, and the log says why
+        with self.assertLogs('simulations.results', 'WARNING') as logs:
+            self.assertEqual(results.precompute(Simulation.objects.get(pk=simulation.pk)), 0)
+        self.assertIn("electricity engine 'circuit'", logs.output[0])
@@ -13,4 +13,5 @@ urlpatterns = [
     # path('simulation/<int:simulation_id>/save-parameters/', views.save_simulation_parameters, name='save_simulation_parameters'),
     # path('simulation/<int:simulation_id>/feedback/', views.submit_simulation_feedback, name='submit_simulation_feedback'),
     path('interactive/<int:simulation_id>/', views.interactive_simulation, name='interactive_simulation'),
+    path('simulation/<int:simulation_id>/compute/', views.simulation_compute, name='simulation_compute'),
 ]
\ No newline at end of file
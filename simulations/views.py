@@ -1,15 +1,31 @@
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.db.models import Q
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from . import engine, results
 from .models import Simulation, SimulationSession, SimulationFeedback
 from topics.models import PhysicsTopic
+from topics import conditional
 # Remove login_required decorator
 # from django.contrib.auth.decorators import login_required
 
+def simulation_list_state(request, topic_id=None):
+    simulations = Simulation.objects.filter(is_active=True)
+    topics = PhysicsTopic.objects.none()
+    if topic_id:
+        simulations = simulations.filter(topic_id=topic_id)
+        topics = PhysicsTopic.objects.filter(id=topic_id)
+    return conditional.page_state(
+        (simulations, ['updated_at', 'topic__updated_at']),
+        (topics, ['updated_at']),
+    )
+
+
+@conditional.catalogue_page(simulation_list_state)
 def simulation_list(request, topic_id=None):
     """List all simulations, optionally filtered by topic"""
-    simulations = Simulation.objects.filter(is_active=True)
+    simulations = Simulation.objects.filter(is_active=True).select_related('topic__grade')
     
     if topic_id:
         simulations = simulations.filter(topic_id=topic_id)
@@ -152,6 +168,13 @@ def simulation_detail(request, simulation_id):
 #         })
 
 
+def interactive_simulation_state(request, simulation_id):
+    return conditional.page_state(
+        (Simulation.objects.filter(id=simulation_id, is_active=True), ['updated_at', 'topic__updated_at']),
+    )
+
+
+@conditional.catalogue_page(interactive_simulation_state)
 def interactive_simulation(request, simulation_id):
     """Render interactive simulation page"""
     simulation = get_object_or_404(Simulation, id=simulation_id, is_active=True)
@@ -159,4 +182,20 @@ def interactive_simulation(request, simulation_id):
     context = {
         'simulation': simulation,
     }
-    return render(request, 'simulations/interactive.html', context)
\ No newline at end of file
+    return render(request, 'simulations/interactive.html', context)
+
+
+def simulation_compute(request, simulation_id):
+    """Evaluate a simulation's physics on the server over a grid of parameter values"""
+    simulation = get_object_or_404(Simulation, id=simulation_id, is_active=True)
+    requested = {name: value for name, value in request.GET.items() if name != 'samples'}
+    try:
+        samples = int(request.GET.get('samples', engine.SERIES_SAMPLES))
+        body = results.get_result(simulation, requested, samples)
+    except ValueError as error:
+        return JsonResponse({'success': False, 'message': str(error)}, status=400)
+
+    response = HttpResponse(body, content_type='application/json')
+    # Results only change with the simulation, so devices and proxies may keep them
+    patch_cache_control(response, public=True, max_age=300)
+    return response
@@ -184,12 +184,42 @@ $(document).ready(function() {
     });
 
     // Real-time search suggestions
+    var suggestTimer = null;
+    var suggestRequest = null;
+    var $suggestions = $('<div id="search-suggestions" class="list-group position-absolute w-100 shadow-sm" style="z-index: 1050;"></div>').hide();
+    $('#search-input').after($suggestions);
+
     $('#search-input').on('input', function() {
         var query = $(this).val().trim();
         
-        if (query.length >= 2) {
-            // Implement real-time search suggestions here
-            // This would typically make an AJAX call to get suggestions
+        clearTimeout(suggestTimer);
+        if (query.length < 2) {
+            $suggestions.empty().hide();
+            return;
+        }
+        
+        // Wait for a pause in typing before asking the server
+        suggestTimer = setTimeout(function() {
+            if (suggestRequest) {
+                suggestRequest.abort();
+            }
+            suggestRequest = $.getJSON('/search/suggest/', {'q': query}, function(response) {
+                $suggestions.empty();
+                response.results.forEach(function(result) {
+                    var $item = $('<a class="list-group-item list-group-item-action"></a>').attr('href', result.url);
+                    $item.append($('<span class="badge bg-secondary me-2"></span>').text(result.type));
+                    $item.append($('<span></span>').text(result.title));
+                    $item.append($('<small class="text-muted ms-2"></small>').text(result.subtitle || ''));
+                    $suggestions.append($item);
+                });
+                $suggestions.toggle(response.results.length > 0);
+            });
+        }, 200);
+    });
+
+    $(document).on('click', function(event) {
+        if (!$(event.target).closest('#search-input, #search-suggestions').length) {
+            $suggestions.hide();
         }
     });
 
@@ -1,4 +1,7 @@
+from django import forms
 from django.contrib import admin
+
+from . import graph
 from .models import (
     CBCGrade, PhysicsTopic, TopicContent, TopicMedia, 
     TopicFormula, TopicExperiment
@@ -12,8 +15,21 @@ class CBCGradeAdmin(admin.ModelAdmin):
     ordering = ['order']
 
 
+class PhysicsTopicForm(forms.ModelForm):
+    class Meta:
+        model = PhysicsTopic
+        fields = '__all__'
+
+    def clean_prerequisites(self):
+        prerequisites = self.cleaned_data['prerequisites']
+        if self.instance.pk:
+            graph.check_prerequisites(self.instance.pk, [topic.pk for topic in prerequisites])
+        return prerequisites
+
+
 @admin.register(PhysicsTopic)
 class PhysicsTopicAdmin(admin.ModelAdmin):
+    form = PhysicsTopicForm
     list_display = ['title', 'grade', 'difficulty_level', 'estimated_duration', 'is_active']
     list_filter = ['grade', 'difficulty_level', 'is_active']
     search_fields = ['title', 'description']
@@ -0,0 +1,61 @@
+"""
+Cached assembly of the topic detail page context.
+
+The detail page is the most visited page of the site, so its context (the
+topic with its grade and all related content lists) is built with one
+select_related query plus one prefetch per relation and then kept in the
+cache under the topic slug until a signal reports that something on the
+page changed.
+"""
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from .models import PhysicsTopic, TopicContent, TopicMedia, TopicFormula, TopicExperiment
+
+DETAIL_TIMEOUT = 60 * 60 * 24
+
+# Context name -> (related name, model); Meta.ordering already sorts by 'order'
+DETAIL_RELATIONS = {
+    'contents': ('contents', TopicContent),
+    'media': ('media', TopicMedia),
+    'formulas': ('formulas', TopicFormula),
+    'experiments': ('experiments', TopicExperiment),
+}
+
+
+def detail_key(slug):
+    return f'topic-detail:{slug}'
+
+
+def build_topic_detail(slug):
+    """Load a topic and everything its detail page shows, or None"""
+    topic = (
+        PhysicsTopic.objects.filter(slug=slug, is_active=True)
+        .select_related('grade')
+        .prefetch_related(*[
+            Prefetch(related_name, queryset=model.objects.all(), to_attr=f'{name}_list')
+            for name, (related_name, model) in DETAIL_RELATIONS.items()
+        ])
+        .first()
+    )
+    if topic is None:
+        return None
+    context = {'topic': topic}
+    for name in DETAIL_RELATIONS:
+        context[name] = getattr(topic, f'{name}_list')
+    return context
+
+
+def get_topic_detail(slug):
+    """Return the detail page context for ``slug``, from the cache if possible"""
+    key = detail_key(slug)
+    context = cache.get(key)
+    if context is None:
+        context = build_topic_detail(slug)
+        if context is not None:
+            cache.set(key, context, DETAIL_TIMEOUT)
+    return context
+
+
+def invalidate_topic_detail(*slugs):
+    cache.delete_many([detail_key(slug) for slug in slugs if slug])
@@ -0,0 +1,109 @@
+"""
+Per-object cache of rendered template fragments.
+
+Catalogue pages look the same for every anonymous visitor, so the HTML of
+each topic, quiz and simulation block is rendered once and reused. Keys are
+versioned by the ``updated_at`` of the object the fragment belongs to; any
+other objects the fragment shows (a quiz card shows its topic) are folded
+into a signature stored next to the HTML. Saving or deleting an object
+evicts its fragments explicitly, and saving related rows (contents,
+questions, parameters, grades) touches the parent's ``updated_at`` so its
+version moves on as well.
+
+Fragments live in the ``fragments`` cache alias, whose backend is chosen in
+settings (locmem, file or Redis).
+"""
+from collections import Counter
+import threading
+
+from django.core.cache import caches
+from django.utils import timezone
+
+CACHE_ALIAS = 'fragments'
+
+# Fragment names rendered for each model, used to evict them on change
+FRAGMENT_NAMES = {
+    'topics.physicstopic': ['home_topic_card', 'topic_card', 'topic_detail'],
+    'quizzes.quiz': ['quiz_card'],
+    'simulations.simulation': ['simulation_card'],
+}
+
+_stats_lock = threading.Lock()
+_stats = Counter()
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def version_of(obj):
+    updated_at = getattr(obj, 'updated_at', None)
+    return updated_at.timestamp() if updated_at else 0
+
+
+def fragment_key(name, obj, version=None):
+    if version is None:
+        version = version_of(obj)
+    return f'fragment:{name}:{obj._meta.label_lower}:{obj.pk}:{version}'
+
+
+def signature(objects):
+    return tuple((obj._meta.label_lower, obj.pk, version_of(obj)) for obj in objects)
+
+
+def record(name, outcome):
+    with _stats_lock:
+        _stats[(name, outcome)] += 1
+
+
+def stats():
+    """Hit/miss counters of this process, per fragment name"""
+    with _stats_lock:
+        names = sorted({name for name, _ in _stats})
+        return {
+            name: {'hits': _stats[(name, 'hit')], 'misses': _stats[(name, 'miss')]}
+            for name in names
+        }
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def get_or_render(name, obj, render, depends_on=()):
+    """
+    Return the cached HTML of fragment ``name`` for ``obj``, calling
+    ``render()`` and storing the result on a miss. ``depends_on`` lists other
+    objects whose change should also invalidate the fragment.
+    """
+    cache = get_cache()
+    key = fragment_key(name, obj)
+    expected = signature(depends_on)
+    cached = cache.get(key)
+    if cached is not None and cached[0] == expected:
+        record(name, 'hit')
+        return cached[1]
+
+    record(name, 'miss')
+    html = render()
+    cache.set(key, (expected, html))
+    return html
+
+
+def evict(obj, version=None):
+    """Drop every fragment of ``obj`` at the given (default: current) version"""
+    names = FRAGMENT_NAMES.get(obj._meta.label_lower, [])
+    if names:
+        get_cache().delete_many([fragment_key(name, obj, version) for name in names])
+
+
+def touch(model, **filters):
+    """
+    Evict the fragments of matching ``model`` rows and bump their
+    ``updated_at``, used when a related row they render has changed.
+    """
+    queryset = model._default_manager.filter(**filters)
+    for obj in queryset.only('pk', 'updated_at'):
+        evict(obj)
+    queryset.update(updated_at=timezone.now())
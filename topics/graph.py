@@ -0,0 +1,209 @@
+"""
+The topic prerequisite graph.
+
+Every topic and prerequisite link is loaded with one query into an
+in-process DAG. Topics are numbered in topological order (ties broken by
+grade and position in the curriculum), and each topic keeps bitsets of its
+direct prerequisites and of its transitive ones, so "which topics does this
+one depend on", "does adding this link create a cycle" and "what can a
+student study next" are a few integer operations instead of one query per
+hop. The graph is rebuilt lazily whenever the shared ``VERSION_KEY`` is
+bumped by a topic or prerequisite change.
+"""
+import heapq
+import logging
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'topic-graph:version'
+
+_lock = threading.Lock()
+_graph = None
+
+
+def bits(mask):
+    """Positions of the set bits of ``mask``, lowest first"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class PrerequisiteGraph:
+    """Topics in topological order with bitsets of their prerequisites"""
+
+    def __init__(self, topics, links):
+        """
+        ``topics`` are ``(id, sort key, is_active)`` triples and ``links``
+        ``(topic id, prerequisite id)`` pairs.
+        """
+        sort_keys = {topic_id: key for topic_id, key, _ in topics}
+        active = {topic_id for topic_id, _, is_active in topics if is_active}
+        requires = {topic_id: set() for topic_id in sort_keys}
+        unlocks = {topic_id: set() for topic_id in sort_keys}
+        for topic_id, prerequisite_id in links:
+            if topic_id in requires and prerequisite_id in requires:
+                requires[topic_id].add(prerequisite_id)
+                unlocks[prerequisite_id].add(topic_id)
+
+        # Kahn's algorithm, always taking the earliest topic of the curriculum
+        waiting = {topic_id: len(prerequisites) for topic_id, prerequisites in requires.items()}
+        ready = [(sort_keys[topic_id], topic_id) for topic_id, count in waiting.items() if not count]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            _, topic_id = heapq.heappop(ready)
+            order.append(topic_id)
+            for dependent in unlocks[topic_id]:
+                waiting[dependent] -= 1
+                if not waiting[dependent]:
+                    heapq.heappush(ready, (sort_keys[dependent], dependent))
+        self.cyclic = frozenset(topic_id for topic_id, count in waiting.items() if count)
+        if self.cyclic:
+            logger.warning('Topic prerequisites form a cycle through %s', sorted(self.cyclic))
+            order.extend(sorted(self.cyclic, key=lambda topic_id: (sort_keys[topic_id], topic_id)))
+
+        self.order = order
+        self.position = {topic_id: position for position, topic_id in enumerate(order)}
+        self.active = 0
+        for topic_id in active:
+            self.active |= 1 << self.position[topic_id]
+        self.direct = [0] * len(order)
+        self.closure = [0] * len(order)
+        self.dependents = [0] * len(order)
+        for position, topic_id in enumerate(order):
+            for prerequisite_id in requires[topic_id]:
+                prerequisite = self.position[prerequisite_id]
+                self.direct[position] |= 1 << prerequisite
+                self.dependents[prerequisite] |= 1 << position
+                # Prerequisites come first in the order, outside of cycles
+                self.closure[position] |= (1 << prerequisite) | self.closure[prerequisite]
+        # Topics with no active prerequisite are open to everyone
+        self.roots = 0
+        for position, mask in enumerate(self.direct):
+            if not mask & self.active:
+                self.roots |= 1 << position
+
+    def __len__(self):
+        return len(self.order)
+
+    def mask(self, topic_ids):
+        mask = 0
+        for topic_id in topic_ids:
+            position = self.position.get(topic_id)
+            if position is not None:
+                mask |= 1 << position
+        return mask
+
+    def topic_ids(self, mask):
+        return [self.order[position] for position in bits(mask)]
+
+    def topological_order(self, topic_ids=None):
+        """Topic ids, every prerequisite before the topics requiring it"""
+        if topic_ids is None:
+            return list(self.order)
+        return self.topic_ids(self.mask(topic_ids))
+
+    def prerequisites(self, topic_id, transitive=True):
+        """Ids of the topics ``topic_id`` requires, in topological order"""
+        position = self.position.get(topic_id)
+        if position is None:
+            return []
+        return self.topic_ids((self.closure if transitive else self.direct)[position])
+
+    def requires(self, topic_id, prerequisite_id):
+        """Whether ``topic_id`` depends on ``prerequisite_id``, directly or not"""
+        position = self.position.get(topic_id)
+        prerequisite = self.position.get(prerequisite_id)
+        if position is None or prerequisite is None:
+            return False
+        return bool(self.closure[position] >> prerequisite & 1)
+
+    def cycle_with(self, topic_id, prerequisite_ids):
+        """The first of ``prerequisite_ids`` that would close a cycle through ``topic_id``"""
+        for prerequisite_id in prerequisite_ids:
+            if prerequisite_id == topic_id or self.requires(prerequisite_id, topic_id):
+                return prerequisite_id
+        return None
+
+    def unlocked(self, completed_ids):
+        """
+        Active topics not in ``completed_ids`` whose active prerequisites are
+        all completed, in topological order.
+        """
+        completed = self.mask(completed_ids)
+        candidates = self.roots
+        for position in bits(completed):
+            candidates |= self.dependents[position]
+        missing = self.active & ~completed
+        candidates &= missing
+        return self.topic_ids(sum(
+            1 << position for position in bits(candidates)
+            if not self.direct[position] & missing
+        ))
+
+    def path_to(self, topic_id, completed_ids=()):
+        """The topics still to study before and including ``topic_id``, in order"""
+        position = self.position.get(topic_id)
+        if position is None:
+            return []
+        needed = (self.closure[position] | 1 << position) & ~self.mask(completed_ids)
+        return self.topic_ids(needed)
+
+
+def build_graph():
+    """Load every topic and prerequisite link with a single query"""
+    from .models import PhysicsTopic
+
+    topics = {}
+    links = []
+    for topic_id, grade_order, order, is_active, prerequisite_id in PhysicsTopic.objects.values_list(
+        'id', 'grade__order', 'order', 'is_active', 'prerequisites'
+    ).order_by():
+        topics[topic_id] = (topic_id, (grade_order, order, topic_id), is_active)
+        if prerequisite_id is not None:
+            links.append((topic_id, prerequisite_id))
+    return PrerequisiteGraph(topics.values(), links)
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate():
+    """Make every process rebuild the graph"""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def get_graph():
+    global _graph
+    version = current_version()
+    graph = _graph
+    if graph is None or graph[0] != version:
+        with _lock:
+            if _graph is None or _graph[0] != version:
+                _graph = (version, build_graph())
+            graph = _graph
+    return graph[1]
+
+
+def check_prerequisites(topic_id, prerequisite_ids):
+    """Raise ValidationError if requiring ``prerequisite_ids`` for the topic makes a cycle"""
+    culprit = get_graph().cycle_with(topic_id, prerequisite_ids)
+    if culprit is not None:
+        from .models import PhysicsTopic
+
+        title = PhysicsTopic.objects.filter(id=culprit).values_list('title', flat=True).first()
+        raise ValidationError(
+            'Requiring "%(title)s" would make it depend on this topic, a prerequisite cycle.',
+            code='prerequisite_cycle', params={'title': title},
+        )
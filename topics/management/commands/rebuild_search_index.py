@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from topics import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for physics topics'
+
+    def handle(self, *args, **options):
+        if search.get_backend() is None:
+            self.stdout.write(self.style.WARNING(
+                'No full-text backend for this database; search falls back to substring matching.'
+            ))
+            return
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} topics'))
@@ -0,0 +1,71 @@
+from django.db import migrations
+
+# The index as topics.search first defined it, inlined so that later changes
+# to that module cannot change what this migration does
+INDEX_TABLE = 'topics_search_index'
+FIELDS = ('title', 'description', 'learning_outcomes', 'content', 'formulas')
+
+CREATE_SQL = {
+    'sqlite': [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5("
+        "title, description, learning_outcomes, content, formulas, "
+        "tokenize='porter unicode61', prefix='2 3')",
+    ],
+    'postgresql': [
+        f'CREATE TABLE IF NOT EXISTS {INDEX_TABLE} ('
+        'topic_id bigint PRIMARY KEY REFERENCES topics_physicstopic (id) '
+        'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+        'document tsvector NOT NULL)',
+        f'CREATE INDEX IF NOT EXISTS {INDEX_TABLE}_document_idx '
+        f'ON {INDEX_TABLE} USING GIN (document)',
+    ],
+}
+INSERT_SQL = {
+    'sqlite': f'INSERT INTO {INDEX_TABLE} '
+              '(rowid, title, description, learning_outcomes, content, formulas) '
+              'VALUES (%s, %s, %s, %s, %s, %s)',
+    'postgresql': f'INSERT INTO {INDEX_TABLE} (topic_id, document) VALUES (%s, '
+                  "setweight(to_tsvector('english', %s), 'A') || "
+                  "setweight(to_tsvector('english', %s), 'B') || "
+                  "setweight(to_tsvector('english', %s), 'C') || "
+                  "setweight(to_tsvector('english', %s), 'D') || "
+                  "setweight(to_tsvector('english', %s), 'C'))",
+}
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in CREATE_SQL:
+        return
+    PhysicsTopic = apps.get_model('topics', 'PhysicsTopic')
+    with schema_editor.connection.cursor() as cursor:
+        for statement in CREATE_SQL[vendor]:
+            cursor.execute(statement)
+        for topic in PhysicsTopic.objects.all():
+            document = {
+                'title': topic.title,
+                'description': topic.description,
+                'learning_outcomes': topic.learning_outcomes,
+                'content': '\n'.join(f'{title}\n{text}'
+                                     for title, text in topic.contents.values_list('title', 'content')),
+                'formulas': '\n'.join(f'{name}\n{text}'
+                                      for name, text in topic.formulas.values_list('name', 'description')),
+            }
+            cursor.execute(INSERT_SQL[vendor], [topic.id] + [document[field] for field in FIELDS])
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_SQL:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {INDEX_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('topics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,233 @@
+"""
+Full-text search index for physics topics.
+
+Each topic is indexed as one document built from its title, description,
+learning outcomes, the text of its TopicContent sections and the names and
+descriptions of its TopicFormula rows. SQLite uses an FTS5 virtual table and
+PostgreSQL a tsvector column with a GIN index; any other database falls back
+to plain ``icontains`` filtering.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import PhysicsTopic, TopicContent, TopicFormula
+
+INDEX_TABLE = 'topics_search_index'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Relative weight of each indexed field when ranking results
+FIELD_WEIGHTS = {
+    'title': 10.0,
+    'description': 4.0,
+    'learning_outcomes': 2.0,
+    'content': 1.0,
+    'formulas': 2.0,
+}
+# PostgreSQL ranks four weight classes: the class of each field, and the
+# weight of each class relative to the highest, as FIELD_WEIGHTS has them
+WEIGHT_CLASSES = {
+    'title': 'A',
+    'description': 'B',
+    'learning_outcomes': 'C',
+    'content': 'D',
+    'formulas': 'C',
+}
+CLASS_WEIGHTS = {
+    label: FIELD_WEIGHTS[field] / max(FIELD_WEIGHTS.values()) for field, label in WEIGHT_CLASSES.items()
+}
+
+
+def tokenize(query):
+    """Split a raw search string into lowercase word tokens"""
+    return [token.lower() for token in TOKEN_RE.findall(query)]
+
+
+def build_document(topic, contents=None, formulas=None):
+    """Collect the searchable text of a topic into a field -> text dict"""
+    if contents is None:
+        contents = topic.contents.values_list('title', 'content')
+    if formulas is None:
+        formulas = topic.formulas.values_list('name', 'description')
+    return {
+        'title': topic.title,
+        'description': topic.description,
+        'learning_outcomes': topic.learning_outcomes,
+        'content': '\n'.join(f'{title}\n{text}' for title, text in contents),
+        'formulas': '\n'.join(f'{name}\n{text}' for name, text in formulas),
+    }
+
+
+class SQLiteSearchBackend:
+    """FTS5 index where the rowid of each document is the topic id"""
+    vendor = 'sqlite'
+
+    create_sql = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5("
+        "title, description, learning_outcomes, content, formulas, "
+        "tokenize='porter unicode61', prefix='2 3')",
+    ]
+    drop_sql = [f'DROP TABLE IF EXISTS {INDEX_TABLE}']
+
+    def index(self, cursor, topic_id, document):
+        cursor.execute(f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', [topic_id])
+        cursor.execute(
+            f'INSERT INTO {INDEX_TABLE} '
+            '(rowid, title, description, learning_outcomes, content, formulas) '
+            'VALUES (%s, %s, %s, %s, %s, %s)',
+            [topic_id] + [document[field] for field in FIELD_WEIGHTS],
+        )
+
+    def remove(self, cursor, topic_id):
+        cursor.execute(f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', [topic_id])
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {INDEX_TABLE}')
+
+    def match(self, cursor, tokens, limit):
+        # Quote every token so user input can never be parsed as FTS syntax,
+        # and add a trailing * for prefix matching.
+        expression = ' '.join('"%s"*' % token for token in tokens)
+        weights = ', '.join(str(weight) for weight in FIELD_WEIGHTS.values())
+        cursor.execute(
+            f'SELECT rowid FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s '
+            f'ORDER BY bm25({INDEX_TABLE}, {weights}) LIMIT %s',
+            [expression, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    """tsvector index weighted by the classes of ``WEIGHT_CLASSES``"""
+    vendor = 'postgresql'
+
+    create_sql = [
+        f'CREATE TABLE IF NOT EXISTS {INDEX_TABLE} ('
+        'topic_id bigint PRIMARY KEY REFERENCES topics_physicstopic (id) '
+        'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+        'document tsvector NOT NULL)',
+        f'CREATE INDEX IF NOT EXISTS {INDEX_TABLE}_document_idx '
+        f'ON {INDEX_TABLE} USING GIN (document)',
+    ]
+    drop_sql = [f'DROP TABLE IF EXISTS {INDEX_TABLE}']
+
+    def index(self, cursor, topic_id, document):
+        cursor.execute(
+            f'INSERT INTO {INDEX_TABLE} (topic_id, document) VALUES (%s, '
+            + ' || '.join(f"setweight(to_tsvector('english', %s), '{WEIGHT_CLASSES[field]}')"
+                          for field in FIELD_WEIGHTS)
+            + ') ON CONFLICT (topic_id) DO UPDATE SET document = EXCLUDED.document',
+            [topic_id] + [document[field] for field in FIELD_WEIGHTS],
+        )
+
+    def remove(self, cursor, topic_id):
+        cursor.execute(f'DELETE FROM {INDEX_TABLE} WHERE topic_id = %s', [topic_id])
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {INDEX_TABLE}')
+
+    def match(self, cursor, tokens, limit):
+        expression = ' & '.join(f'{token}:*' for token in tokens)
+        # ts_rank takes the weights of classes D, C, B and A in that order
+        weights = ', '.join(str(CLASS_WEIGHTS[label]) for label in 'DCBA')
+        cursor.execute(
+            f"SELECT topic_id FROM {INDEX_TABLE}, to_tsquery('english', %s) query WHERE document @@ query "
+            f"ORDER BY ts_rank('{{{weights}}}'::float4[], document, query) DESC LIMIT %s",
+            [expression, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    backend.vendor: backend for backend in (SQLiteSearchBackend, PostgresSearchBackend)
+}
+
+
+def get_backend(conn=None):
+    """Return the search backend for a connection, or None if unsupported"""
+    backend_class = BACKENDS.get((conn or connection).vendor)
+    return backend_class() if backend_class else None
+
+
+def index_topic(topic_id):
+    """(Re)build the index document of a single topic"""
+    backend = get_backend()
+    if backend is None:
+        return
+    topic = PhysicsTopic.objects.filter(id=topic_id).first()
+    with connection.cursor() as cursor:
+        if topic is None:
+            backend.remove(cursor, topic_id)
+        else:
+            backend.index(cursor, topic.id, build_document(topic))
+
+
+def remove_topic(topic_id):
+    """Drop a topic from the index"""
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.remove(cursor, topic_id)
+
+
+def rebuild_index():
+    """Re-index every topic using three queries in total; returns the count"""
+    backend = get_backend()
+    if backend is None:
+        return 0
+
+    contents = {}
+    for topic_id, title, text in TopicContent.objects.values_list('topic_id', 'title', 'content'):
+        contents.setdefault(topic_id, []).append((title, text))
+    formulas = {}
+    for topic_id, name, text in TopicFormula.objects.values_list('topic_id', 'name', 'description'):
+        formulas.setdefault(topic_id, []).append((name, text))
+
+    count = 0
+    with connection.cursor() as cursor:
+        backend.clear(cursor)
+        for topic in PhysicsTopic.objects.order_by().iterator():
+            document = build_document(
+                topic, contents.get(topic.id, []), formulas.get(topic.id, [])
+            )
+            backend.index(cursor, topic.id, document)
+            count += 1
+    return count
+
+
+def search_topics(query, queryset=None, limit=200):
+    """
+    Return topics of ``queryset`` matching ``query``, best match first.
+
+    Every word in the query must match, and the last characters of each word
+    are treated as a prefix so partial words still find results.
+    """
+    if queryset is None:
+        queryset = PhysicsTopic.objects.filter(is_active=True)
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+
+    backend = get_backend()
+    if backend is None:
+        return list(fallback_search(query, queryset))
+
+    with connection.cursor() as cursor:
+        ranked_ids = backend.match(cursor, tokens, limit)
+    topics = queryset.select_related('grade').in_bulk(ranked_ids)
+    return [topics[topic_id] for topic_id in ranked_ids if topic_id in topics]
+
+
+def fallback_search(query, queryset):
+    """Unranked substring search for databases without a full-text backend"""
+    return queryset.select_related('grade').filter(
+        Q(title__icontains=query) |
+        Q(description__icontains=query) |
+        Q(learning_outcomes__icontains=query) |
+        Q(contents__content__icontains=query) |
+        Q(formulas__name__icontains=query) |
+        Q(formulas__description__icontains=query)
+    ).distinct()
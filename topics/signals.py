@@ -0,0 +1,139 @@
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from . import caching, fragments, graph, search, suggest
+from .models import CBCGrade, PhysicsTopic, TopicContent, TopicMedia, TopicFormula, TopicExperiment
+
+
+@receiver(post_save, sender=PhysicsTopic)
+def index_saved_topic(sender, instance, **kwargs):
+    """Keep the search index in sync with topic edits"""
+    search.index_topic(instance.id)
+
+
+@receiver(post_delete, sender=PhysicsTopic)
+def unindex_deleted_topic(sender, instance, **kwargs):
+    """Drop deleted topics from the search index"""
+    search.remove_topic(instance.id)
+
+
+@receiver(post_save, sender=TopicContent)
+@receiver(post_delete, sender=TopicContent)
+@receiver(post_save, sender=TopicFormula)
+@receiver(post_delete, sender=TopicFormula)
+def reindex_parent_topic(sender, instance, **kwargs):
+    """Content and formulas are part of their topic's search document"""
+    search.index_topic(instance.topic_id)
+
+
+@receiver(post_save, sender=PhysicsTopic)
+@receiver(post_delete, sender=PhysicsTopic)
+@receiver(post_save, sender=TopicFormula)
+@receiver(post_delete, sender=TopicFormula)
+@receiver(post_save, sender='quizzes.Quiz')
+@receiver(post_delete, sender='quizzes.Quiz')
+@receiver(post_save, sender='simulations.Simulation')
+@receiver(post_delete, sender='simulations.Simulation')
+def invalidate_suggestions(sender, **kwargs):
+    """Any catalogue title change makes the typeahead index stale"""
+    suggest.invalidate()
+
+
+@receiver(pre_save, sender=PhysicsTopic)
+def remember_previous_slug(sender, instance, **kwargs):
+    """A renamed slug must also drop the page cached under the old one"""
+    if instance.pk:
+        instance._previous_slug = (
+            PhysicsTopic.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=PhysicsTopic)
+@receiver(post_delete, sender=PhysicsTopic)
+def invalidate_topic_detail(sender, instance, **kwargs):
+    caching.invalidate_topic_detail(instance.slug, getattr(instance, '_previous_slug', None))
+
+
+@receiver(post_save, sender=TopicContent)
+@receiver(post_delete, sender=TopicContent)
+@receiver(post_save, sender=TopicMedia)
+@receiver(post_delete, sender=TopicMedia)
+@receiver(post_save, sender=TopicFormula)
+@receiver(post_delete, sender=TopicFormula)
+@receiver(post_save, sender=TopicExperiment)
+@receiver(post_delete, sender=TopicExperiment)
+def invalidate_parent_topic_detail(sender, instance, **kwargs):
+    """Related content is rendered on its topic's detail page"""
+    caching.invalidate_topic_detail(
+        *PhysicsTopic.objects.filter(pk=instance.topic_id).values_list('slug', flat=True)
+    )
+
+
+@receiver(post_save, sender=CBCGrade)
+def invalidate_grade_topic_details(sender, instance, **kwargs):
+    """Grade names are shown on every topic detail page of the grade"""
+    caching.invalidate_topic_detail(*instance.topics.values_list('slug', flat=True))
+
+
+@receiver(pre_save, sender=PhysicsTopic)
+@receiver(pre_save, sender='quizzes.Quiz')
+@receiver(pre_save, sender='simulations.Simulation')
+def remember_fragment_version(sender, instance, **kwargs):
+    """Capture updated_at before auto_now moves it, to evict the old fragments"""
+    if instance.pk:
+        instance._fragment_version = fragments.version_of(instance)
+
+
+@receiver(post_save, sender=PhysicsTopic)
+@receiver(post_save, sender='quizzes.Quiz')
+@receiver(post_save, sender='simulations.Simulation')
+def evict_saved_fragments(sender, instance, created, **kwargs):
+    if not created:
+        fragments.evict(instance, getattr(instance, '_fragment_version', None))
+
+
+@receiver(post_delete, sender=PhysicsTopic)
+@receiver(post_delete, sender='quizzes.Quiz')
+@receiver(post_delete, sender='simulations.Simulation')
+def evict_deleted_fragments(sender, instance, **kwargs):
+    fragments.evict(instance)
+
+
+@receiver(post_save, sender=TopicContent)
+@receiver(post_delete, sender=TopicContent)
+@receiver(post_save, sender=TopicMedia)
+@receiver(post_delete, sender=TopicMedia)
+@receiver(post_save, sender=TopicFormula)
+@receiver(post_delete, sender=TopicFormula)
+@receiver(post_save, sender=TopicExperiment)
+@receiver(post_delete, sender=TopicExperiment)
+def touch_parent_topic(sender, instance, **kwargs):
+    """Related rows are part of the topic's rendered page"""
+    fragments.touch(PhysicsTopic, pk=instance.topic_id)
+
+
+@receiver(post_save, sender=CBCGrade)
+def touch_grade_topics(sender, instance, created, **kwargs):
+    """Topic, quiz and simulation cards all show the grade name"""
+    if not created:
+        fragments.touch(PhysicsTopic, grade=instance)
+
+
+@receiver(m2m_changed, sender=PhysicsTopic.prerequisites.through)
+def guard_prerequisites(sender, instance, action, reverse, pk_set, **kwargs):
+    """Refuse links that would make a prerequisite cycle, and rebuild the graph after changes"""
+    if action == 'pre_add':
+        if reverse:
+            for topic_id in pk_set:
+                graph.check_prerequisites(topic_id, [instance.pk])
+        else:
+            graph.check_prerequisites(instance.pk, pk_set)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        graph.invalidate()
+
+
+@receiver(post_save, sender=PhysicsTopic)
+@receiver(post_delete, sender=PhysicsTopic)
+def invalidate_prerequisite_graph(sender, **kwargs):
+    """Order, grade and activity of topics are part of the graph"""
+    graph.invalidate()
@@ -0,0 +1,161 @@
+"""
+Typeahead suggestions across topics, quizzes, simulations and formulas.
+
+The searchable titles of all four catalogues are loaded once into an
+in-process prefix index (a sorted list of word tokens), so answering a
+keystroke never touches the database. The index is rebuilt lazily whenever
+the shared ``VERSION_KEY`` in the cache is bumped by a model signal, and the
+answer for each normalized prefix is cached so bursts of identical requests
+from many typing students cost a single cache read.
+"""
+from bisect import bisect_left
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from .search import tokenize
+
+VERSION_KEY = 'search-suggest:version'
+RESULT_TIMEOUT = 300
+MIN_PREFIX_LENGTH = 2
+MAX_LIMIT = 20
+MAX_QUERY_LENGTH = 64
+
+# Display and tie-break order of the entity types
+TYPE_ORDER = ['topic', 'quiz', 'simulation', 'formula']
+
+_lock = threading.Lock()
+_index = None
+
+
+class SuggestionIndex:
+    """Sorted (token, entry) pairs supporting word-prefix lookups"""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.tokens = []
+        for position, entry in enumerate(entries):
+            entry['_tokens'] = tokenize(entry['title'])
+            entry['_normalized'] = ' '.join(entry['_tokens'])
+            for token in set(entry['_tokens']):
+                self.tokens.append((token, position))
+        self.tokens.sort()
+
+    def candidates(self, prefix):
+        """Positions of entries with a word starting with ``prefix``"""
+        found = set()
+        start = bisect_left(self.tokens, (prefix, -1))
+        for token, position in self.tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            found.add(position)
+        return found
+
+    def lookup(self, tokens, limit):
+        # Narrow down with the most selective (longest) word, then require
+        # every other word of the query to prefix-match a word of the title.
+        pivot = max(tokens, key=len)
+        normalized = ' '.join(tokens)
+        matches = []
+        for position in self.candidates(pivot):
+            entry = self.entries[position]
+            if not all(
+                any(word.startswith(token) for word in entry['_tokens'])
+                for token in tokens
+            ):
+                continue
+            if entry['_normalized'].startswith(normalized):
+                rank = 0
+            elif entry['_tokens'][0].startswith(tokens[0]):
+                rank = 1
+            else:
+                rank = 2
+            matches.append((rank, TYPE_ORDER.index(entry['type']), entry['title'], position))
+        matches.sort()
+        return [
+            {key: value for key, value in self.entries[position].items() if not key.startswith('_')}
+            for _, _, _, position in matches[:limit]
+        ]
+
+
+def build_entries():
+    """Load the suggestable rows of every catalogue, one query each"""
+    from quizzes.models import Quiz
+    from simulations.models import Simulation
+    from .models import PhysicsTopic, TopicFormula
+
+    entries = []
+    for topic_id, title, slug, grade in PhysicsTopic.objects.filter(
+        is_active=True
+    ).values_list('id', 'title', 'slug', 'grade__name'):
+        entries.append({
+            'type': 'topic', 'id': topic_id, 'title': title, 'subtitle': grade,
+            'url': reverse('topics:topic_detail', args=[slug]),
+        })
+    for quiz_id, title, topic in Quiz.objects.filter(
+        is_active=True, topic__is_active=True
+    ).values_list('id', 'title', 'topic__title'):
+        entries.append({
+            'type': 'quiz', 'id': quiz_id, 'title': title, 'subtitle': topic,
+            'url': reverse('quizzes:quiz_detail', args=[quiz_id]),
+        })
+    for simulation_id, title, topic in Simulation.objects.filter(
+        is_active=True, topic__is_active=True
+    ).values_list('id', 'title', 'topic__title'):
+        entries.append({
+            'type': 'simulation', 'id': simulation_id, 'title': title, 'subtitle': topic,
+            'url': reverse('simulations:interactive_simulation', args=[simulation_id]),
+        })
+    for formula_id, name, topic, slug in TopicFormula.objects.filter(
+        topic__is_active=True
+    ).values_list('id', 'name', 'topic__title', 'topic__slug'):
+        entries.append({
+            'type': 'formula', 'id': formula_id, 'title': name, 'subtitle': topic,
+            'url': reverse('topics:topic_detail', args=[slug]),
+        })
+    return entries
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # A fresh token rather than a counter, so an evicted or cleared key
+        # can never make a stale in-process index look current again.
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate():
+    """Mark the index stale in every process sharing the cache"""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def get_index(version):
+    global _index
+    index = _index
+    if index is None or index[0] != version:
+        with _lock:
+            if _index is None or _index[0] != version:
+                _index = (version, SuggestionIndex(build_entries()))
+            index = _index
+    return index[1]
+
+
+def suggest(query, limit=8):
+    """Return up to ``limit`` suggestion dicts for a partially typed query"""
+    tokens = tokenize(query[:MAX_QUERY_LENGTH])
+    normalized = ' '.join(tokens)
+    if len(normalized) < MIN_PREFIX_LENGTH:
+        return []
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    version = current_version()
+    key = 'search-suggest:%s:%s:%s' % (version, limit, normalized.replace(' ', '+'))
+    results = cache.get(key)
+    if results is None:
+        results = get_index(version).lookup(tokens, limit)
+        cache.set(key, results, RESULT_TIMEOUT)
+    return results
@@ -0,0 +1,48 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from topics import fragments
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, name, obj, depends_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.obj = obj
+        self.depends_on = depends_on
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        obj = self.obj.resolve(context)
+        depends_on = [dependency.resolve(context) for dependency in self.depends_on]
+        return mark_safe(fragments.get_or_render(
+            name, obj, lambda: self.nodelist.render(context), depends_on
+        ))
+
+
+@register.tag
+def cachefragment(parser, token):
+    """
+    Cache the enclosed template block per object::
+
+        {% cachefragment "quiz_card" quiz quiz.topic %} ... {% endcachefragment %}
+
+    The first argument names the fragment, the second is the object it
+    belongs to and any further objects are dependencies whose ``updated_at``
+    must also match for the cached HTML to be reused.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag requires a fragment name and an object"
+        )
+    nodelist = parser.parse(('endcachefragment',))
+    parser.delete_first_token()
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        parser.compile_filter(bits[2]),
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
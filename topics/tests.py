@@ -1,3 +1,423 @@
+from django.core.cache import cache, caches
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from physics_application.testing import ListPageQueryCountTestCase
+from . import fragments, graph, search
+from .models import CBCGrade, PhysicsTopic, TopicContent, TopicFormula
+
+
+def clear_caches():
+    # Test rollbacks do not fire signals, so start every test cold
+    for alias in ('default', 'fragments'):
+        caches[alias].clear()
+
+
+def make_topic(grade, title, **kwargs):
+    defaults = {
+        'slug': title.lower().replace(' ', '-'),
+        'description': f'About {title.lower()}',
+        'learning_outcomes': 'Students will learn things.',
+        'estimated_duration': 30,
+    }
+    defaults.update(kwargs)
+    return PhysicsTopic.objects.create(grade=grade, title=title, **defaults)
+
+
+class TopicSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.grade = CBCGrade.objects.create(name='Grade 7', order=1)
+        cls.motion = make_topic(cls.grade, 'Introduction to Motion',
+                                description='Speed, velocity and acceleration.')
+        cls.waves = make_topic(cls.grade, 'Waves and Sound',
+                               description='Wave motion and properties. Sound travels with a velocity.')
+        cls.optics = make_topic(cls.grade, 'Light and Optics',
+                                description='Reflection and refraction.')
+
+    def test_title_match_ranks_above_description_match(self):
+        results = search.search_topics('velocity')
+        self.assertEqual(set(results), {self.motion, self.waves})
+
+        results = search.search_topics('motion')
+        self.assertEqual(results, [self.motion, self.waves])
+
+    def test_prefix_matching(self):
+        self.assertEqual(search.search_topics('refrac'), [self.optics])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(search.search_topics('sound velocity'), [self.waves])
+        self.assertEqual(search.search_topics('sound refraction'), [])
+
+    def test_fts_syntax_is_not_interpreted(self):
+        self.assertEqual(search.search_topics('"intro"*) ^('), [self.motion])
+        self.assertEqual(search.search_topics('motion OR optics'), [])
+        self.assertEqual(search.search_topics('*** ---'), [])
+
+    def test_content_and_formulas_are_indexed_through_signals(self):
+        content = TopicContent.objects.create(
+            topic=self.optics, content_type='theory', title='Lenses',
+            content='Converging lenses focus parallel rays.'
+        )
+        self.assertEqual(search.search_topics('converging'), [self.optics])
+
+        TopicFormula.objects.create(
+            topic=self.waves, name='Wave speed', formula='v = f\\lambda',
+            description='Frequency times wavelength', variables={}, units='m/s'
+        )
+        self.assertEqual(search.search_topics('wavelength'), [self.waves])
+
+        content.delete()
+        self.assertEqual(search.search_topics('converging'), [])
+
+    def test_topic_edits_and_deletes_update_the_index(self):
+        self.motion.title = 'Kinematics'
+        self.motion.save()
+        self.assertEqual(search.search_topics('kinematics'), [self.motion])
+
+        self.motion.delete()
+        self.assertEqual(search.search_topics('kinematics'), [])
+
+    def test_inactive_topics_are_excluded(self):
+        self.optics.is_active = False
+        self.optics.save()
+        self.assertEqual(search.search_topics('optics'), [])
+
+    def test_rebuild_index(self):
+        self.assertEqual(search.rebuild_index(), 3)
+        self.assertEqual(search.search_topics('optics'), [self.optics])
+
+    def test_search_view(self):
+        response = self.client.get(reverse('topics:search_topics'), {'q': 'refl'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['topics']), [self.optics])
+
+
+class SearchSuggestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from quizzes.models import Quiz
+        from simulations.models import Simulation
+
+        grade = CBCGrade.objects.create(name='Grade 8', order=2)
+        cls.forces = make_topic(grade, 'Forces and Newton\'s Laws', slug='forces')
+        cls.formula = TopicFormula.objects.create(
+            topic=cls.forces, name='Newton\'s Second Law', formula='F = ma',
+            description='Force equals mass times acceleration', variables={}, units='N'
+        )
+        cls.quiz = Quiz.objects.create(
+            topic=cls.forces, title='Forces Quiz', instructions='Answer everything.'
+        )
+        cls.simulation = Simulation.objects.create(
+            topic=cls.forces, title='Inclined Plane Forces', description='Push blocks.',
+            simulation_type='motion', html_content='<div></div>',
+            learning_objectives='Friction', instructions='Drag the block.'
+        )
+
+    def setUp(self):
+        clear_caches()
+
+    def get_suggestions(self, query, **params):
+        response = self.client.get(reverse('search_suggest'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_returns_matches_of_every_type_in_rank_order(self):
+        results = self.get_suggestions('for')
+        self.assertEqual(
+            [(result['type'], result['title']) for result in results],
+            [('topic', 'Forces and Newton\'s Laws'), ('quiz', 'Forces Quiz'),
+             ('simulation', 'Inclined Plane Forces')],
+        )
+        self.assertEqual(results[0]['url'], reverse('topics:topic_detail', args=['forces']))
+
+        results = self.get_suggestions('newton')
+        self.assertEqual([result['type'] for result in results], ['formula', 'topic'])
+
+    def test_multi_word_prefixes_and_limit(self):
+        results = self.get_suggestions('newt sec')
+        self.assertEqual([result['id'] for result in results], [self.formula.id])
+        self.assertEqual(len(self.get_suggestions('forces', limit=1)), 1)
+
+    def test_short_queries_return_nothing(self):
+        self.assertEqual(self.get_suggestions('f'), [])
+        self.assertEqual(self.get_suggestions('  !! '), [])
+
+    def test_warm_lookups_do_not_query_the_database(self):
+        self.get_suggestions('inc')
+        with self.assertNumQueries(0):
+            self.get_suggestions('incl')
+            self.get_suggestions('INC')
+
+    def test_catalogue_changes_invalidate_suggestions(self):
+        self.assertEqual(self.get_suggestions('incl')[0]['id'], self.simulation.id)
+        self.simulation.is_active = False
+        self.simulation.save()
+        self.assertEqual(self.get_suggestions('incl'), [])
+
+
+def add_topics(grades, count, start=0):
+    """Bulk-create ``count`` topics spread over ``grades`` (no signals fire)"""
+    PhysicsTopic.objects.bulk_create([
+        PhysicsTopic(
+            grade=grades[i % len(grades)], title=f'Topic {i}', slug=f'topic-{i}',
+            description='Energy and motion', learning_outcomes='Outcomes',
+            estimated_duration=30, order=i,
+        )
+        for i in range(start, start + count)
+    ])
+
+
+class ListPageQueryCountTests(ListPageQueryCountTestCase):
+    def add_rows(self, start, stop):
+        add_topics(self.grades, stop - start, start=start)
+
+    def test_home(self):
+        # validators (topics, grades), grades, featured topics
+        self.assertConstantQueries(4, reverse('topics:home'))
+
+    def test_topic_list(self):
+        # validators, topics with their grade
+        self.assertConstantQueries(2, reverse('topics:topic_list'))
+
+    def test_topic_list_by_grade(self):
+        # validators (topics, grade), topics with their grade, grade
+        self.assertConstantQueries(4, reverse('topics:topic_list_by_grade', args=[self.grades[0].id]))
+
+    def test_search_topics(self):
+        # validators, full-text match, matching topics with their grade
+        self.assertConstantQueries(3, reverse('topics:search_topics'), {'q': 'energy'}, prepare=search.rebuild_index)
+
+
+class TopicDetailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.grade = CBCGrade.objects.create(name='Grade 9', order=3)
+        cls.topic = make_topic(cls.grade, 'Electricity', slug='electricity')
+        for order in (2, 1):
+            TopicContent.objects.create(topic=cls.topic, content_type='theory',
+                                        title=f'Section {order}', content='Charge', order=order)
+
+    def setUp(self):
+        clear_caches()
+
+    def get_detail(self, slug='electricity'):
+        return self.client.get(reverse('topics:topic_detail', args=[slug]))
+
+    def test_context_is_prefetched_then_cached(self):
+        # validators, topic with grade, then one batch per related set
+        with self.assertNumQueries(6):
+            response = self.get_detail()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['topic'].grade.name, 'Grade 9')
+        self.assertEqual([c.title for c in response.context['contents']], ['Section 1', 'Section 2'])
+
+        with self.assertNumQueries(1):
+            response = self.get_detail()
+        self.assertContains(response, 'Section 2')
+
+    def test_related_changes_invalidate_the_cached_page(self):
+        from .models import TopicExperiment, TopicMedia
+
+        self.get_detail()
+        related = [
+            TopicContent(topic=self.topic, content_type='example', title='Worked example', content='Ohm'),
+            TopicMedia(topic=self.topic, media_type='image', title='Circuit diagram', file='a.png'),
+            TopicFormula(topic=self.topic, name='Ohm law', formula='V = IR',
+                         description='Voltage', variables={}, units='V'),
+            TopicExperiment(topic=self.topic, title='Build a circuit', objective='Light a bulb',
+                            materials_needed='Battery', procedure='Connect', expected_results='Light'),
+        ]
+        for instance in related:
+            with self.subTest(model=type(instance).__name__):
+                title = getattr(instance, 'title', None) or instance.name
+                instance.save()
+                self.assertContains(self.get_detail(), title)
+                instance.delete()
+                self.assertNotContains(self.get_detail(), title)
+
+    def test_topic_and_grade_changes_invalidate_the_cached_page(self):
+        self.get_detail()
+        self.grade.name = 'Grade Nine'
+        self.grade.save()
+        self.assertContains(self.get_detail(), 'Grade Nine')
+
+        self.topic.slug = 'electric-circuits'
+        self.topic.save()
+        self.assertEqual(self.get_detail().status_code, 404)
+        self.assertEqual(self.get_detail('electric-circuits').status_code, 200)
+
+        self.topic.is_active = False
+        self.topic.save()
+        self.assertEqual(self.get_detail('electric-circuits').status_code, 404)
+
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from quizzes.models import Quiz
+
+        cls.grade = CBCGrade.objects.create(name='Grade 10', order=4)
+        cls.topic = make_topic(cls.grade, 'Thermodynamics', slug='thermodynamics')
+        cls.quiz = Quiz.objects.create(topic=cls.topic, title='Heat Quiz', instructions='Go')
+
+    def setUp(self):
+        clear_caches()
+        fragments.reset_stats()
+
+    def test_fragments_are_rendered_once_then_served_from_cache(self):
+        self.client.get(reverse('topics:topic_list'))
+        self.client.get(reverse('topics:topic_list'))
+        self.client.get(reverse('topics:topic_detail', args=['thermodynamics']))
+        self.assertEqual(fragments.stats(), {
+            'topic_card': {'hits': 1, 'misses': 1},
+            'topic_detail': {'hits': 0, 'misses': 1},
+        })
+
+    def test_saving_an_object_evicts_its_fragments(self):
+        key = fragments.fragment_key('topic_card', self.topic)
+        self.client.get(reverse('topics:topic_list'))
+        self.assertIsNotNone(caches['fragments'].get(key))
+
+        self.topic.title = 'Heat and Temperature'
+        self.topic.save()
+        self.assertIsNone(caches['fragments'].get(key))
+        self.assertContains(self.client.get(reverse('topics:topic_list')), 'Heat and Temperature')
+
+    def test_related_changes_reach_dependent_fragments(self):
+        self.assertContains(self.client.get(reverse('quizzes:quiz_list')), 'Grade 10')
+        self.assertContains(self.client.get(reverse('topics:topic_detail', args=['thermodynamics'])),
+                            'Thermodynamics')
+
+        self.grade.name = 'Senior Grade'
+        self.grade.save()
+        self.assertContains(self.client.get(reverse('quizzes:quiz_list')), 'Senior Grade')
+
+        TopicContent.objects.create(topic=self.topic, content_type='theory',
+                                    title='Entropy', content='Disorder')
+        self.assertContains(self.client.get(reverse('topics:topic_detail', args=['thermodynamics'])),
+                            'Entropy')
+        self.assertEqual(fragments.stats()['quiz_card'], {'hits': 0, 'misses': 2})
+
+    def test_stats_view_is_staff_only(self):
+        from django.contrib.auth.models import User
+
+        url = reverse('topics:fragment_cache_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        self.assertEqual(self.client.get(url).json()['fragments'], {})
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.grade = CBCGrade.objects.create(name='Grade 11', order=5)
+        cls.topic = make_topic(cls.grade, 'Optics', slug='optics')
+
+    def setUp(self):
+        clear_caches()
+
+    def test_revalidation_returns_304_without_rendering(self):
+        url = reverse('topics:topic_detail', args=['optics'])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        with self.assertNumQueries(1), self.assertTemplateNotUsed('topics/topic_detail.html'):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_validators_change_with_the_page_content(self):
+        url = reverse('topics:topic_list')
+        etag = self.client.get(url)['ETag']
+
+        TopicContent.objects.create(topic=self.topic, content_type='theory',
+                                    title='Mirrors', content='Plane mirrors')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        lenses = make_topic(self.grade, 'Lenses', slug='lenses')
+        etag = self.client.get(url)['ETag']
+        lenses.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_depends_on_query_string(self):
+        url = reverse('topics:search_topics')
+        first = self.client.get(url, {'q': 'optics'})['ETag']
+        second = self.client.get(url, {'q': 'light'})['ETag']
+        self.assertNotEqual(first, second)
+
+    def test_quiz_pages_follow_question_changes(self):
+        from quizzes.models import Quiz, Question
+
+        quiz = Quiz.objects.create(topic=self.topic, title='Optics Quiz', instructions='Go')
+        url = reverse('quizzes:quiz_detail', args=[quiz.id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Question.objects.create(quiz=quiz, question_type='true_false', question_text='Light bends?')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class PrerequisiteGraphTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        grade = CBCGrade.objects.create(name='Grade 9', order=1)
+        names = ['Measurement', 'Motion', 'Forces', 'Energy', 'Waves', 'Optics']
+        cls.topic = {name: make_topic(grade, name, order=n) for n, name in enumerate(names)}
+        cls.topic['Motion'].prerequisites.add(cls.topic['Measurement'])
+        cls.topic['Forces'].prerequisites.add(cls.topic['Motion'])
+        cls.topic['Energy'].prerequisites.add(cls.topic['Forces'], cls.topic['Measurement'])
+        cls.topic['Optics'].prerequisites.add(cls.topic['Waves'])
+
+    def setUp(self):
+        clear_caches()
+
+    def ids(self, *names):
+        return [self.topic[name].id for name in names]
+
+    def test_built_with_one_query(self):
+        with self.assertNumQueries(1):
+            topics = graph.get_graph()
+        with self.assertNumQueries(0):
+            self.assertIs(graph.get_graph(), topics)
+        self.assertEqual(topics.topological_order(),
+                         self.ids('Measurement', 'Motion', 'Forces', 'Energy', 'Waves', 'Optics'))
+        self.assertEqual(topics.prerequisites(self.topic['Energy'].id),
+                         self.ids('Measurement', 'Motion', 'Forces'))
+        self.assertEqual(topics.prerequisites(self.topic['Energy'].id, transitive=False),
+                         self.ids('Measurement', 'Forces'))
+        self.assertTrue(topics.requires(self.topic['Energy'].id, self.topic['Motion'].id))
+        self.assertFalse(topics.requires(self.topic['Motion'].id, self.topic['Energy'].id))
+
+    def test_unlocked_topics(self):
+        topics = graph.get_graph()
+        self.assertEqual(topics.unlocked([]), self.ids('Measurement', 'Waves'))
+        self.assertEqual(topics.unlocked(self.ids('Measurement', 'Motion')), self.ids('Forces', 'Waves'))
+        self.assertEqual(topics.path_to(self.topic['Energy'].id, self.ids('Measurement')),
+                         self.ids('Motion', 'Forces', 'Energy'))
+
+    def test_cycles_are_refused(self):
+        with self.assertRaises(ValidationError), transaction.atomic():
+            self.topic['Measurement'].prerequisites.add(self.topic['Energy'])
+        with self.assertRaises(ValidationError), transaction.atomic():
+            self.topic['Energy'].prerequisite_for.add(self.topic['Measurement'])
+        with self.assertRaises(ValidationError), transaction.atomic():
+            self.topic['Waves'].prerequisites.add(self.topic['Waves'])
+        self.assertFalse(self.topic['Measurement'].prerequisites.exists())
+
+    def test_changes_rebuild_the_graph(self):
+        graph.get_graph()
+        self.topic['Waves'].prerequisites.add(self.topic['Energy'])
+        self.assertEqual(graph.get_graph().unlocked(self.ids('Measurement', 'Motion', 'Forces')),
+                         self.ids('Energy'))
+        self.topic['Energy'].is_active = False
+        self.topic['Energy'].save()
+        self.assertEqual(graph.get_graph().unlocked(self.ids('Measurement', 'Motion', 'Forces')),
+                         self.ids('Waves'))
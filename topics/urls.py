@@ -12,4 +12,5 @@ urlpatterns = [
     # path('topic/<int:topic_id>/start/', views.start_topic, name='start_topic'),
     # path('topic/<int:topic_id>/complete/', views.complete_topic, name='complete_topic'),
     path('search/', views.search_topics, name='search_topics'),
+    path('cache/stats/', views.fragment_cache_stats, name='fragment_cache_stats'),
 ]
\ No newline at end of file
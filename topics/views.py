@@ -1,18 +1,29 @@
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse, Http404
+from django.utils.cache import patch_cache_control
 from django.db.models import Q
 from django.utils import timezone
 from .models import PhysicsTopic, TopicContent, TopicMedia, TopicFormula, TopicExperiment, CBCGrade
+from . import caching, conditional, fragments, search, suggest
 # Remove UserProfile import since it requires authentication
 # from progress.models import TopicProgress, UserProfile
 
 # Remove login_required decorator
 # from django.contrib.auth.decorators import login_required
 
+def home_state(request):
+    return conditional.page_state(
+        (PhysicsTopic.objects.filter(is_active=True), ['updated_at']),
+        (CBCGrade.objects.all(), []),
+    )
+
+
+@conditional.catalogue_page(home_state)
 def home(request):
     """Home page with overview of physics topics"""
     grades = CBCGrade.objects.all().order_by('order')
-    featured_topics = PhysicsTopic.objects.filter(is_active=True)[:6]
+    featured_topics = PhysicsTopic.objects.filter(is_active=True).select_related('grade')[:6]
     
     context = {
         'grades': grades,
@@ -21,9 +32,19 @@ def home(request):
     return render(request, 'topics/home.html', context)
 
 
+def topic_list_state(request, grade_id=None):
+    topics = PhysicsTopic.objects.filter(is_active=True)
+    grades = CBCGrade.objects.none()
+    if grade_id:
+        topics = topics.filter(grade_id=grade_id)
+        grades = CBCGrade.objects.filter(id=grade_id)
+    return conditional.page_state((topics, ['updated_at']), (grades, []))
+
+
+@conditional.catalogue_page(topic_list_state)
 def topic_list(request, grade_id=None):
     """List all physics topics, optionally filtered by grade"""
-    topics = PhysicsTopic.objects.filter(is_active=True)
+    topics = PhysicsTopic.objects.filter(is_active=True).select_related('grade')
     
     if grade_id:
         topics = topics.filter(grade_id=grade_id)
@@ -38,23 +59,20 @@ def topic_list(request, grade_id=None):
     return render(request, 'topics/topic_list.html', context)
 
 
+def topic_detail_state(request, topic_slug):
+    return conditional.page_state(
+        (PhysicsTopic.objects.filter(slug=topic_slug, is_active=True), ['updated_at']),
+    )
+
+
+@conditional.catalogue_page(topic_detail_state)
 def topic_detail(request, topic_slug):
     """Detailed view of a physics topic"""
-    topic = get_object_or_404(PhysicsTopic, slug=topic_slug, is_active=True)
-    
-    # Get topic content
-    contents = topic.contents.all().order_by('order')
-    media = topic.media.all().order_by('order')
-    formulas = topic.formulas.all().order_by('order')
-    experiments = topic.experiments.all().order_by('order')
+    # Topic, grade and related content, cached per slug until any of it changes
+    context = caching.get_topic_detail(topic_slug)
+    if context is None:
+        raise Http404('No PhysicsTopic matches the given query.')
     
-    context = {
-        'topic': topic,
-        'contents': contents,
-        'media': media,
-        'formulas': formulas,
-        'experiments': experiments,
-    }
     return render(request, 'topics/topic_detail.html', context)
 
 
@@ -104,20 +122,51 @@ def topic_detail(request, topic_slug):
 #         })
 
 
+def search_topics_state(request):
+    # Results depend on content and formulas, whose changes touch their topic
+    return conditional.page_state(
+        (PhysicsTopic.objects.filter(is_active=True), ['updated_at']),
+    )
+
+
+@conditional.catalogue_page(search_topics_state)
 def search_topics(request):
     """Search physics topics"""
     query = request.GET.get('q', '')
     topics = PhysicsTopic.objects.filter(is_active=True)
     
     if query:
-        topics = topics.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(learning_outcomes__icontains=query)
-        )
+        # Ranked full-text match over topics, their content and formulas
+        topics = search.search_topics(query, topics)
     
     context = {
         'topics': topics,
         'query': query,
     }
-    return render(request, 'topics/search_results.html', context)
\ No newline at end of file
+    return render(request, 'topics/search_results.html', context)
+
+
+def search_suggest(request):
+    """JSON typeahead suggestions across topics, quizzes, simulations and formulas"""
+    query = request.GET.get('q', '')
+    try:
+        limit = int(request.GET.get('limit', 8))
+    except ValueError:
+        limit = 8
+    
+    response = JsonResponse({
+        'query': query,
+        'results': suggest.suggest(query, limit),
+    })
+    # Let browsers and proxies absorb repeated keystrokes for the same prefix
+    patch_cache_control(response, public=True, max_age=60)
+    return response
+
+
+@staff_member_required
+def fragment_cache_stats(request):
+    """Hit/miss counters of the rendered-fragment cache in this worker"""
+    return JsonResponse({
+        'backend': fragments.get_cache().__class__.__name__,
+        'fragments': fragments.stats(),
+    })